@@ -38,8 +38,56 @@ class PinballConfig(object):
     # Master and client configuration.
     MASTER_HOST = socket.gethostname()
     MASTER_PORT = 9090
+    # List of 'host:port' addresses of masters owning shards of tokens.  If
+    # set, tokens of each workflow live in one of the masters and clients
+    # route requests to them.  A master serving a shard is started with its
+    # index on the list and persists tokens in tables suffixed with it.
+    MASTER_SHARDS = None
     CLIENT_CONNECT_ATTEMPTS = 10
     CLIENT_TIMEOUT_SEC = 3 * 60
+    # Maximum number of connections to the master shared by clients created
+    # by the same factory.  A thread waits for a free connection if all of
+    # them are in use.  If None, each client opens its own connection.
+    # Pooling suits processes running many short requests in parallel.
+    # Long-polling watchers, e.g., idle workers, are better off with their
+    # own connections since pooled watches are split as described below.
+    CLIENT_POOL_SIZE = None
+    # Clients sharing connections split long watches into calls blocking on
+    # the master for at most this long so that watchers do not hold on to
+    # connections needed by other threads.
+    CLIENT_POOLED_WATCH_TIMEOUT_MS = 1000
+    # Path of the master write-ahead log.  If set, the master makes token
+    # changes durable in the log and updates the database in the background.
+    # Archived tokens are then moved to the archive tables in bulk, off the
+    # path of archive requests.  The log is local to the master so it cannot
+    # be used by a hot standby started with --leader.
+    MASTER_WAL_PATH = None
+    # Path of the master checkpoint.  If set, the master periodically stores
+    # a snapshot of its tokens there to speed up restarts.
+    MASTER_CHECKPOINT_PATH = None
+    # Type of the master server.  A 'threaded' server dedicates a thread to
+    # each client connection.  A 'nonblocking' server handles all connections
+    # in a single event loop and executes requests in a pool of
+    # MASTER_SERVER_THREADS threads.  Clients talk to a nonblocking server
+    # with the framed transport.
+    MASTER_SERVER_TYPE = 'threaded'
+    MASTER_SERVER_THREADS = 16
+    # Wire format of master RPCs.  The protocol is either 'binary' or
+    # 'compact'.  The framed transport is always used with the nonblocking
+    # server.  If the data compression is 'zlib', token data is compressed
+    # on the wire.  The master and its clients must use the same settings.
+    MASTER_PROTOCOL = 'binary'
+    MASTER_FRAMED_TRANSPORT = False
+    MASTER_DATA_COMPRESSION = None
+    # Port of the HTTP server exposing master metrics in the Prometheus text
+    # format at /metrics.  If None, metrics are available only through the
+    # stats RPC.
+    MASTER_METRICS_PORT = None
+    # Path of the file where the master records requests it receives, e.g.,
+    # to replay them in tests.pinball.master.replay_benchmark.  If None,
+    # requests are not recorded.  The file grows with every request so
+    # recording should be enabled only for a limited time.
+    MASTER_RECORD_PATH = None
 
     # Number of workers
     WORKERS = 50
@@ -0,0 +1,202 @@
+# Copyright 2015, Pinterest, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Client keeping multiple requests to the token master in flight.
+
+Requests are sent by a bounded set of background threads through a regular,
+thread-safe client.  Each call returns immediately with a future of the
+response.  E.g., a tool modifying tokens of hundreds of workflow instances
+may issue all modifications first and then wait for their outcomes:
+
+    async_client = factory.get_async_client()
+    futures = [async_client.modify(request) for request in requests]
+    responses = [future.result() for future in futures]
+"""
+import Queue
+import sys
+import threading
+
+from pinball.config.utils import get_log
+
+
+__author__ = 'Pawel Garbacki'
+__copyright__ = 'Copyright 2015, Pinterest, Inc.'
+__credits__ = [__author__]
+__license__ = 'Apache'
+__version__ = '2.0'
+
+
+LOG = get_log('pinball.master.async_client')
+
+
+class Future(object):
+    """Outcome of a request that is being executed in the background."""
+
+    def __init__(self):
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+        self._response = None
+        self._exc_info = None
+        self._callbacks = []
+
+    def done(self):
+        return self._done.is_set()
+
+    def result(self, timeout=None):
+        """Wait for the response.
+
+        Args:
+            timeout: The maximum time, in seconds, to wait.  If not set, the
+                call blocks until the response arrives.
+        Returns:
+            The response to the request.
+        Raises:
+            The exception raised by the request, e.g., TokenMasterException.
+            If the response did not arrive within the timeout, an Exception
+            is raised.
+        """
+        if not self._done.wait(timeout):
+            raise Exception('timed out waiting for the response')
+        if self._exc_info:
+            raise self._exc_info[0], self._exc_info[1], self._exc_info[2]
+        return self._response
+
+    def add_done_callback(self, callback):
+        """Run a function once the response arrives.
+
+        Args:
+            callback: The function taking the future as the argument.  If the
+                future is already done, the function is called right away.
+                Otherwise, it is called by the thread executing the request.
+        """
+        with self._lock:
+            if not self._done.is_set():
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+    def _set_outcome(self, response, exc_info):
+        with self._lock:
+            self._response = response
+            self._exc_info = exc_info
+            self._done.set()
+            callbacks = self._callbacks
+            self._callbacks = []
+        for callback in callbacks:
+            try:
+                callback(self)
+            except:
+                LOG.exception('')
+
+
+class AsyncClient(object):
+    """Client executing requests asynchronously.
+
+    The interface mirrors that of Client but the methods return futures of
+    responses rather than the responses themselves.
+    """
+
+    def __init__(self, client, max_in_flight):
+        """Create an asynchronous client.
+
+        Args:
+            client: The client used to send requests.  It must be safe to use
+                from multiple threads, e.g., a local client or a remote
+                client sharing a connection pool.
+            max_in_flight: The maximum number of requests executed
+                concurrently.  Other requests wait in a queue.
+        """
+        self._client = client
+        self._max_in_flight = max_in_flight
+        self._requests = Queue.Queue()
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def _start_threads(self):
+        with self._lock:
+            if self._threads:
+                return
+            for _ in range(0, self._max_in_flight):
+                thread = threading.Thread(target=self._run)
+                thread.daemon = True
+                thread.start()
+                self._threads.append(thread)
+
+    def _run(self):
+        while True:
+            item = self._requests.get()
+            if not item:
+                return
+            future, function, args = item
+            try:
+                response = function(*args)
+            except:
+                future._set_outcome(None, sys.exc_info())
+            else:
+                future._set_outcome(response, None)
+
+    def _submit(self, function, *args):
+        self._start_threads()
+        future = Future()
+        self._requests.put((future, function, args))
+        return future
+
+    def call(self, request):
+        return self._submit(self._client.call, request)
+
+    def call_many(self, requests, atomic=False):
+        """Execute multiple requests in a single call to the master.
+
+        See Client.call_many for details.
+
+        Returns:
+            The future of the list of responses.
+        """
+        return self._submit(self._client.call_many, requests, atomic)
+
+    def close(self):
+        """Stop the background threads once queued requests are executed."""
+        with self._lock:
+            for _ in self._threads:
+                self._requests.put(None)
+            self._threads = []
+
+    # For description of individual methods, see master.thrift.
+
+    def archive(self, request):
+        return self.call(request)
+
+    def batch(self, request):
+        return self.call(request)
+
+    def group(self, request):
+        return self.call(request)
+
+    def modify(self, request):
+        return self.call(request)
+
+    def query(self, request):
+        return self.call(request)
+
+    def query_and_own(self, request):
+        return self.call(request)
+
+    def renew(self, request):
+        return self.call(request)
+
+    def stats(self, request):
+        return self.call(request)
+
+    def watch(self, request):
+        return self.call(request)
@@ -0,0 +1,129 @@
+# Copyright 2015, Pinterest, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Conversion of requests and responses to and from batch elements.
+
+Thrift has no polymorphic types so elements of a batch are structs with one
+field per request or response type.  Exactly one of the fields is set.
+"""
+
+from pinball.master.thrift_lib.ttypes import ArchiveRequest
+from pinball.master.thrift_lib.ttypes import ErrorCode
+from pinball.master.thrift_lib.ttypes import GroupRequest
+from pinball.master.thrift_lib.ttypes import GroupResponse
+from pinball.master.thrift_lib.ttypes import ModifyRequest
+from pinball.master.thrift_lib.ttypes import ModifyResponse
+from pinball.master.thrift_lib.ttypes import QueryAndOwnRequest
+from pinball.master.thrift_lib.ttypes import QueryAndOwnResponse
+from pinball.master.thrift_lib.ttypes import QueryRequest
+from pinball.master.thrift_lib.ttypes import QueryResponse
+from pinball.master.thrift_lib.ttypes import RenewRequest
+from pinball.master.thrift_lib.ttypes import RenewResponse
+from pinball.master.thrift_lib.ttypes import Request
+from pinball.master.thrift_lib.ttypes import Response
+from pinball.master.thrift_lib.ttypes import TokenMasterException
+
+
+__author__ = 'Pawel Garbacki'
+__copyright__ = 'Copyright 2015, Pinterest, Inc.'
+__credits__ = [__author__]
+__license__ = 'Apache'
+__version__ = '2.0'
+
+
+# Mapping from request class to the name of the batch element field holding
+# requests of this type.
+_REQUEST_TO_FIELD = {ArchiveRequest: 'archive',
+                     GroupRequest: 'group',
+                     ModifyRequest: 'modify',
+                     QueryAndOwnRequest: 'queryAndOwn',
+                     QueryRequest: 'query',
+                     RenewRequest: 'renew'}
+
+# Mapping from response class to the name of the batch element field holding
+# responses of this type.
+_RESPONSE_TO_FIELD = {GroupResponse: 'group',
+                      ModifyResponse: 'modify',
+                      QueryAndOwnResponse: 'queryAndOwn',
+                      QueryResponse: 'query',
+                      RenewResponse: 'renew'}
+
+
+def pack_request(request):
+    """Wrap a request in a batch element.
+
+    Args:
+        request: The request to wrap.
+    Returns:
+        The Request with the field corresponding to the request type set.
+    """
+    field = _REQUEST_TO_FIELD.get(request.__class__)
+    if not field:
+        raise TokenMasterException(
+            ErrorCode.INPUT_ERROR,
+            '%s cannot be batched' % request.__class__.__name__)
+    result = Request()
+    setattr(result, field, request)
+    return result
+
+
+def unpack_request(request):
+    """Extract a request from a batch element.
+
+    Args:
+        request: The Request to unwrap.
+    Returns:
+        The request stored in the batch element.
+    """
+    requests = [getattr(request, field) for field in
+                _REQUEST_TO_FIELD.values()
+                if getattr(request, field) is not None]
+    if len(requests) != 1:
+        raise TokenMasterException(
+            ErrorCode.INPUT_ERROR,
+            'batched request %s should have exactly one field set' % request)
+    return requests[0]
+
+
+def pack_response(response):
+    """Wrap a response in a batch element.
+
+    Args:
+        response: The response to wrap.  None for archive requests.
+    Returns:
+        The Response with the field corresponding to the response type set.
+    """
+    result = Response()
+    if response is not None:
+        setattr(result, _RESPONSE_TO_FIELD[response.__class__], response)
+    return result
+
+
+def unpack_response(response):
+    """Extract a response from a batch element.
+
+    Args:
+        response: The Response to unwrap.
+    Returns:
+        The response stored in the batch element, the exception describing
+        the request failure, or None if the element is a response to an
+        archive request.
+    """
+    if response.error is not None:
+        return response.error
+    for field in _RESPONSE_TO_FIELD.values():
+        result = getattr(response, field)
+        if result is not None:
+            return result
+    return None
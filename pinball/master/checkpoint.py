@@ -0,0 +1,116 @@
+# Copyright 2015, Pinterest, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Snapshots of the master token trie stored in a local file.
+
+Loading all tokens from the database is slow for large token sets.  A master
+periodically writes its tokens to a checkpoint file.  On restart, the file is
+loaded with a single sequential read and only tokens changed after the
+checkpoint are read from the store.
+"""
+import cPickle
+import os
+import struct
+import zlib
+
+from pinball.config.utils import get_log
+from pinball.master.thrift_lib.ttypes import Token
+
+
+__author__ = 'Pawel Garbacki'
+__copyright__ = 'Copyright 2015, Pinterest, Inc.'
+__credits__ = [__author__]
+__license__ = 'Apache'
+__version__ = '2.0'
+
+
+LOG = get_log('pinball.master.checkpoint')
+
+
+class Checkpoint(object):
+    """A file with a snapshot of active tokens at a given blessed version.
+
+    The file consists of a header with the format identifier, the blessed
+    version, the payload length, and the payload crc32, followed by the
+    payload.  The payload is a pickled list of token field tuples.  The file is
+    written to a temporary location and renamed so a crash never leaves a
+    partially written checkpoint behind.
+    """
+    _MAGIC = 'PBCKPT01'
+    _HEADER = struct.Struct('>8sqIi')
+
+    def __init__(self, path):
+        """Create a checkpoint.
+
+        Args:
+            path: The path of the checkpoint file.
+        """
+        self._path = path
+
+    def write(self, version, tokens):
+        """Replace the checkpoint with a new snapshot.
+
+        Args:
+            version: The blessed version of the snapshot.
+            tokens: The list of tokens in the snapshot.
+        """
+        payload = cPickle.dumps([(token.version,
+                                  token.name,
+                                  token.owner,
+                                  token.expirationTime,
+                                  token.priority,
+                                  token.data) for token in tokens],
+                                cPickle.HIGHEST_PROTOCOL)
+        header = Checkpoint._HEADER.pack(Checkpoint._MAGIC,
+                                         version,
+                                         len(payload),
+                                         zlib.crc32(payload))
+        tmp_path = '%s.tmp' % self._path
+        with open(tmp_path, 'wb') as checkpoint:
+            checkpoint.write(header)
+            checkpoint.write(payload)
+            checkpoint.flush()
+            os.fsync(checkpoint.fileno())
+        os.rename(tmp_path, self._path)
+        LOG.info('checkpointed %d tokens at version %d in %s', len(tokens),
+                 version, self._path)
+
+    def remove(self):
+        """Remove the checkpoint file if it exists."""
+        if os.path.exists(self._path):
+            os.remove(self._path)
+
+    def read(self):
+        """Read the snapshot from the checkpoint.
+
+        Returns:
+            Tuple (blessed version, list of tokens) or None if the checkpoint
+            does not exist or it is invalid.
+        """
+        if not os.path.exists(self._path):
+            return None
+        with open(self._path, 'rb') as checkpoint:
+            content = checkpoint.read()
+        if len(content) < Checkpoint._HEADER.size:
+            LOG.warning('ignoring truncated checkpoint %s', self._path)
+            return None
+        magic, version, length, checksum = Checkpoint._HEADER.unpack_from(
+            content)
+        payload = content[Checkpoint._HEADER.size:]
+        if (magic != Checkpoint._MAGIC or len(payload) != length or
+                zlib.crc32(payload) != checksum):
+            LOG.warning('ignoring corrupted checkpoint %s', self._path)
+            return None
+        tokens = [Token(*fields) for fields in cPickle.loads(payload)]
+        return version, tokens
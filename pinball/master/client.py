@@ -15,22 +15,36 @@
 """Interface and implementation of clients talking to the token master."""
 
 import abc
+import contextlib
+import copy
 import random
+import select
 import socket
+import threading
 import time
 
 from thrift.transport import TSocket
 from thrift.transport import TTransport
-from thrift.protocol import TBinaryProtocol
 
 from pinball.config.pinball_config import PinballConfig
 from pinball.config.utils import get_log
+from pinball.master.batch import pack_request
+from pinball.master.batch import unpack_response
 from pinball.master.thrift_lib.ttypes import ArchiveRequest
+from pinball.master.thrift_lib.ttypes import BatchRequest
 from pinball.master.thrift_lib.ttypes import GroupRequest
 from pinball.master.thrift_lib.ttypes import ModifyRequest
 from pinball.master.thrift_lib.ttypes import QueryAndOwnRequest
 from pinball.master.thrift_lib.ttypes import QueryRequest
+from pinball.master.thrift_lib.ttypes import RenewRequest
+from pinball.master.thrift_lib.ttypes import StatsRequest
+from pinball.master.thrift_lib.ttypes import TokenMasterException
+from pinball.master.thrift_lib.ttypes import WatchRequest
 from pinball.master.thrift_lib import TokenMasterService
+from pinball.master.wire import decode_token_data
+from pinball.master.wire import encode_token_data
+from pinball.master.wire import get_protocol_factory
+from pinball.master.wire import wrap_transport
 
 
 __author__ = 'Pawel Garbacki, Mao Ye'
@@ -43,6 +57,36 @@ __version__ = '2.0'
 LOG = get_log('pinball.master.client')
 
 
+def iter_tokens(client, query, page_size=1000):
+    """Iterate over tokens matching a name prefix query page by page.
+
+    Each page is retrieved in a separate request so the master does not
+    materialize the whole result at once.
+
+    Args:
+        client: The client to use when communicating with the master.
+        query: The query with the name prefix and optionally the projection
+            of tokens to retrieve.  The query is not modified.
+        page_size: The maximum number of tokens retrieved in a request.
+    Returns:
+        Iterator over matching tokens ordered on name components.
+    """
+    cursor = None
+    while True:
+        page_query = copy.copy(query)
+        page_query.startAfterName = cursor
+        page_query.pageSize = page_size
+        response = client.query(QueryRequest(queries=[page_query]))
+        if not response.tokens:
+            return
+        assert len(response.tokens) == 1
+        for token in response.tokens[0]:
+            yield token
+        if not response.nextCursors or not response.nextCursors[0]:
+            return
+        cursor = response.nextCursors[0]
+
+
 class Client(object):
     """Interface of a client communicating with token master."""
     __metaclass__ = abc.ABCMeta
@@ -55,6 +99,29 @@ class Client(object):
     def call(self, request):
         return self._request_to_end_point[request.__class__](request)
 
+    def call_many(self, requests, atomic=False):
+        """Execute multiple requests in a single call to the master.
+
+        Args:
+            requests: The list of requests to execute in order.  Watch
+                requests are not supported.
+            atomic: If True, either all requests succeed, or none does.
+        Returns:
+            The list of responses in the order of requests.  Responses to
+            archive requests are None.  If the batch is not atomic, requests
+            that failed are represented by TokenMasterException instances.
+        Raises:
+            TokenMasterException: If the batch is atomic and any request
+                failed.
+        """
+        request = BatchRequest(
+            requests=[pack_request(batched_request)
+                      for batched_request in requests],
+            atomic=atomic)
+        response = self.call(request)
+        return [unpack_response(batched_response)
+                for batched_response in response.responses]
+
     # For description of individual methods, see master.thrift.
 
     # TODO(pawel): remove these methods after replacing their invocations with
@@ -63,6 +130,9 @@ class Client(object):
     def archive(self, request):
         return self.call(request)
 
+    def batch(self, request):
+        return self.call(request)
+
     def group(self, request):
         return self.call(request)
 
@@ -75,6 +145,15 @@ class Client(object):
     def query_and_own(self, request):
         return self.call(request)
 
+    def renew(self, request):
+        return self.call(request)
+
+    def stats(self, request):
+        return self.call(request)
+
+    def watch(self, request):
+        return self.call(request)
+
 
 class LocalClient(Client):
     """Client communicating with master living in the same address space."""
@@ -84,60 +163,240 @@ class LocalClient(Client):
         self._master = master
         self._request_to_end_point = {
             ArchiveRequest: self._master.archive,
+            BatchRequest: self._master.batch,
             GroupRequest: self._master.group,
             ModifyRequest: self._master.modify,
             QueryAndOwnRequest: self._master.query_and_own,
-            QueryRequest: self._master.query}
+            QueryRequest: self._master.query,
+            RenewRequest: self._master.renew,
+            StatsRequest: self._master.stats,
+            WatchRequest: self._master.watch}
+
+
+class _Connection(object):
+    """Connection to a remote master."""
+
+    def __init__(self, host, port):
+        self._socket = TSocket.TSocket(host, port)
+        self._socket.setTimeout(1000 * PinballConfig.CLIENT_TIMEOUT_SEC)
+        self._transport = wrap_transport(self._socket)
+        protocol = get_protocol_factory().getProtocol(self._transport)
+        self.client = TokenMasterService.Client(protocol)
+        self._transport.open()
+
+    def is_healthy(self):
+        """Check if an idle connection can be reused.
+
+        An idle connection has nothing to read.  If it becomes readable, the
+        master has closed it, e.g., because the master restarted.
+
+        Returns:
+            True iff the connection is open and the master has not closed it.
+        """
+        if not self._transport.isOpen():
+            return False
+        try:
+            readable, _, _ = select.select([self._socket.handle], [], [], 0)
+        except (select.error, socket.error, ValueError):
+            return False
+        return not readable
+
+    def close(self):
+        self._transport.close()
+
+
+class ConnectionPool(object):
+    """Bounded pool of connections to a remote master shared by threads.
+
+    Connections are opened lazily, one at a time, so that after a master
+    restart the threads of a process do not all reconnect at once.  Idle
+    connections are checked before reuse and connections that failed during
+    a call are discarded.
+    """
+
+    def __init__(self, host, port, size):
+        """Create a connection pool.
+
+        Args:
+            host: The host of the master.
+            port: The port of the master.
+            size: The maximum number of open connections.
+        """
+        self._host = host
+        self._port = port
+        self._size = size
+        self._lock = threading.Lock()
+        self._released = threading.Condition(self._lock)
+        # Connections not in use, the most recently released last.
+        self._idle = []
+        # The number of open connections, both idle and in use.
+        self._open_connections = 0
+        # Serializes opening connections.
+        self._connect_lock = threading.Lock()
+
+    @staticmethod
+    def _get_backoff_time(backoff):
+        """Get the backoff time for the client reconnecting to master."""
+        return min(backoff * (1 + random.uniform(-0.5, 0.5)),
+                   PinballConfig.MAX_BACKOFF_CLIENT_RECONNECT_SEC)
+
+    def _open(self):
+        """Open a new connection retrying with a randomized backoff."""
+        with self._connect_lock:
+            backoff = PinballConfig.CLIENT_TIMEOUT_SEC
+            for i in range(0, PinballConfig.CLIENT_CONNECT_ATTEMPTS):
+                try:
+                    return _Connection(self._host, self._port)
+                except (TTransport.TTransportException, socket.timeout):
+                    LOG.exception('')
+                    if i == PinballConfig.CLIENT_CONNECT_ATTEMPTS - 1:
+                        raise
+                    LOG.warning('failed during communication with master.  '
+                                'Reconnecting %d / %d' % (
+                        i + 1, PinballConfig.CLIENT_CONNECT_ATTEMPTS - 1))
+                    backoff *= 2
+                    time.sleep(ConnectionPool._get_backoff_time(backoff))
+
+    def acquire(self):
+        """Borrow a connection from the pool.
+
+        The call blocks while all connections are in use.
+
+        Returns:
+            The borrowed connection.  It has to be returned with release().
+        """
+        with self._lock:
+            while True:
+                while self._idle:
+                    connection = self._idle.pop()
+                    if connection.is_healthy():
+                        return connection
+                    connection.close()
+                    self._open_connections -= 1
+                if self._open_connections < self._size:
+                    self._open_connections += 1
+                    break
+                self._released.wait()
+        try:
+            return self._open()
+        except:
+            with self._lock:
+                self._open_connections -= 1
+                self._released.notify()
+            raise
+
+    def release(self, connection, broken=False):
+        """Return a borrowed connection to the pool.
+
+        Args:
+            connection: The connection to return.
+            broken: If True, the connection is closed rather than reused.
+        """
+        if broken:
+            connection.close()
+        with self._lock:
+            if broken:
+                self._open_connections -= 1
+            else:
+                self._idle.append(connection)
+            self._released.notify()
+
+    @contextlib.contextmanager
+    def connection(self):
+        """Borrow a connection for the duration of a with block.
+
+        A connection that raised anything but a TokenMasterException may be
+        left in the middle of a message so it does not get reused.
+        """
+        connection = self.acquire()
+        try:
+            yield connection
+        except TokenMasterException:
+            self.release(connection)
+            raise
+        except:
+            self.release(connection, broken=True)
+            raise
+        self.release(connection)
+
+    def close(self):
+        """Close idle connections."""
+        with self._lock:
+            for connection in self._idle:
+                connection.close()
+            self._open_connections -= len(self._idle)
+            self._idle = []
 
 
 class RemoteClient(Client):
     """Thrift client communicating with a remote master."""
 
-    def __init__(self, host, port):
+    # Mapping from request class to the name of the thrift client method
+    # handling requests of this type.
+    _REQUEST_TO_METHOD = {ArchiveRequest: 'archive',
+                          BatchRequest: 'batch',
+                          GroupRequest: 'group',
+                          ModifyRequest: 'modify',
+                          QueryAndOwnRequest: 'query_and_own',
+                          QueryRequest: 'query',
+                          RenewRequest: 'renew',
+                          StatsRequest: 'stats',
+                          WatchRequest: 'watch'}
+
+    def __init__(self, host, port, pool=None):
+        """Create a remote client.
+
+        Args:
+            host: The host of the master.
+            port: The port of the master.
+            pool: The connection pool shared with other clients.  If not
+                provided, the client uses a connection of its own.
+        """
         super(RemoteClient, self).__init__()
         self._host = host
         self._port = port
-        self._request_to_end_point = None
-        self._connect()
+        self._shared_pool = pool is not None
+        if self._shared_pool:
+            self._pool = pool
+        else:
+            self._pool = ConnectionPool(host, port, 1)
+            # Fail early if the master is not reachable.
+            self._pool.release(self._pool.acquire())
 
     def __del__(self):
-        self._transport.close()
+        if not self._shared_pool:
+            self._pool.close()
 
-    def _connect(self):
-        backoff = PinballConfig.CLIENT_TIMEOUT_SEC
-        for i in range(0, PinballConfig.CLIENT_CONNECT_ATTEMPTS):
-            try:
-                transport = TSocket.TSocket(self._host, self._port)
-                transport.setTimeout(1000 * PinballConfig.CLIENT_TIMEOUT_SEC)
-                self._transport = TTransport.TBufferedTransport(transport)
-                protocol = TBinaryProtocol.TBinaryProtocol(self._transport)
-                self._client = TokenMasterService.Client(protocol)
-                self._request_to_end_point = {
-                    ArchiveRequest: self._client.archive,
-                    GroupRequest: self._client.group,
-                    ModifyRequest: self._client.modify,
-                    QueryAndOwnRequest: self._client.query_and_own,
-                    QueryRequest: self._client.query}
-                self._transport.open()
-            except (TTransport.TTransportException, socket.timeout):
-                LOG.exception('')
-                if i == PinballConfig.CLIENT_CONNECT_ATTEMPTS - 1:
-                    raise
-                LOG.warning('failed during communication with master.  '
-                            'Reconnecting %d / %d' % (
-                    i + 1, PinballConfig.CLIENT_CONNECT_ATTEMPTS - 1))
-                backoff *= 2
-                time.sleep(self._get_backoff_time(backoff))
-
-    def _get_backoff_time(self, backoff):
-        """Get the backoff time for the client reconnecting to master."""
-        return min(backoff * (1 + random.uniform(-0.5, 0.5)),
-                   PinballConfig.MAX_BACKOFF_CLIENT_RECONNECT_SEC)
+    def _call_once(self, request):
+        method = RemoteClient._REQUEST_TO_METHOD[request.__class__]
+        with self._pool.connection() as connection:
+            return getattr(connection.client, method)(request)
 
-    def call(self, request):
+    def _call(self, request):
+        request = encode_token_data(request)
         try:
-            return super(RemoteClient, self).call(request)
+            response = self._call_once(request)
         except (TTransport.TTransportException, socket.timeout, socket.error):
             LOG.exception('')
-            self._connect()
-            return super(RemoteClient, self).call(request)
+            # The failed connection was discarded so the retry goes through
+            # a different one.
+            response = self._call_once(request)
+        return decode_token_data(response)
+
+    def _watch(self, request):
+        """Wait for a change in calls short enough to share connections."""
+        deadline = time.time() + (request.timeoutMs or 0) / 1000.
+        while True:
+            timeout_ms = max(0, int(1000 * (deadline - time.time())))
+            partial_request = copy.copy(request)
+            partial_request.timeoutMs = min(
+                timeout_ms, PinballConfig.CLIENT_POOLED_WATCH_TIMEOUT_MS)
+            response = self._call(partial_request)
+            if (response.changed or request.sinceVersion is None or
+                    timeout_ms <= partial_request.timeoutMs):
+                return response
+
+    def call(self, request):
+        if self._shared_pool and isinstance(request, WatchRequest):
+            return self._watch(request)
+        return self._call(request)
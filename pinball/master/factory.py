@@ -14,16 +14,27 @@
 
 """Factory for creating token master and client objects."""
 import socket
+import threading
 
-from thrift.protocol import TBinaryProtocol
 from thrift.server import TServer
 from thrift.transport import TSocket
-from thrift.transport import TTransport
 
+from pinball.config.pinball_config import PinballConfig
 from pinball.config.utils import get_log
+from pinball.master.async_client import AsyncClient
+from pinball.master.client import ConnectionPool
 from pinball.master.client import LocalClient, RemoteClient
 from pinball.master.master_handler import MasterHandler
+from pinball.master.recorder import RecordingHandler
+from pinball.master.replica import Replica
+from pinball.master.server import NonblockingServer
+from pinball.master.sharded_client import ShardedClient
+from pinball.master.sharded_client import VersionVectors
+from pinball.master.stats import serve_metrics
 from pinball.master.thrift_lib.TokenMasterService import Processor
+from pinball.master.wire import CompressingHandler
+from pinball.master.wire import get_protocol_factory
+from pinball.master.wire import get_transport_factory
 
 
 __author__ = 'Pawel Garbacki'
@@ -39,7 +50,7 @@ LOG = get_log('pinball.master.factory')
 class Factory(object):
     """Factory creating token master and clients."""
 
-    def __init__(self, master_hostname=None, master_port=None):
+    def __init__(self, master_hostname=None, master_port=None, shards=None):
         """Create a factory.
 
         Args:
@@ -48,6 +59,10 @@ class Factory(object):
                 host.
             master_port: Port of the master server.  Not required if master
                 is running locally.
+            shards: The list of 'host:port' addresses of masters owning
+                consecutive shards of tokens.  If set, remote clients route
+                requests to those masters rather than to the master at
+                master_hostname and master_port.
         """
         self._master_handler = None
         if master_hostname:
@@ -55,35 +70,108 @@ class Factory(object):
         else:
             self._hostname = socket.gethostname()
         self._port = master_port
-
-    def create_master(self, store):
+        self._shards = shards
+        # Mapping from (host, port) of a remote master to the connections
+        # shared by clients created by this factory.
+        self._connection_pools = {}
+        # Versions of sharded masters reflected in responses to clients
+        # created by this factory.
+        self._version_vectors = VersionVectors()
+        self._lock = threading.Lock()
+
+    def create_master(self, store, triggers=None, checkpoint_path=None,
+                      trigger_loaded_tokens=False):
         """Create a local master.
 
         Args:
             store: The store where the master persists tokens.
+            triggers: The list of triggers run by the master on modified
+                tokens.
+            checkpoint_path: The path of the file where the master
+                periodically stores a snapshot of its tokens.
+            trigger_loaded_tokens: If True, the master runs triggers on all
+                tokens loaded from the store.
+        """
+        self._master_handler = MasterHandler(
+            store, triggers, checkpoint_path,
+            trigger_loaded_tokens=trigger_loaded_tokens)
+
+    def create_replica(self, leader_hostname, leader_port, store,
+                       triggers=None, checkpoint_path=None):
+        """Create a local replica of a remote master.
+
+        The replica serves read requests until it gets promoted to a master.
+
+        Args:
+            leader_hostname: Hostname of the followed master server.
+            leader_port: Port of the followed master server.
+            store: The store where the master persists tokens after the
+                promotion.
+            triggers: The list of triggers run by the master after the
+                promotion.
+            checkpoint_path: The path of the file where the master
+                periodically stores a snapshot of its tokens after the
+                promotion.
+        Returns:
+            The replica.
         """
-        self._master_handler = MasterHandler(store)
+        self._master_handler = Replica(
+            self._get_remote_client(leader_hostname, leader_port), store,
+            triggers, checkpoint_path)
+        self._master_handler.start()
+        return self._master_handler
 
     def run_master_server(self):
         """Start thrift token master server and block waiting until it's done.
+
+        The type of the server and the wire format are determined by
+        PinballConfig.
         """
         assert self._master_handler
-        processor = Processor(self._master_handler)
-        if self._port:
-            transport = TSocket.TServerSocket(port=self._port)
+        handler = self._master_handler
+        if PinballConfig.MASTER_RECORD_PATH:
+            handler = RecordingHandler(handler,
+                                       PinballConfig.MASTER_RECORD_PATH)
+        if PinballConfig.MASTER_DATA_COMPRESSION:
+            handler = CompressingHandler(handler)
+        if PinballConfig.MASTER_SERVER_TYPE == 'nonblocking':
+            if not self._port:
+                self._port = PinballConfig.MASTER_PORT
+            server = NonblockingServer(handler, self._port,
+                                       PinballConfig.MASTER_SERVER_THREADS)
         else:
-            transport = TSocket.TServerSocket()
-            self._port = transport.port
-        tfactory = TTransport.TBufferedTransportFactory()
-        pfactory = TBinaryProtocol.TBinaryProtocolFactory()
-        server = TServer.TThreadedServer(processor, transport, tfactory,
-                                         pfactory)
-
-        LOG.info('Starting server on host:port %s:%d', self._hostname,
-                 self._port)
+            assert PinballConfig.MASTER_SERVER_TYPE == 'threaded'
+            processor = Processor(handler)
+            if self._port:
+                transport = TSocket.TServerSocket(port=self._port)
+            else:
+                transport = TSocket.TServerSocket()
+                self._port = transport.port
+            tfactory = get_transport_factory()
+            pfactory = get_protocol_factory()
+            server = TServer.TThreadedServer(processor, transport, tfactory,
+                                             pfactory)
+
+        if PinballConfig.MASTER_METRICS_PORT:
+            serve_metrics(self._master_handler,
+                          PinballConfig.MASTER_METRICS_PORT)
+
+        LOG.info('Starting %s server on host:port %s:%d',
+                 PinballConfig.MASTER_SERVER_TYPE, self._hostname, self._port)
         server.serve()
         LOG.info('server is done')
 
+    def _get_remote_client(self, host, port):
+        if not PinballConfig.CLIENT_POOL_SIZE:
+            return RemoteClient(host, port)
+        with self._lock:
+            pool = self._connection_pools.get((host, port))
+            if not pool:
+                pool = ConnectionPool(host, port,
+                                      PinballConfig.CLIENT_POOL_SIZE)
+                self._connection_pools[(host, port)] = pool
+        return RemoteClient(host, port, pool)
+
     def get_client(self):
         """Create local or remote client depending on the master availability.
 
@@ -91,11 +179,38 @@ class Factory(object):
             A local client if this factory was used to create a master.
             Otherwise, return a thrift client connected to a remote master.  In
             the latter case, hostname and port must have been provided in the
-            factory constructor.
+            factory constructor.  Remote clients created by the same factory
+            share a pool of connections if PinballConfig.CLIENT_POOL_SIZE is
+            set.  If shards were provided in the factory constructor, the
+            client routes requests to masters owning the shards.
         """
         if self._master_handler:
             return LocalClient(self._master_handler)
-        else:
-            if not self._hostname or not self._port:
-                raise Exception('hostname and port must be defined')
-            return RemoteClient(self._hostname, self._port)
+        if self._shards:
+            clients = []
+            watch_clients = []
+            for shard in self._shards:
+                host, port = shard.rsplit(':', 1)
+                clients.append(self._get_remote_client(host, int(port)))
+                # Watches blocking on shards in parallel may outlive the
+                # call so they do not share connections with other requests.
+                watch_clients.append(RemoteClient(host, int(port)))
+            return ShardedClient(clients, self._version_vectors,
+                                 watch_clients)
+        if not self._hostname or not self._port:
+            raise Exception('hostname and port must be defined')
+        return self._get_remote_client(self._hostname, self._port)
+
+    def get_async_client(self, max_in_flight=None):
+        """Create a client executing requests asynchronously.
+
+        Args:
+            max_in_flight: The maximum number of concurrently executed
+                requests.  Defaults to the size of the connection pool.
+        Returns:
+            An asynchronous client sending requests through a client created
+            by get_client().
+        """
+        if not max_in_flight:
+            max_in_flight = PinballConfig.CLIENT_POOL_SIZE or 1
+        return AsyncClient(self.get_client(), max_in_flight)
@@ -18,7 +18,9 @@ import argparse
 import sys
 
 from pinball.config.pinball_config import PinballConfig
+from pinball.config.utils import master_name
 from pinball.master.factory import Factory
+from pinball.master.replica import promote_on_signal
 
 
 __author__ = 'Pawel Garbacki, Mao Ye'
@@ -44,10 +46,42 @@ def main():
         type=int,
         default=PinballConfig.MASTER_PORT,
         help='port to run on')
+    parser.add_argument(
+        '-s',
+        '--shard',
+        dest='shard',
+        type=int,
+        default=None,
+        help='index of the shard in PinballConfig.MASTER_SHARDS served by '
+             'the master')
+    parser.add_argument(
+        '-l',
+        '--leader',
+        dest='leader',
+        default=None,
+        help='host:port of the master followed by this master as a hot '
+             'standby.  The standby serves only reads until it receives '
+             'SIGUSR2')
+    parser.add_argument(
+        '--trigger_loaded_tokens',
+        dest='trigger_loaded_tokens',
+        action='store_true',
+        help='run job triggers on all tokens loaded on startup.  Needed once '
+             'after tokens were modified by a master running without '
+             'triggers')
     options = parser.parse_args(sys.argv[1:])
 
     PinballConfig.parse(options.config_file)
+    if options.leader and PinballConfig.MASTER_WAL_PATH:
+        # A standby wrapping the store in a write-ahead log would replay its
+        # local log into the database shared with the live leader.
+        parser.error('--leader cannot be used with MASTER_WAL_PATH')
     master_port = options.port if options.port else PinballConfig.MASTER_PORT
+    if options.shard is not None:
+        # Each shard persists its tokens in separate tables.
+        master_name('%s_shard_%d' % (master_name(), options.shard))
+        master_port = int(
+            PinballConfig.MASTER_SHARDS[options.shard].rsplit(':', 1)[1])
     factory = Factory(master_port=master_port)
 
     # The reason why these imports are not at the top level is that some of the
@@ -55,7 +89,23 @@ def main():
     # passed on the command line (master name).  Those imports need to be delayed
     # until after command line parameter parsing.
     from pinball.persistence.store import DbStore
-    factory.create_master(DbStore())
+    from pinball.persistence.wal_store import WalStore
+    from pinball.workflow.job_trigger import JobTrigger
+    store = DbStore()
+    if PinballConfig.MASTER_WAL_PATH:
+        store = WalStore(store, PinballConfig.MASTER_WAL_PATH)
+    if options.leader:
+        leader_hostname, leader_port = options.leader.rsplit(':', 1)
+        replica = factory.create_replica(
+            leader_hostname, int(leader_port), store,
+            triggers=[JobTrigger()],
+            checkpoint_path=PinballConfig.MASTER_CHECKPOINT_PATH)
+        promote_on_signal(replica)
+    else:
+        factory.create_master(
+            store, triggers=[JobTrigger()],
+            checkpoint_path=PinballConfig.MASTER_CHECKPOINT_PATH,
+            trigger_loaded_tokens=options.trigger_loaded_tokens)
     factory.run_master_server()
 
 if __name__ == '__main__':
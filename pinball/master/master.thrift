@@ -153,6 +153,16 @@ struct ModifyResponse {
     1: optional list<Token> updates;
 }
 
+// Selection of token fields returned by a query.
+enum Projection {
+    // All token fields.
+    FULL = 0,
+    // All token fields except data.
+    METADATA = 1,
+    // Token names and versions.
+    NAME = 2,
+}
+
 // Specification of tokens to retrieve.
 struct Query {
     // Prefix of token names to retrieve.
@@ -162,6 +172,40 @@ struct Query {
     // list.  This way we can support efficient retrieval of a token fully
     // matching the prefix.
     2: optional i32 maxTokens;
+    // Pattern of token names to retrieve.  If set, it takes precedence over
+    // namePrefix.  A pattern is a name prefix where '*' matches any single,
+    // non-empty component of the name, with components separated by '/'.
+    // The master indexes tokens matching patterns used in query and own
+    // requests so that claiming the highest priority unowned token across
+    // many prefixes does not require scanning them.  Plain queries use an
+    // existing index of the pattern or scan tokens under its literal prefix.
+    // Example: /workflow/*/*/job/runnable/ matches runnable jobs in all
+    // workflow instances.
+    3: optional string namePattern;
+    // Fields of the retrieved tokens.  Clients interested only in names or
+    // ownership of tokens should not pay for the transfer of their data.  If
+    // not set, all fields are returned.  Ignored in query and own requests as
+    // claimed tokens are usually modified by the owner.
+    4: optional Projection projection;
+    // Pagination of tokens matching a name prefix.  If pageSize is set, at
+    // most pageSize tokens with names following startAfterName are returned
+    // and the response carries a cursor to pass as startAfterName in the
+    // query for the next page.  Tokens are ordered on the components of their
+    // names separated by '/'.  Pages are retrieved in separate requests so
+    // tokens modified between requests may be skipped or returned with
+    // different versions.  Pagination may not be combined with namePattern
+    // or maxTokens.
+    5: optional string startAfterName;
+    6: optional i32 pageSize;
+    // If set, only tokens modified after this version are returned, together
+    // with names of tokens removed since then.  Clients may use the version
+    // of the previous response to maintain a local copy of the tokens
+    // matching namePrefix.  The master keeps a bounded log of recent changes
+    // and if the version is too old, all matching tokens are returned.  May
+    // not be combined with namePattern, maxTokens, or pagination.  In atomic
+    // batches, changes made by earlier requests in the batch are not
+    // reflected.
+    7: optional i64 sinceVersion;
 }
 
 // Request retrieving tokens matching query specification.
@@ -173,6 +217,23 @@ struct QueryRequest {
 struct QueryResponse {
     // Elements on the list appear in the order of queries in the request.
     1: optional list<list<Token>> tokens;
+    // Version of the master state reflected in the response.  It may be used
+    // as sinceVersion in a watch request.
+    2: optional i64 version;
+    // Set if any of the queries is paginated.  Elements appear in the order
+    // of queries in the request.  An element is the startAfterName of the
+    // next page of the query, or an empty string if there are no more tokens
+    // or the query is not paginated.
+    3: optional list<string> nextCursors;
+    // Set if any of the queries has sinceVersion.  Elements appear in the
+    // order of queries in the request.  An element lists names of tokens
+    // matching the query removed after sinceVersion.
+    4: optional list<list<string>> deletedNames;
+    // Set if any of the queries has sinceVersion.  Elements appear in the
+    // order of queries in the request.  An element is True if the tokens
+    // returned for the query are changes since sinceVersion, or False if
+    // they are all tokens matching the query.
+    5: optional list<bool> incremental;
 }
 
 // Claim ownership of tokens matching query specification.  Only tokens that are
@@ -184,6 +245,16 @@ struct QueryAndOwnRequest {
     2: i64 expirationTime;
     // Query specifying tokens to claim.
     3: optional Query query;
+    // Tokens with names starting with any of these prefixes are not claimed.
+    // Clients may exclude tokens they would not act on, e.g., jobs in
+    // drained workflows, rather than claim and release them.  Excluded
+    // tokens with higher priority than the claimed ones are still visited,
+    // so the list should cover few claimable tokens.
+    4: optional list<string> excludedPrefixes;
+    // If set, the tokens that would be claimed are returned without claiming
+    // them.  Returned tokens carry no data.  Clients of sharded masters use
+    // it to find the shards holding the best tokens before claiming them.
+    5: optional bool dryRun;
 }
 
 // Newly owned tokens.
@@ -191,6 +262,130 @@ struct QueryAndOwnResponse {
     1: optional list<Token> tokens;
 }
 
+// Request waiting for a change of tokens under any of the provided name
+// prefixes.  The master blocks the call until a token matching one of the
+// prefixes gets inserted, updated, deleted, or archived in a transaction
+// committed after sinceVersion, or until the timeout expires.  Versions are
+// values of the master's blessed version counter so a client may use the
+// version returned in the response as a cursor in the next watch request.
+// Example: a client interested in changes of workflow tokens may start with a
+// request leaving sinceVersion unset to obtain the current cursor, read the
+// tokens with a query, and then repeatedly watch /workflow/ passing in the
+// most recently received version.
+struct WatchRequest {
+    // Token name prefixes to watch.  A prefix may contain '*' components
+    // matching any single, non-empty component of the name, as in
+    // Query.namePattern.
+    1: optional list<string> namePrefixes;
+    // Only changes committed after this version are reported.  If not set,
+    // the master responds immediately with the current version.
+    2: optional i64 sinceVersion;
+    // Maximum time, in milliseconds, to block waiting for a change.  The
+    // master may cap this value.  If not set, the master does not block.
+    3: optional i32 timeoutMs;
+    // If true, changes leaving tokens owned, e.g., claims, lease renewals,
+    // or updates by the owner, are not reported.  Clients waiting for
+    // tokens to claim are not woken up by changes they cannot act on.
+    // Expiration of ownership is still reported.
+    4: optional bool ignoreOwned;
+}
+
+// Result of waiting for a change.
+struct WatchResponse {
+    // Version of the master state at the time of the response.  It should be
+    // passed as sinceVersion in the subsequent watch request.
+    1: optional i64 version;
+    // True if tokens matching the watched prefixes changed after
+    // sinceVersion.  The master may report a change conservatively, e.g.,
+    // if it no longer keeps track of changes as old as sinceVersion.
+    2: optional bool changed;
+}
+
+// Extension of the ownership of a token.
+struct Lease {
+    // Name of the owned token.
+    1: optional string name;
+    // Version of the token known to the owner.
+    2: optional i64 version;
+    // New ownership expiration time.
+    3: optional i64 expirationTime;
+}
+
+// Request extending ownership of tokens.  Unlike a modify request, it carries
+// neither token data nor other fields that do not change when a lease gets
+// renewed.  Renewals are atomic - either all leases are extended, or none is.
+// The request fails if any of the tokens is not present in the master or has
+// a different version.
+// Example: a worker running a job periodically renews the lease on the job
+// token without resending the pickled job.
+struct RenewRequest {
+    1: optional list<Lease> leases;
+}
+
+// Renewed tokens.
+struct RenewResponse {
+    // Tokens with versions set to the values recorded in the master.  Token
+    // data is not included.  Elements appear in the order of leases in the
+    // request.
+    1: optional list<Token> tokens;
+}
+
+// One of the requests in a batch.  Exactly one field should be set.  Watch
+// requests block so they cannot be batched.
+struct Request {
+    1: optional ArchiveRequest archive;
+    2: optional GroupRequest group;
+    3: optional ModifyRequest modify;
+    4: optional QueryRequest query;
+    5: optional QueryAndOwnRequest queryAndOwn;
+    6: optional RenewRequest renew;
+}
+
+// Result of a request in a batch.  The field corresponding to the request
+// type is set, unless the request failed.  Responses to archive requests have
+// no fields set.
+struct Response {
+    1: optional GroupResponse group;
+    2: optional ModifyResponse modify;
+    3: optional QueryResponse query;
+    4: optional QueryAndOwnResponse queryAndOwn;
+    // Reason of the request failure in a non-atomic batch.
+    5: optional TokenMasterException error;
+    6: optional RenewResponse renew;
+}
+
+// Request executing multiple requests in a single round trip.  Requests are
+// executed in the order in which they appear on the list.
+// Example: a worker may query its signals and claim a job in one call.
+struct BatchRequest {
+    1: optional list<Request> requests;
+    // If true, all requests are executed in a single transaction - either
+    // all of them succeed, or none does and the failure is reported as an
+    // exception of the batch call.  Otherwise, each request is executed in a
+    // separate transaction and failures are reported in individual
+    // responses.
+    2: optional bool atomic;
+}
+
+// Results of requests in a batch.
+struct BatchResponse {
+    // Elements on the list appear in the order of requests in the batch.
+    1: optional list<Response> responses;
+}
+
+// Request for metrics collected by the master.
+struct StatsRequest {
+}
+
+// Metrics collected by the master since it started.
+struct StatsResponse {
+    // Mapping from sample name to value.  Names follow the Prometheus text
+    // format, e.g., pinball_master_requests_total{request="query"}.
+    // Histograms are represented by cumulative bucket counts, the sum, and
+    // the count of observed values.
+    1: optional map<string, double> metrics;
+}
+
 // API exported by the master server.
 service TokenMasterService {
     void archive(1: ArchiveRequest request)
@@ -207,4 +402,16 @@ service TokenMasterService {
 
     QueryAndOwnResponse query_and_own(1: QueryAndOwnRequest request)
         throws(1: TokenMasterException e),
+
+    WatchResponse watch(1: WatchRequest request)
+        throws(1: TokenMasterException e),
+
+    BatchResponse batch(1: BatchRequest request)
+        throws(1: TokenMasterException e),
+
+    RenewResponse renew(1: RenewRequest request)
+        throws(1: TokenMasterException e),
+
+    StatsResponse stats(1: StatsRequest request)
+        throws(1: TokenMasterException e),
 }
@@ -13,12 +13,35 @@
 # limitations under the License.
 
 """Implementation of the token master logic."""
-import pytrie
+import collections
+import copy
+import gc
+import heapq
+import itertools
 import sys
 import threading
+import time
 
 from pinball.config.utils import get_log
+from pinball.master.batch import pack_response
+from pinball.master.batch import unpack_request
 from pinball.master.blessed_version import BlessedVersion
+from pinball.master.checkpoint import Checkpoint
+from pinball.master.stats import get_request_type
+from pinball.master.stats import get_response_size
+from pinball.master.stats import MasterStats
+from pinball.master.stats import SIZE_BUCKETS_BYTES
+from pinball.master.thrift_lib.ttypes import BatchResponse
+from pinball.master.thrift_lib.ttypes import ModifyRequest
+from pinball.master.thrift_lib.ttypes import Response
+from pinball.master.thrift_lib.ttypes import StatsResponse
+from pinball.master.thrift_lib.ttypes import TokenMasterException
+from pinball.master.thrift_lib.ttypes import WatchResponse
+from pinball.master.token_trie import compile_pattern
+from pinball.master.token_trie import TokenTrie
+from pinball.master.transaction import BatchTransaction
+from pinball.master.transaction import ModifyTransaction
+from pinball.master.transaction import QueryTransaction
 from pinball.master.transaction import REQUEST_TO_TRANSACTION
 
 
@@ -32,29 +55,230 @@ __version__ = '2.0'
 LOG = get_log('pinball.master.master_handler')
 
 
+class _UnlockingStore(object):
+    """Store wrapper releasing a lock for the duration of store writes.
+
+    Transactions persist tokens before applying them to the trie.  Releasing
+    the trie lock while the store is being written lets readers proceed
+    against the last committed state of the trie.  The time spent in store
+    writes is recorded in the stats.
+    """
+    def __init__(self, store, lock, stats):
+        self._store = store
+        self._lock = lock
+        self._stats = stats
+        # Time spent in store writes since the last reset.  It is accessed
+        # only by the writer holding the lock serializing transactions.
+        self.write_time_sec = 0.
+
+    def _call_unlocked(self, method, *args, **kwargs):
+        self._lock.release()
+        start_time = time.time()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            elapsed_time = time.time() - start_time
+            self.write_time_sec += elapsed_time
+            self._stats.observe('pinball_master_store_write_seconds',
+                                elapsed_time,
+                                (('operation', method.__name__),))
+            self._lock.acquire()
+
+    def commit_tokens(self, updates=None, deletes=None, renewals=None):
+        return self._call_unlocked(self._store.commit_tokens, updates,
+                                   deletes, renewals)
+
+    def archive_tokens(self, tokens):
+        return self._call_unlocked(self._store.archive_tokens, tokens)
+
+    def __getattr__(self, name):
+        return getattr(self._store, name)
+
+
+class _Watcher(object):
+    """A watch request waiting for a change."""
+    def __init__(self, name_prefixes, ignore_owned, deadline, callback):
+        self.name_prefixes = name_prefixes
+        self.ignore_owned = ignore_owned
+        self.deadline = deadline
+        self.callback = callback
+        self.done = False
+
+
 class MasterHandler(object):
     """Handler implementing the token master logic.
 
     Tokens are stored in a trie where keys are token names while the values are
     the tokens themselves.  Trie structure provides an efficient access to
     operations on token name prefixes such as token querying and counting.
+    Tokens matching name patterns used in queries are additionally indexed on
+    priority and ownership.
 
     A special type of singleton token - called the blessed version - is stored
     in the tree with other tokens.  The blessed version is used to generate
     unique version numbers.
+
+    Triggers installed in the handler derive additional modifications from
+    tokens updated by modify requests, e.g., to advance workflow state as
+    soon as job dependencies are satisfied.
+
+    Transactions modifying tokens are serialized.  Read-only transactions
+    synchronize with them only on access to the in-memory trie, so they are
+    not blocked while a writer persists tokens in the store.  A writer
+    responds only after its changes are durable, but with stores committing
+    in batches, other transactions may see the changes earlier.
+
+    Batch requests let clients send multiple requests in a single call.
+    Requests in an atomic batch are executed in one transaction.  Otherwise,
+    each of them is a separate transaction but the response is sent once
+    changes of all of them are durable.
+
+    The handler remembers names of tokens changed by the most recent
+    transactions.  This change log, indexed by the blessed version, lets
+    clients block in watch requests until something they are interested in
+    changes, rather than repeatedly querying the master.  Expiration of token
+    ownership is recorded in the change log as well so that watchers can
+    claim tokens abandoned by their owners right away.  Tokens owned after
+    a change are marked in the log so that watchers looking for tokens to
+    claim may ignore claims and lease renewals.  Watched prefixes may be
+    patterns, e.g., of runnable jobs in all workflow instances.  Pending
+    watch requests are tracked as callbacks rather than blocked threads, so
+    a server multiplexing client connections can keep many of them waiting.
+    Queries with a since version look up changed tokens in the change log
+    rather than enumerating all tokens matching the query.  Changes are
+    appended to the log before the trie lock is released, so readers never
+    see a change that is not in the log yet.
+
+    If configured with a checkpoint path, the handler periodically writes a
+    snapshot of the trie to a local file.  On startup, the snapshot is loaded
+    and only tokens modified since then are read from the store.  A replica
+    promoted to a master passes its replicated tokens as the snapshot.
+
+    The handler collects metrics of requests it serves: their counts,
+    latencies, and response sizes, and the time transactions spend waiting
+    for the locks, executing, and writing to the store.  The metrics are
+    returned by the stats request together with counts of tokens under
+    top-level name prefixes.
     """
     _BLESSED_VERSION = '/__BLESSED_VERSION__'
     _MASTER_OWNER = '__master__'
+    # Number of most recent transactions kept in the change log.
+    _MAX_CHANGES = 10000
+    # Upper bound on the time a watch request may block.  It should be well
+    # below the client socket timeout.
+    _MAX_WATCH_TIMEOUT_MS = 60 * 1000
+    _CHECKPOINT_INTERVAL_SEC = 10 * 60
+    # Number of tokens copied to a checkpoint while holding the writer lock.
+    _CHECKPOINT_CHUNK_SIZE = 10000
+    # How often to look for tokens whose ownership expired.
+    _LEASE_EXPIRY_CHECK_INTERVAL_SEC = 1
+
+    def __init__(self, store, triggers=None, checkpoint_path=None,
+                 snapshot=None, trigger_loaded_tokens=False):
+        """Create a master handler.
 
-    def __init__(self, store):
+        Args:
+            store: The store where the master persists tokens.
+            triggers: The list of triggers run on tokens modified by modify
+                requests.
+            checkpoint_path: The path of the file with trie snapshots.  If
+                None, tokens are always loaded from the store.
+            snapshot: The tuple (version, tokens) with a recent state of the
+                tokens, e.g., replicated from another master.  If set, it is
+                used in place of the checkpoint on startup.
+            trigger_loaded_tokens: If True, triggers are run on all tokens
+                loaded on startup.  It is needed only once, after tokens were
+                committed by a master running with no triggers, since the
+                pass reads every token before any request is served.
+        """
         self._store = store
-        self._trie = pytrie.StringTrie()
+        self._triggers = triggers if triggers is not None else []
+        self._checkpoint = (Checkpoint(checkpoint_path) if checkpoint_path
+                            else None)
+        self._snapshot = snapshot
+        self._trie = TokenTrie()
+        # Serializes transactions modifying tokens.
         self._lock = threading.Lock()
+        # Guards access to the trie.  Writers release it while they wait for
+        # the store.
+        self._trie_lock = threading.Lock()
+        self._stats = MasterStats()
+        self._unlocking_store = _UnlockingStore(store, self._trie_lock,
+                                                self._stats)
+        # The watch expirer waits on this condition for new watchers.
+        self._watchers_changed = threading.Condition(self._lock)
+        # Mapping from name prefix to the set of watchers waiting for changes
+        # under this prefix.
+        self._watchers = collections.defaultdict(set)
+        # Mapping from watched name prefix to the compiled pattern.
+        self._watch_patterns = {}
+        # Heap of tuples (deadline, watcher).
+        self._watch_deadlines = []
+        # Elements are tuples (version, list of changed token names, set of
+        # names of changed tokens owned after the change).
+        self._changes = collections.deque(maxlen=MasterHandler._MAX_CHANGES)
         self._load_tokens()
+        if self._triggers and trigger_loaded_tokens:
+            self._trigger_loaded_tokens()
+        self._store.sync()
+        # Changes committed at or before this version are not in the log.
+        self._changes_horizon = self._get_version()
+        if self._checkpoint:
+            checkpointer = threading.Thread(target=self._run_checkpointer)
+            checkpointer.daemon = True
+            checkpointer.start()
+        lease_expirer = threading.Thread(target=self._run_lease_expirer)
+        lease_expirer.daemon = True
+        lease_expirer.start()
+        watch_expirer = threading.Thread(target=self._run_watch_expirer)
+        watch_expirer.daemon = True
+        watch_expirer.start()
+
+    def _read_tokens(self):
+        """Read active tokens from the snapshot or checkpoint and the store.
+
+        Tokens in the snapshot are refreshed with tokens modified in the
+        store after the snapshot was taken.  Tokens missing in the store
+        were removed or archived since then.
+
+        Returns:
+            The list of active tokens.
+        """
+        snapshot = self._snapshot
+        self._snapshot = None
+        if not snapshot and self._checkpoint:
+            snapshot = self._checkpoint.read()
+        if not snapshot:
+            return self._store.read_active_tokens()
+        version, tokens = snapshot
+        # The blessed version is modified in every transaction so it is among
+        # the tokens read unless the store is behind the checkpoint.
+        modified_tokens = self._store.read_active_tokens_since(version - 1)
+        if MasterHandler._BLESSED_VERSION not in [
+                token.name for token in modified_tokens]:
+            # The snapshot may contain changes that never became durable.
+            LOG.warning('discarding snapshot at version %d ahead of the '
+                        'store', version)
+            if self._checkpoint:
+                self._checkpoint.remove()
+            return self._store.read_active_tokens()
+        names = set(self._store.read_active_token_names())
+        tokens_by_name = {}
+        for token in tokens:
+            if token.name in names:
+                tokens_by_name[token.name] = token
+        for token in modified_tokens:
+            tokens_by_name[token.name] = token
+        LOG.info('loaded %d tokens from snapshot and %d from the store',
+                 len(tokens), len(modified_tokens))
+        return tokens_by_name.values()
 
     def _load_tokens(self):
+        # Loaded tokens live until they get modified.  Garbage collection
+        # passes triggered by their allocation would only slow down the load.
+        gc.disable()
         try:
-            tokens = self._store.read_active_tokens()
+            tokens = self._read_tokens()
             for token in tokens:
                 self._trie[token.name] = token
             blessed_version = self._trie.get(MasterHandler._BLESSED_VERSION)
@@ -76,33 +300,487 @@ class MasterHandler(object):
             # partially.  It's dangerous to continue in this state so just
             # exit.
             sys.exit(1)
+        finally:
+            gc.enable()
+
+    def _trigger_loaded_tokens(self):
+        """Run triggers on all tokens loaded from the store.
+
+        Tokens could have been committed by a master running with no triggers.
+        """
+        transaction = ModifyTransaction(self._triggers, self._trie.keys())
+        transaction.prepare(ModifyRequest())
+        transaction.commit(self._trie,
+                           self._trie[MasterHandler._BLESSED_VERSION],
+                           self._store)
+
+    def _copy_tokens_chunk(self, cursor):
+        """Copy a chunk of tokens with the writer lock held.
+
+        Args:
+            cursor: The name after which tokens are copied or None to start
+                from the first token.
+        Returns:
+            The list of (name, token) items in the order of names.
+        """
+        with self._lock:
+            return list(itertools.islice(
+                self._trie.iteritems('', cursor),
+                MasterHandler._CHECKPOINT_CHUNK_SIZE))
+
+    def checkpoint(self):
+        """Write a snapshot of the trie to the checkpoint file.
+
+        Tokens are copied in chunks and writers may run between them.  Tokens
+        modified in the meantime are refreshed from the trie at the end,
+        based on the change log.  Tokens in the trie are replaced rather than
+        modified in place so copied tokens do not change.
+        """
+        with self._lock:
+            start_version = self._get_version()
+        tokens_by_name = {}
+        cursor = None
+        while True:
+            items = self._copy_tokens_chunk(cursor)
+            if not items:
+                break
+            tokens_by_name.update(items)
+            cursor = items[-1][0]
+        # Holding the writer lock guarantees that the trie reflects all
+        # changes up to the blessed version.  Readers are not blocked.
+        with self._lock:
+            version = self._get_version()
+            changed_names = self._get_changed_names(start_version)
+            if changed_names is None:
+                # The change log does not go back far enough.
+                LOG.warning('copying all tokens to checkpoint version %d',
+                            version)
+                tokens = self._trie.values()
+            else:
+                changed_names.add(MasterHandler._BLESSED_VERSION)
+                for name in changed_names:
+                    token = self._trie.get(name)
+                    if token is None:
+                        tokens_by_name.pop(name, None)
+                    else:
+                        tokens_by_name[name] = token
+                tokens = tokens_by_name.values()
+        self._checkpoint.write(version, tokens)
+
+    def _run_checkpointer(self):
+        while True:
+            time.sleep(MasterHandler._CHECKPOINT_INTERVAL_SEC)
+            try:
+                self.checkpoint()
+            except:
+                LOG.exception('')
+
+    def _expire_leases(self):
+        """Record tokens whose ownership expired in the change log."""
+        with self._lock:
+            with self._trie_lock:
+                names = self._trie.get_expired_names(time.time())
+                if not names:
+                    return
+                # Advance the blessed version so that clients watching the
+                # tokens can tell that something has changed.  Readers see the
+                # new version only after it is committed to the store and the
+                # changes are in the log.
+                blessed_version = copy.copy(
+                    self._trie[MasterHandler._BLESSED_VERSION])
+                blessed_version.advance_version()
+                self._unlocking_store.commit_tokens(updates=[blessed_version])
+                self._trie[MasterHandler._BLESSED_VERSION] = blessed_version
+                self._record_changes(names, frozenset())
+            self._notify_watchers(names, frozenset())
+        self._store.sync()
+
+    def _run_lease_expirer(self):
+        while True:
+            time.sleep(MasterHandler._LEASE_EXPIRY_CHECK_INTERVAL_SEC)
+            try:
+                self._expire_leases()
+            except:
+                LOG.exception('')
+
+    def _get_version(self):
+        return self._trie[MasterHandler._BLESSED_VERSION].version
+
+    def _get_owned_names(self, names):
+        """Find tokens that are owned among the given ones.
+
+        Must be called with the trie lock held.
+
+        Args:
+            names: The names of tokens to check.
+        Returns:
+            The set of names of tokens with unexpired ownership.
+        """
+        now = time.time()
+        result = set()
+        for name in names:
+            token = self._trie.get(name)
+            if (token is not None and token.owner and
+                    token.expirationTime > now):
+                result.add(name)
+        return result
+
+    def _record_changes(self, names, owned_names):
+        """Append changes made by a transaction to the change log.
+
+        Must be called with both the lock and the trie lock held.
 
-    def _process_request(self, request):
+        Args:
+            names: The names of tokens modified by the transaction.
+            owned_names: The names of modified tokens that are owned after
+                the transaction.
+        """
+        if len(self._changes) == self._changes.maxlen:
+            self._changes_horizon = self._changes[0][0]
+        self._changes.append((self._get_version(), names, owned_names))
+
+    def _get_changed_names(self, since_version):
+        """Find names of tokens changed after a given version.
+
+        Must be called with the trie lock held.
+
+        Args:
+            since_version: The version after which changes are relevant.
+        Returns:
+            The set of changed token names or None if the change log does not
+            go back far enough.
+        """
+        if since_version < self._changes_horizon:
+            return None
+        result = set()
+        for version, names, _ in reversed(self._changes):
+            if version <= since_version:
+                break
+            result.update(names)
+        return result
+
+    def _notify_watchers(self, names, owned_names):
+        """Respond to watchers interested in changed tokens.
+
+        Must be called with the lock held.
+
+        Args:
+            names: The names of tokens modified by the transaction.
+            owned_names: The names of modified tokens that are owned after
+                the transaction.
+        """
+        version = self._get_version()
+        for prefix, watchers in self._watchers.items():
+            if not watchers:
+                # All watchers got a response under another prefix.
+                continue
+            pattern = self._watch_patterns[prefix]
+            matched = False
+            matched_unowned = False
+            for name in names:
+                if pattern.match(name):
+                    matched = True
+                    if name not in owned_names:
+                        matched_unowned = True
+                        break
+            if not matched:
+                continue
+            for watcher in list(watchers):
+                if matched_unowned or not watcher.ignore_owned:
+                    self._respond_to_watcher(
+                        watcher, WatchResponse(version=version, changed=True))
+
+    def _respond_to_watcher(self, watcher, response):
+        """Stop tracking a watcher and pass it the response.
+
+        Must be called with the lock held.
+        """
+        watcher.done = True
+        for prefix in watcher.name_prefixes:
+            watchers = self._watchers[prefix]
+            watchers.discard(watcher)
+            if not watchers:
+                del self._watchers[prefix]
+                del self._watch_patterns[prefix]
+        try:
+            watcher.callback(response)
+        except:
+            LOG.exception('')
+
+    def _run_watch_expirer(self):
+        """Respond to watchers whose timeout expired."""
+        with self._lock:
+            while True:
+                now = time.time()
+                # Watchers which got a response are dropped along the way.
+                while (self._watch_deadlines and
+                       (self._watch_deadlines[0][0] <= now or
+                        self._watch_deadlines[0][1].done)):
+                    _, watcher = heapq.heappop(self._watch_deadlines)
+                    if not watcher.done:
+                        self._respond_to_watcher(
+                            watcher, WatchResponse(version=self._get_version(),
+                                                   changed=False))
+                if self._watch_deadlines:
+                    self._watchers_changed.wait(
+                        self._watch_deadlines[0][0] - now)
+                else:
+                    self._watchers_changed.wait()
+
+    def _get_watch_patterns(self, name_prefixes):
+        """Get compiled patterns of watched name prefixes.
+
+        Patterns of prefixes with waiting watchers are reused.
+
+        Must be called with the lock held.
+
+        Args:
+            name_prefixes: The watched token name prefixes.
+        Returns:
+            Mapping from name prefix to the compiled pattern.
+        """
+        patterns = {}
+        for prefix in name_prefixes:
+            pattern = self._watch_patterns.get(prefix)
+            if not pattern:
+                pattern = compile_pattern(prefix)
+            patterns[prefix] = pattern
+        return patterns
+
+    def _has_changed(self, patterns, ignore_owned, since_version):
+        """Check if tokens matching patterns changed after a given version.
+
+        Must be called with the lock held.
+
+        Args:
+            patterns: The compiled patterns of token names to check.
+            ignore_owned: If True, changes leaving tokens owned are not
+                relevant.
+            since_version: The version after which changes are relevant.
+        Returns:
+            True if there was a relevant change or the change log does not go
+            back far enough to tell.
+        """
+        if since_version < self._changes_horizon:
+            return True
+        for version, names, owned_names in reversed(self._changes):
+            if version <= since_version:
+                break
+            for name in names:
+                if ignore_owned and name in owned_names:
+                    continue
+                for pattern in patterns:
+                    if pattern.match(name):
+                        return True
+        return False
+
+    def _create_transaction(self, request):
         transaction_cls = REQUEST_TO_TRANSACTION[request.__class__]
-        transaction = transaction_cls()
+        if transaction_cls is ModifyTransaction:
+            return ModifyTransaction(self._triggers)
+        if transaction_cls is BatchTransaction:
+            return BatchTransaction(self._create_transaction)
+        if transaction_cls is QueryTransaction:
+            return QueryTransaction(self._get_changed_names)
+        return transaction_cls()
+
+    def _process_request(self, request, sync=True):
+        """Execute a request in a transaction.
+
+        Args:
+            request: The request to execute.
+            sync: If True, wait until changes made by the transaction are
+                durable.
+        Returns:
+            The response to the request.
+        """
+        transaction = self._create_transaction(request)
         transaction.prepare(request)
+        labels = (('request', get_request_type(request)),)
+        start_time = time.time()
+        if transaction.READ_ONLY:
+            with self._trie_lock:
+                locked_time = time.time()
+                response = transaction.commit(
+                    self._trie,
+                    self._trie[MasterHandler._BLESSED_VERSION],
+                    self._store)
+            self._stats.observe('pinball_master_lock_wait_seconds',
+                                locked_time - start_time, labels)
+            self._stats.observe('pinball_master_execution_seconds',
+                                time.time() - locked_time, labels)
+            return response
         with self._lock:
-            # TODO(pawel): it would be cleaner to subclass trie implementing
-            # auto-persistence in the store when modifying tokens.
-            return transaction.commit(self._trie,
-                                      self._trie[
-                                          MasterHandler._BLESSED_VERSION],
-                                      self._store)
+            with self._trie_lock:
+                locked_time = time.time()
+                self._unlocking_store.write_time_sec = 0.
+                # TODO(pawel): it would be cleaner to subclass trie
+                # implementing auto-persistence in the store when modifying
+                # tokens.
+                response = transaction.commit(
+                    self._trie,
+                    self._trie[MasterHandler._BLESSED_VERSION],
+                    self._unlocking_store)
+                changed_names = transaction.get_changed_names()
+                if changed_names:
+                    owned_names = self._get_owned_names(changed_names)
+                    self._record_changes(changed_names, owned_names)
+            if changed_names:
+                self._notify_watchers(changed_names, owned_names)
+            execution_time = (time.time() - locked_time -
+                              self._unlocking_store.write_time_sec)
+        self._stats.observe('pinball_master_lock_wait_seconds',
+                            locked_time - start_time, labels)
+        self._stats.observe('pinball_master_execution_seconds',
+                            execution_time, labels)
+        # Stores with group commit make changes durable in batches.  Waiting
+        # outside of the lock lets subsequent writers join the batch.
+        if sync:
+            self._sync()
+        return response
+
+    def _sync(self):
+        """Wait until changes committed by the calling thread are durable."""
+        start_time = time.time()
+        self._store.sync()
+        self._stats.observe('pinball_master_store_sync_seconds',
+                            time.time() - start_time)
+
+    def _handle(self, method, request):
+        """Handle a request recording its metrics.
+
+        Args:
+            method: The method handling the request.
+            request: The request to handle.
+        Returns:
+            The response to the request.
+        """
+        labels = (('request', get_request_type(request)),)
+        start_time = time.time()
+        try:
+            response = method(request)
+        except TokenMasterException:
+            self._stats.increment('pinball_master_request_errors_total',
+                                  labels)
+            raise
+        finally:
+            self._stats.increment('pinball_master_requests_total', labels)
+            self._stats.observe('pinball_master_request_latency_seconds',
+                                time.time() - start_time, labels)
+        self._stats.observe('pinball_master_response_bytes',
+                            get_response_size(response), labels,
+                            SIZE_BUCKETS_BYTES)
+        return response
 
     # TODO(pawel): add a meta-operation inferring what to do from the class
     # of the request.
 
     def archive(self, request):
-        return self._process_request(request)
+        return self._handle(self._process_request, request)
 
     def group(self, request):
-        return self._process_request(request)
+        return self._handle(self._process_request, request)
 
     def modify(self, request):
-        return self._process_request(request)
+        return self._handle(self._process_request, request)
 
     def query(self, request):
-        return self._process_request(request)
+        return self._handle(self._process_request, request)
 
     def query_and_own(self, request):
-        return self._process_request(request)
+        return self._handle(self._process_request, request)
+
+    def renew(self, request):
+        return self._handle(self._process_request, request)
+
+    def batch(self, request):
+        return self._handle(self._process_batch, request)
+
+    def _process_batch(self, request):
+        if request.atomic:
+            return self._process_request(request)
+        response = BatchResponse(responses=[])
+        if request.requests:
+            for batched_request in request.requests:
+                try:
+                    batched_response = self._process_request(
+                        unpack_request(batched_request), sync=False)
+                    response.responses.append(pack_response(batched_response))
+                except TokenMasterException as e:
+                    response.responses.append(Response(error=e))
+        # Changes of all requests in the batch become durable together.
+        self._sync()
+        return response
+
+    def stats(self, request):
+        """Get metrics collected by the handler.
+
+        Args:
+            request: The stats request.
+        Returns:
+            The stats response with current values of the metrics.
+        """
+        with self._trie_lock:
+            counts = self._trie.get_group_counts(TokenTrie.DELIMITER)
+            version = self._get_version()
+        gauges = [('pinball_master_tokens', (('prefix', prefix),), count)
+                  for prefix, count in counts.items()]
+        gauges.append(('pinball_master_version', (), version))
+        return StatsResponse(metrics=self._stats.get_samples(gauges))
+
+    def watch(self, request):
+        responses = []
+        responded = threading.Event()
+
+        def _respond(response):
+            responses.append(response)
+            responded.set()
+
+        self.watch_async(request, _respond)
+        responded.wait()
+        return responses[0]
+
+    def watch_async(self, request, callback):
+        """Handle a watch request without blocking the calling thread.
+
+        Args:
+            request: The watch request to handle.
+            callback: The function called with the watch response.  It may
+                be called in another thread, with the handler lock held, so
+                it must not block or call the handler.
+        """
+        labels = (('request', 'watch'),)
+        start_time = time.time()
+
+        def _callback(response):
+            self._stats.increment('pinball_master_requests_total', labels)
+            self._stats.observe('pinball_master_request_latency_seconds',
+                                time.time() - start_time, labels)
+            callback(response)
+
+        name_prefixes = set(request.namePrefixes or [''])
+        ignore_owned = bool(request.ignoreOwned)
+        timeout_ms = min(request.timeoutMs or 0,
+                         MasterHandler._MAX_WATCH_TIMEOUT_MS)
+        with self._lock:
+            version = self._get_version()
+            patterns = self._get_watch_patterns(name_prefixes)
+            if request.sinceVersion is None:
+                response = WatchResponse(version=version, changed=False)
+            elif self._has_changed(patterns.values(), ignore_owned,
+                                   request.sinceVersion):
+                response = WatchResponse(version=version, changed=True)
+            elif timeout_ms <= 0:
+                response = WatchResponse(version=version, changed=False)
+            else:
+                watcher = _Watcher(name_prefixes, ignore_owned,
+                                   time.time() + timeout_ms / 1000.,
+                                   _callback)
+                for prefix, pattern in patterns.items():
+                    self._watch_patterns[prefix] = pattern
+                    self._watchers[prefix].add(watcher)
+                heapq.heappush(self._watch_deadlines,
+                               (watcher.deadline, watcher))
+                self._watchers_changed.notify()
+                return
+            _callback(response)
@@ -0,0 +1,235 @@
+# Copyright 2015, Pinterest, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Recording of requests received by the token master.
+
+A recording handler wraps the master handler and appends every request it
+receives, together with the time of its arrival, to a recording file.  The
+file starts with a snapshot of the tokens in the master so that the requests
+can be replayed against a master in the same initial state, e.g., to
+benchmark changes of the master on realistic traffic.
+
+Each record is a header with the record type, the time, and the length of
+the payload, followed by the payload - a thrift struct serialized with the
+compact protocol.  The time of the snapshot record is the start time of the
+recording.  Times of request records are offsets from the start.  The file
+is compressed with gzip by a background thread so that compression does not
+add to the latency of requests.
+"""
+import gzip
+import Queue
+import struct
+import threading
+import time
+
+from thrift import TSerialization
+from thrift.protocol import TCompactProtocol
+
+from pinball.config.utils import get_log
+from pinball.master.thrift_lib.ttypes import ArchiveRequest
+from pinball.master.thrift_lib.ttypes import BatchRequest
+from pinball.master.thrift_lib.ttypes import GroupRequest
+from pinball.master.thrift_lib.ttypes import ModifyRequest
+from pinball.master.thrift_lib.ttypes import Query
+from pinball.master.thrift_lib.ttypes import QueryAndOwnRequest
+from pinball.master.thrift_lib.ttypes import QueryRequest
+from pinball.master.thrift_lib.ttypes import QueryResponse
+from pinball.master.thrift_lib.ttypes import RenewRequest
+from pinball.master.thrift_lib.ttypes import WatchRequest
+from pinball.master.token_trie import TokenTrie
+
+
+__author__ = 'Pawel Garbacki'
+__copyright__ = 'Copyright 2015, Pinterest, Inc.'
+__credits__ = [__author__]
+__license__ = 'Apache'
+__version__ = '2.0'
+
+
+LOG = get_log('pinball.master.recorder')
+
+
+# Record types are indexes on this list.  The snapshot record holds a
+# QueryResponse with all tokens in the master.
+_RECORD_CLASSES = [QueryResponse, ArchiveRequest, BatchRequest, GroupRequest,
+                   ModifyRequest, QueryAndOwnRequest, QueryRequest,
+                   RenewRequest, WatchRequest]
+_SNAPSHOT = 0
+# Header of a record: type, time, and payload length.
+_HEADER = struct.Struct('>BdI')
+_PROTOCOL_FACTORY = TCompactProtocol.TCompactProtocolFactory()
+
+
+def read_recording(path):
+    """Read a recording file.
+
+    A truncated record at the end of the file, e.g., left by a master that
+    was killed, ends the recording.
+
+    Args:
+        path: The path of the recording file.
+    Returns:
+        The tuple (start time, tokens, records) where tokens is the list of
+        tokens in the master at the start time and records is an iterator
+        over tuples (time offset, request) in the order of arrival.
+    """
+    recording = gzip.open(path, 'rb')
+    record_type, start_time, payload = _read_record(recording)
+    assert record_type == _SNAPSHOT
+    snapshot = TSerialization.deserialize(QueryResponse(), payload,
+                                          _PROTOCOL_FACTORY)
+
+    def _iter_records():
+        try:
+            while True:
+                record = _read_record(recording)
+                if not record:
+                    return
+                record_type, offset, payload = record
+                request = TSerialization.deserialize(
+                    _RECORD_CLASSES[record_type](), payload,
+                    _PROTOCOL_FACTORY)
+                yield offset, request
+        finally:
+            recording.close()
+
+    return start_time, snapshot.tokens[0], _iter_records()
+
+
+def _read_record(recording):
+    """Read a record from a recording file.
+
+    Returns:
+        The tuple (type, time, payload) or None if there are no more complete
+        records.
+    """
+    try:
+        header = recording.read(_HEADER.size)
+        if len(header) < _HEADER.size:
+            return None
+        record_type, record_time, length = _HEADER.unpack(header)
+        payload = recording.read(length)
+    except (IOError, EOFError):
+        LOG.warning('ignoring incomplete record at the end of the recording')
+        return None
+    if len(payload) < length:
+        return None
+    return record_type, record_time, payload
+
+
+class RecordingHandler(object):
+    """Master handler wrapper recording requests in a file.
+
+    Requests are serialized in the threads calling the handler, before the
+    wrapped handler gets a chance to modify them.  If the writer falls behind,
+    requests are dropped from the recording rather than delaying the master.
+    """
+    # The maximum number of serialized requests waiting to be written.
+    _MAX_PENDING_RECORDS = 100000
+
+    def __init__(self, handler, path):
+        """Create a recording handler and write the snapshot of tokens.
+
+        Args:
+            handler: The handler serving requests.
+            path: The path of the recording file.  An existing file is
+                overwritten.
+        """
+        self._handler = handler
+        self._recording = gzip.open(path, 'wb')
+        self._records = Queue.Queue(RecordingHandler._MAX_PENDING_RECORDS)
+        self._dropped = 0
+        self._start_time = time.time()
+        snapshot = handler.query(QueryRequest(queries=[
+            Query(namePrefix=TokenTrie.DELIMITER)]))
+        self._write(_SNAPSHOT, self._start_time,
+                    TSerialization.serialize(snapshot, _PROTOCOL_FACTORY))
+        LOG.info('recording master requests in %s', path)
+        self._writer = threading.Thread(target=self._run_writer)
+        self._writer.daemon = True
+        self._writer.start()
+
+    def __getattr__(self, name):
+        return getattr(self._handler, name)
+
+    def _write(self, record_type, record_time, payload):
+        self._recording.write(_HEADER.pack(record_type, record_time,
+                                           len(payload)))
+        self._recording.write(payload)
+
+    def _run_writer(self):
+        while True:
+            record = self._records.get()
+            if record is None:
+                break
+            self._write(*record)
+            if self._records.empty():
+                self._recording.flush()
+        self._recording.close()
+
+    def _record(self, request):
+        record = (_RECORD_CLASSES.index(request.__class__),
+                  time.time() - self._start_time,
+                  TSerialization.serialize(request, _PROTOCOL_FACTORY))
+        try:
+            self._records.put_nowait(record)
+        except Queue.Full:
+            if not self._dropped:
+                LOG.warning('recording cannot keep up with the master, '
+                            'dropping requests')
+            self._dropped += 1
+
+    def close(self):
+        """Stop recording and wait until recorded requests are written."""
+        self._records.put(None)
+        self._writer.join()
+        if self._dropped:
+            LOG.warning('dropped %d requests from the recording',
+                        self._dropped)
+
+    def archive(self, request):
+        self._record(request)
+        return self._handler.archive(request)
+
+    def batch(self, request):
+        self._record(request)
+        return self._handler.batch(request)
+
+    def group(self, request):
+        self._record(request)
+        return self._handler.group(request)
+
+    def modify(self, request):
+        self._record(request)
+        return self._handler.modify(request)
+
+    def query(self, request):
+        self._record(request)
+        return self._handler.query(request)
+
+    def query_and_own(self, request):
+        self._record(request)
+        return self._handler.query_and_own(request)
+
+    def renew(self, request):
+        self._record(request)
+        return self._handler.renew(request)
+
+    def watch(self, request):
+        self._record(request)
+        return self._handler.watch(request)
+
+    def watch_async(self, request, callback):
+        self._record(request)
+        self._handler.watch_async(request, callback)
@@ -0,0 +1,226 @@
+# Copyright 2015, Pinterest, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Hot standby replica of the token master.
+
+A replica follows the leader master by repeatedly waiting for changes with a
+watch request and fetching them with a query passing the version of the last
+replicated state as sinceVersion.  If the leader's change log does not go
+back far enough, the query returns all tokens and the replica replaces its
+state.
+
+Until promoted, the replica serves query and group requests from the
+replicated tokens, taking read traffic off the leader.  Other requests are
+rejected.  On promotion, the replica stops following the leader and starts a
+master handler.  The replicated tokens are reconciled with the store the way
+a checkpoint is, so only tokens modified after the last replicated version
+are read from the store, rather than all active tokens.
+"""
+import signal
+import threading
+import time
+
+from pinball.config.utils import get_log
+from pinball.master.master_handler import MasterHandler
+from pinball.master.thrift_lib.ttypes import ErrorCode
+from pinball.master.thrift_lib.ttypes import Query
+from pinball.master.thrift_lib.ttypes import QueryRequest
+from pinball.master.thrift_lib.ttypes import Token
+from pinball.master.thrift_lib.ttypes import TokenMasterException
+from pinball.master.thrift_lib.ttypes import WatchRequest
+from pinball.master.token_trie import TokenTrie
+from pinball.master.transaction import GroupTransaction
+from pinball.master.transaction import QueryTransaction
+
+
+__author__ = 'Pawel Garbacki'
+__copyright__ = 'Copyright 2015, Pinterest, Inc.'
+__credits__ = [__author__]
+__license__ = 'Apache'
+__version__ = '2.0'
+
+
+LOG = get_log('pinball.master.replica')
+
+
+class Replica(object):
+    """Read-only copy of the tokens of a leader master."""
+
+    # The maximum time a replication round waits for changes in the leader.
+    _WATCH_TIMEOUT_MS = 10 * 1000
+    # The delay before retrying replication after a failure.
+    _RETRY_INTERVAL_SEC = 1
+
+    def __init__(self, leader_client, store, triggers=None,
+                 checkpoint_path=None):
+        """Create a replica.
+
+        Args:
+            leader_client: The client communicating with the leader master.
+            store: The store shared with the leader.  It is not accessed
+                until the replica gets promoted.
+            triggers: The list of triggers run by the promoted master.
+            checkpoint_path: The path of the checkpoint file of the promoted
+                master.
+        """
+        self._client = leader_client
+        self._store = store
+        self._triggers = triggers
+        self._checkpoint_path = checkpoint_path
+        self._trie = TokenTrie()
+        # The version of the leader state reflected in the trie.
+        self._version = None
+        # Guards access to the trie and the version.
+        self._trie_lock = threading.Lock()
+        # Serializes promotion.
+        self._promote_lock = threading.Lock()
+        self._promoted = threading.Event()
+        # The master handler created on promotion.
+        self._master = None
+        self._replicator = None
+
+    def start(self):
+        """Start following the leader in a background thread."""
+        assert not self._replicator
+        self._replicator = threading.Thread(target=self._run_replicator)
+        self._replicator.daemon = True
+        self._replicator.start()
+
+    def get_version(self):
+        """Get the version of the leader state reflected in the replica."""
+        with self._trie_lock:
+            return self._version
+
+    def replicate(self):
+        """Apply changes committed by the leader since the last call."""
+        response = self._client.query(QueryRequest(queries=[
+            Query(namePrefix=TokenTrie.DELIMITER,
+                  sinceVersion=self._version)]))
+        tokens = response.tokens[0]
+        with self._trie_lock:
+            if response.incremental and response.incremental[0]:
+                for name in response.deletedNames[0]:
+                    if name in self._trie:
+                        del self._trie[name]
+                for token in tokens:
+                    self._trie[token.name] = token
+            else:
+                trie = TokenTrie()
+                for token in tokens:
+                    trie[token.name] = token
+                self._trie = trie
+                LOG.info('replicated %d tokens at version %d', len(tokens),
+                         response.version)
+            self._version = response.version
+
+    def _run_replicator(self):
+        while not self._promoted.is_set():
+            try:
+                self.replicate()
+                self._client.watch(WatchRequest(
+                    namePrefixes=[TokenTrie.DELIMITER],
+                    sinceVersion=self._version,
+                    timeoutMs=Replica._WATCH_TIMEOUT_MS))
+            except:
+                LOG.exception('')
+                time.sleep(Replica._RETRY_INTERVAL_SEC)
+
+    def promote(self):
+        """Stop following the leader and become the master.
+
+        The leader must not modify tokens anymore, e.g., because it is down.
+
+        Returns:
+            The master handler serving requests from now on.
+        """
+        with self._promote_lock:
+            if self._master:
+                return self._master
+            self._promoted.set()
+            with self._trie_lock:
+                snapshot = None
+                if self._version is not None:
+                    snapshot = (self._version, self._trie.values())
+            LOG.info('promoting replica at version %s', self._version)
+            self._master = MasterHandler(self._store, self._triggers,
+                                         self._checkpoint_path, snapshot)
+            return self._master
+
+    def _get_master(self):
+        master = self._master
+        if not master:
+            raise TokenMasterException(
+                ErrorCode.INPUT_ERROR,
+                'replica serves only query and group requests')
+        return master
+
+    def _process_read_request(self, transaction, request):
+        transaction.prepare(request)
+        with self._trie_lock:
+            if self._version is None:
+                raise TokenMasterException(ErrorCode.UNKNOWN,
+                                           'replica is not initialized')
+            return transaction.commit(self._trie,
+                                      Token(version=self._version), None)
+
+    def archive(self, request):
+        return self._get_master().archive(request)
+
+    def batch(self, request):
+        return self._get_master().batch(request)
+
+    def group(self, request):
+        if self._master:
+            return self._master.group(request)
+        return self._process_read_request(GroupTransaction(), request)
+
+    def modify(self, request):
+        return self._get_master().modify(request)
+
+    def query(self, request):
+        if self._master:
+            return self._master.query(request)
+        # The replica has no change log so queries with a since version
+        # return all matching tokens.
+        return self._process_read_request(QueryTransaction(), request)
+
+    def query_and_own(self, request):
+        return self._get_master().query_and_own(request)
+
+    def renew(self, request):
+        return self._get_master().renew(request)
+
+    def stats(self, request):
+        return self._get_master().stats(request)
+
+    def watch(self, request):
+        return self._get_master().watch(request)
+
+    def watch_async(self, request, callback):
+        self._get_master().watch_async(request, callback)
+
+
+def promote_on_signal(replica, signum=signal.SIGUSR2):
+    """Promote a replica when the process receives a signal.
+
+    Args:
+        replica: The replica to promote.
+        signum: The number of the signal triggering the promotion.
+    """
+    def _handler(sig, frame):
+        # Promotion reads the store so it does not run in the handler.
+        promoter = threading.Thread(target=replica.promote)
+        promoter.daemon = True
+        promoter.start()
+    signal.signal(signum, _handler)
@@ -0,0 +1,325 @@
+# Copyright 2015, Pinterest, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Thrift server multiplexing token master client connections.
+
+The thrift TThreadedServer dedicates a thread to each client connection.
+Workers keep their connections open for their entire lifetime and spend most
+of it waiting for changes, so the number of threads grows with the number of
+workers.  The server implemented here handles all connections in a single
+event loop and executes requests in a fixed pool of threads.  Watch requests
+do not occupy a thread while they wait for a change.
+
+Messages are exchanged with the framed transport: each message is preceded by
+its length.  The protocol is configured in PinballConfig.
+"""
+import collections
+import errno
+import Queue
+import select
+import socket
+import struct
+import threading
+
+from thrift.Thrift import TMessageType
+from thrift.transport import TTransport
+
+from pinball.config.utils import get_log
+from pinball.master.thrift_lib.TokenMasterService import Processor
+from pinball.master.thrift_lib.TokenMasterService import watch_args
+from pinball.master.thrift_lib.TokenMasterService import watch_result
+from pinball.master.wire import get_protocol_factory
+
+
+__author__ = 'Pawel Garbacki'
+__copyright__ = 'Copyright 2015, Pinterest, Inc.'
+__credits__ = [__author__]
+__license__ = 'Apache'
+__version__ = '2.0'
+
+
+LOG = get_log('pinball.master.server')
+
+
+class _Connection(object):
+    """Client connection served by the event loop.
+
+    The connection processes one request at a time.  Requests received while
+    another one is being processed wait in the input buffer.
+    """
+    _FRAME_HEADER = struct.Struct('!i')
+
+    def __init__(self, client_socket):
+        self.socket = client_socket
+        self.input = ''
+        self.output = ''
+        self.processing = False
+        self.closed = False
+
+    def fileno(self):
+        return self.socket.fileno()
+
+    def pop_frame(self, max_frame_bytes):
+        """Remove the first complete frame from the input buffer.
+
+        Args:
+            max_frame_bytes: The maximum allowed frame size.
+        Returns:
+            The frame payload or None if no complete frame has been received.
+        Raises:
+            ValueError: If the frame length is invalid.
+        """
+        header_size = _Connection._FRAME_HEADER.size
+        if len(self.input) < header_size:
+            return None
+        length, = _Connection._FRAME_HEADER.unpack_from(self.input)
+        if length <= 0 or length > max_frame_bytes:
+            raise ValueError('invalid frame length %d' % length)
+        if len(self.input) < header_size + length:
+            return None
+        frame = self.input[header_size:header_size + length]
+        self.input = self.input[header_size + length:]
+        return frame
+
+    def push_frame(self, message):
+        self.output += _Connection._FRAME_HEADER.pack(len(message)) + message
+
+
+class NonblockingServer(object):
+    """Token master server handling connections in a single event loop.
+
+    The event loop accepts connections, reads requests, and writes responses
+    on non-blocking sockets.  Complete requests are executed in a fixed pool
+    of threads.  Responses are handed back to the event loop which is woken
+    up through a socket pair.  Watch requests are passed to the handler
+    together with a callback producing the response once there is a change
+    or the watch timeout expires.
+    """
+    # Requests larger than this are rejected by closing the connection.
+    _MAX_FRAME_BYTES = 64 * 1024 * 1024
+    _RECV_BYTES = 64 * 1024
+    _LISTEN_BACKLOG = 1024
+
+    def __init__(self, handler, port, threads):
+        """Create a server.
+
+        Args:
+            handler: The master handler executing requests.
+            port: The port to listen on.
+            threads: The number of threads executing requests.
+        """
+        self._handler = handler
+        self._processor = Processor(handler)
+        self._protocol_factory = get_protocol_factory()
+        self._threads = threads
+        # Elements are tuples (connection, request frame).
+        self._requests = Queue.Queue()
+        # Elements are tuples (connection, response message).  A None
+        # message indicates a failure closing the connection.
+        self._responses = collections.deque()
+        self._wake_up_reader, self._wake_up_writer = socket.socketpair()
+        self._wake_up_writer.setblocking(False)
+        # Mapping from file descriptor to connection.
+        self._connections = {}
+        self._poller = None
+        self._stopped = False
+        # The socket listens from the start so that clients connecting
+        # before serve() is called wait in the backlog rather than fail.
+        self._server_socket = socket.socket(socket.AF_INET,
+                                            socket.SOCK_STREAM)
+        self._server_socket.setsockopt(socket.SOL_SOCKET,
+                                       socket.SO_REUSEADDR, 1)
+        self._server_socket.bind(('', port))
+        self._server_socket.listen(NonblockingServer._LISTEN_BACKLOG)
+        self._server_socket.setblocking(False)
+
+    def _wake_up(self):
+        try:
+            self._wake_up_writer.send('x')
+        except socket.error as e:
+            # A full buffer means that a wake up is already pending.
+            if e.errno not in (errno.EAGAIN, errno.EWOULDBLOCK):
+                raise
+
+    def _respond(self, connection, message):
+        """Pass a response to the event loop.  Called from any thread."""
+        self._responses.append((connection, message))
+        self._wake_up()
+
+    def _reply_to_watch(self, connection, seqid, response):
+        otransport = TTransport.TMemoryBuffer()
+        oprot = self._protocol_factory.getProtocol(otransport)
+        oprot.writeMessageBegin('watch', TMessageType.REPLY, seqid)
+        watch_result(success=response).write(oprot)
+        oprot.writeMessageEnd()
+        self._respond(connection, otransport.getvalue())
+
+    def _process(self, connection, frame):
+        """Execute a request in a pool thread."""
+        iprot = self._protocol_factory.getProtocol(
+            TTransport.TMemoryBuffer(frame))
+        name, _, seqid = iprot.readMessageBegin()
+        if name == 'watch':
+            args = watch_args()
+            args.read(iprot)
+            iprot.readMessageEnd()
+            self._handler.watch_async(
+                args.request,
+                lambda response: self._reply_to_watch(connection, seqid,
+                                                      response))
+            return
+        iprot = self._protocol_factory.getProtocol(
+            TTransport.TMemoryBuffer(frame))
+        otransport = TTransport.TMemoryBuffer()
+        oprot = self._protocol_factory.getProtocol(otransport)
+        self._processor.process(iprot, oprot)
+        self._respond(connection, otransport.getvalue())
+
+    def _run_worker(self):
+        while True:
+            connection, frame = self._requests.get()
+            try:
+                self._process(connection, frame)
+            except:
+                LOG.exception('')
+                self._respond(connection, None)
+
+    def _close(self, connection):
+        if connection.closed:
+            return
+        connection.closed = True
+        del self._connections[connection.fileno()]
+        self._poller.unregister(connection.fileno())
+        connection.socket.close()
+
+    def _update_events(self, connection):
+        events = select.POLLIN
+        if connection.output:
+            events |= select.POLLOUT
+        self._poller.modify(connection.fileno(), events)
+
+    def _dispatch(self, connection):
+        """Pass the next request received on the connection to the pool."""
+        if connection.processing:
+            return
+        try:
+            frame = connection.pop_frame(NonblockingServer._MAX_FRAME_BYTES)
+        except ValueError:
+            LOG.exception('')
+            self._close(connection)
+            return
+        if frame is not None:
+            connection.processing = True
+            self._requests.put((connection, frame))
+
+    def _accept(self):
+        while True:
+            try:
+                client_socket, _ = self._server_socket.accept()
+            except socket.error as e:
+                if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    return
+                raise
+            client_socket.setblocking(False)
+            client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY,
+                                     1)
+            connection = _Connection(client_socket)
+            self._connections[connection.fileno()] = connection
+            self._poller.register(connection.fileno(), select.POLLIN)
+
+    def _read(self, connection):
+        try:
+            data = connection.socket.recv(NonblockingServer._RECV_BYTES)
+        except socket.error as e:
+            if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                return
+            self._close(connection)
+            return
+        if not data:
+            self._close(connection)
+            return
+        connection.input += data
+        self._dispatch(connection)
+
+    def _write(self, connection):
+        try:
+            sent = connection.socket.send(connection.output)
+        except socket.error as e:
+            if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                return
+            self._close(connection)
+            return
+        connection.output = connection.output[sent:]
+        self._update_events(connection)
+
+    def _handle_responses(self):
+        while self._responses:
+            connection, message = self._responses.popleft()
+            if connection.closed:
+                continue
+            if message is None:
+                self._close(connection)
+                continue
+            connection.processing = False
+            connection.push_frame(message)
+            self._write(connection)
+            if not connection.closed:
+                self._dispatch(connection)
+
+    def _create_poller(self):
+        # Epoll scales with the number of active rather than all connections.
+        # The event masks of poll and epoll have the same values.
+        if hasattr(select, 'epoll'):
+            return select.epoll()
+        return select.poll()
+
+    def serve(self):
+        """Serve requests until stop() is called."""
+        self._poller = self._create_poller()
+        self._poller.register(self._server_socket.fileno(), select.POLLIN)
+        self._poller.register(self._wake_up_reader.fileno(), select.POLLIN)
+        for _ in range(0, self._threads):
+            worker = threading.Thread(target=self._run_worker)
+            worker.daemon = True
+            worker.start()
+        while not self._stopped:
+            try:
+                events = self._poller.poll()
+            except (IOError, select.error) as e:
+                if e.args[0] == errno.EINTR:
+                    continue
+                raise
+            for fileno, event in events:
+                if fileno == self._server_socket.fileno():
+                    self._accept()
+                elif fileno == self._wake_up_reader.fileno():
+                    self._wake_up_reader.recv(NonblockingServer._RECV_BYTES)
+                    self._handle_responses()
+                else:
+                    connection = self._connections.get(fileno)
+                    if not connection:
+                        continue
+                    if event & (select.POLLIN | select.POLLHUP |
+                                select.POLLERR):
+                        self._read(connection)
+                    if not connection.closed and event & select.POLLOUT:
+                        self._write(connection)
+        for connection in self._connections.values():
+            self._close(connection)
+        self._server_socket.close()
+
+    def stop(self):
+        """Make serve() return.  May be called from any thread."""
+        self._stopped = True
+        self._wake_up()
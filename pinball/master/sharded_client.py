@@ -0,0 +1,621 @@
+# Copyright 2015, Pinterest, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Client routing requests to masters owning shards of the token space.
+
+In a sharded deployment, each master owns the tokens of a subset of
+workflows.  Tokens of a workflow, i.e., /workflow/<workflow>/... and
+/schedule/workflow/<workflow>, live in the master selected by the hash of the
+workflow name so that all changes of a workflow are handled by a single
+master.  Remaining tokens live in the first shard.
+
+Requests naming tokens of a single shard are forwarded to the owning master.
+Queries, groups, and watches of prefixes spanning workflows are fanned out to
+all masters and their results are merged.  Watches spanning shards block on
+all of them in parallel, through connections separate from other requests.
+Modifications and renewals are atomic only within a master, so they must not
+span shards.  Metrics of all masters are returned together, with samples
+labeled by the shard.
+
+Each master keeps its own version counter.  A response merging data from
+multiple masters reflects a vector of their versions.  The client registers
+the vector and returns its identifier in place of the version.  The
+identifier may be passed back as sinceVersion in subsequent requests.
+"""
+import collections
+import copy
+import heapq
+import re
+import threading
+import time
+import zlib
+
+from pinball.master.batch import pack_request
+from pinball.master.batch import pack_response
+from pinball.master.batch import unpack_request
+from pinball.master.client import Client
+from pinball.master.thrift_lib.ttypes import ArchiveRequest
+from pinball.master.thrift_lib.ttypes import BatchRequest
+from pinball.master.thrift_lib.ttypes import BatchResponse
+from pinball.master.thrift_lib.ttypes import ErrorCode
+from pinball.master.thrift_lib.ttypes import GroupRequest
+from pinball.master.thrift_lib.ttypes import GroupResponse
+from pinball.master.thrift_lib.ttypes import ModifyRequest
+from pinball.master.thrift_lib.ttypes import QueryAndOwnRequest
+from pinball.master.thrift_lib.ttypes import QueryAndOwnResponse
+from pinball.master.thrift_lib.ttypes import QueryRequest
+from pinball.master.thrift_lib.ttypes import QueryResponse
+from pinball.master.thrift_lib.ttypes import RenewRequest
+from pinball.master.thrift_lib.ttypes import Response
+from pinball.master.thrift_lib.ttypes import StatsRequest
+from pinball.master.thrift_lib.ttypes import StatsResponse
+from pinball.master.thrift_lib.ttypes import TokenMasterException
+from pinball.master.thrift_lib.ttypes import WatchRequest
+from pinball.master.thrift_lib.ttypes import WatchResponse
+
+
+__author__ = 'Pawel Garbacki'
+__copyright__ = 'Copyright 2015, Pinterest, Inc.'
+__credits__ = [__author__]
+__license__ = 'Apache'
+__version__ = '2.0'
+
+
+# Prefixes of names of tokens belonging to workflows.
+_WORKFLOW_PREFIXES = ['/workflow/', '/schedule/workflow/']
+_WORKFLOW_NAME_REGEX = re.compile(
+    r'^(?:/schedule)?/workflow/(?P<workflow>[^/]+)(?P<end>/|$)')
+_PATTERN_WILDCARD = '*'
+
+
+def get_shard(name, num_shards):
+    """Find the shard owning a token.
+
+    Args:
+        name: The name of the token.
+        num_shards: The number of shards.
+    Returns:
+        The index of the shard owning the token.
+    """
+    m = _WORKFLOW_NAME_REGEX.match(name)
+    if not m:
+        return 0
+    return (zlib.crc32(m.group('workflow')) & 0xffffffff) % num_shards
+
+
+def get_prefix_shards(prefix, num_shards):
+    """Find shards owning tokens matching a name prefix or pattern.
+
+    Args:
+        prefix: The name prefix or pattern.
+        num_shards: The number of shards.
+    Returns:
+        The sorted list of indices of shards that may own matching tokens.
+    """
+    m = _WORKFLOW_NAME_REGEX.match(prefix)
+    if (m and m.group('end') and
+            m.group('workflow') != _PATTERN_WILDCARD):
+        return [get_shard(prefix, num_shards)]
+    for workflow_prefix in _WORKFLOW_PREFIXES:
+        if (workflow_prefix.startswith(prefix) or
+                prefix.startswith(workflow_prefix)):
+            return range(0, num_shards)
+    if _PATTERN_WILDCARD in prefix:
+        return range(0, num_shards)
+    return [0]
+
+
+class VersionVectors(object):
+    """Registry of versions of masters reflected in responses."""
+
+    # The number of most recently registered vectors that are retained.
+    # Requests referring to older vectors are handled conservatively, as if
+    # the versions were unknown.
+    _MAX_VECTORS = 10000
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Mapping from vector identifier to a mapping from shard to version.
+        self._vectors = collections.OrderedDict()
+        self._next_id = 1
+
+    def register(self, vector):
+        """Register a version vector.
+
+        Args:
+            vector: The mapping from shard index to the version of its master.
+        Returns:
+            The identifier of the vector.
+        """
+        with self._lock:
+            vector_id = self._next_id
+            self._next_id += 1
+            self._vectors[vector_id] = dict(vector)
+            if len(self._vectors) > VersionVectors._MAX_VECTORS:
+                self._vectors.popitem(last=False)
+            return vector_id
+
+    def get(self, vector_id):
+        """Get a registered version vector.
+
+        Args:
+            vector_id: The identifier of the vector.
+        Returns:
+            The mapping from shard index to version.  It is empty if the
+            vector is not known.
+        """
+        with self._lock:
+            return dict(self._vectors.get(vector_id, {}))
+
+
+def _get_name_key(token):
+    """Get the key ordering tokens the way masters order them."""
+    return token.name.split('/')
+
+
+def _get_priority(token):
+    """Get the key masters use to select top tokens of queries."""
+    return token.priority or 0
+
+
+class _ShardWatch(object):
+    """A watch request blocking on a shard in a separate thread."""
+    def __init__(self, request):
+        self.request = request
+        self.response = None
+        self.error = None
+        self.done = False
+
+
+class ShardedClient(Client):
+    """Client communicating with masters owning shards of tokens."""
+
+    def __init__(self, clients, versions, watch_clients=None):
+        """Create a sharded client.
+
+        Args:
+            clients: The list of clients communicating with masters owning
+                consecutive shards.
+            versions: The registry of version vectors shared by clients of
+                the same masters.
+            watch_clients: The list of clients used by watches blocking on
+                multiple shards in parallel.  A watch may outlive the call
+                which started it so the clients should not share connections
+                with the clients serving other requests.  Defaults to
+                clients.
+        """
+        super(ShardedClient, self).__init__()
+        self._clients = clients
+        self._versions = versions
+        self._watch_clients = watch_clients or clients
+        self._lock = threading.Lock()
+        # Notified when a shard watch completes.
+        self._shard_watch_done = threading.Condition(self._lock)
+        # Mapping from tuple (shard, name prefixes, ignore owned) to the
+        # pending shard watch.
+        self._shard_watches = {}
+        self._request_to_end_point = {
+            ArchiveRequest: self._archive,
+            BatchRequest: self._batch,
+            GroupRequest: self._group,
+            ModifyRequest: self._modify,
+            QueryAndOwnRequest: self._query_and_own,
+            QueryRequest: self._query,
+            RenewRequest: self._renew,
+            StatsRequest: self._stats,
+            WatchRequest: self._watch}
+
+    def _get_shards(self, names):
+        return sorted(set([get_shard(name, len(self._clients))
+                           for name in names]))
+
+    def _get_prefix_shards(self, prefix):
+        return get_prefix_shards(prefix or '', len(self._clients))
+
+    def _get_query_shards(self, query):
+        if query.namePattern:
+            return self._get_prefix_shards(query.namePattern)
+        return self._get_prefix_shards(query.namePrefix)
+
+    def _get_request_shards(self, request):
+        """Find shards touched by a request."""
+        if isinstance(request, ModifyRequest):
+            return self._get_shards(
+                [token.name for token in
+                 (request.updates or []) + (request.deletes or [])])
+        if isinstance(request, RenewRequest):
+            return self._get_shards([lease.name for lease in
+                                     request.leases or []])
+        if isinstance(request, ArchiveRequest):
+            return self._get_shards([token.name for token in
+                                     request.tokens or []])
+        if isinstance(request, QueryRequest):
+            shards = set()
+            for query in request.queries or []:
+                shards.update(self._get_query_shards(query))
+            return sorted(shards)
+        if isinstance(request, QueryAndOwnRequest):
+            return self._get_query_shards(request.query)
+        if isinstance(request, GroupRequest):
+            return self._get_prefix_shards(request.namePrefix)
+        raise TokenMasterException(
+            ErrorCode.INPUT_ERROR,
+            '%s cannot be routed' % request.__class__.__name__)
+
+    def _get_single_shard(self, request):
+        """Find the only shard touched by a request."""
+        shards = self._get_request_shards(request)
+        if len(shards) > 1:
+            raise TokenMasterException(
+                ErrorCode.INPUT_ERROR,
+                'request %s spans shards %s' % (request, shards))
+        return shards[0] if shards else 0
+
+    def _archive(self, request):
+        shard_tokens = collections.defaultdict(list)
+        for token in request.tokens or []:
+            shard_tokens[get_shard(token.name,
+                                   len(self._clients))].append(token)
+        for shard, tokens in sorted(shard_tokens.items()):
+            self._clients[shard].archive(ArchiveRequest(tokens=tokens))
+
+    def _modify(self, request):
+        return self._clients[self._get_single_shard(request)].modify(request)
+
+    def _renew(self, request):
+        return self._clients[self._get_single_shard(request)].renew(request)
+
+    def _stats(self, request):
+        # Samples of each master are labeled with its shard.
+        metrics = {}
+        for shard, client in enumerate(self._clients):
+            label = 'shard="%d"' % shard
+            response = client.stats(request)
+            for name, value in (response.metrics or {}).items():
+                if '{' in name:
+                    name = name.replace('{', '{%s,' % label, 1)
+                else:
+                    name = '%s{%s}' % (name, label)
+                metrics[name] = value
+        return StatsResponse(metrics=metrics)
+
+    def _group(self, request):
+        counts = collections.defaultdict(int)
+        for shard in self._get_prefix_shards(request.namePrefix):
+            response = self._clients[shard].group(request)
+            for group, count in (response.counts or {}).items():
+                counts[group] += count
+        return GroupResponse(counts=dict(counts))
+
+    def _query_and_own(self, request):
+        """Claim the top priority tokens across shards.
+
+        Shards are first asked for the tokens they would claim without
+        claiming them.  The top priority tokens among the answers are then
+        claimed in the shards holding them, starting from the shard with the
+        highest priority token.  A shard whose tokens get claimed by another
+        owner between the two steps returns its next best tokens, or fewer
+        tokens, so the result is not guaranteed to be the global top under
+        concurrent claims.
+        """
+        shards = self._get_query_shards(request.query)
+        max_tokens = request.query.maxTokens
+        if len(shards) == 1 or not max_tokens or request.dryRun:
+            tokens = []
+            for shard in shards:
+                response = self._clients[shard].query_and_own(request)
+                tokens.extend(response.tokens or [])
+            if max_tokens is not None:
+                tokens = heapq.nlargest(max_tokens,
+                                        sorted(tokens, key=_get_name_key),
+                                        key=_get_priority)
+            return QueryAndOwnResponse(tokens=tokens)
+
+        dry_run_request = copy.copy(request)
+        dry_run_request.dryRun = True
+        candidates = []
+        for shard in shards:
+            response = self._clients[shard].query_and_own(dry_run_request)
+            candidates.extend((shard, token)
+                              for token in response.tokens or [])
+        candidates.sort(key=lambda candidate: _get_name_key(candidate[1]))
+        best = heapq.nlargest(max_tokens, candidates,
+                              key=lambda candidate: _get_priority(
+                                  candidate[1]))
+        shard_counts = collections.OrderedDict()
+        for shard, _ in best:
+            shard_counts[shard] = shard_counts.get(shard, 0) + 1
+
+        tokens = []
+        for shard, count in shard_counts.items():
+            shard_request = copy.copy(request)
+            shard_request.query = copy.copy(request.query)
+            shard_request.query.maxTokens = count
+            response = self._clients[shard].query_and_own(shard_request)
+            tokens.extend(response.tokens or [])
+        return QueryAndOwnResponse(tokens=tokens)
+
+    def _localize_query(self, query, shard):
+        """Translate the version in a query to the version of a shard."""
+        if query.sinceVersion is None:
+            return query
+        result = copy.copy(query)
+        result.sinceVersion = self._versions.get(query.sinceVersion).get(
+            shard)
+        return result
+
+    def _query_shards(self, queries, shards_per_query):
+        """Send queries to shards.
+
+        Returns:
+            The list with a mapping from shard to the query response for each
+            query, and the mapping from shard to the version of its master.
+        """
+        shard_queries = collections.defaultdict(list)
+        for i, query in enumerate(queries):
+            for shard in shards_per_query[i]:
+                shard_queries[shard].append(i)
+        results = [{} for _ in queries]
+        versions = {}
+        for shard, indices in sorted(shard_queries.items()):
+            response = self._clients[shard].query(QueryRequest(queries=[
+                self._localize_query(queries[i], shard)
+                for i in indices]))
+            versions[shard] = response.version
+            for j, i in enumerate(indices):
+                results[i][shard] = QueryResponse(
+                    tokens=[response.tokens[j]],
+                    nextCursors=(response.nextCursors[j:j + 1]
+                                 if response.nextCursors else None),
+                    deletedNames=(response.deletedNames[j:j + 1]
+                                  if response.deletedNames else None),
+                    incremental=(response.incremental[j:j + 1]
+                                 if response.incremental else None))
+        return results, versions
+
+    @staticmethod
+    def _is_incremental(result):
+        return bool(result.incremental and result.incremental[0])
+
+    @staticmethod
+    def _merge_tokens(query, results):
+        """Merge tokens matching a query in multiple shards.
+
+        Returns:
+            The tokens and the cursor of the next page.
+        """
+        if len(results) == 1:
+            result = results.values()[0]
+            return (result.tokens[0],
+                    result.nextCursors[0] if result.nextCursors else '')
+        tokens = []
+        has_more = False
+        for result in results.values():
+            tokens.extend(result.tokens[0])
+            if result.nextCursors and result.nextCursors[0]:
+                has_more = True
+        tokens.sort(key=_get_name_key)
+        if query.pageSize:
+            if len(tokens) > query.pageSize:
+                tokens = tokens[:query.pageSize]
+                has_more = True
+            return tokens, tokens[-1].name if has_more and tokens else ''
+        if query.maxTokens is not None:
+            # Like a single master, select the highest priority tokens with
+            # ties broken on the name.
+            tokens = heapq.nlargest(query.maxTokens, tokens,
+                                    key=_get_priority)
+        return tokens, ''
+
+    def _query(self, request):
+        queries = request.queries or []
+        shards_per_query = [self._get_query_shards(query)
+                            for query in queries]
+        results, versions = self._query_shards(queries, shards_per_query)
+        # A response merging changes from some shards with all tokens from
+        # others would be interpreted as all tokens.  Queries answered this
+        # way are repeated for all tokens.
+        repeated = []
+        for i, query in enumerate(queries):
+            if query.sinceVersion is not None and len(set(
+                    [ShardedClient._is_incremental(result)
+                     for result in results[i].values()])) > 1:
+                repeated.append(i)
+        if repeated:
+            full_queries = []
+            for i in repeated:
+                full_query = copy.copy(queries[i])
+                full_query.sinceVersion = None
+                full_queries.append(full_query)
+            full_results, full_versions = self._query_shards(
+                full_queries, [shards_per_query[i] for i in repeated])
+            for i, result in zip(repeated, full_results):
+                for shard_result in result.values():
+                    shard_result.deletedNames = [[]]
+                    shard_result.incremental = [False]
+                results[i] = result
+            versions.update(full_versions)
+
+        response = QueryResponse(tokens=[])
+        if any(query.pageSize for query in queries):
+            response.nextCursors = []
+        if any(query.sinceVersion is not None for query in queries):
+            response.deletedNames = []
+            response.incremental = []
+        for query, result in zip(queries, results):
+            tokens, cursor = ShardedClient._merge_tokens(query, result)
+            response.tokens.append(tokens)
+            if response.nextCursors is not None:
+                response.nextCursors.append(cursor)
+            if response.deletedNames is not None:
+                deleted_names = []
+                for shard_result in result.values():
+                    if shard_result.deletedNames:
+                        deleted_names.extend(shard_result.deletedNames[0])
+                response.deletedNames.append(deleted_names)
+                response.incremental.append(all(
+                    ShardedClient._is_incremental(shard_result)
+                    for shard_result in result.values()))
+        response.version = self._versions.register(versions)
+        return response
+
+    def _watch(self, request):
+        shard_prefixes = collections.defaultdict(list)
+        for prefix in request.namePrefixes or ['']:
+            for shard in self._get_prefix_shards(prefix):
+                shard_prefixes[shard].append(prefix)
+        shards = sorted(shard_prefixes.keys())
+        vector = {}
+        if request.sinceVersion is not None:
+            vector = self._versions.get(request.sinceVersion)
+        # Shards whose version is not known are reported as changed.
+        changed = (request.sinceVersion is not None and
+                   any(shard not in vector for shard in shards))
+        deadline = time.time() + (request.timeoutMs or 0) / 1000.
+        # A single shard may block for the whole timeout.  Multiple shards
+        # are checked without blocking first and then watched in parallel.
+        if len(shards) == 1:
+            timeout_ms = request.timeoutMs
+        else:
+            timeout_ms = 0
+        for shard in shards:
+            response = self._clients[shard].watch(WatchRequest(
+                namePrefixes=shard_prefixes[shard],
+                sinceVersion=vector.get(shard),
+                timeoutMs=0 if changed else timeout_ms,
+                ignoreOwned=request.ignoreOwned))
+            vector[shard] = response.version
+            changed = changed or response.changed
+        if (not changed and request.sinceVersion is not None and
+                len(shards) > 1):
+            changed = self._wait_for_shards(shard_prefixes,
+                                            request.ignoreOwned, vector,
+                                            deadline)
+        return WatchResponse(version=self._versions.register(vector),
+                             changed=changed)
+
+    def _run_shard_watch(self, shard, key, shard_watch):
+        try:
+            response = self._watch_clients[shard].watch(shard_watch.request)
+            error = None
+        except Exception as e:
+            response = None
+            error = e
+        with self._lock:
+            shard_watch.response = response
+            shard_watch.error = error
+            shard_watch.done = True
+            del self._shard_watches[key]
+            self._shard_watch_done.notify_all()
+
+    def _get_shard_watch(self, shard, prefixes, ignore_owned, since_version,
+                         timeout_ms):
+        """Find or start a watch blocking on a shard.
+
+        Must be called with the lock held.
+        """
+        key = (shard, tuple(sorted(prefixes)), bool(ignore_owned))
+        shard_watch = self._shard_watches.get(key)
+        if not shard_watch:
+            shard_watch = _ShardWatch(WatchRequest(namePrefixes=prefixes,
+                                                   sinceVersion=since_version,
+                                                   timeoutMs=timeout_ms,
+                                                   ignoreOwned=ignore_owned))
+            self._shard_watches[key] = shard_watch
+            thread = threading.Thread(target=self._run_shard_watch,
+                                      args=(shard, key, shard_watch))
+            thread.daemon = True
+            thread.start()
+        return shard_watch
+
+    def _wait_for_shards(self, shard_prefixes, ignore_owned, vector,
+                         deadline):
+        """Block on multiple shards in parallel until any of them changes.
+
+        Each shard is watched in a separate thread for the whole timeout.  A
+        watch still pending when the call returns is reused by subsequent
+        calls with the same prefixes rather than duplicated, so a client
+        keeps at most one watch per shard.  The reused watch started at an
+        older version so it may report a change preceding the versions in
+        the vector.  Such spurious changes are harmless for callers waking
+        up to look for work.
+
+        Args:
+            shard_prefixes: The mapping from shard to the watched prefixes.
+            ignore_owned: If True, changes leaving tokens owned are ignored.
+            vector: The mapping from shard to the version checked for
+                changes.  It is updated with versions in responses of shard
+                watches.
+            deadline: The time when the wait times out.
+        Returns:
+            True if any of the shards changed.
+        """
+        shard_watches = {}
+        with self._lock:
+            while True:
+                for shard, shard_watch in shard_watches.items():
+                    if not shard_watch.done:
+                        continue
+                    if shard_watch.error:
+                        raise shard_watch.error
+                    vector[shard] = shard_watch.response.version
+                    if shard_watch.response.changed:
+                        return True
+                    del shard_watches[shard]
+                remaining_ms = int(1000 * (deadline - time.time()))
+                if remaining_ms <= 0:
+                    return False
+                for shard, prefixes in shard_prefixes.items():
+                    if shard not in shard_watches:
+                        shard_watches[shard] = self._get_shard_watch(
+                            shard, prefixes, ignore_owned, vector[shard],
+                            remaining_ms)
+                self._shard_watch_done.wait(remaining_ms / 1000.)
+
+    def _batch(self, request):
+        requests = [unpack_request(batched_request)
+                    for batched_request in request.requests or []]
+        if not request.atomic:
+            responses = []
+            for batched_request in requests:
+                try:
+                    responses.append(
+                        pack_response(self.call(batched_request)))
+                except TokenMasterException as e:
+                    responses.append(Response(error=e))
+            return BatchResponse(responses=responses)
+
+        # Atomic batches have to be executed by a single master.
+        shards = set()
+        for batched_request in requests:
+            shards.update(self._get_request_shards(batched_request))
+        if len(shards) > 1:
+            raise TokenMasterException(
+                ErrorCode.INPUT_ERROR,
+                'atomic batch spans shards %s' % sorted(shards))
+        shard = shards.pop() if shards else 0
+        shard_requests = []
+        for batched_request in requests:
+            if isinstance(batched_request, QueryRequest):
+                batched_request = QueryRequest(queries=[
+                    self._localize_query(query, shard)
+                    for query in batched_request.queries or []])
+            shard_requests.append(pack_request(batched_request))
+        response = self._clients[shard].batch(
+            BatchRequest(requests=shard_requests, atomic=True))
+        for batched_response in response.responses:
+            if batched_response.query:
+                batched_response.query.version = self._versions.register(
+                    {shard: batched_response.query.version})
+        return response
@@ -13,6 +13,10 @@
 # limitations under the License.
 
 """Snapshot maintains a collection of tokens matching a given query."""
+import copy
+
+from pinball.master.thrift_lib.ttypes import QueryRequest
+from pinball.master.thrift_lib.ttypes import WatchRequest
 
 
 __author__ = 'Pawel Garbacki'
@@ -23,18 +27,123 @@ __version__ = '2.0'
 
 
 class Snapshot(object):
+    """Local copy of tokens matching queries.
+
+    If all queries select tokens by name prefix only, the copy is refreshed
+    incrementally: the master returns tokens changed since the version of
+    the previous response and names of removed tokens.  Otherwise, all
+    matching tokens are retrieved on each refresh.
+    """
     def __init__(self, client, request):
         self._client = client
         self._request = request
-        self._response = None
+        self._version = None
+        # Elements are mappings from token name to token, one per query.
+        self._tokens = None
         self.refresh()
 
-    def refresh(self):
+    def _get_name_prefixes(self):
+        if not self._request.queries:
+            return []
+        return [query.namePrefix or '' for query in self._request.queries]
+
+    def _has_changed(self, timeout_sec):
+        """Check if tokens matching the queries changed since the last query.
+
+        Args:
+            timeout_sec: The maximum time to block waiting for a change.
+        Returns:
+            True if tokens under the queried prefixes may have changed.
+        """
+        if self._version is None:
+            return True
+        request = WatchRequest(namePrefixes=self._get_name_prefixes(),
+                               sinceVersion=self._version,
+                               timeoutMs=int(timeout_sec * 1000))
+        return self._client.watch(request).changed
+
+    def _is_incremental(self):
+        """Check if the snapshot may be refreshed with delta queries."""
+        if self._tokens is None or self._version is None:
+            return False
+        for query in self._request.queries or []:
+            if (query.namePattern or query.maxTokens is not None or
+                    query.pageSize is not None):
+                return False
+        return True
+
+    @staticmethod
+    def _to_mapping(tokens):
+        return dict((token.name, token) for token in tokens)
+
+    def _query_all(self):
+        """Retrieve all matching tokens.
+
+        Returns:
+            True if the local copy of the tokens has changed.
+        """
+        response = self._client.query(self._request)
+        tokens = [Snapshot._to_mapping(query_tokens)
+                  for query_tokens in response.tokens or []]
+        # Versions differ between responses so compare the tokens only.
+        changed = tokens != self._tokens
+        self._tokens = tokens
+        self._version = response.version
+        return changed
+
+    def _query_changes(self):
+        """Apply tokens changed since the last refresh to the local copy.
+
+        Returns:
+            True if the local copy of the tokens has changed.
+        """
+        request = QueryRequest(queries=[])
+        for query in self._request.queries:
+            query = copy.copy(query)
+            query.sinceVersion = self._version
+            request.queries.append(query)
+        response = self._client.query(request)
+        changed = False
+        for i, tokens in enumerate(self._tokens):
+            if not response.incremental[i]:
+                query_tokens = Snapshot._to_mapping(response.tokens[i])
+                changed = changed or query_tokens != tokens
+                self._tokens[i] = query_tokens
+                continue
+            for name in response.deletedNames[i]:
+                if tokens.pop(name, None) is not None:
+                    changed = True
+            for token in response.tokens[i]:
+                if tokens.get(token.name) != token:
+                    tokens[token.name] = token
+                    changed = True
+        self._version = response.version
+        return changed
+
+    def refresh(self, timeout_sec=0):
         """Query the master.
 
+        The master gets queried only if tokens under the queried prefixes
+        changed since the last refresh.
+
+        Args:
+            timeout_sec: The maximum time to block waiting for a change.
         Returns:
             True if the local copy of the tokens has changed.  Otherwise False.
         """
-        old_response = self._response
-        self._response = self._client.query(self._request)
-        return self._response != old_response
+        if not self._has_changed(timeout_sec):
+            return False
+        if self._is_incremental():
+            return self._query_changes()
+        return self._query_all()
+
+    def get_tokens(self):
+        """Return the local copy of the tokens.
+
+        Returns:
+            List with lists of tokens matching the queries.  Elements appear
+            in the order of queries in the request.  Tokens are sorted on
+            name.
+        """
+        return [[tokens[name] for name in sorted(tokens)]
+                for tokens in self._tokens]
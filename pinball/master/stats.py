@@ -0,0 +1,326 @@
+# Copyright 2015, Pinterest, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Metrics of the token master.
+
+The master counts requests and records distributions of their latencies,
+the time transactions wait for the master locks, the time they execute, the
+time spent writing to the store, and the sizes of responses.  Metrics are
+identified by sample names in the Prometheus text format, e.g.,
+pinball_master_requests_total{request="query"}.  They are returned by the
+stats RPC and may be served over HTTP in the Prometheus text format.
+"""
+import BaseHTTPServer
+import bisect
+import collections
+import re
+import threading
+
+from pinball.config.utils import get_log
+from pinball.master.thrift_lib.ttypes import StatsRequest
+
+
+__author__ = 'Pawel Garbacki'
+__copyright__ = 'Copyright 2015, Pinterest, Inc.'
+__credits__ = [__author__]
+__license__ = 'Apache'
+__version__ = '2.0'
+
+
+LOG = get_log('pinball.master.stats')
+
+
+# Upper bounds of buckets of histograms measuring time in seconds.
+LATENCY_BUCKETS_SEC = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                       0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# Upper bounds of buckets of histograms measuring sizes in bytes.
+SIZE_BUCKETS_BYTES = (100, 1000, 10 * 1000, 100 * 1000, 1000 * 1000,
+                      10 * 1000 * 1000, 100 * 1000 * 1000)
+
+# The label holding the upper bound of a histogram bucket.
+_BUCKET_BOUND = re.compile(r',?le="([^"]*)"')
+
+# Mapping from metric name to the tuple (type, description).
+METRICS = collections.OrderedDict([
+    ('pinball_master_requests_total',
+     ('counter', 'Requests handled by the master.')),
+    ('pinball_master_request_errors_total',
+     ('counter', 'Requests which failed with a TokenMasterException.')),
+    ('pinball_master_request_latency_seconds',
+     ('histogram', 'Time from receiving a request to responding to it.')),
+    ('pinball_master_lock_wait_seconds',
+     ('histogram', 'Time transactions waited for the master locks.')),
+    ('pinball_master_execution_seconds',
+     ('histogram', 'Time transactions held the master locks, excluding '
+                   'store writes.')),
+    ('pinball_master_store_write_seconds',
+     ('histogram', 'Time spent writing tokens to the store.')),
+    ('pinball_master_store_sync_seconds',
+     ('histogram', 'Time spent waiting for store writes to become '
+                   'durable.')),
+    ('pinball_master_response_bytes',
+     ('histogram', 'Total length of strings, e.g., token names and data, '
+                   'in responses.')),
+    ('pinball_master_tokens',
+     ('gauge', 'Tokens under a top-level name prefix.')),
+    ('pinball_master_version',
+     ('gauge', 'The blessed version of the master.'))])
+
+
+def get_request_type(request):
+    """Get the name of the RPC handling a request.
+
+    Args:
+        request: The request, e.g., a QueryAndOwnRequest.
+    Returns:
+        The name of the RPC, e.g., 'query_and_own'.
+    """
+    name = request.__class__.__name__
+    if name.endswith('Request'):
+        name = name[:-len('Request')]
+    return re.sub('(?<!^)([A-Z])', r'_\1', name).lower()
+
+
+def get_response_size(response):
+    """Estimate the size of a response.
+
+    The size is approximated by the total length of strings in the response,
+    which is dominated by names and data of tokens.
+
+    Args:
+        response: The thrift response.
+    Returns:
+        The size of the response in bytes.
+    """
+    size = 0
+    values = [response]
+    while values:
+        value = values.pop()
+        if isinstance(value, basestring):
+            size += len(value)
+        elif isinstance(value, (list, tuple, set)):
+            values.extend(value)
+        elif isinstance(value, dict):
+            values.extend(value.iterkeys())
+        elif hasattr(value, 'thrift_spec'):
+            values.extend(value.__dict__.itervalues())
+    return size
+
+
+def _format_labels(labels):
+    """Format labels of a sample in the Prometheus text format.
+
+    Args:
+        labels: The sequence of (name, value) pairs.
+    Returns:
+        The labels enclosed in braces or an empty string if there are no
+        labels.
+    """
+    if not labels:
+        return ''
+    return '{%s}' % ','.join(
+        '%s="%s"' % (name, str(value).replace('\\', '\\\\')
+                                     .replace('"', '\\"')
+                                     .replace('\n', '\\n'))
+        for name, value in labels)
+
+
+class Histogram(object):
+    """Distribution of observed values over buckets with fixed bounds.
+
+    The histogram is not thread safe.
+    """
+    def __init__(self, bounds):
+        """Create a histogram.
+
+        Args:
+            bounds: The sorted upper bounds of buckets.  Values above the last
+                bound fall into an implicit infinite bucket.
+        """
+        self._bounds = bounds
+        self._counts = [0] * (len(bounds) + 1)
+        self._sum = 0.
+
+    def observe(self, value):
+        self._counts[bisect.bisect_left(self._bounds, value)] += 1
+        self._sum += value
+
+    def get_samples(self, name, labels):
+        """Get samples describing the histogram.
+
+        Args:
+            name: The name of the histogram metric.
+            labels: The sequence of (name, value) label pairs of the
+                histogram.
+        Returns:
+            The list of (sample name, value) pairs with cumulative bucket
+            counts, the sum, and the count of observed values.
+        """
+        result = []
+        count = 0
+        for bound, bucket_count in zip(self._bounds, self._counts):
+            count += bucket_count
+            result.append((name + '_bucket' + _format_labels(
+                tuple(labels) + (('le', '%g' % bound),)), count))
+        count += self._counts[-1]
+        result.append((name + '_bucket' + _format_labels(
+            tuple(labels) + (('le', '+Inf'),)), count))
+        result.append((name + '_sum' + _format_labels(labels), self._sum))
+        result.append((name + '_count' + _format_labels(labels), count))
+        return result
+
+
+class MasterStats(object):
+    """Thread safe registry of counters and histograms of the master."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Mapping from tuple (metric name, labels) to the counter value.
+        self._counters = collections.defaultdict(int)
+        # Mapping from tuple (metric name, labels) to the histogram.
+        self._histograms = {}
+
+    def increment(self, name, labels=(), value=1):
+        """Increment a counter.
+
+        Args:
+            name: The name of the counter metric.
+            labels: The tuple of (name, value) label pairs.
+            value: The increment.
+        """
+        with self._lock:
+            self._counters[(name, labels)] += value
+
+    def observe(self, name, value, labels=(), bounds=LATENCY_BUCKETS_SEC):
+        """Record a value in a histogram.
+
+        Args:
+            name: The name of the histogram metric.
+            value: The observed value.
+            labels: The tuple of (name, value) label pairs.
+            bounds: The bucket bounds used if the histogram does not exist
+                yet.
+        """
+        with self._lock:
+            histogram = self._histograms.get((name, labels))
+            if not histogram:
+                histogram = Histogram(bounds)
+                self._histograms[(name, labels)] = histogram
+            histogram.observe(value)
+
+    def get_samples(self, gauges=None):
+        """Get current values of the metrics.
+
+        Args:
+            gauges: The list of tuples (metric name, labels, value) with
+                values of gauges computed by the caller.
+        Returns:
+            Mapping from sample name to value.
+        """
+        result = {}
+        with self._lock:
+            for (name, labels), value in self._counters.iteritems():
+                result[name + _format_labels(labels)] = value
+            for (name, labels), histogram in self._histograms.iteritems():
+                result.update(histogram.get_samples(name, labels))
+        for name, labels, value in gauges or []:
+            result[name + _format_labels(labels)] = value
+        return result
+
+
+def _get_metric_name(sample_name):
+    """Find the name of the metric a sample belongs to."""
+    name = sample_name.split('{', 1)[0]
+    for suffix in ('_bucket', '_sum', '_count'):
+        if name.endswith(suffix) and name[:-len(suffix)] in METRICS:
+            return name[:-len(suffix)]
+    return name
+
+
+def _get_sort_key(sample_name):
+    """Get the key ordering buckets of a histogram on their bounds."""
+    match = _BUCKET_BOUND.search(sample_name)
+    if not match:
+        return sample_name, 0.
+    return (_BUCKET_BOUND.sub('', sample_name).replace('{}', ''),
+            float(match.group(1)))
+
+
+def format_text(samples):
+    """Format samples in the Prometheus text exposition format.
+
+    Args:
+        samples: Mapping from sample name to value.
+    Returns:
+        The text listing samples grouped by metric, with type and help lines
+        of known metrics.
+    """
+    samples_by_metric = collections.defaultdict(list)
+    for sample_name, value in samples.iteritems():
+        samples_by_metric[_get_metric_name(sample_name)].append(
+            (sample_name, value))
+    lines = []
+    for name in sorted(samples_by_metric):
+        if name in METRICS:
+            metric_type, description = METRICS[name]
+            lines.append('# HELP %s %s' % (name, description))
+            lines.append('# TYPE %s %s' % (name, metric_type))
+        for sample_name, value in sorted(
+                samples_by_metric[name],
+                key=lambda sample: _get_sort_key(sample[0])):
+            lines.append('%s %s' % (sample_name, repr(float(value))))
+    return '\n'.join(lines) + '\n'
+
+
+class _MetricsRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Request handler serving master metrics at /metrics."""
+
+    def do_GET(self):
+        if self.path.split('?', 1)[0] != '/metrics':
+            self.send_error(404)
+            return
+        try:
+            response = self.server.master_handler.stats(StatsRequest())
+        except:
+            LOG.exception('')
+            self.send_error(503)
+            return
+        body = format_text(response.metrics or {})
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes are frequent so they are not logged.
+        pass
+
+
+def serve_metrics(master_handler, port):
+    """Serve master metrics over HTTP in a background thread.
+
+    Args:
+        master_handler: The handler whose stats get served.
+        port: The port of the HTTP server.
+    Returns:
+        The HTTP server.
+    """
+    server = BaseHTTPServer.HTTPServer(('', port), _MetricsRequestHandler)
+    server.master_handler = master_handler
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    LOG.info('serving master metrics on port %d', server.server_address[1])
+    return server
@@ -36,6 +36,23 @@ class ErrorCode:
     "INPUT_ERROR": 3,
   }
 
+class Projection:
+  FULL = 0
+  METADATA = 1
+  NAME = 2
+
+  _VALUES_TO_NAMES = {
+    0: "FULL",
+    1: "METADATA",
+    2: "NAME",
+  }
+
+  _NAMES_TO_VALUES = {
+    "FULL": 0,
+    "METADATA": 1,
+    "NAME": 2,
+  }
+
 
 class Token:
   """
@@ -611,17 +628,32 @@ class Query:
   Attributes:
    - namePrefix
    - maxTokens
+   - namePattern
+   - projection
+   - startAfterName
+   - pageSize
+   - sinceVersion
   """
 
   thrift_spec = (
     None, # 0
     (1, TType.STRING, 'namePrefix', None, None, ), # 1
     (2, TType.I32, 'maxTokens', None, None, ), # 2
+    (3, TType.STRING, 'namePattern', None, None, ), # 3
+    (4, TType.I32, 'projection', None, None, ), # 4
+    (5, TType.STRING, 'startAfterName', None, None, ), # 5
+    (6, TType.I32, 'pageSize', None, None, ), # 6
+    (7, TType.I64, 'sinceVersion', None, None, ), # 7
   )
 
-  def __init__(self, namePrefix=None, maxTokens=None,):
+  def __init__(self, namePrefix=None, maxTokens=None, namePattern=None, projection=None, startAfterName=None, pageSize=None, sinceVersion=None,):
     self.namePrefix = namePrefix
     self.maxTokens = maxTokens
+    self.namePattern = namePattern
+    self.projection = projection
+    self.startAfterName = startAfterName
+    self.pageSize = pageSize
+    self.sinceVersion = sinceVersion
 
   def read(self, iprot):
     if iprot.__class__ == TBinaryProtocol.TBinaryProtocolAccelerated and isinstance(iprot.trans, TTransport.CReadableTransport) and self.thrift_spec is not None and fastbinary is not None:
@@ -642,6 +674,31 @@ class Query:
           self.maxTokens = iprot.readI32();
         else:
           iprot.skip(ftype)
+      elif fid == 3:
+        if ftype == TType.STRING:
+          self.namePattern = iprot.readString();
+        else:
+          iprot.skip(ftype)
+      elif fid == 4:
+        if ftype == TType.I32:
+          self.projection = iprot.readI32();
+        else:
+          iprot.skip(ftype)
+      elif fid == 5:
+        if ftype == TType.STRING:
+          self.startAfterName = iprot.readString();
+        else:
+          iprot.skip(ftype)
+      elif fid == 6:
+        if ftype == TType.I32:
+          self.pageSize = iprot.readI32();
+        else:
+          iprot.skip(ftype)
+      elif fid == 7:
+        if ftype == TType.I64:
+          self.sinceVersion = iprot.readI64();
+        else:
+          iprot.skip(ftype)
       else:
         iprot.skip(ftype)
       iprot.readFieldEnd()
@@ -660,6 +717,26 @@ class Query:
       oprot.writeFieldBegin('maxTokens', TType.I32, 2)
       oprot.writeI32(self.maxTokens)
       oprot.writeFieldEnd()
+    if self.namePattern is not None:
+      oprot.writeFieldBegin('namePattern', TType.STRING, 3)
+      oprot.writeString(self.namePattern)
+      oprot.writeFieldEnd()
+    if self.projection is not None:
+      oprot.writeFieldBegin('projection', TType.I32, 4)
+      oprot.writeI32(self.projection)
+      oprot.writeFieldEnd()
+    if self.startAfterName is not None:
+      oprot.writeFieldBegin('startAfterName', TType.STRING, 5)
+      oprot.writeString(self.startAfterName)
+      oprot.writeFieldEnd()
+    if self.pageSize is not None:
+      oprot.writeFieldBegin('pageSize', TType.I32, 6)
+      oprot.writeI32(self.pageSize)
+      oprot.writeFieldEnd()
+    if self.sinceVersion is not None:
+      oprot.writeFieldBegin('sinceVersion', TType.I64, 7)
+      oprot.writeI64(self.sinceVersion)
+      oprot.writeFieldEnd()
     oprot.writeFieldStop()
     oprot.writeStructEnd()
 
@@ -751,15 +828,27 @@ class QueryResponse:
   """
   Attributes:
    - tokens
+   - version
+   - nextCursors
+   - deletedNames
+   - incremental
   """
 
   thrift_spec = (
     None, # 0
     (1, TType.LIST, 'tokens', (TType.LIST,(TType.STRUCT,(Token, Token.thrift_spec))), None, ), # 1
+    (2, TType.I64, 'version', None, None, ), # 2
+    (3, TType.LIST, 'nextCursors', (TType.STRING,None), None, ), # 3
+    (4, TType.LIST, 'deletedNames', (TType.LIST,(TType.STRING,None)), None, ), # 4
+    (5, TType.LIST, 'incremental', (TType.BOOL,None), None, ), # 5
   )
 
-  def __init__(self, tokens=None,):
+  def __init__(self, tokens=None, version=None, nextCursors=None, deletedNames=None, incremental=None,):
     self.tokens = tokens
+    self.version = version
+    self.nextCursors = nextCursors
+    self.deletedNames = deletedNames
+    self.incremental = incremental
 
   def read(self, iprot):
     if iprot.__class__ == TBinaryProtocol.TBinaryProtocolAccelerated and isinstance(iprot.trans, TTransport.CReadableTransport) and self.thrift_spec is not None and fastbinary is not None:
@@ -786,6 +875,46 @@ class QueryResponse:
           iprot.readListEnd()
         else:
           iprot.skip(ftype)
+      elif fid == 2:
+        if ftype == TType.I64:
+          self.version = iprot.readI64();
+        else:
+          iprot.skip(ftype)
+      elif fid == 3:
+        if ftype == TType.LIST:
+          self.nextCursors = []
+          (_etype89, _size86) = iprot.readListBegin()
+          for _i90 in xrange(_size86):
+            _elem91 = iprot.readString();
+            self.nextCursors.append(_elem91)
+          iprot.readListEnd()
+        else:
+          iprot.skip(ftype)
+      elif fid == 4:
+        if ftype == TType.LIST:
+          self.deletedNames = []
+          (_etype96, _size93) = iprot.readListBegin()
+          for _i97 in xrange(_size93):
+            _elem98 = []
+            (_etype102, _size99) = iprot.readListBegin()
+            for _i103 in xrange(_size99):
+              _elem104 = iprot.readString();
+              _elem98.append(_elem104)
+            iprot.readListEnd()
+            self.deletedNames.append(_elem98)
+          iprot.readListEnd()
+        else:
+          iprot.skip(ftype)
+      elif fid == 5:
+        if ftype == TType.LIST:
+          self.incremental = []
+          (_etype108, _size105) = iprot.readListBegin()
+          for _i109 in xrange(_size105):
+            _elem110 = iprot.readBool();
+            self.incremental.append(_elem110)
+          iprot.readListEnd()
+        else:
+          iprot.skip(ftype)
       else:
         iprot.skip(ftype)
       iprot.readFieldEnd()
@@ -806,6 +935,34 @@ class QueryResponse:
         oprot.writeListEnd()
       oprot.writeListEnd()
       oprot.writeFieldEnd()
+    if self.version is not None:
+      oprot.writeFieldBegin('version', TType.I64, 2)
+      oprot.writeI64(self.version)
+      oprot.writeFieldEnd()
+    if self.nextCursors is not None:
+      oprot.writeFieldBegin('nextCursors', TType.LIST, 3)
+      oprot.writeListBegin(TType.STRING, len(self.nextCursors))
+      for iter92 in self.nextCursors:
+        oprot.writeString(iter92)
+      oprot.writeListEnd()
+      oprot.writeFieldEnd()
+    if self.deletedNames is not None:
+      oprot.writeFieldBegin('deletedNames', TType.LIST, 4)
+      oprot.writeListBegin(TType.LIST, len(self.deletedNames))
+      for iter111 in self.deletedNames:
+        oprot.writeListBegin(TType.STRING, len(iter111))
+        for iter112 in iter111:
+          oprot.writeString(iter112)
+        oprot.writeListEnd()
+      oprot.writeListEnd()
+      oprot.writeFieldEnd()
+    if self.incremental is not None:
+      oprot.writeFieldBegin('incremental', TType.LIST, 5)
+      oprot.writeListBegin(TType.BOOL, len(self.incremental))
+      for iter113 in self.incremental:
+        oprot.writeBool(iter113)
+      oprot.writeListEnd()
+      oprot.writeFieldEnd()
     oprot.writeFieldStop()
     oprot.writeStructEnd()
 
@@ -830,6 +987,8 @@ class QueryAndOwnRequest:
    - owner
    - expirationTime
    - query
+   - excludedPrefixes
+   - dryRun
   """
 
   thrift_spec = (
@@ -837,12 +996,16 @@ class QueryAndOwnRequest:
     (1, TType.STRING, 'owner', None, None, ), # 1
     (2, TType.I64, 'expirationTime', None, None, ), # 2
     (3, TType.STRUCT, 'query', (Query, Query.thrift_spec), None, ), # 3
+    (4, TType.LIST, 'excludedPrefixes', (TType.STRING,None), None, ), # 4
+    (5, TType.BOOL, 'dryRun', None, None, ), # 5
   )
 
-  def __init__(self, owner=None, expirationTime=None, query=None,):
+  def __init__(self, owner=None, expirationTime=None, query=None, excludedPrefixes=None, dryRun=None,):
     self.owner = owner
     self.expirationTime = expirationTime
     self.query = query
+    self.excludedPrefixes = excludedPrefixes
+    self.dryRun = dryRun
 
   def read(self, iprot):
     if iprot.__class__ == TBinaryProtocol.TBinaryProtocolAccelerated and isinstance(iprot.trans, TTransport.CReadableTransport) and self.thrift_spec is not None and fastbinary is not None:
@@ -869,6 +1032,21 @@ class QueryAndOwnRequest:
           self.query.read(iprot)
         else:
           iprot.skip(ftype)
+      elif fid == 4:
+        if ftype == TType.LIST:
+          self.excludedPrefixes = []
+          (_etype140, _size137) = iprot.readListBegin()
+          for _i141 in xrange(_size137):
+            _elem142 = iprot.readString();
+            self.excludedPrefixes.append(_elem142)
+          iprot.readListEnd()
+        else:
+          iprot.skip(ftype)
+      elif fid == 5:
+        if ftype == TType.BOOL:
+          self.dryRun = iprot.readBool();
+        else:
+          iprot.skip(ftype)
       else:
         iprot.skip(ftype)
       iprot.readFieldEnd()
@@ -891,6 +1069,17 @@ class QueryAndOwnRequest:
       oprot.writeFieldBegin('query', TType.STRUCT, 3)
       self.query.write(oprot)
       oprot.writeFieldEnd()
+    if self.excludedPrefixes is not None:
+      oprot.writeFieldBegin('excludedPrefixes', TType.LIST, 4)
+      oprot.writeListBegin(TType.STRING, len(self.excludedPrefixes))
+      for iter143 in self.excludedPrefixes:
+        oprot.writeString(iter143)
+      oprot.writeListEnd()
+      oprot.writeFieldEnd()
+    if self.dryRun is not None:
+      oprot.writeFieldBegin('dryRun', TType.BOOL, 5)
+      oprot.writeBool(self.dryRun)
+      oprot.writeFieldEnd()
     oprot.writeFieldStop()
     oprot.writeStructEnd()
 
@@ -967,6 +1156,918 @@ class QueryAndOwnResponse:
     return
 
 
+  def __repr__(self):
+    L = ['%s=%r' % (key, value)
+      for key, value in self.__dict__.iteritems()]
+    return '%s(%s)' % (self.__class__.__name__, ', '.join(L))
+
+  def __eq__(self, other):
+    return isinstance(other, self.__class__) and self.__dict__ == other.__dict__
+
+  def __ne__(self, other):
+    return not (self == other)
+
+class WatchRequest:
+  """
+  Attributes:
+   - namePrefixes
+   - sinceVersion
+   - timeoutMs
+   - ignoreOwned
+  """
+
+  thrift_spec = (
+    None, # 0
+    (1, TType.LIST, 'namePrefixes', (TType.STRING,None), None, ), # 1
+    (2, TType.I64, 'sinceVersion', None, None, ), # 2
+    (3, TType.I32, 'timeoutMs', None, None, ), # 3
+    (4, TType.BOOL, 'ignoreOwned', None, None, ), # 4
+  )
+
+  def __init__(self, namePrefixes=None, sinceVersion=None, timeoutMs=None, ignoreOwned=None,):
+    self.namePrefixes = namePrefixes
+    self.sinceVersion = sinceVersion
+    self.timeoutMs = timeoutMs
+    self.ignoreOwned = ignoreOwned
+
+  def read(self, iprot):
+    if iprot.__class__ == TBinaryProtocol.TBinaryProtocolAccelerated and isinstance(iprot.trans, TTransport.CReadableTransport) and self.thrift_spec is not None and fastbinary is not None:
+      fastbinary.decode_binary(self, iprot.trans, (self.__class__, self.thrift_spec))
+      return
+    iprot.readStructBegin()
+    while True:
+      (fname, ftype, fid) = iprot.readFieldBegin()
+      if ftype == TType.STOP:
+        break
+      if fid == 1:
+        if ftype == TType.LIST:
+          self.namePrefixes = []
+          (_etype68, _size65) = iprot.readListBegin()
+          for _i69 in xrange(_size65):
+            _elem70 = iprot.readString();
+            self.namePrefixes.append(_elem70)
+          iprot.readListEnd()
+        else:
+          iprot.skip(ftype)
+      elif fid == 2:
+        if ftype == TType.I64:
+          self.sinceVersion = iprot.readI64();
+        else:
+          iprot.skip(ftype)
+      elif fid == 3:
+        if ftype == TType.I32:
+          self.timeoutMs = iprot.readI32();
+        else:
+          iprot.skip(ftype)
+      elif fid == 4:
+        if ftype == TType.BOOL:
+          self.ignoreOwned = iprot.readBool();
+        else:
+          iprot.skip(ftype)
+      else:
+        iprot.skip(ftype)
+      iprot.readFieldEnd()
+    iprot.readStructEnd()
+
+  def write(self, oprot):
+    if oprot.__class__ == TBinaryProtocol.TBinaryProtocolAccelerated and self.thrift_spec is not None and fastbinary is not None:
+      oprot.trans.write(fastbinary.encode_binary(self, (self.__class__, self.thrift_spec)))
+      return
+    oprot.writeStructBegin('WatchRequest')
+    if self.namePrefixes is not None:
+      oprot.writeFieldBegin('namePrefixes', TType.LIST, 1)
+      oprot.writeListBegin(TType.STRING, len(self.namePrefixes))
+      for iter71 in self.namePrefixes:
+        oprot.writeString(iter71)
+      oprot.writeListEnd()
+      oprot.writeFieldEnd()
+    if self.sinceVersion is not None:
+      oprot.writeFieldBegin('sinceVersion', TType.I64, 2)
+      oprot.writeI64(self.sinceVersion)
+      oprot.writeFieldEnd()
+    if self.timeoutMs is not None:
+      oprot.writeFieldBegin('timeoutMs', TType.I32, 3)
+      oprot.writeI32(self.timeoutMs)
+      oprot.writeFieldEnd()
+    if self.ignoreOwned is not None:
+      oprot.writeFieldBegin('ignoreOwned', TType.BOOL, 4)
+      oprot.writeBool(self.ignoreOwned)
+      oprot.writeFieldEnd()
+    oprot.writeFieldStop()
+    oprot.writeStructEnd()
+
+  def validate(self):
+    return
+
+
+  def __repr__(self):
+    L = ['%s=%r' % (key, value)
+      for key, value in self.__dict__.iteritems()]
+    return '%s(%s)' % (self.__class__.__name__, ', '.join(L))
+
+  def __eq__(self, other):
+    return isinstance(other, self.__class__) and self.__dict__ == other.__dict__
+
+  def __ne__(self, other):
+    return not (self == other)
+
+class WatchResponse:
+  """
+  Attributes:
+   - version
+   - changed
+  """
+
+  thrift_spec = (
+    None, # 0
+    (1, TType.I64, 'version', None, None, ), # 1
+    (2, TType.BOOL, 'changed', None, None, ), # 2
+  )
+
+  def __init__(self, version=None, changed=None,):
+    self.version = version
+    self.changed = changed
+
+  def read(self, iprot):
+    if iprot.__class__ == TBinaryProtocol.TBinaryProtocolAccelerated and isinstance(iprot.trans, TTransport.CReadableTransport) and self.thrift_spec is not None and fastbinary is not None:
+      fastbinary.decode_binary(self, iprot.trans, (self.__class__, self.thrift_spec))
+      return
+    iprot.readStructBegin()
+    while True:
+      (fname, ftype, fid) = iprot.readFieldBegin()
+      if ftype == TType.STOP:
+        break
+      if fid == 1:
+        if ftype == TType.I64:
+          self.version = iprot.readI64();
+        else:
+          iprot.skip(ftype)
+      elif fid == 2:
+        if ftype == TType.BOOL:
+          self.changed = iprot.readBool();
+        else:
+          iprot.skip(ftype)
+      else:
+        iprot.skip(ftype)
+      iprot.readFieldEnd()
+    iprot.readStructEnd()
+
+  def write(self, oprot):
+    if oprot.__class__ == TBinaryProtocol.TBinaryProtocolAccelerated and self.thrift_spec is not None and fastbinary is not None:
+      oprot.trans.write(fastbinary.encode_binary(self, (self.__class__, self.thrift_spec)))
+      return
+    oprot.writeStructBegin('WatchResponse')
+    if self.version is not None:
+      oprot.writeFieldBegin('version', TType.I64, 1)
+      oprot.writeI64(self.version)
+      oprot.writeFieldEnd()
+    if self.changed is not None:
+      oprot.writeFieldBegin('changed', TType.BOOL, 2)
+      oprot.writeBool(self.changed)
+      oprot.writeFieldEnd()
+    oprot.writeFieldStop()
+    oprot.writeStructEnd()
+
+  def validate(self):
+    return
+
+
+  def __repr__(self):
+    L = ['%s=%r' % (key, value)
+      for key, value in self.__dict__.iteritems()]
+    return '%s(%s)' % (self.__class__.__name__, ', '.join(L))
+
+  def __eq__(self, other):
+    return isinstance(other, self.__class__) and self.__dict__ == other.__dict__
+
+  def __ne__(self, other):
+    return not (self == other)
+
+class Lease:
+  """
+  Attributes:
+   - name
+   - version
+   - expirationTime
+  """
+
+  thrift_spec = (
+    None, # 0
+    (1, TType.STRING, 'name', None, None, ), # 1
+    (2, TType.I64, 'version', None, None, ), # 2
+    (3, TType.I64, 'expirationTime', None, None, ), # 3
+  )
+
+  def __init__(self, name=None, version=None, expirationTime=None,):
+    self.name = name
+    self.version = version
+    self.expirationTime = expirationTime
+
+  def read(self, iprot):
+    if iprot.__class__ == TBinaryProtocol.TBinaryProtocolAccelerated and isinstance(iprot.trans, TTransport.CReadableTransport) and self.thrift_spec is not None and fastbinary is not None:
+      fastbinary.decode_binary(self, iprot.trans, (self.__class__, self.thrift_spec))
+      return
+    iprot.readStructBegin()
+    while True:
+      (fname, ftype, fid) = iprot.readFieldBegin()
+      if ftype == TType.STOP:
+        break
+      if fid == 1:
+        if ftype == TType.STRING:
+          self.name = iprot.readString();
+        else:
+          iprot.skip(ftype)
+      elif fid == 2:
+        if ftype == TType.I64:
+          self.version = iprot.readI64();
+        else:
+          iprot.skip(ftype)
+      elif fid == 3:
+        if ftype == TType.I64:
+          self.expirationTime = iprot.readI64();
+        else:
+          iprot.skip(ftype)
+      else:
+        iprot.skip(ftype)
+      iprot.readFieldEnd()
+    iprot.readStructEnd()
+
+  def write(self, oprot):
+    if oprot.__class__ == TBinaryProtocol.TBinaryProtocolAccelerated and self.thrift_spec is not None and fastbinary is not None:
+      oprot.trans.write(fastbinary.encode_binary(self, (self.__class__, self.thrift_spec)))
+      return
+    oprot.writeStructBegin('Lease')
+    if self.name is not None:
+      oprot.writeFieldBegin('name', TType.STRING, 1)
+      oprot.writeString(self.name)
+      oprot.writeFieldEnd()
+    if self.version is not None:
+      oprot.writeFieldBegin('version', TType.I64, 2)
+      oprot.writeI64(self.version)
+      oprot.writeFieldEnd()
+    if self.expirationTime is not None:
+      oprot.writeFieldBegin('expirationTime', TType.I64, 3)
+      oprot.writeI64(self.expirationTime)
+      oprot.writeFieldEnd()
+    oprot.writeFieldStop()
+    oprot.writeStructEnd()
+
+  def validate(self):
+    return
+
+
+  def __repr__(self):
+    L = ['%s=%r' % (key, value)
+      for key, value in self.__dict__.iteritems()]
+    return '%s(%s)' % (self.__class__.__name__, ', '.join(L))
+
+  def __eq__(self, other):
+    return isinstance(other, self.__class__) and self.__dict__ == other.__dict__
+
+  def __ne__(self, other):
+    return not (self == other)
+
+class RenewRequest:
+  """
+  Attributes:
+   - leases
+  """
+
+  thrift_spec = (
+    None, # 0
+    (1, TType.LIST, 'leases', (TType.STRUCT,(Lease, Lease.thrift_spec)), None, ), # 1
+  )
+
+  def __init__(self, leases=None,):
+    self.leases = leases
+
+  def read(self, iprot):
+    if iprot.__class__ == TBinaryProtocol.TBinaryProtocolAccelerated and isinstance(iprot.trans, TTransport.CReadableTransport) and self.thrift_spec is not None and fastbinary is not None:
+      fastbinary.decode_binary(self, iprot.trans, (self.__class__, self.thrift_spec))
+      return
+    iprot.readStructBegin()
+    while True:
+      (fname, ftype, fid) = iprot.readFieldBegin()
+      if ftype == TType.STOP:
+        break
+      if fid == 1:
+        if ftype == TType.LIST:
+          self.leases = []
+          (_etype117, _size114) = iprot.readListBegin()
+          for _i118 in xrange(_size114):
+            _elem119 = Lease()
+            _elem119.read(iprot)
+            self.leases.append(_elem119)
+          iprot.readListEnd()
+        else:
+          iprot.skip(ftype)
+      else:
+        iprot.skip(ftype)
+      iprot.readFieldEnd()
+    iprot.readStructEnd()
+
+  def write(self, oprot):
+    if oprot.__class__ == TBinaryProtocol.TBinaryProtocolAccelerated and self.thrift_spec is not None and fastbinary is not None:
+      oprot.trans.write(fastbinary.encode_binary(self, (self.__class__, self.thrift_spec)))
+      return
+    oprot.writeStructBegin('RenewRequest')
+    if self.leases is not None:
+      oprot.writeFieldBegin('leases', TType.LIST, 1)
+      oprot.writeListBegin(TType.STRUCT, len(self.leases))
+      for iter120 in self.leases:
+        iter120.write(oprot)
+      oprot.writeListEnd()
+      oprot.writeFieldEnd()
+    oprot.writeFieldStop()
+    oprot.writeStructEnd()
+
+  def validate(self):
+    return
+
+
+  def __repr__(self):
+    L = ['%s=%r' % (key, value)
+      for key, value in self.__dict__.iteritems()]
+    return '%s(%s)' % (self.__class__.__name__, ', '.join(L))
+
+  def __eq__(self, other):
+    return isinstance(other, self.__class__) and self.__dict__ == other.__dict__
+
+  def __ne__(self, other):
+    return not (self == other)
+
+class RenewResponse:
+  """
+  Attributes:
+   - tokens
+  """
+
+  thrift_spec = (
+    None, # 0
+    (1, TType.LIST, 'tokens', (TType.STRUCT,(Token, Token.thrift_spec)), None, ), # 1
+  )
+
+  def __init__(self, tokens=None,):
+    self.tokens = tokens
+
+  def read(self, iprot):
+    if iprot.__class__ == TBinaryProtocol.TBinaryProtocolAccelerated and isinstance(iprot.trans, TTransport.CReadableTransport) and self.thrift_spec is not None and fastbinary is not None:
+      fastbinary.decode_binary(self, iprot.trans, (self.__class__, self.thrift_spec))
+      return
+    iprot.readStructBegin()
+    while True:
+      (fname, ftype, fid) = iprot.readFieldBegin()
+      if ftype == TType.STOP:
+        break
+      if fid == 1:
+        if ftype == TType.LIST:
+          self.tokens = []
+          (_etype124, _size121) = iprot.readListBegin()
+          for _i125 in xrange(_size121):
+            _elem126 = Token()
+            _elem126.read(iprot)
+            self.tokens.append(_elem126)
+          iprot.readListEnd()
+        else:
+          iprot.skip(ftype)
+      else:
+        iprot.skip(ftype)
+      iprot.readFieldEnd()
+    iprot.readStructEnd()
+
+  def write(self, oprot):
+    if oprot.__class__ == TBinaryProtocol.TBinaryProtocolAccelerated and self.thrift_spec is not None and fastbinary is not None:
+      oprot.trans.write(fastbinary.encode_binary(self, (self.__class__, self.thrift_spec)))
+      return
+    oprot.writeStructBegin('RenewResponse')
+    if self.tokens is not None:
+      oprot.writeFieldBegin('tokens', TType.LIST, 1)
+      oprot.writeListBegin(TType.STRUCT, len(self.tokens))
+      for iter127 in self.tokens:
+        iter127.write(oprot)
+      oprot.writeListEnd()
+      oprot.writeFieldEnd()
+    oprot.writeFieldStop()
+    oprot.writeStructEnd()
+
+  def validate(self):
+    return
+
+
+  def __repr__(self):
+    L = ['%s=%r' % (key, value)
+      for key, value in self.__dict__.iteritems()]
+    return '%s(%s)' % (self.__class__.__name__, ', '.join(L))
+
+  def __eq__(self, other):
+    return isinstance(other, self.__class__) and self.__dict__ == other.__dict__
+
+  def __ne__(self, other):
+    return not (self == other)
+
+class Request:
+  """
+  Attributes:
+   - archive
+   - group
+   - modify
+   - query
+   - queryAndOwn
+   - renew
+  """
+
+  thrift_spec = (
+    None, # 0
+    (1, TType.STRUCT, 'archive', (ArchiveRequest, ArchiveRequest.thrift_spec), None, ), # 1
+    (2, TType.STRUCT, 'group', (GroupRequest, GroupRequest.thrift_spec), None, ), # 2
+    (3, TType.STRUCT, 'modify', (ModifyRequest, ModifyRequest.thrift_spec), None, ), # 3
+    (4, TType.STRUCT, 'query', (QueryRequest, QueryRequest.thrift_spec), None, ), # 4
+    (5, TType.STRUCT, 'queryAndOwn', (QueryAndOwnRequest, QueryAndOwnRequest.thrift_spec), None, ), # 5
+    (6, TType.STRUCT, 'renew', (RenewRequest, RenewRequest.thrift_spec), None, ), # 6
+  )
+
+  def __init__(self, archive=None, group=None, modify=None, query=None, queryAndOwn=None, renew=None,):
+    self.archive = archive
+    self.group = group
+    self.modify = modify
+    self.query = query
+    self.queryAndOwn = queryAndOwn
+    self.renew = renew
+
+  def read(self, iprot):
+    if iprot.__class__ == TBinaryProtocol.TBinaryProtocolAccelerated and isinstance(iprot.trans, TTransport.CReadableTransport) and self.thrift_spec is not None and fastbinary is not None:
+      fastbinary.decode_binary(self, iprot.trans, (self.__class__, self.thrift_spec))
+      return
+    iprot.readStructBegin()
+    while True:
+      (fname, ftype, fid) = iprot.readFieldBegin()
+      if ftype == TType.STOP:
+        break
+      if fid == 1:
+        if ftype == TType.STRUCT:
+          self.archive = ArchiveRequest()
+          self.archive.read(iprot)
+        else:
+          iprot.skip(ftype)
+      elif fid == 2:
+        if ftype == TType.STRUCT:
+          self.group = GroupRequest()
+          self.group.read(iprot)
+        else:
+          iprot.skip(ftype)
+      elif fid == 3:
+        if ftype == TType.STRUCT:
+          self.modify = ModifyRequest()
+          self.modify.read(iprot)
+        else:
+          iprot.skip(ftype)
+      elif fid == 4:
+        if ftype == TType.STRUCT:
+          self.query = QueryRequest()
+          self.query.read(iprot)
+        else:
+          iprot.skip(ftype)
+      elif fid == 5:
+        if ftype == TType.STRUCT:
+          self.queryAndOwn = QueryAndOwnRequest()
+          self.queryAndOwn.read(iprot)
+        else:
+          iprot.skip(ftype)
+      elif fid == 6:
+        if ftype == TType.STRUCT:
+          self.renew = RenewRequest()
+          self.renew.read(iprot)
+        else:
+          iprot.skip(ftype)
+      else:
+        iprot.skip(ftype)
+      iprot.readFieldEnd()
+    iprot.readStructEnd()
+
+  def write(self, oprot):
+    if oprot.__class__ == TBinaryProtocol.TBinaryProtocolAccelerated and self.thrift_spec is not None and fastbinary is not None:
+      oprot.trans.write(fastbinary.encode_binary(self, (self.__class__, self.thrift_spec)))
+      return
+    oprot.writeStructBegin('Request')
+    if self.archive is not None:
+      oprot.writeFieldBegin('archive', TType.STRUCT, 1)
+      self.archive.write(oprot)
+      oprot.writeFieldEnd()
+    if self.group is not None:
+      oprot.writeFieldBegin('group', TType.STRUCT, 2)
+      self.group.write(oprot)
+      oprot.writeFieldEnd()
+    if self.modify is not None:
+      oprot.writeFieldBegin('modify', TType.STRUCT, 3)
+      self.modify.write(oprot)
+      oprot.writeFieldEnd()
+    if self.query is not None:
+      oprot.writeFieldBegin('query', TType.STRUCT, 4)
+      self.query.write(oprot)
+      oprot.writeFieldEnd()
+    if self.queryAndOwn is not None:
+      oprot.writeFieldBegin('queryAndOwn', TType.STRUCT, 5)
+      self.queryAndOwn.write(oprot)
+      oprot.writeFieldEnd()
+    if self.renew is not None:
+      oprot.writeFieldBegin('renew', TType.STRUCT, 6)
+      self.renew.write(oprot)
+      oprot.writeFieldEnd()
+    oprot.writeFieldStop()
+    oprot.writeStructEnd()
+
+  def validate(self):
+    return
+
+
+  def __repr__(self):
+    L = ['%s=%r' % (key, value)
+      for key, value in self.__dict__.iteritems()]
+    return '%s(%s)' % (self.__class__.__name__, ', '.join(L))
+
+  def __eq__(self, other):
+    return isinstance(other, self.__class__) and self.__dict__ == other.__dict__
+
+  def __ne__(self, other):
+    return not (self == other)
+
+class Response:
+  """
+  Attributes:
+   - group
+   - modify
+   - query
+   - queryAndOwn
+   - error
+   - renew
+  """
+
+  thrift_spec = (
+    None, # 0
+    (1, TType.STRUCT, 'group', (GroupResponse, GroupResponse.thrift_spec), None, ), # 1
+    (2, TType.STRUCT, 'modify', (ModifyResponse, ModifyResponse.thrift_spec), None, ), # 2
+    (3, TType.STRUCT, 'query', (QueryResponse, QueryResponse.thrift_spec), None, ), # 3
+    (4, TType.STRUCT, 'queryAndOwn', (QueryAndOwnResponse, QueryAndOwnResponse.thrift_spec), None, ), # 4
+    (5, TType.STRUCT, 'error', (TokenMasterException, TokenMasterException.thrift_spec), None, ), # 5
+    (6, TType.STRUCT, 'renew', (RenewResponse, RenewResponse.thrift_spec), None, ), # 6
+  )
+
+  def __init__(self, group=None, modify=None, query=None, queryAndOwn=None, error=None, renew=None,):
+    self.group = group
+    self.modify = modify
+    self.query = query
+    self.queryAndOwn = queryAndOwn
+    self.error = error
+    self.renew = renew
+
+  def read(self, iprot):
+    if iprot.__class__ == TBinaryProtocol.TBinaryProtocolAccelerated and isinstance(iprot.trans, TTransport.CReadableTransport) and self.thrift_spec is not None and fastbinary is not None:
+      fastbinary.decode_binary(self, iprot.trans, (self.__class__, self.thrift_spec))
+      return
+    iprot.readStructBegin()
+    while True:
+      (fname, ftype, fid) = iprot.readFieldBegin()
+      if ftype == TType.STOP:
+        break
+      if fid == 1:
+        if ftype == TType.STRUCT:
+          self.group = GroupResponse()
+          self.group.read(iprot)
+        else:
+          iprot.skip(ftype)
+      elif fid == 2:
+        if ftype == TType.STRUCT:
+          self.modify = ModifyResponse()
+          self.modify.read(iprot)
+        else:
+          iprot.skip(ftype)
+      elif fid == 3:
+        if ftype == TType.STRUCT:
+          self.query = QueryResponse()
+          self.query.read(iprot)
+        else:
+          iprot.skip(ftype)
+      elif fid == 4:
+        if ftype == TType.STRUCT:
+          self.queryAndOwn = QueryAndOwnResponse()
+          self.queryAndOwn.read(iprot)
+        else:
+          iprot.skip(ftype)
+      elif fid == 5:
+        if ftype == TType.STRUCT:
+          self.error = TokenMasterException()
+          self.error.read(iprot)
+        else:
+          iprot.skip(ftype)
+      elif fid == 6:
+        if ftype == TType.STRUCT:
+          self.renew = RenewResponse()
+          self.renew.read(iprot)
+        else:
+          iprot.skip(ftype)
+      else:
+        iprot.skip(ftype)
+      iprot.readFieldEnd()
+    iprot.readStructEnd()
+
+  def write(self, oprot):
+    if oprot.__class__ == TBinaryProtocol.TBinaryProtocolAccelerated and self.thrift_spec is not None and fastbinary is not None:
+      oprot.trans.write(fastbinary.encode_binary(self, (self.__class__, self.thrift_spec)))
+      return
+    oprot.writeStructBegin('Response')
+    if self.group is not None:
+      oprot.writeFieldBegin('group', TType.STRUCT, 1)
+      self.group.write(oprot)
+      oprot.writeFieldEnd()
+    if self.modify is not None:
+      oprot.writeFieldBegin('modify', TType.STRUCT, 2)
+      self.modify.write(oprot)
+      oprot.writeFieldEnd()
+    if self.query is not None:
+      oprot.writeFieldBegin('query', TType.STRUCT, 3)
+      self.query.write(oprot)
+      oprot.writeFieldEnd()
+    if self.queryAndOwn is not None:
+      oprot.writeFieldBegin('queryAndOwn', TType.STRUCT, 4)
+      self.queryAndOwn.write(oprot)
+      oprot.writeFieldEnd()
+    if self.error is not None:
+      oprot.writeFieldBegin('error', TType.STRUCT, 5)
+      self.error.write(oprot)
+      oprot.writeFieldEnd()
+    if self.renew is not None:
+      oprot.writeFieldBegin('renew', TType.STRUCT, 6)
+      self.renew.write(oprot)
+      oprot.writeFieldEnd()
+    oprot.writeFieldStop()
+    oprot.writeStructEnd()
+
+  def validate(self):
+    return
+
+
+  def __repr__(self):
+    L = ['%s=%r' % (key, value)
+      for key, value in self.__dict__.iteritems()]
+    return '%s(%s)' % (self.__class__.__name__, ', '.join(L))
+
+  def __eq__(self, other):
+    return isinstance(other, self.__class__) and self.__dict__ == other.__dict__
+
+  def __ne__(self, other):
+    return not (self == other)
+
+class BatchRequest:
+  """
+  Attributes:
+   - requests
+   - atomic
+  """
+
+  thrift_spec = (
+    None, # 0
+    (1, TType.LIST, 'requests', (TType.STRUCT,(Request, Request.thrift_spec)), None, ), # 1
+    (2, TType.BOOL, 'atomic', None, None, ), # 2
+  )
+
+  def __init__(self, requests=None, atomic=None,):
+    self.requests = requests
+    self.atomic = atomic
+
+  def read(self, iprot):
+    if iprot.__class__ == TBinaryProtocol.TBinaryProtocolAccelerated and isinstance(iprot.trans, TTransport.CReadableTransport) and self.thrift_spec is not None and fastbinary is not None:
+      fastbinary.decode_binary(self, iprot.trans, (self.__class__, self.thrift_spec))
+      return
+    iprot.readStructBegin()
+    while True:
+      (fname, ftype, fid) = iprot.readFieldBegin()
+      if ftype == TType.STOP:
+        break
+      if fid == 1:
+        if ftype == TType.LIST:
+          self.requests = []
+          (_etype75, _size72) = iprot.readListBegin()
+          for _i76 in xrange(_size72):
+            _elem77 = Request()
+            _elem77.read(iprot)
+            self.requests.append(_elem77)
+          iprot.readListEnd()
+        else:
+          iprot.skip(ftype)
+      elif fid == 2:
+        if ftype == TType.BOOL:
+          self.atomic = iprot.readBool();
+        else:
+          iprot.skip(ftype)
+      else:
+        iprot.skip(ftype)
+      iprot.readFieldEnd()
+    iprot.readStructEnd()
+
+  def write(self, oprot):
+    if oprot.__class__ == TBinaryProtocol.TBinaryProtocolAccelerated and self.thrift_spec is not None and fastbinary is not None:
+      oprot.trans.write(fastbinary.encode_binary(self, (self.__class__, self.thrift_spec)))
+      return
+    oprot.writeStructBegin('BatchRequest')
+    if self.requests is not None:
+      oprot.writeFieldBegin('requests', TType.LIST, 1)
+      oprot.writeListBegin(TType.STRUCT, len(self.requests))
+      for iter78 in self.requests:
+        iter78.write(oprot)
+      oprot.writeListEnd()
+      oprot.writeFieldEnd()
+    if self.atomic is not None:
+      oprot.writeFieldBegin('atomic', TType.BOOL, 2)
+      oprot.writeBool(self.atomic)
+      oprot.writeFieldEnd()
+    oprot.writeFieldStop()
+    oprot.writeStructEnd()
+
+  def validate(self):
+    return
+
+
+  def __repr__(self):
+    L = ['%s=%r' % (key, value)
+      for key, value in self.__dict__.iteritems()]
+    return '%s(%s)' % (self.__class__.__name__, ', '.join(L))
+
+  def __eq__(self, other):
+    return isinstance(other, self.__class__) and self.__dict__ == other.__dict__
+
+  def __ne__(self, other):
+    return not (self == other)
+
+class BatchResponse:
+  """
+  Attributes:
+   - responses
+  """
+
+  thrift_spec = (
+    None, # 0
+    (1, TType.LIST, 'responses', (TType.STRUCT,(Response, Response.thrift_spec)), None, ), # 1
+  )
+
+  def __init__(self, responses=None,):
+    self.responses = responses
+
+  def read(self, iprot):
+    if iprot.__class__ == TBinaryProtocol.TBinaryProtocolAccelerated and isinstance(iprot.trans, TTransport.CReadableTransport) and self.thrift_spec is not None and fastbinary is not None:
+      fastbinary.decode_binary(self, iprot.trans, (self.__class__, self.thrift_spec))
+      return
+    iprot.readStructBegin()
+    while True:
+      (fname, ftype, fid) = iprot.readFieldBegin()
+      if ftype == TType.STOP:
+        break
+      if fid == 1:
+        if ftype == TType.LIST:
+          self.responses = []
+          (_etype82, _size79) = iprot.readListBegin()
+          for _i83 in xrange(_size79):
+            _elem84 = Response()
+            _elem84.read(iprot)
+            self.responses.append(_elem84)
+          iprot.readListEnd()
+        else:
+          iprot.skip(ftype)
+      else:
+        iprot.skip(ftype)
+      iprot.readFieldEnd()
+    iprot.readStructEnd()
+
+  def write(self, oprot):
+    if oprot.__class__ == TBinaryProtocol.TBinaryProtocolAccelerated and self.thrift_spec is not None and fastbinary is not None:
+      oprot.trans.write(fastbinary.encode_binary(self, (self.__class__, self.thrift_spec)))
+      return
+    oprot.writeStructBegin('BatchResponse')
+    if self.responses is not None:
+      oprot.writeFieldBegin('responses', TType.LIST, 1)
+      oprot.writeListBegin(TType.STRUCT, len(self.responses))
+      for iter85 in self.responses:
+        iter85.write(oprot)
+      oprot.writeListEnd()
+      oprot.writeFieldEnd()
+    oprot.writeFieldStop()
+    oprot.writeStructEnd()
+
+  def validate(self):
+    return
+
+
+  def __repr__(self):
+    L = ['%s=%r' % (key, value)
+      for key, value in self.__dict__.iteritems()]
+    return '%s(%s)' % (self.__class__.__name__, ', '.join(L))
+
+  def __eq__(self, other):
+    return isinstance(other, self.__class__) and self.__dict__ == other.__dict__
+
+  def __ne__(self, other):
+    return not (self == other)
+
+class StatsRequest:
+
+  thrift_spec = (
+  )
+
+  def read(self, iprot):
+    if iprot.__class__ == TBinaryProtocol.TBinaryProtocolAccelerated and isinstance(iprot.trans, TTransport.CReadableTransport) and self.thrift_spec is not None and fastbinary is not None:
+      fastbinary.decode_binary(self, iprot.trans, (self.__class__, self.thrift_spec))
+      return
+    iprot.readStructBegin()
+    while True:
+      (fname, ftype, fid) = iprot.readFieldBegin()
+      if ftype == TType.STOP:
+        break
+      else:
+        iprot.skip(ftype)
+      iprot.readFieldEnd()
+    iprot.readStructEnd()
+
+  def write(self, oprot):
+    if oprot.__class__ == TBinaryProtocol.TBinaryProtocolAccelerated and self.thrift_spec is not None and fastbinary is not None:
+      oprot.trans.write(fastbinary.encode_binary(self, (self.__class__, self.thrift_spec)))
+      return
+    oprot.writeStructBegin('StatsRequest')
+    oprot.writeFieldStop()
+    oprot.writeStructEnd()
+
+  def validate(self):
+    return
+
+
+  def __repr__(self):
+    L = ['%s=%r' % (key, value)
+      for key, value in self.__dict__.iteritems()]
+    return '%s(%s)' % (self.__class__.__name__, ', '.join(L))
+
+  def __eq__(self, other):
+    return isinstance(other, self.__class__) and self.__dict__ == other.__dict__
+
+  def __ne__(self, other):
+    return not (self == other)
+
+class StatsResponse:
+  """
+  Attributes:
+   - metrics
+  """
+
+  thrift_spec = (
+    None, # 0
+    (1, TType.MAP, 'metrics', (TType.STRING,None,TType.DOUBLE,None), None, ), # 1
+  )
+
+  def __init__(self, metrics=None,):
+    self.metrics = metrics
+
+  def read(self, iprot):
+    if iprot.__class__ == TBinaryProtocol.TBinaryProtocolAccelerated and isinstance(iprot.trans, TTransport.CReadableTransport) and self.thrift_spec is not None and fastbinary is not None:
+      fastbinary.decode_binary(self, iprot.trans, (self.__class__, self.thrift_spec))
+      return
+    iprot.readStructBegin()
+    while True:
+      (fname, ftype, fid) = iprot.readFieldBegin()
+      if ftype == TType.STOP:
+        break
+      if fid == 1:
+        if ftype == TType.MAP:
+          self.metrics = {}
+          (_ktype129, _vtype130, _size128 ) = iprot.readMapBegin() 
+          for _i132 in xrange(_size128):
+            _key133 = iprot.readString();
+            _val134 = iprot.readDouble();
+            self.metrics[_key133] = _val134
+          iprot.readMapEnd()
+        else:
+          iprot.skip(ftype)
+      else:
+        iprot.skip(ftype)
+      iprot.readFieldEnd()
+    iprot.readStructEnd()
+
+  def write(self, oprot):
+    if oprot.__class__ == TBinaryProtocol.TBinaryProtocolAccelerated and self.thrift_spec is not None and fastbinary is not None:
+      oprot.trans.write(fastbinary.encode_binary(self, (self.__class__, self.thrift_spec)))
+      return
+    oprot.writeStructBegin('StatsResponse')
+    if self.metrics is not None:
+      oprot.writeFieldBegin('metrics', TType.MAP, 1)
+      oprot.writeMapBegin(TType.STRING, TType.DOUBLE, len(self.metrics))
+      for kiter135,viter136 in self.metrics.items():
+        oprot.writeString(kiter135)
+        oprot.writeDouble(viter136)
+      oprot.writeMapEnd()
+      oprot.writeFieldEnd()
+    oprot.writeFieldStop()
+    oprot.writeStructEnd()
+
+  def validate(self):
+    return
+
+
   def __repr__(self):
     L = ['%s=%r' % (key, value)
       for key, value in self.__dict__.iteritems()]
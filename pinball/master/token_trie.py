@@ -0,0 +1,545 @@
+# Copyright 2015, Pinterest, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Token tree maintaining secondary indexes of the tokens it stores."""
+import collections
+import heapq
+import pytrie
+import re
+
+
+__author__ = 'Pawel Garbacki'
+__copyright__ = 'Copyright 2015, Pinterest, Inc.'
+__credits__ = [__author__]
+__license__ = 'Apache'
+__version__ = '2.0'
+
+
+def compile_pattern(pattern):
+    """Compile a name pattern to a regular expression.
+
+    A pattern is a token name prefix where '*' stands for any single,
+    non-empty component of the name.  Components are separated with '/'.
+
+    Args:
+        pattern: The name pattern.
+    Returns:
+        The regular expression matching names starting with the pattern.
+    """
+    return re.compile('[^/]+'.join([re.escape(part)
+                                    for part in pattern.split('*')]))
+
+
+class PatternIndex(object):
+    """Index of tokens with names matching a pattern.
+
+    A pattern is a token name prefix where '*' stands for any single,
+    non-empty component of the name.  Components are separated with '/'.
+    E.g., pattern /workflow/*/*/job/runnable/ matches
+    /workflow/some_workflow/123/job/runnable/some_job.  A pattern with no '*'
+    matches all names starting with it.
+
+    Tokens that are not owned are kept in a heap ordered on priority so that
+    the most important claimable token can be found in logarithmic time.
+    Owned tokens are kept in a heap ordered on the ownership expiration time
+    and they are moved to the unowned heap once their ownership expires.
+
+    Heap entries are tuples (key, name, version).  An entry is stale if the
+    indexed token with that name has a different version.  Stale entries are
+    removed lazily.
+    """
+    # Heaps are rebuilt when the number of entries exceeds the number of
+    # indexed tokens by this factor.
+    _MAX_STALE_RATIO = 2
+    # Heaps with fewer entries are never rebuilt.
+    _MIN_COMPACTION_SIZE = 64
+
+    def __init__(self, pattern):
+        self.pattern = pattern
+        self.prefix = pattern.split('*', 1)[0]
+        self._regex = compile_pattern(pattern)
+        # Mapping from token name to the indexed token.
+        self._tokens = {}
+        self._unowned = []
+        self._owned = []
+
+    def __len__(self):
+        return len(self._tokens)
+
+    def is_prefix(self):
+        """Check if the index pattern is a plain name prefix."""
+        return self.prefix == self.pattern
+
+    def matches(self, name):
+        """Check if a token name matches the index pattern."""
+        return self._regex.match(name) is not None
+
+    @staticmethod
+    def _is_owned(token):
+        return token.owner and token.expirationTime
+
+    def _push(self, token):
+        if PatternIndex._is_owned(token):
+            heapq.heappush(self._owned,
+                           (token.expirationTime, token.name, token.version))
+        else:
+            heapq.heappush(self._unowned,
+                           (-(token.priority or 0), token.name, token.version))
+
+    def _compact(self):
+        """Rebuild heaps if they contain too many stale entries."""
+        size = len(self._unowned) + len(self._owned)
+        if (size < PatternIndex._MIN_COMPACTION_SIZE or
+                size <= PatternIndex._MAX_STALE_RATIO * len(self._tokens)):
+            return
+        self._unowned = []
+        self._owned = []
+        for token in self._tokens.values():
+            self._push(token)
+
+    def add(self, token):
+        """Insert or update a token in the index."""
+        self._tokens[token.name] = token
+        self._push(token)
+        self._compact()
+
+    def remove(self, name):
+        """Remove a token from the index if it is there."""
+        self._tokens.pop(name, None)
+
+    def _is_current(self, name, version):
+        token = self._tokens.get(name)
+        return token is not None and token.version == version
+
+    def _release_expired(self, now):
+        """Move tokens whose ownership expired to the unowned heap."""
+        while self._owned and self._owned[0][0] <= now:
+            _, name, version = heapq.heappop(self._owned)
+            if self._is_current(name, version):
+                token = self._tokens[name]
+                heapq.heappush(self._unowned,
+                               (-(token.priority or 0), name, version))
+
+    def get_tokens(self):
+        """Return all indexed tokens."""
+        return self._tokens.values()
+
+    def get_unowned_tokens(self, max_tokens, now, excluded_prefixes=None):
+        """Retrieve the highest priority tokens that are not owned.
+
+        Args:
+            max_tokens: The maximum number of tokens to return.  If None, all
+                unowned tokens are returned.
+            now: The current time in seconds since epoch.
+            excluded_prefixes: The list of name prefixes of tokens that
+                should not be returned.  Excluded tokens ahead of the
+                returned ones are popped from the heap and pushed back.
+        Returns:
+            List of unowned tokens sorted on priority in decreasing order.
+            Tokens with the same priority are sorted on name.
+        """
+        self._release_expired(now)
+        excluded_prefixes = tuple(excluded_prefixes or ())
+        entries = []
+        excluded_entries = []
+        last_entry = None
+        while (self._unowned and
+               (max_tokens is None or len(entries) < max_tokens)):
+            entry = heapq.heappop(self._unowned)
+            if (entry == last_entry or
+                    not self._is_current(entry[1], entry[2])):
+                continue
+            last_entry = entry
+            if excluded_prefixes and entry[1].startswith(excluded_prefixes):
+                excluded_entries.append(entry)
+            else:
+                entries.append(entry)
+        for entry in entries + excluded_entries:
+            heapq.heappush(self._unowned, entry)
+        return [self._tokens[entry[1]] for entry in entries]
+
+
+class LeaseIndex(object):
+    """Index of owned tokens ordered on the ownership expiration time.
+
+    Heap entries are tuples (expiration time, name).  An entry is stale if the
+    token with that name is no longer owned until that time.  Stale entries
+    are removed lazily.  Token updates which do not change the ownership
+    expiration time add no entries.
+    """
+    # The heap is rebuilt when the number of entries exceeds the number of
+    # tokens in the trie by this factor.
+    _MAX_STALE_RATIO = 2
+    # Heaps with fewer entries are never rebuilt.
+    _MIN_COMPACTION_SIZE = 64
+
+    def __init__(self, trie):
+        """Create a lease index.
+
+        Args:
+            trie: The trie with the indexed tokens.
+        """
+        self._trie = trie
+        self._leases = []
+
+    @staticmethod
+    def _is_owned(token):
+        return token is not None and token.owner and token.expirationTime
+
+    def _is_current(self, expiration_time, name):
+        token = self._trie.get(name)
+        return (LeaseIndex._is_owned(token) and
+                token.expirationTime == expiration_time)
+
+    def _compact(self):
+        """Rebuild the heap if it contains too many stale entries."""
+        size = len(self._leases)
+        if (size < LeaseIndex._MIN_COMPACTION_SIZE or
+                size <= LeaseIndex._MAX_STALE_RATIO * len(self._trie)):
+            return
+        self._leases = [(token.expirationTime, token.name)
+                        for token in self._trie.itervalues()
+                        if LeaseIndex._is_owned(token)]
+        heapq.heapify(self._leases)
+
+    def update(self, token, previous_token):
+        """Index a token update.
+
+        Args:
+            token: The updated token.
+            previous_token: The token replaced by the update or None if the
+                token is new.
+        """
+        if not LeaseIndex._is_owned(token):
+            return
+        if (LeaseIndex._is_owned(previous_token) and
+                previous_token.expirationTime == token.expirationTime):
+            return
+        heapq.heappush(self._leases, (token.expirationTime, token.name))
+        self._compact()
+
+    def get_expired_names(self, now):
+        """Retrieve names of tokens whose ownership expired.
+
+        Each expiration is reported once.
+
+        Args:
+            now: The current time in seconds since epoch.
+        Returns:
+            List of token names ordered on the expiration time.
+        """
+        names = []
+        while self._leases and self._leases[0][0] <= now:
+            expiration_time, name = heapq.heappop(self._leases)
+            if self._is_current(expiration_time, name):
+                names.append(name)
+        return names
+
+
+class _Node(object):
+    """Node of the token tree.
+
+    A node corresponds to a path of name components.  Nodes without children
+    do not allocate the children mapping.
+    """
+    __slots__ = ('token', 'count', 'children')
+
+    def __init__(self):
+        # The token whose name ends at this node or None.
+        self.token = None
+        # The number of tokens in the subtree rooted at this node.
+        self.count = 0
+        # Mapping from name component to the child node or None.
+        self.children = None
+
+    def __getstate__(self):
+        return self.token, self.count, self.children
+
+    def __setstate__(self, state):
+        self.token, self.count, self.children = state
+
+
+class TokenTrie(collections.MutableMapping):
+    """Tree mapping token names to tokens.
+
+    Names are split into components on '/' and tokens are stored in a tree
+    with one node per component path.  E.g., name /a/b/c is stored on the
+    path '', 'a', 'b', 'c'.  Name components are interned so that those
+    repeated across paths, e.g., job states, are stored once.  Each node
+    counts tokens in its subtree which makes the tree size and counts of
+    tokens under name components available without enumerating them.
+    Tokens are enumerated in the order of name components.
+
+    The trie keeps pattern indexes up to date as tokens get inserted and
+    removed.  Indexes are created on the first request for a given pattern.
+    Indexes are themselves stored in a trie keyed on the prefix of their
+    patterns so that a token update touches only indexes which may match it.
+    Indexes on plain prefixes are dropped when they become empty.
+
+    Owned tokens are additionally indexed on the ownership expiration time.
+    """
+    DELIMITER = '/'
+
+    def __init__(self, *args, **kwargs):
+        self._root = _Node()
+        # Mapping from pattern prefix to the mapping from pattern to the
+        # index for that pattern.
+        self._indexes = pytrie.StringTrie()
+        self._leases = LeaseIndex(self)
+        self.update(*args, **kwargs)
+
+    @staticmethod
+    def _intern(component):
+        # Only byte strings can be interned.
+        if type(component) is str:
+            return intern(component)
+        return component
+
+    def _find(self, components):
+        """Find the node at a given path of name components."""
+        node = self._root
+        for component in components:
+            if not node.children:
+                return None
+            node = node.children.get(component)
+            if node is None:
+                return None
+        return node
+
+    def __getitem__(self, name):
+        node = self._find(name.split(TokenTrie.DELIMITER))
+        if node is None or node.token is None:
+            raise KeyError(name)
+        return node.token
+
+    def get(self, name, default=None):
+        node = self._find(name.split(TokenTrie.DELIMITER))
+        if node is None or node.token is None:
+            return default
+        return node.token
+
+    def __contains__(self, name):
+        node = self._find(name.split(TokenTrie.DELIMITER))
+        return node is not None and node.token is not None
+
+    def __len__(self):
+        return self._root.count
+
+    def __nonzero__(self):
+        return self._root.count > 0
+
+    def __iter__(self):
+        return self.iterkeys()
+
+    def __setitem__(self, name, token):
+        assert token is not None
+        path = [self._root]
+        node = self._root
+        for component in name.split(TokenTrie.DELIMITER):
+            if node.children is None:
+                node.children = {}
+            child = node.children.get(component)
+            if child is None:
+                child = _Node()
+                node.children[TokenTrie._intern(component)] = child
+            path.append(child)
+            node = child
+        previous_token = node.token
+        node.token = token
+        if previous_token is None:
+            for node in path:
+                node.count += 1
+        self._leases.update(token, previous_token)
+        for indexes in self._indexes.iter_prefix_values(name):
+            for index in indexes.values():
+                if index.matches(name):
+                    index.add(token)
+
+    def __delitem__(self, name):
+        path = [(None, None, self._root)]
+        node = self._root
+        for component in name.split(TokenTrie.DELIMITER):
+            child = node.children.get(component) if node.children else None
+            if child is None:
+                raise KeyError(name)
+            path.append((node, component, child))
+            node = child
+        if node.token is None:
+            raise KeyError(name)
+        node.token = None
+        for parent, component, node in path:
+            node.count -= 1
+            if not node.count and parent is not None:
+                # The whole subtree is empty.
+                del parent.children[component]
+                if not parent.children:
+                    parent.children = None
+                break
+        for prefix, indexes in list(self._indexes.iter_prefix_items(name)):
+            for pattern, index in indexes.items():
+                index.remove(name)
+                if index.is_prefix() and not index:
+                    del indexes[pattern]
+            if not indexes:
+                del self._indexes[prefix]
+
+    def clear(self):
+        self._root = _Node()
+        self._indexes = pytrie.StringTrie()
+        self._leases = LeaseIndex(self)
+
+    def _iter_subtrees(self, prefix):
+        """Find subtrees with names starting with a prefix.
+
+        Args:
+            prefix: The name prefix.
+        Returns:
+            List of tuples (name, node) where name corresponds to the node
+            path.  Subtrees are sorted on name.
+        """
+        components = prefix.split(TokenTrie.DELIMITER)
+        parent = self._find(components[:-1])
+        if parent is None or not parent.children:
+            return []
+        last = components[-1]
+        parent_name = TokenTrie.DELIMITER.join(components[:-1])
+        if len(components) > 1:
+            parent_name += TokenTrie.DELIMITER
+        return [(parent_name + component, parent.children[component])
+                for component in sorted(parent.children)
+                if component.startswith(last)]
+
+    def iteritems(self, prefix='', start_after=None):
+        """Iterate over (name, token) items with names starting with a prefix.
+
+        Args:
+            prefix: The name prefix.
+            start_after: If set, only items following the item with this name
+                in the iteration order are returned.  The name does not have
+                to be in the trie.  Subtrees preceding it are not visited.
+        """
+        # Items are enumerated in the order of lists of name components.
+        after = (start_after.split(TokenTrie.DELIMITER)
+                 if start_after is not None else None)
+        stack = self._iter_subtrees(prefix or '')
+        stack.reverse()
+        while stack:
+            name, node = stack.pop()
+            if after is not None:
+                components = name.split(TokenTrie.DELIMITER)
+                if components > after:
+                    # All remaining items follow start_after.
+                    after = None
+                elif after[:len(components)] != components:
+                    # The whole subtree precedes start_after.
+                    continue
+            if node.token is not None and after is None:
+                yield name, node.token
+            if node.children:
+                name += TokenTrie.DELIMITER
+                for component in sorted(node.children, reverse=True):
+                    stack.append((name + component, node.children[component]))
+
+    def itervalues(self, prefix=''):
+        """Iterate over tokens with names starting with a prefix."""
+        stack = [node for _, node in self._iter_subtrees(prefix or '')]
+        stack.reverse()
+        while stack:
+            node = stack.pop()
+            if node.token is not None:
+                yield node.token
+            if node.children:
+                children = node.children
+                for component in sorted(children, reverse=True):
+                    stack.append(children[component])
+
+    def iterkeys(self, prefix=''):
+        """Iterate over names starting with a prefix."""
+        return (name for name, _ in self.iteritems(prefix))
+
+    def items(self, prefix=''):
+        return list(self.iteritems(prefix))
+
+    def values(self, prefix=''):
+        return list(self.itervalues(prefix))
+
+    def keys(self, prefix=''):
+        return list(self.iterkeys(prefix))
+
+    def get_group_counts(self, prefix):
+        """Count tokens in groups sharing the name component after a prefix.
+
+        Args:
+            prefix: The name prefix ending with '/'.
+        Returns:
+            Mapping from group to the number of tokens in it.  Groups are
+            token names truncated at the first '/' after the prefix.
+        """
+        assert prefix.endswith(TokenTrie.DELIMITER)
+        node = self._find(prefix.split(TokenTrie.DELIMITER)[:-1])
+        if node is None or not node.children:
+            return {}
+        counts = {}
+        for component, child in node.children.iteritems():
+            counts[prefix + component] = child.count
+        return counts
+
+    def get_expired_names(self, now):
+        """Retrieve names of tokens whose ownership expired since the last
+        call.
+
+        Args:
+            now: The current time in seconds since epoch.
+        Returns:
+            List of token names ordered on the expiration time.
+        """
+        return self._leases.get_expired_names(now)
+
+    def find_index(self, pattern):
+        """Return the index for a given pattern if it exists.
+
+        Args:
+            pattern: The pattern of names of indexed tokens.
+        Returns:
+            The pattern index or None if there is no index for the pattern.
+        """
+        indexes = self._indexes.get(pattern.split('*', 1)[0])
+        if indexes is None:
+            return None
+        return indexes.get(pattern)
+
+    def get_index(self, pattern):
+        """Return the index for a given pattern, creating it if needed.
+
+        Args:
+            pattern: The pattern of names of tokens to index.
+        Returns:
+            The pattern index populated with matching tokens.
+        """
+        prefix = pattern.split('*', 1)[0]
+        indexes = self._indexes.get(prefix)
+        if indexes is not None and pattern in indexes:
+            return indexes[pattern]
+        index = PatternIndex(pattern)
+        for name, token in self.iteritems(index.prefix):
+            if index.matches(name):
+                index.add(token)
+        if index.is_prefix() and not index:
+            # Do not keep empty prefix indexes around.
+            return index
+        if indexes is None:
+            indexes = {}
+            self._indexes[prefix] = indexes
+        indexes[pattern] = index
+        return index
@@ -17,21 +17,34 @@
 import abc
 import collections
 import copy
+import heapq
+import itertools
 import sys
 import time
 
 from pinball.config.utils import get_log
+from pinball.master.batch import pack_response
+from pinball.master.batch import unpack_request
 from pinball.master.thrift_lib.ttypes import ArchiveRequest
+from pinball.master.thrift_lib.ttypes import BatchRequest
+from pinball.master.thrift_lib.ttypes import BatchResponse
 from pinball.master.thrift_lib.ttypes import ErrorCode
 from pinball.master.thrift_lib.ttypes import GroupRequest
 from pinball.master.thrift_lib.ttypes import GroupResponse
 from pinball.master.thrift_lib.ttypes import ModifyRequest
 from pinball.master.thrift_lib.ttypes import ModifyResponse
+from pinball.master.thrift_lib.ttypes import Projection
 from pinball.master.thrift_lib.ttypes import QueryAndOwnRequest
 from pinball.master.thrift_lib.ttypes import QueryAndOwnResponse
 from pinball.master.thrift_lib.ttypes import QueryRequest
 from pinball.master.thrift_lib.ttypes import QueryResponse
+from pinball.master.thrift_lib.ttypes import RenewRequest
+from pinball.master.thrift_lib.ttypes import RenewResponse
+from pinball.master.thrift_lib.ttypes import Token
 from pinball.master.thrift_lib.ttypes import TokenMasterException
+from pinball.master.token_trie import TokenTrie
+from pinball.master.token_trie import compile_pattern
+from pinball.master.trigger import TokenView
 
 
 __author__ = 'Pawel Garbacki'
@@ -44,10 +57,44 @@ __version__ = '2.0'
 LOG = get_log('pinball.master.transaction')
 
 
+def _split_renewals(trie, updates):
+    """Separate token updates changing only the ownership of tokens.
+
+    Renewed tokens differ from their copies in the trie only in versions,
+    owners, and expiration times so the store may persist them without
+    rewriting token data.
+
+    Args:
+        trie: The trie with tokens before the updates.
+        updates: The list of token updates.
+    Returns:
+        Tuple with the list of renewals and the list of remaining updates.
+    """
+    renewals = []
+    other_updates = []
+    for token in updates:
+        existing_token = trie.get(token.name)
+        if (existing_token is not None and
+                existing_token.priority == token.priority and
+                existing_token.data == token.data):
+            renewals.append(token)
+        else:
+            other_updates.append(token)
+    return renewals, other_updates
+
+
 class Transaction(object):
-    """Interface defining a transaction on a token trie."""
+    """Interface defining a transaction on a token trie.
+
+    Transactions modifying tokens persist them in the store before applying
+    them to the trie.  This way the trie may be read while the store is being
+    updated.
+    """
     __metaclass__ = abc.ABCMeta
 
+    # Read-only transactions neither modify the trie nor write to the store.
+    READ_ONLY = False
+
     def __init__(self):
         self._updates = []
         self._deletes = []
@@ -89,18 +136,31 @@ class Transaction(object):
     def _add_delete(self, token):
         self._deletes.append(token)
 
+    def get_changed_names(self):
+        """Return names of tokens modified by the committed transaction.
+
+        Returns:
+            List of names of tokens inserted, updated, or removed from the
+            trie.  Empty if the transaction has not modified anything.
+        """
+        if not self._committed:
+            return []
+        return ([token.name for token in self._updates] +
+                [token.name for token in self._deletes])
+
     def _commit(self):
         """Merge token updates into the trie."""
         assert not self._committed
         try:
             self._blessed_version.advance_version()
-            self._trie[self._blessed_version.name] = self._blessed_version
-            self._store.commit_tokens(self._updates + [self._blessed_version],
-                                      self._deletes)
+            renewals, updates = _split_renewals(
+                self._trie, self._updates + [self._blessed_version])
+            self._store.commit_tokens(updates, self._deletes, renewals)
             for token in self._updates:
                 self._trie[token.name] = token
             for token in self._deletes:
                 del self._trie[token.name]
+            self._trie[self._blessed_version.name] = self._blessed_version
         except:
             # This should never happen but if it does happen, our state will
             # get out of sync so we better crash.
@@ -136,19 +196,36 @@ class ArchiveTransaction(Transaction):
         self._set_trie(trie, blessed_version, store)
         if self._request.tokens:
             self._verify_archive_tokens()
+            # The request may carry tokens stripped of data by a query
+            # projection.  Tokens with matching versions are identical so we
+            # archive the copies stored in the trie.
+            tokens = [self._trie[token.name] for token in self._request.tokens]
             try:
-                store.archive_tokens(self._request.tokens)
+                store.archive_tokens(tokens)
+                # Advance the blessed version so that clients watching the
+                # archived tokens can tell that something has changed.
+                self._blessed_version.advance_version()
+                store.commit_tokens(updates=[self._blessed_version])
                 for token in self._request.tokens:
                     del self._trie[token.name]
+                self._trie[self._blessed_version.name] = self._blessed_version
             except:
                 # This should never happen but if it does happen, our state
                 # will get out of sync so we better crash.
                 LOG.exception('')
                 sys.exit(1)
+            self._committed = True
+
+    def get_changed_names(self):
+        if not self._committed:
+            return []
+        return [token.name for token in self._request.tokens]
 
 
 class GroupTransaction(Transaction):
     """Transaction handling group requests."""
+    READ_ONLY = True
+
     def __init__(self):
         super(GroupTransaction, self).__init__()
         self._request = None
@@ -169,7 +246,13 @@ class GroupTransaction(Transaction):
 
     def commit(self, trie, blessed_version, store):
         response = GroupResponse()
-        if self._request.namePrefix:
+        if (self._request.namePrefix and
+                self._request.groupSuffix == TokenTrie.DELIMITER and
+                self._request.namePrefix.endswith(TokenTrie.DELIMITER)):
+            # Groups are children of the prefix in the tree of name
+            # components where counts are maintained incrementally.
+            response.counts = trie.get_group_counts(self._request.namePrefix)
+        elif self._request.namePrefix:
             response.counts = collections.defaultdict(int)
             names = trie.keys(self._request.namePrefix)
             for name in names:
@@ -180,9 +263,20 @@ class GroupTransaction(Transaction):
 
 class ModifyTransaction(Transaction):
     """Transaction handling update requests."""
-    def __init__(self):
+    def __init__(self, triggers=None, trigger_names=None):
+        """Create a modify transaction.
+
+        Args:
+            triggers: The list of triggers deriving additional modifications
+                from the tokens updated by the request.
+            trigger_names: The names of existing tokens to run the triggers on
+                in addition to the tokens updated by the request.
+        """
         super(ModifyTransaction, self).__init__()
         self._request = None
+        self._triggers = triggers if triggers is not None else []
+        self._trigger_names = (trigger_names if trigger_names is not None
+                               else [])
 
     def prepare(self, request):
         self._request = request
@@ -218,91 +312,472 @@ class ModifyTransaction(Transaction):
         if self._request.deletes:
             for token in self._request.deletes:
                 self._add_delete(token)
+        # Updates requested by the client are returned even if a trigger
+        # consumed them.
+        requested_updates = list(self._updates)
+        self._fire_triggers()
         self._commit()
         response = ModifyResponse()
-        if self._updates:
-            response.updates = []
-        for token in self._updates:
-            response.updates.append(token)
+        if requested_updates:
+            response.updates = requested_updates
         return response
 
+    def _fire_triggers(self):
+        """Merge modifications derived by triggers into the transaction.
+
+        Triggers run on the requested updates.  A token deleted by a trigger
+        which is not yet in the trie gets dropped from the pending updates.
+        """
+        names = [token.name for token in self._updates] + self._trigger_names
+        if not names:
+            return
+        for trigger in self._triggers:
+            view = TokenView(self._trie, self._updates, self._deletes)
+            updates, deletes = trigger.fire(view, names)
+            for token in deletes:
+                pending = [update for update in self._updates
+                           if update.name == token.name]
+                if pending:
+                    self._updates.remove(pending[0])
+                if token.name in self._trie:
+                    self._add_delete(self._trie[token.name])
+            for token in updates:
+                self._add_update(token)
+
 
 class QueryTransaction(Transaction):
     """Transaction handling query requests."""
-    def __init__(self):
+    READ_ONLY = True
+
+    def __init__(self, get_changed_names=None):
+        """Create a query transaction.
+
+        Args:
+            get_changed_names: The function returning the set of names of
+                tokens changed after a given version, or None if changes
+                that old are not known.  If not set, queries with
+                sinceVersion return all matching tokens.
+        """
         super(QueryTransaction, self).__init__()
+        self._get_changed_names = get_changed_names
         self._request = None
 
+    @staticmethod
+    def _verify_query(query):
+        """Raise an exception if a query is not well formed."""
+        if query.sinceVersion is not None and (
+                query.namePattern or query.maxTokens is not None or
+                query.pageSize is not None):
+            raise TokenMasterException(
+                ErrorCode.INPUT_ERROR,
+                'query %s with since version may not have pattern, max '
+                'tokens, or page size set' % query)
+        if query.pageSize is None:
+            return
+        if query.pageSize <= 0:
+            raise TokenMasterException(
+                ErrorCode.INPUT_ERROR,
+                'page size %d is not positive' % query.pageSize)
+        if query.namePattern or query.maxTokens is not None:
+            raise TokenMasterException(
+                ErrorCode.INPUT_ERROR,
+                'paginated query %s may not have pattern or max tokens set' %
+                query)
+
     def prepare(self, request):
         self._request = request
-        # TODO(pawel): add checks of the request
+        if request.queries:
+            for query in request.queries:
+                QueryTransaction._verify_query(query)
+
+    @staticmethod
+    def _priority(token):
+        if not token.priority:
+            return 0
+        return token.priority
+
+    def _get_matching_tokens(self, query):
+        """Retrieve all tokens matching the name prefix or pattern.
+
+        Queries use an index maintained for claims on the same pattern but
+        they never create one.  Otherwise, any client could make the master
+        maintain an index for every pattern it ever queried.
+        """
+        if query.namePattern:
+            index = self._trie.find_index(query.namePattern)
+            if index is not None:
+                return index.get_tokens()
+            regex = compile_pattern(query.namePattern)
+            return [token for name, token in self._trie.iteritems(
+                query.namePattern.split('*', 1)[0]) if regex.match(name)]
+        return self._trie.values(query.namePrefix)
 
     @staticmethod
-    def _sort_on_priority(tokens):
-        def _priority(token):
-            if not token.priority:
-                return 0
-            return token.priority
-        return sorted(tokens, key=_priority, reverse=True)
+    def _project(tokens, projection):
+        """Strip tokens of fields not selected by a projection."""
+        if projection == Projection.NAME:
+            return [Token(version=token.version, name=token.name)
+                    for token in tokens]
+        if projection == Projection.METADATA:
+            return [Token(version=token.version,
+                          name=token.name,
+                          owner=token.owner,
+                          expirationTime=token.expirationTime,
+                          priority=token.priority)
+                    for token in tokens]
+        return tokens
 
     def _get_tokens(self, query):
         """Retrieve tokens matching a given query."""
-        matching_tokens = self._trie.values(query.namePrefix)
+        matching_tokens = self._get_matching_tokens(query)
         if query.maxTokens is None:
             return matching_tokens
-        sorted_tokens = QueryTransaction._sort_on_priority(matching_tokens)
-        return sorted_tokens[:query.maxTokens]
+        # Selecting the top tokens is cheaper than sorting all of them.  Ties
+        # are broken on the position in the input, i.e., on the name.
+        return heapq.nlargest(query.maxTokens, matching_tokens,
+                              key=QueryTransaction._priority)
+
+    def _get_page(self, query):
+        """Retrieve a page of tokens matching a paginated query.
+
+        Only the tokens on the page are enumerated, starting from the
+        position of the cursor in the trie.
+
+        Returns:
+            Tuple (tokens, cursor of the next page).  The cursor is an empty
+            string if there are no more tokens.
+        """
+        items = self._trie.iteritems(query.namePrefix, query.startAfterName)
+        # Fetching one extra item tells us if there is a next page.
+        page = list(itertools.islice(items, query.pageSize + 1))
+        cursor = ''
+        if len(page) > query.pageSize:
+            page.pop()
+            cursor = page[-1][0]
+        return [token for _, token in page], cursor
+
+    @staticmethod
+    def _name_order(name):
+        return name.split(TokenTrie.DELIMITER)
+
+    def _get_delta(self, query):
+        """Retrieve changes of tokens matching a query with since version.
+
+        Only names in the change log after the version are looked up.
+
+        Returns:
+            Tuple (tokens, deleted names, incremental) where incremental is
+            False if the change log does not go back far enough and tokens
+            are all tokens matching the query.
+        """
+        names = None
+        if self._get_changed_names:
+            names = self._get_changed_names(query.sinceVersion)
+        if names is None:
+            return self._get_tokens(query), [], False
+        prefix = query.namePrefix or ''
+        tokens = []
+        deleted_names = []
+        for name in sorted([name for name in names
+                            if name.startswith(prefix)],
+                           key=QueryTransaction._name_order):
+            token = self._trie.get(name)
+            if token is None:
+                deleted_names.append(name)
+            elif token.version > query.sinceVersion:
+                # Names in the change log include tokens whose ownership
+                # expired without modifications.
+                tokens.append(token)
+        return tokens, deleted_names, True
 
     def commit(self, trie, blessed_version, store):
         self._set_trie(trie, blessed_version, store)
-        response = QueryResponse()
+        response = QueryResponse(version=blessed_version.version)
         if self._request.queries:
             response.tokens = []
+            cursors = []
+            deleted_names = []
+            incremental = []
             for query in self._request.queries:
-                response.tokens.append(self._get_tokens(query))
+                cursor = ''
+                deleted = []
+                is_delta = False
+                if query.sinceVersion is not None:
+                    tokens, deleted, is_delta = self._get_delta(query)
+                elif query.pageSize is not None:
+                    tokens, cursor = self._get_page(query)
+                else:
+                    tokens = self._get_tokens(query)
+                response.tokens.append(
+                    QueryTransaction._project(tokens, query.projection))
+                cursors.append(cursor)
+                deleted_names.append(deleted)
+                incremental.append(is_delta)
+            if any(query.pageSize is not None
+                   for query in self._request.queries):
+                response.nextCursors = cursors
+            if any(query.sinceVersion is not None
+                   for query in self._request.queries):
+                response.deletedNames = deleted_names
+                response.incremental = incremental
         return response
 
 
 class QueryAndOwnTransaction(QueryTransaction):
     """Transaction handling query and own requests."""
+    READ_ONLY = False
+
+    def prepare(self, request):
+        self._request = request
+        if request.query and request.query.pageSize is not None:
+            raise TokenMasterException(
+                ErrorCode.INPUT_ERROR,
+                'query and own request %s may not be paginated' % request)
+
     @staticmethod
     def _get_timestamp_secs():
         """Return time in seconds since the epoch."""
         return int(time.time())
 
-    @ staticmethod
-    def _is_owned(token):
-        """Check if a given token is currently owned."""
-        return (token.owner and
-                token.expirationTime and
-                (token.expirationTime >
-                 QueryAndOwnTransaction._get_timestamp_secs()))
+    def _get_unowned_tokens(self, query):
+        """Retrieve the highest priority unowned tokens matching a query.
+
+        Tokens are looked up in the index for the query name pattern or
+        prefix rather than by scanning and sorting all candidates.  Tokens
+        under prefixes excluded by the request are skipped.
+        """
+        index = self._trie.get_index(query.namePattern or
+                                     query.namePrefix or '')
+        return index.get_unowned_tokens(
+            query.maxTokens, QueryAndOwnTransaction._get_timestamp_secs(),
+            self._request.excludedPrefixes)
 
     def commit(self, trie, blessed_version, store):
         self._set_trie(trie, blessed_version, store)
         response = QueryAndOwnResponse()
         response.tokens = []
-        if self._request.query:
-            matching_tokens = self._trie.values(self._request.query.namePrefix)
-            sorted_tokens = QueryTransaction._sort_on_priority(matching_tokens)
-            for token in sorted_tokens:
-                if (self._request.query.maxTokens is not None and
-                        len(self._updates) >= self._request.query.maxTokens):
-                    break
-                if not QueryAndOwnTransaction._is_owned(token):
-                    token = copy.copy(token)
-                    token.owner = self._request.owner
-                    token.expirationTime = self._request.expirationTime
-                    self._add_update(token)
-            self._commit()
+        if self._request.query and self._request.dryRun:
+            response.tokens = [Token(version=token.version,
+                                     name=token.name,
+                                     priority=token.priority)
+                               for token in self._get_unowned_tokens(
+                                   self._request.query)]
+        elif self._request.query:
+            for token in self._get_unowned_tokens(self._request.query):
+                token = copy.copy(token)
+                token.owner = self._request.owner
+                token.expirationTime = self._request.expirationTime
+                self._add_update(token)
+            # A claim finding no tokens does not modify the master state.
+            if self._updates:
+                self._commit()
             response.tokens = self._updates
         return response
 
 
+class RenewTransaction(Transaction):
+    """Transaction handling lease renewal requests."""
+    def __init__(self):
+        super(RenewTransaction, self).__init__()
+        self._request = None
+
+    def prepare(self, request):
+        self._request = request
+        if request.leases:
+            Transaction._verify_have_version(request.leases)
+
+    def _verify_leases(self):
+        for lease in self._request.leases:
+            existing_token = self._trie.get(lease.name)
+            if not existing_token:
+                raise TokenMasterException(ErrorCode.NOT_FOUND,
+                                           'token %s not found' % lease.name)
+            if lease.version != existing_token.version:
+                raise TokenMasterException(
+                    ErrorCode.VERSION_CONFLICT,
+                    'token %s with different version %d found' %
+                    (existing_token.name, existing_token.version))
+
+    def commit(self, trie, blessed_version, store):
+        self._set_trie(trie, blessed_version, store)
+        response = RenewResponse()
+        response.tokens = []
+        if self._request.leases:
+            self._verify_leases()
+            for lease in self._request.leases:
+                token = copy.copy(self._trie[lease.name])
+                token.expirationTime = lease.expirationTime
+                self._add_update(token)
+            self._commit()
+            response.tokens = QueryTransaction._project(self._updates,
+                                                        Projection.METADATA)
+        return response
+
+
+class _JournalingTrie(object):
+    """Trie wrapper remembering tokens replaced by modifications.
+
+    The journal lets a sequence of transactions modify the trie and then
+    undo all their changes.
+    """
+    def __init__(self, trie):
+        self._trie = trie
+        # Mapping from token name to the token stored under this name before
+        # the first modification or None if there was no such token.
+        self.originals = {}
+
+    def _remember(self, name):
+        if name not in self.originals:
+            self.originals[name] = self._trie.get(name)
+
+    def __getitem__(self, name):
+        return self._trie[name]
+
+    def __setitem__(self, name, token):
+        self._remember(name)
+        self._trie[name] = token
+
+    def __delitem__(self, name):
+        self._remember(name)
+        del self._trie[name]
+
+    def __contains__(self, name):
+        return name in self._trie
+
+    def __iter__(self):
+        return iter(self._trie)
+
+    def __len__(self):
+        return len(self._trie)
+
+    def __getattr__(self, name):
+        return getattr(self._trie, name)
+
+    def get_changes(self):
+        """Return the current tokens under modified names.
+
+        Returns:
+            Mapping from token name to the token stored under this name or
+            None if the token has been removed.
+        """
+        return dict((name, self._trie.get(name)) for name in self.originals)
+
+    def rollback(self):
+        """Restore tokens replaced by modifications."""
+        for name, token in self.originals.items():
+            if token is not None:
+                self._trie[name] = token
+            elif name in self._trie:
+                del self._trie[name]
+        self.originals = {}
+
+
+class _DeferringStore(object):
+    """Store wrapper recording archived tokens instead of persisting them.
+
+    Token commits are ignored since the net changes of a batch can be derived
+    from the trie journal.
+    """
+    def __init__(self):
+        self.archived_tokens = []
+
+    def commit_tokens(self, updates=None, deletes=None, renewals=None):
+        pass
+
+    def archive_tokens(self, tokens):
+        self.archived_tokens.extend(tokens)
+
+
+class BatchTransaction(Transaction):
+    """Transaction handling atomic batches of requests.
+
+    Requests are executed one after another on a journaling view of the trie
+    so that each of them sees the changes made by its predecessors.  Store
+    writes are deferred.  If any request fails, the trie is restored from the
+    journal and nothing gets persisted.  Otherwise, the net changes of the
+    batch are committed to the store at once before they are applied to the
+    trie.
+    """
+    def __init__(self, create_transaction):
+        """Create a batch transaction.
+
+        Args:
+            create_transaction: The function creating the transaction
+                handling a given request.
+        """
+        super(BatchTransaction, self).__init__()
+        self._create_transaction = create_transaction
+        self._transactions = []
+
+    def prepare(self, request):
+        if request.requests:
+            for batched_request in request.requests:
+                batched_request = unpack_request(batched_request)
+                transaction = self._create_transaction(batched_request)
+                transaction.prepare(batched_request)
+                self._transactions.append(transaction)
+        # Batches of read-only requests do not need to be serialized with
+        # writers.
+        self.READ_ONLY = all([batched_transaction.READ_ONLY
+                              for batched_transaction in self._transactions])
+
+    def commit(self, trie, blessed_version, store):
+        journal = _JournalingTrie(trie)
+        deferring_store = _DeferringStore()
+        response = BatchResponse(responses=[])
+        try:
+            for transaction in self._transactions:
+                response.responses.append(pack_response(transaction.commit(
+                    journal, journal[blessed_version.name], deferring_store)))
+        except:
+            journal.rollback()
+            raise
+        if not journal.originals:
+            return response
+        # Changes are persisted before the trie gets modified so that readers
+        # never see tokens which are not in the store.
+        changes = journal.get_changes()
+        originals = journal.originals
+        journal.rollback()
+        archived_names = set([token.name for token in
+                              deferring_store.archived_tokens])
+        renewals, updates = _split_renewals(
+            trie, [token for token in changes.values() if token is not None])
+        deletes = [originals[name] for name, token in changes.items()
+                   if token is None and originals[name] is not None and
+                   name not in archived_names]
+        try:
+            if deferring_store.archived_tokens:
+                store.archive_tokens(deferring_store.archived_tokens)
+            store.commit_tokens(updates, deletes, renewals)
+            for name, token in changes.items():
+                if token is not None:
+                    trie[name] = token
+                elif name in trie:
+                    del trie[name]
+        except:
+            # This should never happen but if it does happen, our state will
+            # get out of sync so we better crash.
+            LOG.exception('')
+            sys.exit(1)
+        self._committed = True
+        return response
+
+    def get_changed_names(self):
+        if not self._committed:
+            return []
+        result = []
+        for transaction in self._transactions:
+            result.extend(transaction.get_changed_names())
+        return result
+
+
 # Mapping from request class to the transaction class that handles requests of
 # this type.
 REQUEST_TO_TRANSACTION = {ArchiveRequest: ArchiveTransaction,
+                          BatchRequest: BatchTransaction,
                           GroupRequest: GroupTransaction,
                           ModifyRequest: ModifyTransaction,
                           QueryAndOwnRequest: QueryAndOwnTransaction,
-                          QueryRequest: QueryTransaction}
+                          QueryRequest: QueryTransaction,
+                          RenewRequest: RenewTransaction}
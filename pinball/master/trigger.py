@@ -0,0 +1,90 @@
+# Copyright 2015, Pinterest, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Triggers deriving token modifications inside the master."""
+import abc
+
+
+__author__ = 'Pawel Garbacki'
+__copyright__ = 'Copyright 2015, Pinterest, Inc.'
+__credits__ = [__author__]
+__license__ = 'Apache'
+__version__ = '2.0'
+
+
+class TokenView(object):
+    """Read-only view of the token trie with pending modifications applied.
+
+    The view lets triggers see the state of tokens as it will be after a
+    transaction gets committed.
+    """
+    def __init__(self, trie, updates, deletes):
+        """Create a view of a trie.
+
+        Args:
+            trie: The token trie.
+            updates: The list of tokens that will be inserted or updated.
+            deletes: The list of tokens that will be removed.
+        """
+        self._trie = trie
+        self._updates = {}
+        for token in updates:
+            self._updates[token.name] = token
+        self._deleted_names = set([token.name for token in deletes])
+
+    def get(self, name):
+        """Return a token with a given name or None if it does not exist."""
+        if name in self._deleted_names:
+            return None
+        token = self._updates.get(name)
+        if token:
+            return token
+        return self._trie.get(name)
+
+    def values(self, name_prefix):
+        """Return tokens with names starting with a prefix sorted on name."""
+        tokens = {}
+        for token in self._trie.values(name_prefix):
+            tokens[token.name] = token
+        for name, token in self._updates.items():
+            if name.startswith(name_prefix):
+                tokens[name] = token
+        for name in self._deleted_names:
+            tokens.pop(name, None)
+        return [tokens[name] for name in sorted(tokens.keys())]
+
+
+class Trigger(object):
+    """Interface of a trigger run by the master on token modifications.
+
+    Triggers derive additional modifications from the tokens changed by a
+    modify request.  The derived modifications are committed atomically with
+    the request.
+    """
+    __metaclass__ = abc.ABCMeta
+
+    @abc.abstractmethod
+    def fire(self, view, names):
+        """Derive modifications from changed tokens.
+
+        Args:
+            view: The TokenView reflecting the state of tokens after the
+                modification.
+            names: The names of inserted or updated tokens.
+        Returns:
+            Tuple (updates, deletes) where updates is a list of tokens to
+            insert or update and deletes is a list of tokens to remove.
+            Tokens on the deletes list must come from the view.
+        """
+        return
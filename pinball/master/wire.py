@@ -0,0 +1,171 @@
+# Copyright 2015, Pinterest, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Wire format of master RPCs.
+
+The thrift protocol, the transport, and compression of token data are
+controlled by PinballConfig.  The master and its clients must be configured
+identically.
+
+Token data is usually a pickled job which grows with the execution history.
+If compression is enabled, the data of tokens in requests and responses is
+compressed before it is sent and decompressed right after it is received.
+The master stores and serves uncompressed data so that readers not going
+through RPCs, e.g., the UI reading the database, are not affected.
+"""
+import copy
+import zlib
+
+from thrift.protocol import TBinaryProtocol
+from thrift.protocol import TCompactProtocol
+from thrift.transport import TTransport
+
+from pinball.config.pinball_config import PinballConfig
+from pinball.master.thrift_lib.ttypes import Token
+
+
+__author__ = 'Pawel Garbacki'
+__copyright__ = 'Copyright 2015, Pinterest, Inc.'
+__credits__ = [__author__]
+__license__ = 'Apache'
+__version__ = '2.0'
+
+
+# Fast compression is preferred as every response leaving the master is
+# compressed.  Pickled jobs compress well even at the lowest level.
+_ZLIB_LEVEL = 1
+
+
+def is_framed():
+    """Check if messages are exchanged with the framed transport."""
+    return (PinballConfig.MASTER_FRAMED_TRANSPORT or
+            PinballConfig.MASTER_SERVER_TYPE == 'nonblocking')
+
+
+def get_protocol_factory():
+    """Create a factory of the configured thrift protocol."""
+    if PinballConfig.MASTER_PROTOCOL == 'compact':
+        return TCompactProtocol.TCompactProtocolFactory()
+    assert PinballConfig.MASTER_PROTOCOL == 'binary'
+    return TBinaryProtocol.TBinaryProtocolFactory()
+
+
+def get_transport_factory():
+    """Create a factory of the configured server transport."""
+    if is_framed():
+        return TTransport.TFramedTransportFactory()
+    return TTransport.TBufferedTransportFactory()
+
+
+def wrap_transport(transport):
+    """Wrap a client socket transport in the configured transport."""
+    if is_framed():
+        return TTransport.TFramedTransport(transport)
+    return TTransport.TBufferedTransport(transport)
+
+
+def _map_token_data(value, function):
+    """Apply a function to data of all tokens in a thrift value.
+
+    The value is not modified.  Tokens and structures containing them are
+    copied.
+
+    Args:
+        value: The thrift structure, list, or primitive to transform.
+        function: The function converting token data.
+    Returns:
+        The value with token data converted.
+    """
+    if isinstance(value, Token):
+        if value.data is None:
+            return value
+        result = copy.copy(value)
+        result.data = function(value.data)
+        return result
+    if isinstance(value, list):
+        return [_map_token_data(element, function) for element in value]
+    thrift_spec = getattr(value, 'thrift_spec', None)
+    if thrift_spec is None:
+        return value
+    result = copy.copy(value)
+    for field_spec in thrift_spec:
+        if field_spec:
+            name = field_spec[2]
+            setattr(result, name, _map_token_data(getattr(value, name),
+                                                  function))
+    return result
+
+
+def _compress(data):
+    return zlib.compress(data, _ZLIB_LEVEL)
+
+
+def encode_token_data(value):
+    """Prepare token data in a request or response to be sent.
+
+    Args:
+        value: The request or response to send.
+    Returns:
+        The value with token data compressed if compression is enabled.
+    """
+    if not PinballConfig.MASTER_DATA_COMPRESSION:
+        return value
+    assert PinballConfig.MASTER_DATA_COMPRESSION == 'zlib'
+    return _map_token_data(value, _compress)
+
+
+def decode_token_data(value):
+    """Restore token data in a received request or response.
+
+    Args:
+        value: The received request or response.
+    Returns:
+        The value with token data decompressed if compression is enabled.
+    """
+    if not PinballConfig.MASTER_DATA_COMPRESSION:
+        return value
+    assert PinballConfig.MASTER_DATA_COMPRESSION == 'zlib'
+    return _map_token_data(value, zlib.decompress)
+
+
+class CompressingHandler(object):
+    """Master handler wrapper converting token data on the wire.
+
+    Requests are decoded before they reach the wrapped handler and responses
+    are encoded before they are returned to the server.  Calls not carrying
+    tokens are passed through.
+    """
+    def __init__(self, handler):
+        self._handler = handler
+
+    def __getattr__(self, name):
+        return getattr(self._handler, name)
+
+    def _call(self, end_point, request):
+        return encode_token_data(end_point(decode_token_data(request)))
+
+    def archive(self, request):
+        return self._call(self._handler.archive, request)
+
+    def batch(self, request):
+        return self._call(self._handler.batch, request)
+
+    def modify(self, request):
+        return self._call(self._handler.modify, request)
+
+    def query(self, request):
+        return self._call(self._handler.query, request)
+
+    def query_and_own(self, request):
+        return self._call(self._handler.query_and_own, request)
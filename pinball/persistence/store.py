@@ -68,7 +68,7 @@ class Store(object):
         return
 
     @abc.abstractmethod
-    def commit_tokens(self, updates=None, deletes=None):
+    def commit_tokens(self, updates=None, deletes=None, renewals=None):
         """Update or remove active tokens.
 
         Args:
@@ -77,6 +77,19 @@ class Store(object):
                 inserted.
             deletes: The list of active tokens to remove from the store.
                 Tokens on this list are required to exist in the store.
+            renewals: The list of active token updates changing only token
+                versions, owners, and expiration times.  Only those fields
+                are persisted so that the store does not need to rewrite
+                token data.  Other fields of tokens on this list may be
+                unset.  Tokens on this list are required to exist in the
+                store.
+        """
+        return
+
+    def sync(self):
+        """Block until changes committed by the calling thread are durable.
+
+        Stores persisting changes synchronously have nothing to wait for.
         """
         return
 
@@ -95,6 +108,21 @@ class Store(object):
         """Read active tokens with names matching the provided filters."""
         return
 
+    def read_active_token_names(self):
+        """Read names of all active tokens."""
+        return [token.name for token in self.read_active_tokens()]
+
+    def read_active_tokens_since(self, version):
+        """Read active tokens modified after a given version.
+
+        Args:
+            version: The version after which tokens are returned.  Every
+                token modification assigns the token a new version greater
+                than versions of all earlier modifications.
+        """
+        return [token for token in self.read_active_tokens()
+                if token.version > version]
+
     @abc.abstractmethod
     def read_archived_tokens(self, name_prefix='',
                              name_infix='',
@@ -142,6 +170,9 @@ class Store(object):
 
 class DbStore(Store):
     """Implementation of token store on top of a database."""
+    # The maximum number of tokens archived with a single statement.
+    _ARCHIVE_BATCH_SIZE = 500
+
     def initialize(self):
         """Create db tables if they don't exist."""
         if django.VERSION < (1, 7):
@@ -152,15 +183,21 @@ class DbStore(Store):
             management.call_command('migrate', fake_initial=True)
 
     @atomic
-    def commit_tokens(self, updates=None, deletes=None):
+    def commit_tokens(self, updates=None, deletes=None, renewals=None):
         updates = updates if updates is not None else []
         deletes = deletes if deletes is not None else []
+        renewals = renewals if renewals is not None else []
         for token in updates:
             token_model = ActiveTokenModel.from_token(token)
             token_model.save()
         for token in deletes:
             token_model = ActiveTokenModel.from_token(token)
             token_model.delete()
+        for token in renewals:
+            ActiveTokenModel.objects.filter(name=token.name).update(
+                version=token.version,
+                owner=token.owner,
+                expirationTime=token.expirationTime)
 
     @atomic
     def delete_archived_tokens(self, deletes):
@@ -184,6 +221,23 @@ class DbStore(Store):
             result.append(token_model.to_token())
         return result
 
+    def read_active_token_names(self):
+        close_connection()
+        return self._read_active_token_names()
+
+    @atomic
+    def _read_active_token_names(self):
+        return list(ActiveTokenModel.objects.values_list('name', flat=True))
+
+    def read_active_tokens_since(self, version):
+        close_connection()
+        return self._read_active_tokens_since(version)
+
+    @atomic
+    def _read_active_tokens_since(self, version):
+        token_models = ActiveTokenModel.objects.filter(version__gt=version)
+        return [token_model.to_token() for token_model in token_models]
+
     def read_archived_tokens(self, name_prefix='', name_infix='',
                              name_suffix=''):
         close_connection()
@@ -217,11 +271,16 @@ class DbStore(Store):
 
     @atomic
     def archive_tokens(self, tokens):
-        for token in tokens:
-            active_token_model = ActiveTokenModel.from_token(token)
-            active_token_model.delete()
-            archived_token_model = ArchivedTokenModel.from_token(token)
-            archived_token_model.save()
+        # Tokens are moved in bulk, a few statements per batch rather than
+        # per token.  Archived copies left behind by an earlier attempt are
+        # replaced so that archiving is idempotent.
+        for i in range(0, len(tokens), DbStore._ARCHIVE_BATCH_SIZE):
+            batch = tokens[i:i + DbStore._ARCHIVE_BATCH_SIZE]
+            names = [token.name for token in batch]
+            ArchivedTokenModel.objects.filter(name__in=names).delete()
+            ArchivedTokenModel.objects.bulk_create(
+                [ArchivedTokenModel.from_token(token) for token in batch])
+            ActiveTokenModel.objects.filter(name__in=names).delete()
 
     def read_tokens(self, name_prefix='', name_infix='', name_suffix=''):
         close_connection()
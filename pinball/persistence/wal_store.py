@@ -0,0 +1,332 @@
+# Copyright 2015, Pinterest, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Token store persisting changes in a write-ahead log.
+
+Changes are appended to a local log file which is the durability point.  A
+background thread applies logged changes to the underlying store, e.g., the
+database.  Log writes are batched: a single flush makes durable all changes
+committed since the previous flush (group commit).  Changes are applied in
+batches where archived tokens are moved to the archive in bulk, so archiving
+large workflow instances does not hold up the master.
+"""
+import collections
+import cPickle
+import os
+import struct
+import threading
+import time
+import zlib
+
+from pinball.config.utils import get_log
+from pinball.master.thrift_lib.ttypes import Token
+from pinball.persistence.store import Store
+
+
+__author__ = 'Pawel Garbacki'
+__copyright__ = 'Copyright 2015, Pinterest, Inc.'
+__credits__ = [__author__]
+__license__ = 'Apache'
+__version__ = '2.0'
+
+
+LOG = get_log('pinball.persistence.wal_store')
+
+
+class WalStore(Store):
+    """Store wrapper logging token changes before applying them.
+
+    Changes of active tokens are appended to the log and applied to the
+    underlying store asynchronously.  A thread committing changes calls
+    sync() to wait until they are durable.  On initialization, changes left
+    in the log by a previous run are applied to the underlying store.
+    Changes may get applied more than once so the underlying store has to
+    apply them idempotently.
+
+    Each log record is a header with the length and crc32 of the payload
+    followed by the pickled payload.  The log is truncated once all changes
+    in it have been applied.
+
+    A failure to write the log terminates the process since changes exposed
+    to readers of the master could be lost.  Failures to apply changes to
+    the underlying store, e.g., transient database errors, are retried with
+    a backoff as the changes are safe in the log.
+    """
+    _COMMIT = 'commit'
+    _ARCHIVE = 'archive'
+    # Header of a log record: payload length and checksum.
+    _HEADER = struct.Struct('>Ii')
+    # The log is truncated after it grows above this size and all changes in
+    # it have been applied.
+    _MAX_LOG_BYTES = 64 * 1024 * 1024
+    # Commits block if this many changes have not been applied yet.
+    _MAX_UNAPPLIED_RECORDS = 100000
+    # The maximum number of records applied to the underlying store in a
+    # single batch.
+    _MAX_APPLY_BATCH_RECORDS = 1000
+    # Bounds of the delay between attempts to apply changes to the
+    # underlying store.
+    _MIN_APPLY_RETRY_DELAY_SEC = 1
+    _MAX_APPLY_RETRY_DELAY_SEC = 60
+
+    def __init__(self, store, log_path):
+        """Create a write-ahead log store.
+
+        Args:
+            store: The underlying store where changes get applied.
+            log_path: The path of the log file.
+        """
+        self._store = store
+        self._log_path = log_path
+        super(WalStore, self).__init__()
+
+    def initialize(self):
+        self._lock = threading.Lock()
+        # Notified when records get appended, flushed, or applied.
+        self._changed = threading.Condition(self._lock)
+        # Records waiting to be written to the log.
+        self._pending = []
+        # Records written to the log and waiting to be applied.
+        self._flushed = collections.deque()
+        # Sequence numbers of the most recent records in each stage.
+        self._appended_sequence = 0
+        self._flushed_sequence = 0
+        self._applied_sequence = 0
+        self._local = threading.local()
+        self._recover()
+        self._log = open(self._log_path, 'ab')
+        self._log_size = self._log.tell()
+        flusher = threading.Thread(target=self._run_flusher)
+        flusher.daemon = True
+        flusher.start()
+        applier = threading.Thread(target=self._run_applier)
+        applier.daemon = True
+        applier.start()
+
+    @staticmethod
+    def _read_records(log):
+        """Read complete records from the log.
+
+        A truncated or corrupted record ends the log.  It is a trace of a
+        write that was not made durable.
+        """
+        records = []
+        while True:
+            header = log.read(WalStore._HEADER.size)
+            if len(header) < WalStore._HEADER.size:
+                return records
+            length, checksum = WalStore._HEADER.unpack(header)
+            payload = log.read(length)
+            if (len(payload) < length or
+                    zlib.crc32(payload) != checksum):
+                LOG.warning('ignoring incomplete record at the end of the log')
+                return records
+            records.append(cPickle.loads(payload))
+
+    def _recover(self):
+        """Apply changes left in the log and truncate it."""
+        if not os.path.exists(self._log_path):
+            return
+        with open(self._log_path, 'rb') as log:
+            records = WalStore._read_records(log)
+        LOG.info('applying %d records from log %s', len(records),
+                 self._log_path)
+        for i in range(0, len(records), WalStore._MAX_APPLY_BATCH_RECORDS):
+            self._apply_batch_with_retries(
+                records[i:i + WalStore._MAX_APPLY_BATCH_RECORDS])
+        with open(self._log_path, 'wb') as log:
+            os.fsync(log.fileno())
+
+    def _append(self, record):
+        with self._lock:
+            while (self._appended_sequence - self._applied_sequence >=
+                   WalStore._MAX_UNAPPLIED_RECORDS):
+                self._changed.wait()
+            self._appended_sequence += 1
+            self._pending.append(record)
+            self._local.sequence = self._appended_sequence
+            self._changed.notify_all()
+
+    def commit_tokens(self, updates=None, deletes=None, renewals=None):
+        # Renewals are logged without token data.
+        renewals = [Token(version=token.version,
+                          name=token.name,
+                          owner=token.owner,
+                          expirationTime=token.expirationTime)
+                    for token in renewals or []]
+        self._append((WalStore._COMMIT, updates or [], deletes or [],
+                      renewals))
+
+    def archive_tokens(self, tokens):
+        self._append((WalStore._ARCHIVE, tokens))
+
+    def sync(self):
+        sequence = getattr(self._local, 'sequence', 0)
+        with self._lock:
+            while self._flushed_sequence < sequence:
+                self._changed.wait()
+
+    def _wait_for_apply(self):
+        """Block until all changes have been applied to the underlying store.
+        """
+        with self._lock:
+            while self._applied_sequence < self._appended_sequence:
+                self._changed.wait()
+
+    def _write(self, records):
+        """Write records to the log and make them durable."""
+        if (self._log_size > WalStore._MAX_LOG_BYTES and
+                self._applied_sequence == self._flushed_sequence):
+            self._log.truncate(0)
+            self._log.seek(0)
+            self._log_size = 0
+        for record in records:
+            payload = cPickle.dumps(record, cPickle.HIGHEST_PROTOCOL)
+            self._log.write(WalStore._HEADER.pack(len(payload),
+                                                  zlib.crc32(payload)))
+            self._log.write(payload)
+            self._log_size += WalStore._HEADER.size + len(payload)
+        self._log.flush()
+        os.fsync(self._log.fileno())
+
+    def _run_flusher(self):
+        while True:
+            with self._lock:
+                while not self._pending:
+                    self._changed.wait()
+                records = self._pending
+                self._pending = []
+            try:
+                self._write(records)
+            except:
+                # Changes may have been exposed to readers of the master so we
+                # cannot continue without persisting them.
+                LOG.exception('')
+                os._exit(1)
+            with self._lock:
+                self._flushed_sequence += len(records)
+                self._flushed.extend(records)
+                self._changed.notify_all()
+
+    def _apply(self, record):
+        """Apply a logged change to the underlying store."""
+        if record[0] == WalStore._COMMIT:
+            self._store.commit_tokens(updates=record[1], deletes=record[2],
+                                      renewals=record[3])
+        else:
+            assert record[0] == WalStore._ARCHIVE
+            self._store.archive_tokens(record[1])
+
+    def _apply_batch(self, records):
+        """Apply a sequence of logged changes to the underlying store.
+
+        Tokens archived in the sequence are moved to the archive together.
+        Archiving is deferred past commits of other tokens, e.g., advances of
+        the blessed version following each archive request, but it is
+        applied before a commit touching an archived token.
+        """
+        archived = collections.OrderedDict()
+        for record in records:
+            if record[0] == WalStore._ARCHIVE:
+                for token in record[1]:
+                    archived[token.name] = token
+                continue
+            if archived and any(token.name in archived
+                                for tokens in record[1:] for token in tokens):
+                self._store.archive_tokens(archived.values())
+                archived.clear()
+            self._apply(record)
+        if archived:
+            self._store.archive_tokens(archived.values())
+
+    def _apply_batch_with_retries(self, records):
+        """Apply a sequence of logged changes, retrying until it succeeds.
+
+        Changes already applied in a failed attempt are applied again.
+        """
+        delay_sec = WalStore._MIN_APPLY_RETRY_DELAY_SEC
+        while True:
+            try:
+                self._apply_batch(records)
+                return
+            except:
+                LOG.exception('failed to apply %d records, retrying in %d '
+                              'seconds', len(records), delay_sec)
+            time.sleep(delay_sec)
+            delay_sec = min(2 * delay_sec,
+                            WalStore._MAX_APPLY_RETRY_DELAY_SEC)
+
+    def _run_applier(self):
+        while True:
+            with self._lock:
+                while not self._flushed:
+                    self._changed.wait()
+                records = []
+                while (self._flushed and len(records) <
+                       WalStore._MAX_APPLY_BATCH_RECORDS):
+                    records.append(self._flushed.popleft())
+            self._apply_batch_with_retries(records)
+            with self._lock:
+                self._applied_sequence += len(records)
+                self._changed.notify_all()
+
+    def delete_archived_tokens(self, deletes):
+        self._wait_for_apply()
+        self._store.delete_archived_tokens(deletes)
+
+    def read_active_tokens(self, name_prefix='', name_infix='',
+                           name_suffix=''):
+        self._wait_for_apply()
+        return self._store.read_active_tokens(name_prefix, name_infix,
+                                              name_suffix)
+
+    def read_active_token_names(self):
+        self._wait_for_apply()
+        return self._store.read_active_token_names()
+
+    def read_active_tokens_since(self, version):
+        self._wait_for_apply()
+        return self._store.read_active_tokens_since(version)
+
+    def read_archived_tokens(self, name_prefix='', name_infix='',
+                             name_suffix=''):
+        self._wait_for_apply()
+        return self._store.read_archived_tokens(name_prefix, name_infix,
+                                                name_suffix)
+
+    def get_cached_data(self, name):
+        return self._store.get_cached_data(name)
+
+    def set_cached_data(self, name, data):
+        self._store.set_cached_data(name, data)
+
+    def read_tokens(self, name_prefix='', name_infix='', name_suffix=''):
+        self._wait_for_apply()
+        return self._store.read_tokens(name_prefix, name_infix, name_suffix)
+
+    def read_token_names(self, name_prefix='', name_infix='', name_suffix=''):
+        self._wait_for_apply()
+        return self._store.read_token_names(name_prefix, name_infix,
+                                            name_suffix)
+
+    def read_archived_token_names(self, name_prefix='', name_infix='',
+                                  name_suffix=''):
+        self._wait_for_apply()
+        return self._store.read_archived_token_names(name_prefix, name_infix,
+                                                     name_suffix)
+
+    def read_cached_data_names(self, name_prefix='', name_infix='',
+                               name_suffix=''):
+        return self._store.read_cached_data_names(name_prefix, name_infix,
+                                                  name_suffix)
@@ -27,6 +27,7 @@ from pinball.config.pinball_config import PinballConfig
 from pinball.config.utils import get_log
 from pinball.config.utils import master_name
 from pinball.master.factory import Factory
+from pinball.master.replica import promote_on_signal
 from pinball.ui import cache_thread
 
 
@@ -40,8 +41,11 @@ __version__ = '2.0'
 LOG = get_log('pinball.run_pinball')
 
 DbStore = None
+WalStore = None
 Scheduler = None
 Emailer = None
+JobTrigger = None
+LeaseManager = None
 Worker = None
 
 
@@ -58,6 +62,10 @@ def _pinball_imports():
     from pinball.persistence.store import DbStore
     assert DbStore
 
+    global WalStore
+    from pinball.persistence.wal_store import WalStore
+    assert WalStore
+
     global Scheduler
     from pinball.scheduler.scheduler import Scheduler
     assert Scheduler
@@ -66,6 +74,14 @@ def _pinball_imports():
     from pinball.workflow.emailer import Emailer
     assert Emailer
 
+    global JobTrigger
+    from pinball.workflow.job_trigger import JobTrigger
+    assert JobTrigger
+
+    global LeaseManager
+    from pinball.workflow.lease_manager import LeaseManager
+    assert LeaseManager
+
     global Worker
     from pinball.workflow.worker import Worker
     assert Worker
@@ -92,8 +108,12 @@ def _create_workers(num_workers, factory, emailer):
     # that it would substantially delay processing.
     sleep_interval = 5. / num_workers
     sleep_interval = max(sleep_interval, 1)
+    # Leases on job tokens owned by all workers are renewed together.
+    lease_manager = LeaseManager(factory.get_client())
     for _ in range(0, num_workers):
-        thread = threading.Thread(target=_run_worker, args=[factory, emailer])
+        thread = threading.Thread(target=_run_worker,
+                                  args=[factory, emailer, None,
+                                        lease_manager])
         thread.daemon = True
         threads.append(thread)
         thread.start()
@@ -101,11 +121,11 @@ def _create_workers(num_workers, factory, emailer):
     return threads
 
 
-def _run_worker(factory, emailer, store=None):
+def _run_worker(factory, emailer, store=None, lease_manager=None):
     store = store or DbStore()
     while True:
         client = factory.get_client()
-        worker = Worker(client, store, emailer)
+        worker = Worker(client, store, emailer, lease_manager)
         try:
             worker.run()
             return
@@ -186,12 +206,45 @@ def main():
         choices=['master', 'scheduler', 'workers', 'ui'],
         default='master',
         help='execution mode')
+    parser.add_argument(
+        '-s',
+        '--shard',
+        dest='shard',
+        type=int,
+        default=None,
+        help='index of the shard in PinballConfig.MASTER_SHARDS served by '
+             'the master')
+    parser.add_argument(
+        '-l',
+        '--leader',
+        dest='leader',
+        default=None,
+        help='host:port of the master followed by this master as a hot '
+             'standby.  The standby serves only reads until it receives '
+             'SIGUSR2')
+    parser.add_argument(
+        '--trigger_loaded_tokens',
+        dest='trigger_loaded_tokens',
+        action='store_true',
+        help='run job triggers on all tokens loaded on startup.  Needed once '
+             'after tokens were modified by a master running without '
+             'triggers')
 
     options = parser.parse_args(sys.argv[1:])
     PinballConfig.parse(options.config_file)
+    if options.leader and PinballConfig.MASTER_WAL_PATH:
+        # A standby wrapping the store in a write-ahead log would replay its
+        # local log into the database shared with the live leader.
+        parser.error('--leader cannot be used with MASTER_WAL_PATH')
 
     if hasattr(PinballConfig, 'MASTER_NAME') and PinballConfig.MASTER_NAME:
         master_name(PinballConfig.MASTER_NAME)
+    master_port = PinballConfig.MASTER_PORT
+    if options.shard is not None:
+        # Each shard persists its tokens in separate tables.
+        master_name('%s_shard_%d' % (master_name(), options.shard))
+        master_port = int(
+            PinballConfig.MASTER_SHARDS[options.shard].rsplit(':', 1)[1])
     _pinball_imports()
     if PinballConfig.UI_HOST:
         # the physical port should be hidden here.
@@ -214,10 +267,25 @@ def main():
         return
 
     factory = Factory(master_hostname=PinballConfig.MASTER_HOST,
-                      master_port=PinballConfig.MASTER_PORT)
+                      master_port=master_port,
+                      shards=PinballConfig.MASTER_SHARDS)
     threads = []
     if options.mode == 'master':
-        factory.create_master(DbStore())
+        store = DbStore()
+        if PinballConfig.MASTER_WAL_PATH:
+            store = WalStore(store, PinballConfig.MASTER_WAL_PATH)
+        if options.leader:
+            leader_hostname, leader_port = options.leader.rsplit(':', 1)
+            replica = factory.create_replica(
+                leader_hostname, int(leader_port), store,
+                triggers=[JobTrigger()],
+                checkpoint_path=PinballConfig.MASTER_CHECKPOINT_PATH)
+            promote_on_signal(replica)
+        else:
+            factory.create_master(
+                store, triggers=[JobTrigger()],
+                checkpoint_path=PinballConfig.MASTER_CHECKPOINT_PATH,
+                trigger_loaded_tokens=options.trigger_loaded_tokens)
     elif options.mode == 'scheduler':
         threads.append(_create_scheduler(factory, emailer))
     else:
@@ -27,6 +27,7 @@ from pinball.config.utils import token_to_str
 from pinball.master.factory import Factory
 from pinball.master.thrift_lib.ttypes import GroupRequest
 from pinball.master.thrift_lib.ttypes import ModifyRequest
+from pinball.master.thrift_lib.ttypes import Projection
 from pinball.master.thrift_lib.ttypes import Token
 from pinball.master.thrift_lib.ttypes import Query
 from pinball.master.thrift_lib.ttypes import QueryRequest
@@ -43,7 +44,7 @@ __license__ = 'Apache'
 __version__ = '2.0'
 
 
-def _get_tokens(prefix, recursive, client):
+def _get_tokens(prefix, recursive, client, projection=None):
     """Get tokens for a given name prefix.
 
     Args:
@@ -52,11 +53,13 @@ def _get_tokens(prefix, recursive, client):
             will be retrieved.  Otherwise, all tokens with names starting with
             the prefix will be retrieved.
         client: The client to use when communicating with the master.
+        projection: The fields of tokens to retrieve.  All fields are
+            retrieved if not set.
     Returns:
         List of tokens matching a given prefix.
     """
     result = []
-    query = Query(namePrefix=prefix)
+    query = Query(namePrefix=prefix, projection=projection)
     request = QueryRequest(queries=[query])
     response = client.query(request)
     if response.tokens:
@@ -141,7 +144,8 @@ class Rm(Command):
 
     def execute(self, client, store):
         output = ''
-        tokens = _get_tokens(self._prefix, self._recursive, client)
+        tokens = _get_tokens(self._prefix, self._recursive, client,
+                             Projection.METADATA)
         deleted = 0
         if not tokens:
             output += 'no tokens found\n'
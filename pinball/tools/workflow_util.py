@@ -27,6 +27,7 @@ from pinball.common.s3_utils import delete_s3_directory
 from pinball.config.pinball_config import PinballConfig
 from pinball.config.utils import get_unique_name
 from pinball.config.utils import master_name
+from pinball.master.client import iter_tokens
 from pinball.master.factory import Factory
 from pinball.master.thrift_lib.ttypes import GroupRequest
 from pinball.master.thrift_lib.ttypes import ModifyRequest
@@ -68,11 +69,7 @@ def _get_all_tokens(workflow, instance, client):
     """
     name = Name(workflow=workflow, instance=instance)
     prefix = name.get_instance_prefix()
-    query = Query(namePrefix=prefix)
-    request = QueryRequest(queries=[query])
-    response = client.query(request)
-    assert len(response.tokens) == 1
-    return response.tokens[0]
+    return list(iter_tokens(client, Query(namePrefix=prefix)))
 
 
 class Start(Command):
@@ -1210,7 +1207,8 @@ def run_command(options):
     command = _COMMANDS[options.command]()
     command.prepare(options)
     factory = Factory(master_hostname=PinballConfig.MASTER_HOST,
-                      master_port=PinballConfig.MASTER_PORT)
+                      master_port=PinballConfig.MASTER_PORT,
+                      shards=PinballConfig.MASTER_SHARDS)
     client = factory.get_client()
 
     # The reason why these imports are not at the top level is that some of the
@@ -17,6 +17,7 @@ import time
 
 from pinball.config.utils import get_log
 from pinball.master.thrift_lib.ttypes import ArchiveRequest
+from pinball.master.thrift_lib.ttypes import Projection
 from pinball.master.thrift_lib.ttypes import Query
 from pinball.master.thrift_lib.ttypes import QueryRequest
 from pinball.master.thrift_lib.ttypes import TokenMasterException
@@ -48,7 +49,9 @@ class Archiver(object):
             List of tokens in the workflow instance.
         """
         prefix = Name(workflow=self._workflow, instance=self._instance)
-        query = Query(namePrefix=prefix.get_instance_prefix())
+        # Archiving and ownership checks do not look at token data.
+        query = Query(namePrefix=prefix.get_instance_prefix(),
+                      projection=Projection.METADATA)
         query_request = QueryRequest(queries=[query])
         try:
             query_response = self._client.query(query_request)
@@ -0,0 +1,149 @@
+# Copyright 2015, Pinterest, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Master trigger making waiting jobs runnable when their inputs arrive."""
+import pickle
+
+from pinball.config.utils import get_log
+from pinball.master.thrift_lib.ttypes import Token
+from pinball.master.trigger import Trigger
+from pinball.workflow.name import Name
+
+
+__author__ = 'Pawel Garbacki'
+__copyright__ = 'Copyright 2015, Pinterest, Inc.'
+__credits__ = [__author__]
+__license__ = 'Apache'
+__version__ = '2.0'
+
+
+LOG = get_log('pinball.workflow.job_trigger')
+
+
+class JobTrigger(Trigger):
+    """Trigger moving waiting jobs with satisfied inputs to runnable.
+
+    The trigger fires on updates of waiting job tokens and event tokens.  If
+    every input of a waiting job has an event in it, one event per input is
+    removed, events are stored in the job, and the job token is moved to the
+    runnable branch of the token tree.
+    """
+    @staticmethod
+    def _get_job_token_names(names):
+        """Find names of waiting job tokens affected by token updates.
+
+        Args:
+            names: The names of updated tokens.
+        Returns:
+            Sorted list of names of waiting job tokens which may have become
+            runnable.
+        """
+        job_token_names = set()
+        for name in names:
+            job_name = Name.from_job_token_name(name)
+            if job_name.job:
+                if job_name.job_state == Name.WAITING_STATE:
+                    job_token_names.add(name)
+                continue
+            event_name = Name.from_event_token_name(name)
+            if event_name.event:
+                job_name = Name(workflow=event_name.workflow,
+                                instance=event_name.instance,
+                                job_state=Name.WAITING_STATE,
+                                job=event_name.job)
+                job_token_names.add(job_name.get_job_token_name())
+        return sorted(job_token_names)
+
+    @staticmethod
+    def _get_triggering_events(view, job_name, job):
+        """Get a list of triggering events.
+
+        Args:
+            view: The token view to look for events in.
+            job_name: The name of the job token.
+            job: The job whose inputs should be checked.
+        Returns:
+            A list of event tokens, one per input, that may be used to trigger
+            the job.  The highest priority event is picked from each input.
+            If any of the inputs has no events in it, the result list will be
+            empty.
+        """
+        triggering_events = []
+        for input_name in job.inputs:
+            prefix = Name(workflow=job_name.workflow,
+                          instance=job_name.instance,
+                          job=job_name.job,
+                          input_name=input_name)
+            events = view.values(prefix.get_input_prefix())
+            if not events:
+                return []
+            triggering_events.append(
+                max(events, key=lambda event: event.priority))
+        return triggering_events
+
+    @staticmethod
+    def _add_events_to_job(job, triggering_event_tokens):
+        """Put triggering events inside the job.
+
+        Args:
+            job: The job which should be augmented with the events.
+            triggering_event_tokens: List of event tokens that triggered the
+                job.
+        """
+        assert not job.events
+        for event_token in triggering_event_tokens:
+            if event_token.data:
+                event = pickle.loads(event_token.data)
+                # Optimization to make the job data structure smaller: do not
+                # append events with no attributes.
+                if event.attributes:
+                    job.events.append(event)
+            else:
+                # This logic is here for backwards compatibility.
+                # TODO(pawel): remove this logic after the transition to the
+                # new model has been completed.
+                name = Name.from_event_token_name(event_token.name)
+                assert name.input == Name.WORKFLOW_START_INPUT
+
+    def fire(self, view, names):
+        updates = []
+        deletes = []
+        for job_token_name in JobTrigger._get_job_token_names(names):
+            job_token = view.get(job_token_name)
+            if not job_token:
+                continue
+            try:
+                job = pickle.loads(job_token.data)
+                name = Name.from_job_token_name(job_token.name)
+                # TODO(pawel): handle jobs with no dependencies
+                if not job.inputs:
+                    continue
+                triggering_events = JobTrigger._get_triggering_events(
+                    view, name, job)
+                if not triggering_events:
+                    continue
+                JobTrigger._add_events_to_job(job, triggering_events)
+            except Exception:
+                LOG.exception('failed to trigger job %s', job_token_name)
+                continue
+            name.job_state = Name.RUNNABLE_STATE
+            if view.get(name.get_job_token_name()):
+                LOG.warning('job %s is already runnable', job_token_name)
+                continue
+            runnable_job_token = Token(name=name.get_job_token_name(),
+                                       priority=job_token.priority,
+                                       data=pickle.dumps(job))
+            updates.append(runnable_job_token)
+            deletes.extend(triggering_events + [job_token])
+        return updates, deletes
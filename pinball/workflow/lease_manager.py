@@ -0,0 +1,230 @@
+# Copyright 2015, Pinterest, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Renewal of job token leases shared by workers running in one process.
+
+A worker executing a job owns the job token and has to renew its lease before
+it expires.  Instead of each worker polling the master on its own, workers in
+a process register their owned job tokens with a single lease manager.  In
+every round, the lease manager sends one batch to the master with the query
+for ABORT signals of all workflow instances with running jobs, renewals of
+leases that are about to expire, and updates of jobs whose properties changed
+during execution.  Jobs in aborted instances and jobs whose tokens could not
+be updated get aborted.
+"""
+import copy
+import pickle
+import socket
+import threading
+import time
+
+from thrift.transport import TTransport
+
+from pinball.config.pinball_config import PinballConfig
+from pinball.config.utils import get_log
+from pinball.master.thrift_lib.ttypes import Lease
+from pinball.master.thrift_lib.ttypes import ModifyRequest
+from pinball.master.thrift_lib.ttypes import Projection
+from pinball.master.thrift_lib.ttypes import Query
+from pinball.master.thrift_lib.ttypes import QueryRequest
+from pinball.master.thrift_lib.ttypes import RenewRequest
+from pinball.master.thrift_lib.ttypes import RenewResponse
+from pinball.master.thrift_lib.ttypes import TokenMasterException
+from pinball.workflow.name import Name
+from pinball.workflow.signaller import Signal
+
+
+__author__ = 'Pawel Garbacki'
+__copyright__ = 'Copyright 2015, Pinterest, Inc.'
+__credits__ = [__author__]
+__license__ = 'Apache'
+__version__ = '2.0'
+
+
+LOG = get_log('pinball.workflow.lease_manager')
+
+
+class _OwnedJob(object):
+    """A job token owned by a worker and the executor running the job."""
+    def __init__(self, job_token, executor, lease_time_sec):
+        self.job_token = job_token
+        self.executor = executor
+        self.lease_time_sec = lease_time_sec
+        # Set once the job has been aborted by the lease manager.
+        self.aborted = False
+
+
+class LeaseManager(object):
+    """Lease renewer shared by workers running in the same process."""
+
+    def __init__(self, client):
+        """Create a lease manager.
+
+        Args:
+            client: The client communicating with the master.  It is used
+                exclusively by the lease manager thread.
+        """
+        self._client = client
+        # Mapping from job token name to the owned job.
+        self._jobs = {}
+        # The lock is held for the duration of a renewal round so that jobs
+        # do not get removed while their tokens are being updated.
+        self._lock = threading.Lock()
+        self._renewer = None
+
+    def add(self, job_token, executor, lease_time_sec):
+        """Start renewing the lease on an owned job token.
+
+        Args:
+            job_token: The owned job token.
+            executor: The executor running the job.  It gets aborted if the
+                workflow instance of the job is aborted or if the job token
+                cannot be updated.
+            lease_time_sec: The time by which renewals extend the lease.
+        """
+        with self._lock:
+            assert job_token.name not in self._jobs
+            self._jobs[job_token.name] = _OwnedJob(job_token, executor,
+                                                   lease_time_sec)
+            if not self._renewer:
+                self._renewer = threading.Thread(target=self._run_renewer)
+                self._renewer.daemon = True
+                self._renewer.start()
+
+    def remove(self, name):
+        """Stop renewing the lease on a job token.
+
+        The call blocks until the ongoing renewal round completes.
+
+        Args:
+            name: The name of the job token.
+        Returns:
+            The most recent version of the job token.
+        """
+        with self._lock:
+            return self._jobs.pop(name).job_token
+
+    @staticmethod
+    def _get_abort_signal_names(job_token_name):
+        """Get names of ABORT signals applicable to a job."""
+        name = Name.from_job_token_name(job_token_name)
+        action = Signal.action_to_string(Signal.ABORT)
+        return [Name(signal=action).get_signal_token_name(),
+                Name(workflow=name.workflow,
+                     signal=action).get_signal_token_name(),
+                Name(workflow=name.workflow,
+                     instance=name.instance,
+                     signal=action).get_signal_token_name()]
+
+    @staticmethod
+    def _abort(job):
+        if not job.aborted:
+            job.aborted = True
+            job.executor.abort()
+
+    @staticmethod
+    def _get_update_request(job, now):
+        """Create a request updating the job token if needed.
+
+        Returns:
+            The request updating the job token or None if the token does not
+            need to be updated in this round.
+        """
+        if job.executor.job_dirty:
+            # The ordering here is important - we need to reset the changed
+            # flag before updating the token.
+            job.executor.job_dirty = False
+            job_token = copy.copy(job.job_token)
+            job_token.data = pickle.dumps(job.executor.job)
+            job_token.expirationTime = int(now + job.lease_time_sec)
+            return ModifyRequest(updates=[job_token])
+        if job.job_token.expirationTime < now + job.lease_time_sec / 2:
+            return RenewRequest(leases=[
+                Lease(name=job.job_token.name,
+                      version=job.job_token.version,
+                      expirationTime=int(now + job.lease_time_sec))])
+        return None
+
+    @staticmethod
+    def _update_job_token(job, response):
+        """Record the outcome of a job token update in the owned job."""
+        if isinstance(response, TokenMasterException):
+            LOG.error('failed to update job token %s: %s',
+                      job.job_token.name, response)
+            LeaseManager._abort(job)
+        elif isinstance(response, RenewResponse):
+            renewed_token = response.tokens[0]
+            job_token = copy.copy(job.job_token)
+            job_token.version = renewed_token.version
+            job_token.expirationTime = renewed_token.expirationTime
+            job.job_token = job_token
+        else:
+            job.job_token = response.updates[0]
+
+    def renew(self):
+        """Run a renewal round.
+
+        Abort signals are checked and job tokens are updated in a single
+        call to the master.  If the call fails, all jobs get aborted.
+        """
+        with self._lock:
+            jobs = [job for job in self._jobs.values() if not job.aborted]
+            if not jobs:
+                return
+            signal_names = set()
+            for job in jobs:
+                signal_names.update(
+                    LeaseManager._get_abort_signal_names(job.job_token.name))
+            requests = [QueryRequest(queries=[
+                Query(namePrefix=signal_name, projection=Projection.NAME)
+                for signal_name in sorted(signal_names)])]
+            updated_jobs = []
+            now = time.time()
+            for job in jobs:
+                request = LeaseManager._get_update_request(job, now)
+                if request:
+                    requests.append(request)
+                    updated_jobs.append(job)
+            try:
+                responses = self._client.call_many(requests)
+                if isinstance(responses[0], TokenMasterException):
+                    raise responses[0]
+            except (TokenMasterException, TTransport.TTransportException,
+                    socket.timeout, socket.error):
+                # We cannot tell if the jobs should keep running so we abort
+                # them and let the workers decide what to do.
+                LOG.exception('')
+                for job in jobs:
+                    LeaseManager._abort(job)
+                return
+            for job, response in zip(updated_jobs, responses[1:]):
+                LeaseManager._update_job_token(job, response)
+            set_signal_names = set()
+            for tokens in responses[0].tokens:
+                for token in tokens:
+                    set_signal_names.add(token.name)
+            for job in jobs:
+                if set_signal_names.intersection(
+                        LeaseManager._get_abort_signal_names(
+                            job.job_token.name)):
+                    LOG.info('aborting job %s', job.job_token.name)
+                    LeaseManager._abort(job)
+
+    def _run_renewer(self):
+        while True:
+            time.sleep(PinballConfig.WORKER_POLL_TIME_SEC)
+            try:
+                self.renew()
+            except:
+                LOG.exception('')
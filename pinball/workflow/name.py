@@ -216,6 +216,17 @@ class Name(object):
                      'job_state': self.job_state})
         return ''
 
+    def get_job_state_pattern(self):
+        """Get the pattern of job state prefixes across workflow instances.
+
+        The pattern matches the job state prefix in all instances of all
+        workflows.  It is meant to be used in master queries.
+        """
+        if self.job_state:
+            return ('/workflow/*/*/job/%(job_state)s/' %
+                    {'job_state': self.job_state})
+        return ''
+
     def get_job_token_name(self):
         if (self.workflow and self.instance and self.job_state and
                 self.job):
@@ -35,9 +35,11 @@ import time
 
 from pinball.config.pinball_config import PinballConfig
 from pinball.master.thrift_lib.ttypes import ModifyRequest
+from pinball.master.thrift_lib.ttypes import Projection
 from pinball.master.thrift_lib.ttypes import Query
 from pinball.master.thrift_lib.ttypes import QueryRequest
 from pinball.master.thrift_lib.ttypes import Token
+from pinball.master.thrift_lib.ttypes import WatchRequest
 from pinball.persistence.token_data import TokenData
 from pinball.workflow.name import Name
 
@@ -108,6 +110,8 @@ class Signaller(object):
         self._workflow = workflow
         self._instance = instance
         self._signals = {}  # mapping from action to signal
+        # Master version that locally stored signals are up to date with.
+        self._version = None
         self._refresh_actions()
 
     def _dedup_actions(self, signal_tokens):
@@ -128,26 +132,23 @@ class Signaller(object):
             signal = pickle.loads(signal_token.data)
             self._signals[signal.action] = signal
 
-    def _refresh_actions(self):
-        """Reload actions from the master."""
-        request = QueryRequest(queries=[])
+    def _get_signal_prefixes(self):
+        """Get name prefixes of signals applicable in the signaller scope."""
         name = Name()
-
-        top_query = Query()
-        top_query.namePrefix = name.get_signal_prefix()
-        request.queries.append(top_query)
-
+        result = [name.get_signal_prefix()]
         if self._workflow:
-            workflow_query = Query()
             name.workflow = self._workflow
-            workflow_query.namePrefix = name.get_signal_prefix()
-            request.queries.append(workflow_query)
-
+            result.append(name.get_signal_prefix())
         if self._instance:
-            instance_query = Query()
             name.instance = self._instance
-            instance_query.namePrefix = name.get_signal_prefix()
-            request.queries.append(instance_query)
+            result.append(name.get_signal_prefix())
+        return result
+
+    def _refresh_actions(self):
+        """Reload actions from the master."""
+        request = QueryRequest(queries=[])
+        for prefix in self._get_signal_prefixes():
+            request.queries.append(Query(namePrefix=prefix))
 
         response = self._client.query(request)
         signal_tokens = []
@@ -155,12 +156,39 @@ class Signaller(object):
             signal_tokens.extend(tokens)
 
         self._dedup_actions(signal_tokens)
+        self._version = response.version
+
+    def wait_for_change(self, timeout_sec):
+        """Block until signals in the signaller scope change.
 
-    def _get_signal_token(self, action):
+        Locally stored signals get refreshed if a change has been detected.
+
+        Args:
+            timeout_sec: The maximum time to wait for the change.
+        Returns:
+            True iff signals have been refreshed.
+        """
+        if self._version is None:
+            # We don't know what version the signals correspond to so fall
+            # back to polling.
+            time.sleep(timeout_sec)
+        else:
+            request = WatchRequest(namePrefixes=self._get_signal_prefixes(),
+                                   sinceVersion=self._version,
+                                   timeoutMs=int(timeout_sec * 1000))
+            response = self._client.watch(request)
+            if not response.changed:
+                return False
+        self._refresh_actions()
+        return True
+
+    def _get_signal_token(self, action, projection=None):
         """Retrieve signal for a specific action from the master.
 
         Args:
             action: The action to get signal for.
+            projection: The fields of the token to retrieve.  All fields are
+                retrieved if not set.
         Returns:
             The signal token if found, otherwise None.
         """
@@ -171,6 +199,7 @@ class Signaller(object):
 
         query = Query()
         query.namePrefix = name.get_signal_token_name()
+        query.projection = projection
         request.queries.append(query)
 
         response = self._client.query(request)
@@ -258,8 +287,8 @@ class Signaller(object):
         if signal and signal.attributes == attributes:
             return
         # A signal with the same action but different data may already exist
-        # in the master.
-        signal_token = self._get_signal_token(action)
+        # in the master.  Its data is overwritten so we don't need to fetch it.
+        signal_token = self._get_signal_token(action, Projection.METADATA)
         if not signal_token:
             name = Name(workflow=self._workflow, instance=self._instance,
                         signal=Signal.action_to_string(action))
@@ -278,7 +307,7 @@ class Signaller(object):
         """
         if not self.is_signal_present(action):
             return
-        signal_token = self._get_signal_token(action)
+        signal_token = self._get_signal_token(action, Projection.METADATA)
         if signal_token:
             request = ModifyRequest(deletes=[signal_token])
             self._client.modify(request)
@@ -22,9 +22,10 @@ shared by related event tokens of relevance to a specific job.
 
 A job at a given point time is in one of two states: waiting or runnable.
 All jobs start in the waiting state.  If there is at least one event in each
-input of a job, the job can be made runnable.  When a worker makes a job
-runnable, it consumes (i.e., removes) one event token from each of its inputs.
-We call those events triggering events.
+input of a job, the job can be made runnable.  The master makes a job runnable
+in the same transaction that fills its last empty input (see JobTrigger).
+Doing so, it consumes (i.e., removes) one event token from each of the job's
+inputs.  We call those events triggering events.
 
 Runnable job tokens are claimed by idle workers and executed.  During execution
 the ownership of the claimed job token is renewed periodically.  If a worker
@@ -33,29 +34,27 @@ else.  In this model we assume job idempotence.
 """
 import pickle
 import random
-import socket
-import threading
 import time
 
-from thrift.transport import TTransport
-
 from pinball.config.pinball_config import PinballConfig
 from pinball.config.utils import get_log
 from pinball.config.utils import get_unique_name
 
-from pinball.master.snapshot import Snapshot
 from pinball.master.thrift_lib.ttypes import ModifyRequest
+from pinball.master.thrift_lib.ttypes import Projection
 from pinball.master.thrift_lib.ttypes import Query
 from pinball.master.thrift_lib.ttypes import QueryAndOwnRequest
 from pinball.master.thrift_lib.ttypes import QueryRequest
 from pinball.master.thrift_lib.ttypes import Token
 from pinball.master.thrift_lib.ttypes import TokenMasterException
+from pinball.master.thrift_lib.ttypes import WatchRequest
 
 from pinball.ui.data_builder import DataBuilder
 from pinball.workflow.archiver import Archiver
 from pinball.workflow.event import Event
 from pinball.workflow.inspector import Inspector
 from pinball.workflow.job_executor import JobExecutor
+from pinball.workflow.lease_manager import LeaseManager
 from pinball.workflow.name import Name
 from pinball.workflow.signaller import Signal
 from pinball.workflow.signaller import Signaller
@@ -78,197 +77,33 @@ class Worker(object):
     # Delay between subsequent queries to the master.
     _INTER_QUERY_DELAY_SEC = 5
 
-    def __init__(self, client, store, emailer):
+    # Signal actions preventing execution of jobs in their scope.
+    _BLOCKING_ACTIONS = [Signal.DRAIN, Signal.ABORT, Signal.EXIT]
+
+    def __init__(self, client, store, emailer, lease_manager=None):
+        """Create a worker.
+
+        Args:
+            client: The client communicating with the master.
+            store: The store to read workflow data from.
+            emailer: The emailer sending job and workflow notifications.
+            lease_manager: The lease manager renewing ownership of job
+                tokens, shared by workers in the process.  If not set, the
+                worker renews the ownership on its own.
+        """
         self._client = client
         self._emailer = emailer
         self._data_builder = DataBuilder(store)
         self._owned_job_token = None
         self._name = get_unique_name()
         self._inspector = Inspector(client)
-        # The lock synchronizes access to shared attributes between the worker
-        # thread and the lease renewer thread.
-        self._lock = threading.Lock()
-        self._lease_renewer = None
+        self._lease_manager = (lease_manager if lease_manager is not None
+                               else LeaseManager(client))
         self._executor = None
+        # Master version of the workflow tokens that the worker has seen.
+        self._watch_version = None
         self._test_only_end_if_no_runnable = False
 
-    @staticmethod
-    def _get_triggering_events(inputs):
-        """Get a list of triggering events.
-
-        Args:
-            inputs: A list of lists where the elements of the outer list
-                represent inputs of a job, while the elements of inner lists
-                are names of events in those inputs.
-
-        Returns:
-            A list of event tokens, one per input, that may be used to trigger
-            the job.  If any of the inputs has no events in it, the result list
-            will be empty.
-
-        Example:
-            inputs = [[token('/workflows/wf/events/j/i1/e1'),
-                       token('/workflows/wf/events/j/i1/e2')].
-                      [token('/workflows/wf/events/j/i2/e3')]]
-            return: [token('/workflows/wf/events/j/i1/e1'),
-                     token('/workflows/wf/events/j/i2/e3')]
-
-            inputs = [[token('/workflows/wf/events/j/i1/e1'),
-                       token('/workflows/wf/events/j/i1/e2')].
-                      []]
-            return: []
-        """
-        triggering_events = []
-        for events in inputs:
-            if not events:
-                return []
-            triggering_events.append(events[0])
-        return triggering_events
-
-    def _move_job_token_to_runnable(self, job_token, triggering_event_tokens):
-        """Move a job token to the runnable branch of the token tree.
-
-        Token tree is the global, hierarchically structured token namespace.
-        Args:
-            job_token: The job token to make runnable.
-            triggering_event_tokens: The list of events used to trigger the
-                job.  These events will be removed from the master in the same
-                call to that makes the job token runnable.
-        Returns:
-            True on success, otherwise False.
-        """
-        name = Name.from_job_token_name(job_token.name)
-        name.job_state = Name.RUNNABLE_STATE
-        job = pickle.loads(job_token.data)
-        Worker._add_events_to_job(job, triggering_event_tokens)
-        runnable_job_token = Token(name=name.get_job_token_name(),
-                                   priority=job_token.priority,
-                                   data=pickle.dumps(job))
-        request = ModifyRequest(updates=[runnable_job_token],
-                                deletes=triggering_event_tokens + [job_token])
-        return self._send_request(request)
-
-    @staticmethod
-    def _add_events_to_job(job, triggering_event_tokens):
-        """Put triggering events inside the job.
-
-        Args:
-            job: The job which should be augmented with the events.
-            triggering_event_tokens: List of event tokens that triggered the
-                job.
-        """
-        assert not job.events
-        for event_token in triggering_event_tokens:
-            if event_token.data:
-                event = pickle.loads(event_token.data)
-                # Optimization to make the job data structure smaller: do not
-                # append events with no attributes.
-                if event.attributes:
-                    job.events.append(event)
-            else:
-                # This logic is here for backwards compatibility.
-                # TODO(pawel): remove this logic after the transition to the
-                # new model has been completed.
-                name = Name.from_event_token_name(event_token.name)
-                assert name.input == Name.WORKFLOW_START_INPUT
-
-    def _make_job_runnable(self, job_token):
-        """Attempt to make a job runnable.
-
-        Query event tokens in job inputs.  If a combination of triggering
-        events exist, remove those events and make the job runnable.
-        Otherwise, do nothing.
-
-        Args:
-            job_token: The job token to make runnable.
-        Returns:
-            True if there were no errors during communication with the master,
-            otherwise False.
-        """
-        job = pickle.loads(job_token.data)
-        name = Name.from_job_token_name(job_token.name)
-        request = QueryRequest(queries=[])
-        # TODO(pawel): handle jobs with no dependencies
-        assert job.inputs
-        for input_name in job.inputs:
-            prefix = Name()
-            prefix.workflow = name.workflow
-            prefix.instance = name.instance
-            prefix.job = name.job
-            prefix.input = input_name
-            query = Query()
-            query.namePrefix = prefix.get_input_prefix()
-            query.maxTokens = 1
-            request.queries.append(query)
-        try:
-            response = self._client.query(request)
-        except TokenMasterException:
-            # TODO(pawel): add a retry count and fail if a limit is reached.
-            LOG.exception('error sending request %s', request)
-            return False
-        triggering_events = Worker._get_triggering_events(response.tokens)
-        if triggering_events:
-            return self._move_job_token_to_runnable(job_token,
-                                                    triggering_events)
-        return True
-
-    def _make_runnable(self, workflow, instance):
-        """Attempt to make jobs in a given workflow instance runnable.
-
-        Go over all waiting jobs in a given workflow instance and try to make
-        them runnable.
-
-        Args:
-            workflow: The name of the workflow whose jobs should be considered.
-            instance: The workflow instance whose jobs should be considered.
-        Returns:
-            True if there were no errors during communication with the master,
-            otherwise False.
-        """
-        name = Name()
-        name.workflow = workflow
-        name.instance = instance
-        name.job_state = Name.WAITING_STATE
-        query = Query(namePrefix=name.get_job_state_prefix())
-        # TODO(pawel): to prevent multiple workers from trying to make the
-        # same job runnable at the same time, this should be a
-        # QueryAndOwnRequest.  Note that the current implementation is correct,
-        # just inefficient.
-        request = QueryRequest(queries=[query])
-        try:
-            response = self._client.query(request)
-        except TokenMasterException:
-            LOG.exception('error sending request %s', request)
-            return False
-        assert len(response.tokens) == 1
-        for token in response.tokens[0]:
-            if not self._make_job_runnable(token):
-                return False
-        return True
-
-    def _has_no_runnable_jobs(self, workflow, instance):
-        """Check if the workflow instance does not contain runnable jobs.
-
-        Returns:
-            True if we are certain that the workflow has no runnable jobs.
-            Otherwise False.  If there were any errors during communication
-            with the master, the return value is False.
-        """
-        name = Name(workflow=workflow,
-                    instance=instance,
-                    job_state=Name.RUNNABLE_STATE)
-        query = Query(namePrefix=name.get_job_state_prefix())
-        request = QueryRequest(queries=[query])
-        try:
-            response = self._client.query(request)
-        except TokenMasterException:
-            LOG.exception('error sending request %s', request)
-            return False
-        assert len(response.tokens) == 1
-        if response.tokens[0]:
-            return False
-        return True
-
     def _is_done(self, workflow, instance):
         """Check if the workflow instance is done.
 
@@ -279,27 +114,37 @@ class Worker(object):
             False.  If there were any errors during communication with the
             master, the return value is False.
         """
-        # Attempt to make the workflow runnable and verify that no WAITING job
-        # tokens were changed in the meantime.
-        name = Name(workflow=workflow,
-                    instance=instance,
-                    job_state=Name.WAITING_STATE)
-        query = Query(namePrefix=name.get_job_state_prefix())
-        request = QueryRequest(queries=[query])
+        # The master makes waiting jobs runnable as soon as their inputs are
+        # satisfied.  Verify that no WAITING job tokens were changed while
+        # checking for runnable jobs.  The queries are sent in a single batch
+        # executed in order.  Token versions change with every modification
+        # so comparing names and versions of waiting jobs is enough.
+        waiting_name = Name(workflow=workflow,
+                            instance=instance,
+                            job_state=Name.WAITING_STATE)
+        waiting_request = QueryRequest(queries=[
+            Query(namePrefix=waiting_name.get_job_state_prefix(),
+                  projection=Projection.NAME)])
+        runnable_name = Name(workflow=workflow,
+                             instance=instance,
+                             job_state=Name.RUNNABLE_STATE)
+        runnable_request = QueryRequest(queries=[
+            Query(namePrefix=runnable_name.get_job_state_prefix())])
+        requests = [waiting_request, runnable_request, waiting_request]
         try:
-            snapshot = Snapshot(self._client, request)
+            responses = self._client.call_many(requests)
         except:
-            LOG.exception('error sending request %s', request)
-            return False
-        if not self._make_runnable(workflow, instance):
-            return False
-        if not self._has_no_runnable_jobs(workflow, instance):
+            LOG.exception('error sending requests %s', requests)
             return False
-        try:
-            return not snapshot.refresh()
-        except:
-            LOG.exception('error sending request %s', request)
+        for response in responses:
+            if isinstance(response, TokenMasterException):
+                LOG.error('error sending requests %s: %s', requests, response)
+                return False
+        waiting_before, runnable, waiting_after = responses
+        assert len(runnable.tokens) == 1
+        if runnable.tokens[0]:
             return False
+        return waiting_before.tokens == waiting_after.tokens
 
     def _process_signals(self, workflow, instance):
         """Process signals for a given workflow instance.
@@ -372,9 +217,90 @@ class Worker(object):
         except TokenMasterException:
             LOG.exception('error sending request %s', request)
 
+    @staticmethod
+    def _get_signal_patterns():
+        """Get patterns of signal token names at all levels."""
+        return [Name().get_signal_prefix(),
+                Name(workflow='*').get_signal_prefix(),
+                Name(workflow='*', instance='*').get_signal_prefix()]
+
+    def _get_blocked_prefixes(self):
+        """Find workflows and instances where jobs should not be executed.
+
+        Aborted instances are archived along the way if they have no running
+        jobs.
+
+        Returns:
+            The list of name prefixes of workflows and instances with signals
+            preventing job execution, or None if signals could not be
+            retrieved.
+        """
+        request = QueryRequest(queries=[
+            Query(namePattern=pattern, projection=Projection.NAME)
+            for pattern in Worker._get_signal_patterns()])
+        try:
+            response = self._client.query(request)
+        except TokenMasterException:
+            LOG.exception('error sending request %s', request)
+            return None
+        blocking_signals = [Signal.action_to_string(action)
+                            for action in Worker._BLOCKING_ACTIONS]
+        abort_signal = Signal.action_to_string(Signal.ABORT)
+        result = []
+        for tokens in response.tokens:
+            for token in tokens:
+                name = Name.from_signal_token_name(token.name)
+                if name.signal not in blocking_signals:
+                    continue
+                if name.instance:
+                    if name.signal == abort_signal:
+                        self._process_signals(name.workflow, name.instance)
+                    result.append(name.get_instance_prefix())
+                elif name.workflow:
+                    result.append(name.get_workflow_prefix())
+                else:
+                    result.append(Name.WORKFLOW_PREFIX)
+        return result
+
+    def _query_and_own_best_runnable_job_token(self):
+        """Attempt to own the highest priority runnable job token.
+
+        Runnable jobs in all workflow instances are considered.  The master
+        indexes them on priority so the claim does not require iterating over
+        workflows and instances.  Workflows and instances where signals
+        prevent job execution are excluded from the claim, so their tokens
+        are never claimed and released.
+        """
+        assert not self._owned_job_token
+        excluded_prefixes = self._get_blocked_prefixes()
+        if excluded_prefixes is None:
+            return
+        query = Query()
+        query.namePattern = Name(
+            job_state=Name.RUNNABLE_STATE).get_job_state_pattern()
+        query.maxTokens = 1
+        request = QueryAndOwnRequest()
+        request.query = query
+        request.expirationTime = time.time() + Worker._LEASE_TIME_SEC
+        request.owner = self._name
+        request.excludedPrefixes = excluded_prefixes
+        try:
+            response = self._client.query_and_own(request)
+        except TokenMasterException:
+            LOG.exception('error sending request %s', request)
+            return
+        if response.tokens:
+            assert len(response.tokens) == 1
+            self._owned_job_token = response.tokens[0]
+
     def _own_runnable_job_token(self):
         """Attempt to own a runnable job token from any workflow."""
         assert not self._owned_job_token
+        self._query_and_own_best_runnable_job_token()
+        if self._owned_job_token:
+            return
+        # Fall back to scanning workflow instances.  The scan processes
+        # signals in instances with no runnable jobs.
         workflow_names = self._inspector.get_workflow_names()
         # Shuffle workflows to address starvation.
         random.shuffle(workflow_names)
@@ -384,101 +310,11 @@ class Worker(object):
             random.shuffle(instances)
             for instance in instances:
                 if self._process_signals(workflow, instance):
-                    self._make_runnable(workflow, instance)
                     self._query_and_own_runnable_job_token(workflow, instance)
                     if self._owned_job_token:
                         return
             time.sleep(Worker._INTER_QUERY_DELAY_SEC)
 
-    def _abort(self):
-        """Abort the running job."""
-        assert self._executor
-        self._executor.abort()
-
-    def _process_abort_signals(self):
-        """Check if the running job should be aborted.
-
-        Returns:
-            False iff the job has been aborted.
-        """
-        name = Name.from_job_token_name(self._owned_job_token.name)
-        abort = False
-        try:
-            signaller = Signaller(self._client, name.workflow, name.instance)
-            abort = signaller.is_action_set(Signal.ABORT)
-        except (TTransport.TTransportException, socket.timeout, socket.error):
-            # We need this exception handler only in logic located in the
-            # Timer thread.  If that thread fails, we should abort the process
-            # and let the main thread decide what to do.
-            LOG.exception('')
-            abort = True
-        if abort:
-            self._abort()
-        return not abort
-
-    def _refresh_job_properties(self):
-        """Record job properties in the master if they changed.
-
-        If there are communication issues with the master, the running job
-        gets aborted.
-
-        Returns:
-            False iff there was an error during communication with the master.
-        """
-        assert self._executor
-        if self._executor.job_dirty:
-            # The ordering here is important - we need to reset the changed
-            # flag before updating the token.
-            self._executor.job_dirty = False
-            self._owned_job_token.data = pickle.dumps(self._executor.job)
-            if not self._update_owned_job_token():
-                self._abort()
-                return False
-        return True
-
-    def _renew_ownership(self):
-        """Periodic job token ownership renewal routine."""
-        assert self._owned_job_token
-
-        if not self._process_abort_signals():
-            return
-
-        if not self._refresh_job_properties():
-            return
-
-        now = time.time()
-        if (self._owned_job_token.expirationTime <
-                now + Worker._LEASE_TIME_SEC / 2):
-            self._owned_job_token.expirationTime = (now +
-                                                    Worker._LEASE_TIME_SEC)
-            if not self._update_owned_job_token():
-                self._abort()
-                return
-
-        with self._lock:
-            if self._lease_renewer:
-                self._lease_renewer = threading.Timer(
-                    Worker._randomized_worker_polling_time(),
-                    self._renew_ownership)
-                self._lease_renewer.start()
-
-    def _start_renew_ownership(self):
-        """Start periodic renewal of the claimed job token ownership."""
-        assert not self._lease_renewer
-        self._lease_renewer = threading.Timer(
-            Worker._randomized_worker_polling_time(),
-            self._renew_ownership)
-        self._lease_renewer.start()
-
-    def _stop_renew_ownership(self):
-        """Stop periodic renewal of the claimed job token ownership."""
-        with self._lock:
-            assert self._lease_renewer
-            self._lease_renewer.cancel()
-            lease_renewer = self._lease_renewer
-            self._lease_renewer = None
-        lease_renewer.join()
-
     def _send_request(self, request):
         """Send a modify request to the master.
 
@@ -625,9 +461,11 @@ class Worker(object):
             self._owned_job_token.data = pickle.dumps(self._executor.job)
             success = self._update_owned_job_token()
             if success:
-                self._start_renew_ownership()
+                self._lease_manager.add(self._owned_job_token, self._executor,
+                                        Worker._LEASE_TIME_SEC)
                 success = self._executor.execute()
-                self._stop_renew_ownership()
+                self._owned_job_token = self._lease_manager.remove(
+                    self._owned_job_token.name)
         if success:
             self._move_job_token_to_waiting(self._executor.job, True)
         elif self._executor.job.retry():
@@ -691,6 +529,42 @@ class Worker(object):
         """Generate random worker polling time."""
         return (1.0 + random.random()) * PinballConfig.WORKER_POLL_TIME_SEC
 
+    @staticmethod
+    def _get_watched_patterns():
+        """Get patterns of tokens whose changes may let the worker run a job.
+
+        Those are runnable job tokens and signals at all levels.
+        """
+        return ([Name(job_state=Name.RUNNABLE_STATE).get_job_state_pattern()] +
+                Worker._get_signal_patterns())
+
+    def _wait_for_workflow_change(self):
+        """Block until workflow tokens change or the polling time elapses.
+
+        Changes are tracked relative to the master version observed in the
+        previous call so nothing that happened in the meantime gets missed.
+        Only changes that may produce a claimable job are of interest.
+        Claims, lease renewals, and updates of owned job tokens are ignored.
+        """
+        deadline = time.time() + Worker._randomized_worker_polling_time()
+        while True:
+            timeout_sec = deadline - time.time()
+            if timeout_sec <= 0:
+                return
+            request = WatchRequest(namePrefixes=Worker._get_watched_patterns(),
+                                   sinceVersion=self._watch_version,
+                                   timeoutMs=int(timeout_sec * 1000),
+                                   ignoreOwned=True)
+            try:
+                response = self._client.watch(request)
+            except TokenMasterException:
+                LOG.exception('error sending request %s', request)
+                time.sleep(timeout_sec)
+                return
+            self._watch_version = response.version
+            if response.changed:
+                return
+
     def run(self):
         """Run the worker."""
         LOG.info('Running worker ' + self._name)
@@ -704,6 +578,10 @@ class Worker(object):
                 self._execute_job()
             elif self._test_only_end_if_no_runnable:
                 return
+            elif signaller.is_action_set(Signal.DRAIN):
+                # A drained worker is interested in signal changes only.
+                signaller.wait_for_change(
+                    Worker._randomized_worker_polling_time())
             else:
-                time.sleep(Worker._randomized_worker_polling_time())
+                self._wait_for_workflow_change()
         LOG.info('Exiting worker ' + self._name)
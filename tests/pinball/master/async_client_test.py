@@ -0,0 +1,86 @@
+# Copyright 2015, Pinterest, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Validation tests for the asynchronous master client."""
+import mock
+import threading
+import unittest
+
+from pinball.master.factory import Factory
+from pinball.master.thrift_lib.ttypes import ModifyRequest
+from pinball.master.thrift_lib.ttypes import Query
+from pinball.master.thrift_lib.ttypes import QueryRequest
+from pinball.master.thrift_lib.ttypes import Token
+from pinball.master.thrift_lib.ttypes import TokenMasterException
+from tests.pinball.persistence.ephemeral_store import EphemeralStore
+
+
+__author__ = 'Pawel Garbacki'
+__copyright__ = 'Copyright 2015, Pinterest, Inc.'
+__credits__ = [__author__]
+__license__ = 'Apache'
+__version__ = '2.0'
+
+
+class AsyncClientTestCase(unittest.TestCase):
+    def setUp(self):
+        self._factory = Factory()
+        self._factory.create_master(EphemeralStore())
+        self._client = self._factory.get_async_client(max_in_flight=4)
+
+    def tearDown(self):
+        self._client.close()
+
+    def test_requests(self):
+        futures = []
+        for i in range(0, 100):
+            futures.append(self._client.modify(ModifyRequest(updates=[
+                Token(name='/some_dir/some_token_%03d' % i)])))
+        names = [future.result().updates[0].name for future in futures]
+        self.assertEqual(['/some_dir/some_token_%03d' % i
+                          for i in range(0, 100)], names)
+
+        response = self._client.query(QueryRequest(queries=[
+            Query(namePrefix='/some_dir/')])).result()
+        self.assertEqual(100, len(response.tokens[0]))
+
+    def test_exception(self):
+        future = self._client.modify(ModifyRequest(updates=[
+            Token(version=1, name='/some_dir/missing')]))
+        self.assertRaises(TokenMasterException, future.result)
+
+    def test_call_many(self):
+        future = self._client.call_many([
+            ModifyRequest(updates=[Token(name='/some_dir/some_token')]),
+            QueryRequest(queries=[Query(namePrefix='/some_dir/')])])
+        modify_response, query_response = future.result()
+        self.assertEqual([modify_response.updates], query_response.tokens)
+
+    def test_done_callback(self):
+        blocker = threading.Event()
+        client = mock.Mock()
+        client.call.side_effect = lambda request: blocker.wait() and 'done'
+        called = threading.Event()
+        with mock.patch.object(self._client, '_client', client):
+            future = self._client.query(QueryRequest())
+            future.add_done_callback(lambda done_future: called.set())
+            self.assertFalse(future.done())
+            self.assertFalse(called.is_set())
+            blocker.set()
+            self.assertEqual('done', future.result())
+            called.wait()
+        # Callbacks added to done futures run right away.
+        callback = mock.Mock()
+        future.add_done_callback(callback)
+        callback.assert_called_once_with(future)
@@ -0,0 +1,104 @@
+# Copyright 2015, Pinterest, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Validation tests for batches of requests."""
+import unittest
+
+from pinball.master.batch import pack_request
+from pinball.master.batch import pack_response
+from pinball.master.batch import unpack_request
+from pinball.master.batch import unpack_response
+from pinball.master.factory import Factory
+from pinball.master.thrift_lib.ttypes import ArchiveRequest
+from pinball.master.thrift_lib.ttypes import ErrorCode
+from pinball.master.thrift_lib.ttypes import GroupRequest
+from pinball.master.thrift_lib.ttypes import ModifyRequest
+from pinball.master.thrift_lib.ttypes import Query
+from pinball.master.thrift_lib.ttypes import QueryRequest
+from pinball.master.thrift_lib.ttypes import QueryResponse
+from pinball.master.thrift_lib.ttypes import Request
+from pinball.master.thrift_lib.ttypes import Response
+from pinball.master.thrift_lib.ttypes import Token
+from pinball.master.thrift_lib.ttypes import TokenMasterException
+from pinball.master.thrift_lib.ttypes import WatchRequest
+from tests.pinball.persistence.ephemeral_store import EphemeralStore
+
+
+__author__ = 'Pawel Garbacki'
+__copyright__ = 'Copyright 2015, Pinterest, Inc.'
+__credits__ = [__author__]
+__license__ = 'Apache'
+__version__ = '2.0'
+
+
+class BatchTestCase(unittest.TestCase):
+    def test_pack_request(self):
+        request = QueryRequest(queries=[Query(namePrefix='/some_dir/')])
+        self.assertEqual(Request(query=request), pack_request(request))
+        self.assertEqual(request, unpack_request(pack_request(request)))
+        self.assertRaises(TokenMasterException, pack_request,
+                          WatchRequest())
+        self.assertRaises(TokenMasterException, unpack_request, Request())
+        self.assertRaises(TokenMasterException, unpack_request,
+                          Request(query=request, group=GroupRequest()))
+
+    def test_pack_response(self):
+        response = QueryResponse(tokens=[[]], version=1)
+        self.assertEqual(Response(query=response), pack_response(response))
+        self.assertEqual(response, unpack_response(pack_response(response)))
+        self.assertIsNone(unpack_response(pack_response(None)))
+        error = TokenMasterException(ErrorCode.NOT_FOUND, 'some message')
+        self.assertEqual(error, unpack_response(Response(error=error)))
+
+
+class CallManyTestCase(unittest.TestCase):
+    def setUp(self):
+        factory = Factory()
+        factory.create_master(EphemeralStore())
+        self._client = factory.get_client()
+
+    def test_call_many(self):
+        token = self._client.modify(ModifyRequest(updates=[
+            Token(name='/some_dir/some_token')])).updates[0]
+        query_request = QueryRequest(queries=[Query(namePrefix='/some_dir/')])
+        # The second modification fails because the token version changed.
+        responses = self._client.call_many([
+            ModifyRequest(updates=[token]),
+            ModifyRequest(updates=[token]),
+            query_request,
+            ArchiveRequest(tokens=[])])
+        self.assertEqual(4, len(responses))
+        updated_token = responses[0].updates[0]
+        self.assertIsInstance(responses[1], TokenMasterException)
+        self.assertEqual(ErrorCode.VERSION_CONFLICT, responses[1].errorCode)
+        self.assertEqual([[updated_token]], responses[2].tokens)
+        self.assertIsNone(responses[3])
+
+    def test_call_many_atomic(self):
+        token = self._client.modify(ModifyRequest(updates=[
+            Token(name='/some_dir/some_token')])).updates[0]
+        query_request = QueryRequest(queries=[Query(namePrefix='/some_dir/')])
+        self.assertRaises(TokenMasterException,
+                          self._client.call_many,
+                          [ModifyRequest(updates=[token]),
+                           ModifyRequest(updates=[token])],
+                          atomic=True)
+        # Nothing changed.
+        self.assertEqual([[token]],
+                         self._client.query(query_request).tokens)
+
+        responses = self._client.call_many(
+            [ModifyRequest(updates=[token]), query_request], atomic=True)
+        self.assertEqual([responses[0].updates],
+                         responses[1].tokens)
@@ -0,0 +1,138 @@
+# Copyright 2015, Pinterest, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Benchmark of master startup time with and without a checkpoint.
+
+Tokens are generated in a sqlite database accessed through the DbStore.  The
+benchmark measures the startup of a master loading all tokens from the
+database, and of a master loading a checkpoint followed by tokens modified
+after the checkpoint.  Each master runs in a separate process.
+
+Usage:
+    python -m tests.pinball.master.checkpoint_benchmark \\
+        [--tokens=<number>] [--modified_tokens=<number>]
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from pinball.config.pinball_config import PinballConfig
+from pinball.master.blessed_version import BlessedVersion
+from pinball.master.master_handler import MasterHandler
+from pinball.master.thrift_lib.ttypes import ModifyRequest
+from pinball.master.thrift_lib.ttypes import Query
+from pinball.master.thrift_lib.ttypes import QueryRequest
+
+
+__author__ = 'Pawel Garbacki'
+__copyright__ = 'Copyright 2015, Pinterest, Inc.'
+__credits__ = [__author__]
+__license__ = 'Apache'
+__version__ = '2.0'
+
+
+def _configure_database(path):
+    database = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': path}
+    PinballConfig.DATABASES = {'default': database,
+                               'pinball.persistence': database}
+
+
+def _generate_tokens(store, num_tokens, data_size):
+    """Insert tokens directly into the database."""
+    from pinball.persistence.models import ActiveTokenModel
+    batch_size = 10000
+    version = 1
+    for start in range(0, num_tokens, batch_size):
+        models = []
+        for i in range(start, min(start + batch_size, num_tokens)):
+            models.append(ActiveTokenModel(
+                version=version,
+                name='/workflow/workflow_%d/%d/job/waiting/job_%d' % (
+                    i / 10000, i / 100, i),
+                priority=i % 10,
+                data='x' * data_size))
+            version += 1
+        ActiveTokenModel.objects.bulk_create(models)
+    store.commit_tokens([BlessedVersion(MasterHandler._BLESSED_VERSION,
+                                        MasterHandler._MASTER_OWNER)])
+
+
+def _start_master(store, checkpoint_path, modified_tokens, results):
+    """Start a master and modify some tokens after writing a checkpoint."""
+    start = time.time()
+    handler = MasterHandler(store, checkpoint_path=checkpoint_path)
+    results.put(time.time() - start)
+    start = time.time()
+    handler.checkpoint()
+    results.put(time.time() - start)
+    if modified_tokens:
+        response = handler.query(QueryRequest(queries=[
+            Query(namePrefix='/workflow/workflow_0/',
+                  maxTokens=modified_tokens)]))
+        handler.modify(ModifyRequest(updates=response.tokens[0]))
+
+
+def _run_master(store, checkpoint_path, modified_tokens):
+    """Run a master in a separate process to simulate its restart."""
+    results = multiprocessing.Queue()
+    process = multiprocessing.Process(
+        target=_start_master,
+        args=(store, checkpoint_path, modified_tokens, results))
+    process.start()
+    startup_sec = results.get()
+    checkpoint_sec = results.get()
+    process.join()
+    return startup_sec, checkpoint_sec
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark master startup time from a checkpoint.')
+    parser.add_argument('--tokens', dest='tokens', type=int, default=1000000,
+                        help='number of generated tokens')
+    parser.add_argument('--modified_tokens', dest='modified_tokens',
+                        type=int, default=1000,
+                        help='number of tokens modified after the checkpoint')
+    parser.add_argument('--data_size', dest='data_size', type=int,
+                        default=100, help='size of token data')
+    options = parser.parse_args(sys.argv[1:])
+
+    directory = tempfile.mkdtemp()
+    try:
+        _configure_database(os.path.join(directory, 'pinball.db'))
+        # Django settings are initialized when the store module is loaded.
+        from pinball.persistence.store import DbStore
+        store = DbStore()
+        _generate_tokens(store, options.tokens, options.data_size)
+
+        # There is no checkpoint yet so all tokens are read from the store.
+        checkpoint_path = os.path.join(directory, 'checkpoint')
+        startup_sec, checkpoint_sec = _run_master(store, checkpoint_path,
+                                                  options.modified_tokens)
+        print 'startup from the store: %.1f sec' % startup_sec
+        print 'checkpoint write: %.1f sec, %d bytes' % (
+            checkpoint_sec, os.path.getsize(checkpoint_path))
+
+        startup_sec, _ = _run_master(store, checkpoint_path, 0)
+        print 'startup from the checkpoint: %.1f sec' % startup_sec
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+# Copyright 2015, Pinterest, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Validation tests for master checkpoint."""
+import os
+import shutil
+import tempfile
+import unittest
+
+from pinball.master.checkpoint import Checkpoint
+from pinball.master.thrift_lib.ttypes import Token
+
+
+__author__ = 'Pawel Garbacki'
+__copyright__ = 'Copyright 2015, Pinterest, Inc.'
+__credits__ = [__author__]
+__license__ = 'Apache'
+__version__ = '2.0'
+
+
+class CheckpointTestCase(unittest.TestCase):
+    def setUp(self):
+        self._dir = tempfile.mkdtemp()
+        self._path = os.path.join(self._dir, 'checkpoint')
+
+    def tearDown(self):
+        shutil.rmtree(self._dir)
+
+    def test_missing(self):
+        self.assertIsNone(Checkpoint(self._path).read())
+
+    def test_write_and_read(self):
+        tokens = [Token(version=1, name='/some_dir/some_token'),
+                  Token(version=2,
+                        name='/some_dir/some_other_token',
+                        owner='some_owner',
+                        expirationTime=10,
+                        priority=1.5,
+                        data='some data')]
+        checkpoint = Checkpoint(self._path)
+        checkpoint.write(2, tokens)
+        self.assertEqual((2, tokens), checkpoint.read())
+        self.assertFalse(os.path.exists('%s.tmp' % self._path))
+
+        checkpoint.remove()
+        self.assertIsNone(checkpoint.read())
+
+    def test_corrupted(self):
+        checkpoint = Checkpoint(self._path)
+        checkpoint.write(1, [Token(version=1, name='/some_dir/some_token')])
+        with open(self._path, 'r+b') as checkpoint_file:
+            checkpoint_file.seek(-1, os.SEEK_END)
+            checkpoint_file.write('\xff')
+        self.assertIsNone(checkpoint.read())
+
+        with open(self._path, 'wb') as checkpoint_file:
+            checkpoint_file.write('PBCKPT')
+        self.assertIsNone(checkpoint.read())
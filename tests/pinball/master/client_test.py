@@ -0,0 +1,101 @@
+# Copyright 2015, Pinterest, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Validation tests for the master client connection pool."""
+import mock
+import threading
+import unittest
+
+from thrift.transport import TTransport
+
+from pinball.master.client import ConnectionPool
+from pinball.master.thrift_lib.ttypes import TokenMasterException
+
+
+__author__ = 'Pawel Garbacki'
+__copyright__ = 'Copyright 2015, Pinterest, Inc.'
+__credits__ = [__author__]
+__license__ = 'Apache'
+__version__ = '2.0'
+
+
+class ConnectionPoolTestCase(unittest.TestCase):
+    def setUp(self):
+        self._connection_patcher = mock.patch(
+            'pinball.master.client._Connection')
+        self._connection_class = self._connection_patcher.start()
+        self._connection_class.side_effect = lambda host, port: mock.Mock()
+        self._pool = ConnectionPool('some_host', 1234, 2)
+
+    def tearDown(self):
+        self._connection_patcher.stop()
+
+    def test_reuse(self):
+        connection = self._pool.acquire()
+        self._pool.release(connection)
+        self.assertEqual(connection, self._pool.acquire())
+        self._connection_class.assert_called_once_with('some_host', 1234)
+
+    def test_unhealthy_connection_is_replaced(self):
+        connection = self._pool.acquire()
+        self._pool.release(connection)
+        connection.is_healthy.return_value = False
+
+        self.assertNotEqual(connection, self._pool.acquire())
+        connection.close.assert_called_once_with()
+        self.assertEqual(1, self._pool._open_connections)
+
+    def test_acquire_blocks_when_pool_is_exhausted(self):
+        first_connection = self._pool.acquire()
+        self._pool.acquire()
+        acquired = []
+        acquirer = threading.Thread(
+            target=lambda: acquired.append(self._pool.acquire()))
+        acquirer.start()
+        acquirer.join(0.1)
+        self.assertTrue(acquirer.is_alive())
+
+        self._pool.release(first_connection)
+        acquirer.join()
+        self.assertEqual([first_connection], acquired)
+        self.assertEqual(2, self._connection_class.call_count)
+
+    def test_broken_connection_is_discarded(self):
+        def fail():
+            with self._pool.connection():
+                raise TTransport.TTransportException()
+        self.assertRaises(TTransport.TTransportException, fail)
+
+        with self._pool.connection():
+            pass
+        self.assertEqual(2, self._connection_class.call_count)
+        self.assertEqual(1, self._pool._open_connections)
+
+    def test_connection_is_kept_on_master_exception(self):
+        def fail():
+            with self._pool.connection():
+                raise TokenMasterException()
+        self.assertRaises(TokenMasterException, fail)
+
+        with self._pool.connection():
+            pass
+        self._connection_class.assert_called_once_with('some_host', 1234)
+
+    def test_failed_connect(self):
+        self._connection_class.side_effect = TTransport.TTransportException()
+        with mock.patch('pinball.master.client.PinballConfig') as config:
+            config.CLIENT_CONNECT_ATTEMPTS = 1
+            self.assertRaises(TTransport.TTransportException,
+                              self._pool.acquire)
+        self.assertEqual(0, self._pool._open_connections)
@@ -0,0 +1,172 @@
+# Copyright 2015, Pinterest, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Benchmark of master throughput under concurrent query and modify load.
+
+The master is served by the thrift TThreadedServer and it persists tokens in
+an ephemeral store simulating the latency of a database commit.  Clients
+connect to it through RemoteClients.
+
+Usage:
+    python -m tests.pinball.master.master_handler_benchmark \\
+        [--serialize_reads] [--wal_path=<path>]
+"""
+import argparse
+import os
+import socket
+import sys
+import threading
+import time
+
+from pinball.master.factory import Factory
+from pinball.master.master_handler import MasterHandler
+from pinball.master.thrift_lib.ttypes import ModifyRequest
+from pinball.master.thrift_lib.ttypes import Query
+from pinball.master.thrift_lib.ttypes import QueryRequest
+from pinball.master.thrift_lib.ttypes import Token
+from pinball.persistence.wal_store import WalStore
+from tests.pinball.persistence.ephemeral_store import EphemeralStore
+
+
+__author__ = 'Pawel Garbacki'
+__copyright__ = 'Copyright 2015, Pinterest, Inc.'
+__credits__ = [__author__]
+__license__ = 'Apache'
+__version__ = '2.0'
+
+
+class _SlowStore(EphemeralStore):
+    """Ephemeral store simulating the latency of database commits."""
+    def __init__(self, commit_latency_sec):
+        super(_SlowStore, self).__init__()
+        self._commit_latency_sec = commit_latency_sec
+
+    def commit_tokens(self, updates=None, deletes=None, renewals=None):
+        time.sleep(self._commit_latency_sec)
+        super(_SlowStore, self).commit_tokens(updates, deletes, renewals)
+
+
+class _SerializedMasterHandler(MasterHandler):
+    """Master handler running all transactions under a single lock."""
+    def _process_request(self, request):
+        transaction = self._create_transaction(request)
+        transaction.prepare(request)
+        with self._lock:
+            with self._trie_lock:
+                response = transaction.commit(
+                    self._trie,
+                    self._trie[MasterHandler._BLESSED_VERSION],
+                    self._store)
+            changed_names = transaction.get_changed_names()
+            if changed_names:
+                self._record_changes(changed_names,
+                                     self._get_owned_names(changed_names))
+            return response
+
+
+def _run_master(handler, port):
+    """Serve the handler in a background thread and wait until it's up."""
+    factory = Factory(master_port=port)
+    factory._master_handler = handler
+    thread = threading.Thread(target=factory.run_master_server)
+    thread.daemon = True
+    thread.start()
+    while True:
+        try:
+            socket.create_connection((socket.gethostname(), port)).close()
+            return
+        except socket.error:
+            time.sleep(0.1)
+
+
+def _modify(client, index, deadline, counts):
+    name = '/benchmark/modify/token_%d' % index
+    token = client.modify(ModifyRequest(updates=[Token(name=name)])).updates[0]
+    count = 0
+    while time.time() < deadline:
+        token.data = str(time.time())
+        token = client.modify(ModifyRequest(updates=[token])).updates[0]
+        count += 1
+    counts.append(count)
+
+
+def _query(client, deadline, counts):
+    request = QueryRequest(queries=[Query(namePrefix='/benchmark/query/')])
+    count = 0
+    while time.time() < deadline:
+        client.query(request)
+        count += 1
+    counts.append(count)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark master query throughput under modify load.')
+    parser.add_argument('--port', dest='port', type=int, default=9191,
+                        help='port to run the master on')
+    parser.add_argument('--modifiers', dest='modifiers', type=int, default=4,
+                        help='number of clients sending modify requests')
+    parser.add_argument('--readers', dest='readers', type=int, default=4,
+                        help='number of clients sending query requests')
+    parser.add_argument('--commit_latency_ms', dest='commit_latency_ms',
+                        type=float, default=20,
+                        help='simulated latency of a store commit')
+    parser.add_argument('--duration_sec', dest='duration_sec', type=float,
+                        default=10, help='duration of the benchmark')
+    parser.add_argument('--serialize_reads', dest='serialize_reads',
+                        action='store_true', default=False,
+                        help='run queries under the writer lock')
+    parser.add_argument('--wal_path', dest='wal_path', default=None,
+                        help='path of the write-ahead log to commit to')
+    options = parser.parse_args(sys.argv[1:])
+
+    store = _SlowStore(options.commit_latency_ms / 1000.)
+    if options.wal_path:
+        store = WalStore(store, options.wal_path)
+    if options.serialize_reads:
+        handler = _SerializedMasterHandler(store)
+    else:
+        handler = MasterHandler(store)
+    tokens = [Token(name='/benchmark/query/token_%d' % i, data='x' * 100)
+              for i in range(0, 100)]
+    handler.modify(ModifyRequest(updates=tokens))
+    _run_master(handler, options.port)
+
+    client_factory = Factory(master_port=options.port)
+    deadline = time.time() + options.duration_sec
+    modify_counts = []
+    query_counts = []
+    threads = []
+    for i in range(0, options.modifiers):
+        threads.append(threading.Thread(
+            target=_modify,
+            args=(client_factory.get_client(), i, deadline, modify_counts)))
+    for _ in range(0, options.readers):
+        threads.append(threading.Thread(
+            target=_query,
+            args=(client_factory.get_client(), deadline, query_counts)))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    print 'modifies per second: %.1f' % (sum(modify_counts) /
+                                         options.duration_sec)
+    print 'queries per second: %.1f' % (sum(query_counts) /
+                                        options.duration_sec)
+    # Server threads serving open connections are not daemonic.
+    os._exit(0)
+
+
+if __name__ == '__main__':
+    main()
@@ -13,17 +13,30 @@
 # limitations under the License.
 
 """Validation tests for master handler."""
+import copy
+import mock
+import os
+import shutil
 import sys
+import tempfile
+import threading
+import time
 import unittest
 
+from pinball.master.batch import pack_request
+from pinball.master.checkpoint import Checkpoint
 from pinball.master.master_handler import MasterHandler
 from pinball.master.thrift_lib.ttypes import ArchiveRequest
+from pinball.master.thrift_lib.ttypes import BatchRequest
 from pinball.master.thrift_lib.ttypes import GroupRequest
 from pinball.master.thrift_lib.ttypes import ModifyRequest
 from pinball.master.thrift_lib.ttypes import Query
 from pinball.master.thrift_lib.ttypes import QueryAndOwnRequest
 from pinball.master.thrift_lib.ttypes import QueryRequest
+from pinball.master.thrift_lib.ttypes import StatsRequest
 from pinball.master.thrift_lib.ttypes import Token
+from pinball.master.thrift_lib.ttypes import WatchRequest
+from pinball.master.token_trie import compile_pattern
 from tests.pinball.persistence.ephemeral_store import EphemeralStore
 
 
@@ -86,3 +99,404 @@ class MasterHandlerTestCase(unittest.TestCase):
         handler = MasterHandler(EphemeralStore())
         response = handler.query_and_own(request)
         self.assertEqual(0, len(response.tokens))
+
+    def test_batch(self):
+        handler = MasterHandler(EphemeralStore())
+        version = handler.watch(WatchRequest()).version
+        token = Token(name='/some_dir/some_token')
+        request = BatchRequest(requests=[
+            pack_request(ModifyRequest(updates=[token])),
+            pack_request(QueryRequest(queries=[
+                Query(namePrefix='/some_dir/')]))],
+            atomic=True)
+        response = handler.batch(request)
+        self.assertEqual(2, len(response.responses))
+        self.assertEqual([response.responses[0].modify.updates],
+                         response.responses[1].query.tokens)
+        # The logic handling the request is tested thoroughly in
+        # transaction tests.  Here we only make sure that changes get
+        # recorded for watchers.
+        request = WatchRequest(namePrefixes=['/some_dir/'],
+                               sinceVersion=version)
+        self.assertTrue(handler.watch(request).changed)
+
+    def test_stats(self):
+        handler = MasterHandler(EphemeralStore())
+        self._insert_token(handler)
+        handler.query(QueryRequest(queries=[Query(namePrefix='/')]))
+        handler.watch(WatchRequest(namePrefixes=['/']))
+
+        metrics = handler.stats(StatsRequest()).metrics
+        for request_type in ('modify', 'query', 'watch'):
+            self.assertEqual(1, metrics[
+                'pinball_master_requests_total{request="%s"}' %
+                request_type])
+        self.assertEqual(1, metrics[
+            'pinball_master_lock_wait_seconds_count{request="modify"}'])
+        self.assertEqual(1, metrics[
+            'pinball_master_execution_seconds_count{request="query"}'])
+        self.assertEqual(1, metrics[
+            'pinball_master_store_write_seconds_count'
+            '{operation="commit_tokens"}'])
+        self.assertLess(0, metrics[
+            'pinball_master_response_bytes_sum{request="query"}'])
+        self.assertEqual(1, metrics[
+            'pinball_master_tokens{prefix="/some_other_dir"}'])
+
+    def test_watch_current_version(self):
+        handler = MasterHandler(EphemeralStore())
+        request = WatchRequest(namePrefixes=['/some_other_dir/'])
+        response = handler.watch(request)
+        self.assertFalse(response.changed)
+        self.assertTrue(response.version)
+
+    def test_watch_timeout(self):
+        handler = MasterHandler(EphemeralStore())
+        version = handler.watch(WatchRequest()).version
+        self._insert_token(handler)
+        request = WatchRequest(namePrefixes=['/some_dir/'],
+                               sinceVersion=version,
+                               timeoutMs=10)
+        response = handler.watch(request)
+        self.assertFalse(response.changed)
+        self.assertLess(version, response.version)
+
+    def test_watch_changed(self):
+        handler = MasterHandler(EphemeralStore())
+        version = handler.watch(WatchRequest()).version
+        token = self._insert_token(handler)
+        request = WatchRequest(namePrefixes=['/some_dir/', '/some_other_dir/'],
+                               sinceVersion=version)
+        response = handler.watch(request)
+        self.assertTrue(response.changed)
+
+        request.sinceVersion = response.version
+        handler.archive(ArchiveRequest(tokens=[token]))
+        response = handler.watch(request)
+        self.assertTrue(response.changed)
+
+        request.sinceVersion = response.version
+        response = handler.watch(request)
+        self.assertFalse(response.changed)
+
+    def test_watch_blocks_until_change(self):
+        handler = MasterHandler(EphemeralStore())
+        version = handler.watch(WatchRequest()).version
+        request = WatchRequest(namePrefixes=['/some_other_dir/'],
+                               sinceVersion=version,
+                               timeoutMs=60 * 1000)
+        responses = []
+        watcher = threading.Thread(
+            target=lambda: responses.append(handler.watch(request)))
+        watcher.start()
+        self._insert_token(handler)
+        watcher.join()
+
+        self.assertEqual(1, len(responses))
+        self.assertTrue(responses[0].changed)
+
+    def test_watch_beyond_change_log(self):
+        handler = MasterHandler(EphemeralStore())
+        version = handler.watch(WatchRequest()).version
+        request = WatchRequest(namePrefixes=['/some_dir/'],
+                               sinceVersion=version - 1)
+        # The version precedes the master startup so the master cannot tell
+        # what changed.
+        self.assertTrue(handler.watch(request).changed)
+
+    def test_watch_pattern(self):
+        handler = MasterHandler(EphemeralStore())
+        version = handler.watch(WatchRequest()).version
+        handler.modify(ModifyRequest(updates=[
+            Token(name='/some_dir/some_token')]))
+        request = WatchRequest(namePrefixes=['/*/some_other_token'],
+                               sinceVersion=version)
+        self.assertFalse(handler.watch(request).changed)
+
+        request.timeoutMs = 60 * 1000
+        responses = []
+        watcher = threading.Thread(
+            target=lambda: responses.append(handler.watch(request)))
+        watcher.start()
+        handler.modify(ModifyRequest(updates=[
+            Token(name='/some_dir/some_other_token')]))
+        watcher.join()
+        self.assertTrue(responses[0].changed)
+
+    def test_watch_reuses_patterns(self):
+        handler = MasterHandler(EphemeralStore())
+        version = handler.watch(WatchRequest()).version
+        request = WatchRequest(namePrefixes=['/*/some_token'],
+                               sinceVersion=version,
+                               timeoutMs=60 * 1000)
+        responses = []
+        handler.watch_async(request, responses.append)
+        with mock.patch('pinball.master.master_handler.compile_pattern',
+                        wraps=compile_pattern) as compile_mock:
+            # The pattern of the waiting watcher is reused.
+            handler.watch_async(request, responses.append)
+            self.assertFalse(compile_mock.called)
+            handler.modify(ModifyRequest(updates=[
+                Token(name='/some_dir/some_token')]))
+            self.assertEqual(2, len(responses))
+            # Patterns of prefixes no longer watched are compiled again.
+            request.sinceVersion = responses[0].version
+            handler.watch_async(request, responses.append)
+            self.assertEqual(1, compile_mock.call_count)
+
+    def test_watch_ignore_owned(self):
+        handler = MasterHandler(EphemeralStore())
+        handler.modify(ModifyRequest(updates=[
+            Token(name='/some_dir/some_token')]))
+        version = handler.watch(WatchRequest()).version
+        query = Query(namePrefix='/some_dir/', maxTokens=1)
+        token = handler.query_and_own(QueryAndOwnRequest(
+            owner='some_owner', expirationTime=sys.maxint,
+            query=query)).tokens[0]
+        request = WatchRequest(namePrefixes=['/some_dir/'],
+                               sinceVersion=version,
+                               ignoreOwned=True)
+        self.assertFalse(handler.watch(request).changed)
+        request.ignoreOwned = False
+        self.assertTrue(handler.watch(request).changed)
+
+        # Releasing the ownership is reported.
+        request.ignoreOwned = True
+        request.timeoutMs = 60 * 1000
+        responses = []
+        watcher = threading.Thread(
+            target=lambda: responses.append(handler.watch(request)))
+        watcher.start()
+        token.owner = None
+        token.expirationTime = None
+        handler.modify(ModifyRequest(updates=[token]))
+        watcher.join()
+        self.assertTrue(responses[0].changed)
+
+    def test_query_since_version(self):
+        handler = MasterHandler(EphemeralStore())
+        version = handler.watch(WatchRequest()).version
+        token = self._insert_token(handler)
+        other_token = handler.modify(ModifyRequest(updates=[
+            Token(name='/some_other_dir/other_token')])).updates[0]
+        query = Query(namePrefix='/some_other_dir/', sinceVersion=version)
+        response = handler.query(QueryRequest(queries=[query]))
+        # Tokens are sorted on name.
+        self.assertEqual([[other_token, token]], response.tokens)
+        self.assertEqual([[]], response.deletedNames)
+        self.assertEqual([True], response.incremental)
+
+        query.sinceVersion = response.version
+        handler.archive(ArchiveRequest(tokens=[token]))
+        other_token = copy.copy(other_token)
+        other_token.data = 'some data'
+        other_token = handler.modify(ModifyRequest(
+            updates=[other_token])).updates[0]
+        response = handler.query(QueryRequest(queries=[query]))
+        self.assertEqual([[other_token]], response.tokens)
+        self.assertEqual([[token.name]], response.deletedNames)
+
+        query.sinceVersion = response.version
+        response = handler.query(QueryRequest(queries=[query]))
+        self.assertEqual([[]], response.tokens)
+        self.assertEqual([[]], response.deletedNames)
+
+        # The version precedes the master startup so all tokens are returned.
+        query.sinceVersion = version - 1
+        response = handler.query(QueryRequest(queries=[query]))
+        self.assertEqual([[other_token]], response.tokens)
+        self.assertEqual([False], response.incremental)
+
+    def test_query_during_store_commit(self):
+        store = EphemeralStore()
+        handler = MasterHandler(store)
+        token = self._insert_token(handler)
+
+        commit_started = threading.Event()
+        commit_released = threading.Event()
+        commit_tokens = store.commit_tokens
+
+        def _blocking_commit_tokens(*args, **kwargs):
+            commit_started.set()
+            commit_released.wait()
+            return commit_tokens(*args, **kwargs)
+
+        store.commit_tokens = _blocking_commit_tokens
+        token = copy.copy(token)
+        token.data = 'some other data'
+        modify_thread = threading.Thread(
+            target=handler.modify, args=(ModifyRequest(updates=[token]),))
+        modify_thread.start()
+        try:
+            commit_started.wait()
+            # The query does not wait for the store and it sees the last
+            # committed state.
+            request = QueryRequest(
+                queries=[Query(namePrefix='/some_other_dir/')])
+            response = handler.query(request)
+            self.assertEqual('some data', response.tokens[0][0].data)
+        finally:
+            commit_released.set()
+            modify_thread.join()
+        response = handler.query(request)
+        self.assertEqual('some other data', response.tokens[0][0].data)
+
+    def test_watch_lease_expiry(self):
+        store = EphemeralStore()
+        handler = MasterHandler(store)
+        token = Token(name='/some_dir/some_token', owner='some_owner',
+                      expirationTime=time.time() + 60)
+        handler.modify(ModifyRequest(updates=[token]))
+        version = handler.watch(WatchRequest()).version
+        request = WatchRequest(namePrefixes=['/some_dir/'],
+                               sinceVersion=version)
+        handler._expire_leases()
+        self.assertFalse(handler.watch(request).changed)
+
+        token = Token(name='/some_dir/some_other_token', owner='some_owner',
+                      expirationTime=time.time() - 1)
+        handler.modify(ModifyRequest(updates=[token]))
+        version = handler.watch(WatchRequest()).version
+        request.sinceVersion = version
+        self.assertFalse(handler.watch(request).changed)
+
+        handler._expire_leases()
+        response = handler.watch(request)
+        self.assertTrue(response.changed)
+        self.assertLess(version, response.version)
+        blessed_version = store.read_active_tokens(
+            name_prefix=MasterHandler._BLESSED_VERSION)[0]
+        self.assertEqual(response.version, blessed_version.version)
+
+    def test_lease_expiry_during_store_commit(self):
+        store = EphemeralStore()
+        handler = MasterHandler(store)
+        token = Token(name='/some_dir/some_token', owner='some_owner',
+                      expirationTime=time.time() - 1)
+        handler.modify(ModifyRequest(updates=[token]))
+        version = handler.query(QueryRequest(queries=[])).version
+
+        commit_started = threading.Event()
+        commit_released = threading.Event()
+        commit_tokens = store.commit_tokens
+
+        def _blocking_commit_tokens(*args, **kwargs):
+            commit_started.set()
+            commit_released.wait()
+            return commit_tokens(*args, **kwargs)
+
+        store.commit_tokens = _blocking_commit_tokens
+        expirer = threading.Thread(target=handler._expire_leases)
+        expirer.start()
+        try:
+            commit_started.wait()
+            # The version advanced by the expiry is not exposed before it is
+            # persisted and the expired token is in the change log.
+            self.assertEqual(version,
+                             handler.query(QueryRequest(queries=[])).version)
+        finally:
+            commit_released.set()
+            expirer.join()
+        response = handler.query(QueryRequest(queries=[
+            Query(namePrefix='/some_dir/', sinceVersion=version)]))
+        self.assertLess(version, response.version)
+        self.assertEqual([[]], response.deletedNames)
+        request = WatchRequest(namePrefixes=['/some_dir/'],
+                               sinceVersion=version)
+        self.assertTrue(handler.watch(request).changed)
+
+    def _get_token_names(self, handler):
+        response = handler.group(GroupRequest(namePrefix='/'))
+        return sorted(response.counts.keys())
+
+    def test_load_from_checkpoint(self):
+        checkpoint_dir = tempfile.mkdtemp()
+        try:
+            checkpoint_path = os.path.join(checkpoint_dir, 'checkpoint')
+            store = EphemeralStore()
+            handler = MasterHandler(store, checkpoint_path=checkpoint_path)
+            tokens = handler.modify(ModifyRequest(updates=[
+                Token(name='/some_dir/token_%d' % i, data='data %d' % i)
+                for i in range(0, 4)])).updates
+            handler.checkpoint()
+
+            updated_token = copy.copy(tokens[0])
+            updated_token.data = 'some other data'
+            new_token = Token(name='/some_dir/new_token')
+            handler.modify(ModifyRequest(updates=[updated_token, new_token],
+                                         deletes=[tokens[1]]))
+            handler.archive(ArchiveRequest(tokens=[tokens[2]]))
+
+            # Tokens in the store which are not in the checkpoint are
+            # ignored unless they changed after the checkpoint.
+            store._active_tokens['/some_dir/token_3'].data = 'ignored data'
+
+            handler = MasterHandler(store, checkpoint_path=checkpoint_path)
+            self.assertEqual(['/__BLESSED_VERSION__',
+                              '/some_dir/new_token',
+                              '/some_dir/token_0',
+                              '/some_dir/token_3'],
+                             self._get_token_names(handler))
+            response = handler.query(QueryRequest(queries=[
+                Query(namePrefix='/some_dir/token_')]))
+            self.assertEqual(['some other data', 'data 3'],
+                             [token.data for token in response.tokens[0]])
+        finally:
+            shutil.rmtree(checkpoint_dir)
+
+    def test_checkpoint_concurrent_with_writers(self):
+        checkpoint_dir = tempfile.mkdtemp()
+        try:
+            checkpoint_path = os.path.join(checkpoint_dir, 'checkpoint')
+            store = EphemeralStore()
+            handler = MasterHandler(store, checkpoint_path=checkpoint_path)
+            tokens = handler.modify(ModifyRequest(updates=[
+                Token(name='/some_dir/token_%d' % i, data='data %d' % i)
+                for i in range(0, 4)])).updates
+            copy_tokens_chunk = handler._copy_tokens_chunk
+
+            def _copy_and_modify(cursor):
+                items = copy_tokens_chunk(cursor)
+                if cursor == '/some_dir/token_1':
+                    # Modify tokens both before and after the cursor.
+                    updated_token = copy.copy(tokens[3])
+                    updated_token.data = 'some other data'
+                    handler.modify(ModifyRequest(
+                        updates=[updated_token,
+                                 Token(name='/some_dir/new_token')],
+                        deletes=[tokens[0]]))
+                return items
+
+            with mock.patch.object(MasterHandler, '_CHECKPOINT_CHUNK_SIZE',
+                                   1):
+                handler._copy_tokens_chunk = _copy_and_modify
+                handler.checkpoint()
+
+            version, checkpointed_tokens = Checkpoint(checkpoint_path).read()
+            self.assertEqual(handler.watch(WatchRequest()).version, version)
+            response = handler.query(QueryRequest(queries=[
+                Query(namePrefix='/')]))
+            self.assertEqual(
+                sorted((token.name, token.version, token.data)
+                       for token in response.tokens[0]),
+                sorted((token.name, token.version, token.data)
+                       for token in checkpointed_tokens))
+        finally:
+            shutil.rmtree(checkpoint_dir)
+
+    def test_discard_checkpoint_ahead_of_store(self):
+        checkpoint_dir = tempfile.mkdtemp()
+        try:
+            checkpoint_path = os.path.join(checkpoint_dir, 'checkpoint')
+            handler = MasterHandler(EphemeralStore(),
+                                    checkpoint_path=checkpoint_path)
+            self._insert_token(handler)
+            handler.checkpoint()
+
+            handler = MasterHandler(EphemeralStore(),
+                                    checkpoint_path=checkpoint_path)
+            self.assertEqual(['/__BLESSED_VERSION__'],
+                             self._get_token_names(handler))
+            self.assertIsNone(Checkpoint(checkpoint_path).read())
+        finally:
+            shutil.rmtree(checkpoint_dir)
@@ -0,0 +1,81 @@
+# Copyright 2015, Pinterest, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Validation tests for the master request recorder."""
+import gzip
+import os
+import shutil
+import tempfile
+import unittest
+
+from pinball.master.master_handler import MasterHandler
+from pinball.master.recorder import read_recording
+from pinball.master.recorder import RecordingHandler
+from pinball.master.thrift_lib.ttypes import ModifyRequest
+from pinball.master.thrift_lib.ttypes import Query
+from pinball.master.thrift_lib.ttypes import QueryRequest
+from pinball.master.thrift_lib.ttypes import Token
+from pinball.master.thrift_lib.ttypes import WatchRequest
+from tests.pinball.persistence.ephemeral_store import EphemeralStore
+
+
+__author__ = 'Pawel Garbacki'
+__copyright__ = 'Copyright 2015, Pinterest, Inc.'
+__credits__ = [__author__]
+__license__ = 'Apache'
+__version__ = '2.0'
+
+
+class RecordingHandlerTestCase(unittest.TestCase):
+    def setUp(self):
+        self._dir = tempfile.mkdtemp()
+        self._path = os.path.join(self._dir, 'recording')
+
+    def tearDown(self):
+        shutil.rmtree(self._dir)
+
+    def test_record(self):
+        handler = MasterHandler(EphemeralStore())
+        token = handler.modify(ModifyRequest(updates=[
+            Token(name='/some_dir/some_token', data='some_data')])).updates[0]
+        recorder = RecordingHandler(handler, self._path)
+        requests = [
+            ModifyRequest(updates=[Token(name='/some_dir/other_token')]),
+            QueryRequest(queries=[Query(namePrefix='/some_dir/')]),
+            WatchRequest(namePrefixes=['/some_dir/'])]
+        recorder.modify(requests[0])
+        self.assertEqual(2, len(recorder.query(requests[1]).tokens[0]))
+        recorder.watch(requests[2])
+        recorder.close()
+
+        _, tokens, records = read_recording(self._path)
+        self.assertTrue(token in tokens)
+        records = list(records)
+        self.assertEqual(requests, [request for _offset, request in records])
+        offsets = [offset for offset, _request in records]
+        self.assertEqual(sorted(offsets), offsets)
+
+    def test_truncated_recording(self):
+        handler = MasterHandler(EphemeralStore())
+        recorder = RecordingHandler(handler, self._path)
+        for i in range(0, 10):
+            recorder.modify(ModifyRequest(updates=[
+                Token(name='/some_dir/some_token_%d' % i)]))
+        recorder.close()
+        # Simulate a torn write at the end of the recording.
+        with gzip.open(self._path, 'ab') as recording:
+            recording.write('\x04\x00\x00')
+
+        _, _, records = read_recording(self._path)
+        self.assertEqual(10, len(list(records)))
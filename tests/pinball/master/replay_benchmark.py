@@ -0,0 +1,273 @@
+# Copyright 2015, Pinterest, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Benchmark replaying requests recorded by a production master.
+
+A master handler persisting tokens in an ephemeral store is loaded with the
+tokens from the snapshot at the start of the recording.  Recorded requests
+are then sent to it by a pool of threads at the recorded pace, sped up by a
+given factor, or as fast as the handler accepts them.  Watches are handled
+asynchronously so they do not occupy the threads.  The latency of a request
+is measured from the time it was due, so that requests delayed by a
+saturated master are accounted for.
+
+Versions of tokens in the replayed master differ from those in the recording.
+Token versions in requests are replaced with the most recent versions of the
+tokens seen in responses, and since versions are replaced with the most
+recent master version.  Lease expiration times are shifted to the replay
+time and scaled with the speed.
+
+Usage:
+    python -m tests.pinball.master.replay_benchmark \\
+        --recording_path=<path> [--speed=<1|10|max>] [--threads=64]
+
+Recordings are produced by a master with PinballConfig.MASTER_RECORD_PATH
+set.
+"""
+import argparse
+import collections
+import Queue
+import sys
+import threading
+import time
+
+from pinball.master.master_handler import MasterHandler
+from pinball.master.recorder import read_recording
+from pinball.master.stats import get_request_type
+from pinball.master.thrift_lib.ttypes import Lease
+from pinball.master.thrift_lib.ttypes import ModifyRequest
+from pinball.master.thrift_lib.ttypes import Token
+from pinball.master.thrift_lib.ttypes import TokenMasterException
+from pinball.master.thrift_lib.ttypes import WatchRequest
+from tests.pinball.persistence.ephemeral_store import EphemeralStore
+
+
+__author__ = 'Pawel Garbacki'
+__copyright__ = 'Copyright 2015, Pinterest, Inc.'
+__credits__ = [__author__]
+__license__ = 'Apache'
+__version__ = '2.0'
+
+
+_PERCENTILES = (50, 90, 99, 99.9)
+
+
+def _iter_structs(value):
+    """Iterate over thrift structs nested in a value."""
+    values = [value]
+    while values:
+        value = values.pop()
+        if isinstance(value, list):
+            values.extend(value)
+        elif hasattr(value, 'thrift_spec'):
+            yield value
+            values.extend(value.__dict__.itervalues())
+
+
+class _Translator(object):
+    """Translator of recorded requests to the state of the replayed master.
+    """
+    def __init__(self, start_time, speed):
+        """Create a translator.
+
+        Args:
+            start_time: The start time of the recording.
+            speed: The replay speed-up factor or None if requests are
+                replayed as fast as possible.
+        """
+        self._start_time = start_time
+        self._speed = speed
+        # The time corresponding to the start time of the recording.
+        self.replay_start_time = time.time()
+        self._lock = threading.Lock()
+        # Mapping from token name to the most recent version of the token.
+        self._versions = {}
+        # The most recent version of the master.
+        self._version = None
+
+    def _translate_time(self, recorded_time):
+        elapsed_time = recorded_time - self._start_time
+        if self._speed:
+            elapsed_time /= self._speed
+        return int(self.replay_start_time + elapsed_time)
+
+    def translate(self, request):
+        """Translate a request in place."""
+        with self._lock:
+            for struct in _iter_structs(request):
+                if isinstance(struct, (Token, Lease)):
+                    if (struct.version is not None and
+                            struct.name in self._versions):
+                        struct.version = self._versions[struct.name]
+                    if struct.expirationTime:
+                        struct.expirationTime = self._translate_time(
+                            struct.expirationTime)
+                elif getattr(struct, 'sinceVersion', None) is not None:
+                    struct.sinceVersion = self._version
+
+    def observe(self, response):
+        """Record versions of tokens and the master in a response."""
+        with self._lock:
+            for struct in _iter_structs(response):
+                if isinstance(struct, Token):
+                    if struct.version is not None:
+                        self._versions[struct.name] = struct.version
+                elif getattr(struct, 'version', None) is not None:
+                    self._version = max(self._version, struct.version)
+
+
+class _Results(object):
+    """Latencies and failures of replayed requests."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Mapping from request type to the list of latencies in seconds.
+        self.latencies = collections.defaultdict(list)
+        # Mapping from request type to the number of failed requests.
+        self.failures = collections.defaultdict(int)
+        # The number of watches waiting for a response.
+        self.pending_watches = 0
+
+    def add_watch(self):
+        with self._lock:
+            self.pending_watches += 1
+
+    def add(self, request_type, latency_sec, failed=False):
+        with self._lock:
+            self.latencies[request_type].append(latency_sec)
+            if failed:
+                self.failures[request_type] += 1
+            if request_type == 'watch':
+                self.pending_watches -= 1
+
+
+def _load_tokens(handler, tokens, translator):
+    """Insert tokens from the recording snapshot into the master."""
+    tokens = [token for token in tokens
+              if token.name != MasterHandler._BLESSED_VERSION]
+    for token in tokens:
+        token.version = None
+    translator.translate(ModifyRequest(updates=tokens))
+    translator.observe(handler.modify(ModifyRequest(updates=tokens)))
+    translator.observe(handler.watch(WatchRequest()))
+
+
+def _run_sender(handler, requests, translator, results):
+    while True:
+        item = requests.get()
+        if item is None:
+            return
+        due_time, request = item
+        translator.translate(request)
+        request_type = get_request_type(request)
+        if isinstance(request, WatchRequest):
+            def _callback(response, due_time=due_time):
+                results.add('watch', time.time() - due_time)
+            results.add_watch()
+            handler.watch_async(request, _callback)
+            continue
+        try:
+            response = getattr(handler, request_type)(request)
+            translator.observe(response)
+            failed = False
+        except TokenMasterException:
+            failed = True
+        results.add(request_type, time.time() - due_time, failed)
+
+
+def _get_percentile(sorted_values, percentile):
+    index = int(round(percentile / 100. * (len(sorted_values) - 1)))
+    return sorted_values[index]
+
+
+def _print_latencies(name, latencies, failures):
+    latencies = sorted(latencies)
+    print '%-14s %8d %8d %s %9.2f' % (
+        name, len(latencies), failures,
+        ' '.join('%9.2f' % (1000 * _get_percentile(latencies, percentile))
+                 for percentile in _PERCENTILES),
+        1000 * latencies[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Replay requests recorded by a master.')
+    parser.add_argument('--recording_path', dest='recording_path',
+                        required=True, help='path of the recording file')
+    parser.add_argument('--speed', dest='speed', default='1',
+                        help='replay speed-up factor, e.g., 1 or 10, or '
+                             '"max" to send requests as fast as possible')
+    parser.add_argument('--threads', dest='threads', type=int, default=64,
+                        help='number of threads sending requests')
+    options = parser.parse_args(sys.argv[1:])
+    speed = None if options.speed == 'max' else float(options.speed)
+
+    start_time, tokens, records = read_recording(options.recording_path)
+    handler = MasterHandler(EphemeralStore())
+    translator = _Translator(start_time, speed)
+    _load_tokens(handler, tokens, translator)
+    print 'loaded %d tokens' % len(tokens)
+
+    # With the maximum speed, a request is due once a thread is available
+    # to send it.
+    requests = Queue.Queue(options.threads if speed is None else 0)
+    results = _Results()
+    threads = []
+    for _ in range(0, options.threads):
+        thread = threading.Thread(
+            target=_run_sender,
+            args=(handler, requests, translator, results))
+        thread.daemon = True
+        threads.append(thread)
+        thread.start()
+    replay_start_time = time.time()
+    translator.replay_start_time = replay_start_time
+    for offset, request in records:
+        if speed is None:
+            requests.put((time.time(), request))
+            continue
+        due_time = replay_start_time + offset / speed
+        delay = due_time - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        requests.put((due_time, request))
+    for _ in threads:
+        requests.put(None)
+    for thread in threads:
+        thread.join()
+    duration_sec = time.time() - replay_start_time
+    # Pending watches get their responses within the watch timeout cap.
+    while results.pending_watches:
+        time.sleep(0.1)
+
+    all_latencies = []
+    for latencies in results.latencies.values():
+        all_latencies.extend(latencies)
+    if not all_latencies:
+        print 'no requests replayed'
+        return
+    print 'replayed %d requests in %.1f sec: %.1f requests per second' % (
+        len(all_latencies), duration_sec, len(all_latencies) / duration_sec)
+    print '%-14s %8s %8s %s %9s' % (
+        'request', 'count', 'failed',
+        ' '.join('%9s' % ('p%g ms' % percentile)
+                 for percentile in _PERCENTILES),
+        'max ms')
+    for request_type in sorted(results.latencies):
+        _print_latencies(request_type, results.latencies[request_type],
+                         results.failures[request_type])
+    _print_latencies('all', all_latencies, sum(results.failures.values()))
+
+
+if __name__ == '__main__':
+    main()
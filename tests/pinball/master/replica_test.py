@@ -0,0 +1,104 @@
+# Copyright 2015, Pinterest, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Validation tests for the master replica."""
+import unittest
+
+from pinball.master.client import LocalClient
+from pinball.master.master_handler import MasterHandler
+from pinball.master.replica import Replica
+from pinball.master.thrift_lib.ttypes import GroupRequest
+from pinball.master.thrift_lib.ttypes import ModifyRequest
+from pinball.master.thrift_lib.ttypes import Query
+from pinball.master.thrift_lib.ttypes import QueryRequest
+from pinball.master.thrift_lib.ttypes import Token
+from pinball.master.thrift_lib.ttypes import TokenMasterException
+from tests.pinball.persistence.ephemeral_store import EphemeralStore
+
+
+__author__ = 'Pawel Garbacki'
+__copyright__ = 'Copyright 2015, Pinterest, Inc.'
+__credits__ = [__author__]
+__license__ = 'Apache'
+__version__ = '2.0'
+
+
+class ReplicaTestCase(unittest.TestCase):
+    def setUp(self):
+        self._store = EphemeralStore()
+        self._leader = MasterHandler(self._store)
+        self._replica = Replica(LocalClient(self._leader), self._store)
+
+    def _modify(self, updates=None, deletes=None):
+        return self._leader.modify(ModifyRequest(updates=updates,
+                                                 deletes=deletes)).updates
+
+    def _query(self, handler):
+        return handler.query(QueryRequest(queries=[
+            Query(namePrefix='/some_dir/')])).tokens[0]
+
+    def test_replicate(self):
+        tokens = self._modify(updates=[Token(name='/some_dir/some_token'),
+                                       Token(name='/some_dir/other_token')])
+        self._replica.replicate()
+        self.assertEqual(self._query(self._leader),
+                         self._query(self._replica))
+
+        # Changes are applied incrementally.
+        self._modify(updates=[Token(name='/some_dir/new_token')],
+                     deletes=[tokens[0]])
+        self._replica.replicate()
+        self.assertEqual(self._query(self._leader),
+                         self._query(self._replica))
+        self.assertEqual(self._leader._get_version(),
+                         self._replica.get_version())
+
+        response = self._replica.group(GroupRequest(namePrefix='/some_dir/'))
+        self.assertEqual({'/some_dir/other_token': 1,
+                          '/some_dir/new_token': 1}, response.counts)
+
+    def test_resync(self):
+        self._modify(updates=[Token(name='/some_dir/some_token')])
+        self._replica.replicate()
+        # The leader no longer has changes since the replicated version in
+        # its log.
+        self._replica._version = 0
+        self._replica._trie['/some_dir/stale_token'] = Token(
+            name='/some_dir/stale_token')
+
+        self._replica.replicate()
+
+        self.assertEqual(self._query(self._leader),
+                         self._query(self._replica))
+
+    def test_reject_writes(self):
+        self._replica.replicate()
+        self.assertRaises(TokenMasterException, self._replica.modify,
+                          ModifyRequest(updates=[
+                              Token(name='/some_dir/some_token')]))
+
+    def test_promote(self):
+        self._modify(updates=[Token(name='/some_dir/some_token')])
+        self._replica.replicate()
+        # The change is durable in the store but not replicated.
+        self._modify(updates=[Token(name='/some_dir/other_token')])
+        expected_tokens = self._query(self._leader)
+
+        self._replica.promote()
+
+        self.assertEqual(expected_tokens, self._query(self._replica))
+        tokens = self._replica.modify(ModifyRequest(updates=[
+            Token(name='/some_dir/new_token')])).updates
+        self.assertLess(max(token.version for token in expected_tokens),
+                        tokens[0].version)
@@ -0,0 +1,314 @@
+# Copyright 2015, Pinterest, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Benchmark of master scalability with the number of client connections.
+
+The master runs in a separate process with the server type selected on the
+command line.  Clients keep their connections open and periodically send
+query requests, mimicking idle workers polling the master.  Thousands of
+clients are simulated in a single event loop rather than thousands of threads
+so that the benchmark itself does not dominate the cost.
+
+Usage:
+    python -m tests.pinball.master.server_benchmark \\
+        --server_type=<threaded|nonblocking> [--clients=5000]
+"""
+import argparse
+import errno
+import heapq
+import multiprocessing
+import random
+import resource
+import select
+import socket
+import struct
+import sys
+import time
+
+from thrift.Thrift import TMessageType
+from thrift.protocol import TBinaryProtocol
+from thrift.transport import TTransport
+
+from pinball.config.pinball_config import PinballConfig
+from pinball.master.factory import Factory
+from pinball.master.master_handler import MasterHandler
+from pinball.master.thrift_lib.TokenMasterService import query_args
+from pinball.master.thrift_lib.TokenMasterService import query_result
+from pinball.master.thrift_lib.ttypes import ModifyRequest
+from pinball.master.thrift_lib.ttypes import Query
+from pinball.master.thrift_lib.ttypes import QueryRequest
+from pinball.master.thrift_lib.ttypes import Token
+from tests.pinball.persistence.ephemeral_store import EphemeralStore
+
+
+__author__ = 'Pawel Garbacki'
+__copyright__ = 'Copyright 2015, Pinterest, Inc.'
+__credits__ = [__author__]
+__license__ = 'Apache'
+__version__ = '2.0'
+
+
+_FRAME_HEADER = struct.Struct('!i')
+
+
+def _raise_file_limit(files):
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < files:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(files, hard), hard))
+
+
+def _run_master(server_type, port, threads):
+    PinballConfig.MASTER_SERVER_TYPE = server_type
+    PinballConfig.MASTER_SERVER_THREADS = threads
+    handler = MasterHandler(EphemeralStore())
+    tokens = [Token(name='/benchmark/token_%d' % i, data='x' * 100)
+              for i in range(0, 100)]
+    handler.modify(ModifyRequest(updates=tokens))
+    factory = Factory(master_port=port)
+    factory._master_handler = handler
+    factory.run_master_server()
+
+
+def _get_process_status(pid):
+    """Read the thread count and resident memory of a process."""
+    status = {}
+    with open('/proc/%d/status' % pid) as status_file:
+        for line in status_file:
+            key, value = line.split(':', 1)
+            status[key] = value.strip()
+    return status.get('Threads'), status.get('VmRSS')
+
+
+def _serialize_request(framed):
+    otransport = TTransport.TMemoryBuffer()
+    oprot = TBinaryProtocol.TBinaryProtocol(otransport)
+    oprot.writeMessageBegin('query', TMessageType.CALL, 0)
+    request = QueryRequest(queries=[Query(namePrefix='/benchmark/',
+                                          maxTokens=10)])
+    query_args(request=request).write(oprot)
+    oprot.writeMessageEnd()
+    message = otransport.getvalue()
+    if framed:
+        return _FRAME_HEADER.pack(len(message)) + message
+    return message
+
+
+def _pop_response(data, framed):
+    """Remove the first complete response from the received data.
+
+    Returns:
+        Tuple (response found, remaining data).
+    """
+    if framed:
+        if len(data) < _FRAME_HEADER.size:
+            return False, data
+        length, = _FRAME_HEADER.unpack_from(data)
+        end = _FRAME_HEADER.size + length
+        if len(data) < end:
+            return False, data
+        return True, data[end:]
+    # Without framing the only way to find the end of a message is to parse
+    # it.
+    itransport = TTransport.TMemoryBuffer(data)
+    iprot = TBinaryProtocol.TBinaryProtocol(itransport)
+    try:
+        iprot.readMessageBegin()
+        query_result().read(iprot)
+        iprot.readMessageEnd()
+    except EOFError:
+        return False, data
+    return True, data[itransport._buffer.tell():]
+
+
+class _Client(object):
+    def __init__(self, index):
+        self.index = index
+        self.socket = None
+        self.input = ''
+        self.sent_time = None
+
+
+class _LoadGenerator(object):
+    """Event loop simulating many clients with long-lived connections."""
+    def __init__(self, host, port, clients, think_time_sec, framed):
+        self._host = host
+        self._port = port
+        self._think_time_sec = think_time_sec
+        self._framed = framed
+        self._request = _serialize_request(framed)
+        self._clients = [_Client(i) for i in range(0, clients)]
+        self._poller = select.epoll()
+        # Mapping from file descriptor to client.
+        self._connections = {}
+        # Heap of tuples (time, client index) of requests to send.
+        self._schedule = []
+        self._measuring = False
+        self.latencies = []
+        self.failures = 0
+
+    def _connect(self, client):
+        client.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        client.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        client.socket.connect((self._host, self._port))
+        client.socket.setblocking(False)
+        self._connections[client.socket.fileno()] = client
+        self._poller.register(client.socket.fileno(), select.EPOLLIN)
+
+    def connect(self):
+        """Open connections of all clients.
+
+        Returns:
+            The number of connected clients.
+        """
+        connected = 0
+        for client in self._clients:
+            try:
+                self._connect(client)
+                connected += 1
+            except socket.error:
+                client.socket = None
+                self.failures += 1
+        return connected
+
+    def _schedule_request(self, client, now):
+        delay = random.uniform(0, 2 * self._think_time_sec)
+        heapq.heappush(self._schedule, (now + delay, client.index))
+
+    def _send(self, client, now):
+        client.sent_time = now
+        try:
+            client.socket.sendall(self._request)
+        except socket.error:
+            self._close(client)
+
+    def _close(self, client):
+        self.failures += 1
+        self._poller.unregister(client.socket.fileno())
+        del self._connections[client.socket.fileno()]
+        client.socket.close()
+        client.socket = None
+
+    def _read(self, client, now):
+        try:
+            data = client.socket.recv(64 * 1024)
+        except socket.error as e:
+            if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                return
+            self._close(client)
+            return
+        if not data:
+            self._close(client)
+            return
+        client.input += data
+        found, client.input = _pop_response(client.input, self._framed)
+        if found:
+            if self._measuring:
+                self.latencies.append(now - client.sent_time)
+            client.sent_time = None
+            self._schedule_request(client, now)
+
+    def run(self, warm_up_sec, duration_sec):
+        """Send requests until the benchmark is over."""
+        now = time.time()
+        for client in self._clients:
+            if client.socket:
+                self._schedule_request(client, now)
+        measure_time = now + warm_up_sec
+        end_time = measure_time + duration_sec
+        while now < end_time:
+            if not self._measuring and now >= measure_time:
+                self._measuring = True
+            while self._schedule and self._schedule[0][0] <= now:
+                _, index = heapq.heappop(self._schedule)
+                client = self._clients[index]
+                if client.socket:
+                    self._send(client, now)
+            timeout = end_time - now
+            if self._schedule:
+                timeout = min(timeout, self._schedule[0][0] - now)
+            for fileno, _ in self._poller.poll(max(timeout, 0)):
+                client = self._connections.get(fileno)
+                if client:
+                    self._read(client, time.time())
+            now = time.time()
+
+
+def _get_percentile(sorted_values, percentile):
+    index = int(len(sorted_values) * percentile / 100.)
+    return sorted_values[min(index, len(sorted_values) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark master latency with many client connections.')
+    parser.add_argument('--server_type', dest='server_type',
+                        default='nonblocking',
+                        choices=['threaded', 'nonblocking'],
+                        help='type of the master server')
+    parser.add_argument('--server_threads', dest='server_threads', type=int,
+                        default=PinballConfig.MASTER_SERVER_THREADS,
+                        help='number of threads of the nonblocking server')
+    parser.add_argument('--port', dest='port', type=int, default=9191,
+                        help='port to run the master on')
+    parser.add_argument('--clients', dest='clients', type=int, default=5000,
+                        help='number of concurrent client connections')
+    parser.add_argument('--think_time_ms', dest='think_time_ms', type=float,
+                        default=5000,
+                        help='average time between requests of a client')
+    parser.add_argument('--warm_up_sec', dest='warm_up_sec', type=float,
+                        default=10, help='time before measurements start')
+    parser.add_argument('--duration_sec', dest='duration_sec', type=float,
+                        default=30, help='duration of the measurements')
+    options = parser.parse_args(sys.argv[1:])
+
+    # Both the master and the clients need a descriptor per connection.
+    _raise_file_limit(options.clients + 1024)
+    master = multiprocessing.Process(
+        target=_run_master,
+        args=(options.server_type, options.port, options.server_threads))
+    master.daemon = True
+    master.start()
+    host = socket.gethostname()
+    while True:
+        try:
+            socket.create_connection((host, options.port)).close()
+            break
+        except socket.error:
+            time.sleep(0.1)
+
+    generator = _LoadGenerator(host, options.port, options.clients,
+                               options.think_time_ms / 1000.,
+                               options.server_type == 'nonblocking')
+    start_time = time.time()
+    connected = generator.connect()
+    print 'connected clients: %d in %.1f sec' % (connected,
+                                                 time.time() - start_time)
+    generator.run(options.warm_up_sec, options.duration_sec)
+    threads, rss = _get_process_status(master.pid)
+    master.terminate()
+
+    latencies = sorted(generator.latencies)
+    print 'failed connections: %d' % generator.failures
+    print 'requests per second: %.1f' % (len(latencies) /
+                                         options.duration_sec)
+    if latencies:
+        print 'latency p50: %.1f ms, p99: %.1f ms, max: %.1f ms' % (
+            1000 * _get_percentile(latencies, 50),
+            1000 * _get_percentile(latencies, 99),
+            1000 * latencies[-1])
+    print 'master threads: %s, resident memory: %s' % (threads, rss)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+# Copyright 2015, Pinterest, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Validation tests for the non-blocking master server."""
+import mock
+import socket
+import threading
+import time
+import unittest
+
+from pinball.config.pinball_config import PinballConfig
+from pinball.master.client import ConnectionPool
+from pinball.master.client import RemoteClient
+from pinball.master.master_handler import MasterHandler
+from pinball.master.server import NonblockingServer
+from pinball.master.thrift_lib.ttypes import ModifyRequest
+from pinball.master.thrift_lib.ttypes import Query
+from pinball.master.thrift_lib.ttypes import QueryRequest
+from pinball.master.thrift_lib.ttypes import Token
+from pinball.master.thrift_lib.ttypes import TokenMasterException
+from pinball.master.thrift_lib.ttypes import WatchRequest
+from pinball.master.wire import CompressingHandler
+from tests.pinball.persistence.ephemeral_store import EphemeralStore
+
+
+__author__ = 'Pawel Garbacki'
+__copyright__ = 'Copyright 2015, Pinterest, Inc.'
+__credits__ = [__author__]
+__license__ = 'Apache'
+__version__ = '2.0'
+
+
+class NonblockingServerTestCase(unittest.TestCase):
+    _CONFIG = {'MASTER_SERVER_TYPE': 'nonblocking'}
+
+    def setUp(self):
+        self._config_patcher = mock.patch.multiple(PinballConfig,
+                                                   **self._CONFIG)
+        self._config_patcher.start()
+        probe = socket.socket()
+        probe.bind(('', 0))
+        self._port = probe.getsockname()[1]
+        probe.close()
+        self._handler = MasterHandler(EphemeralStore())
+        handler = self._handler
+        if PinballConfig.MASTER_DATA_COMPRESSION:
+            handler = CompressingHandler(handler)
+        self._server = NonblockingServer(handler, self._port, threads=2)
+        self._thread = threading.Thread(target=self._server.serve)
+        self._thread.start()
+
+    def tearDown(self):
+        self._config_patcher.stop()
+        self._server.stop()
+        self._thread.join()
+
+    def _get_client(self):
+        return RemoteClient('localhost', self._port)
+
+    def test_requests(self):
+        client = self._get_client()
+        token = client.modify(ModifyRequest(updates=[
+            Token(name='/some_dir/some_token',
+                  data='some_data')])).updates[0]
+        self.assertEqual('some_data', token.data)
+        response = client.query(QueryRequest(queries=[
+            Query(namePrefix='/some_dir/')]))
+        self.assertEqual([[token]], response.tokens)
+        # Exceptions are passed to the client.
+        self.assertRaises(TokenMasterException, client.modify,
+                          ModifyRequest(updates=[
+                              Token(version=1, name='/some_dir/missing')]))
+
+    def test_watchers_do_not_occupy_threads(self):
+        version = self._get_client().watch(WatchRequest()).version
+        request = WatchRequest(namePrefixes=['/some_dir/'],
+                               sinceVersion=version,
+                               timeoutMs=60 * 1000)
+        responses = []
+        watchers = []
+        # There are more watchers than threads executing requests.
+        for _ in range(0, 5):
+            client = self._get_client()
+            watcher = threading.Thread(
+                target=lambda client=client: responses.append(
+                    client.watch(request)))
+            watcher.start()
+            watchers.append(watcher)
+        # Wait until all watchers are registered.
+        while len(self._handler._watch_deadlines) < len(watchers):
+            threading.Event().wait(0.01)
+
+        self._get_client().modify(ModifyRequest(updates=[
+            Token(name='/some_dir/some_token')]))
+        for watcher in watchers:
+            watcher.join()
+        self.assertEqual(5, len(responses))
+        for response in responses:
+            self.assertTrue(response.changed)
+
+
+class CompactCompressedServerTestCase(NonblockingServerTestCase):
+    _CONFIG = {'MASTER_SERVER_TYPE': 'nonblocking',
+               'MASTER_PROTOCOL': 'compact',
+               'MASTER_DATA_COMPRESSION': 'zlib'}
+
+
+class PooledServerTestCase(NonblockingServerTestCase):
+    _CONFIG = {'MASTER_SERVER_TYPE': 'nonblocking',
+               'CLIENT_POOLED_WATCH_TIMEOUT_MS': 100}
+
+    def setUp(self):
+        super(PooledServerTestCase, self).setUp()
+        self._pool = ConnectionPool('localhost', self._port, 6)
+
+    def tearDown(self):
+        self._pool.close()
+        super(PooledServerTestCase, self).tearDown()
+
+    def _get_client(self):
+        return RemoteClient('localhost', self._port, self._pool)
+
+    def test_watch_is_split(self):
+        client = self._get_client()
+        version = client.watch(WatchRequest()).version
+        start = time.time()
+        response = client.watch(WatchRequest(namePrefixes=['/some_dir/'],
+                                             sinceVersion=version,
+                                             timeoutMs=500))
+        self.assertFalse(response.changed)
+        self.assertLessEqual(0.4, time.time() - start)
+        # The watch went through a single connection.
+        self.assertEqual(1, self._pool._open_connections)
@@ -0,0 +1,358 @@
+# Copyright 2015, Pinterest, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Validation tests for the client of sharded masters."""
+import mock
+import multiprocessing
+import socket
+import threading
+import time
+import unittest
+
+from pinball.config.pinball_config import PinballConfig
+from pinball.master.client import iter_tokens
+from pinball.master.factory import Factory
+from pinball.master.master_handler import MasterHandler
+from pinball.master.server import NonblockingServer
+from pinball.master.sharded_client import ShardedClient
+from pinball.master.sharded_client import VersionVectors
+from pinball.master.sharded_client import get_prefix_shards
+from pinball.master.sharded_client import get_shard
+from pinball.master.thrift_lib.ttypes import GroupRequest
+from pinball.master.thrift_lib.ttypes import ModifyRequest
+from pinball.master.thrift_lib.ttypes import Query
+from pinball.master.thrift_lib.ttypes import QueryAndOwnRequest
+from pinball.master.thrift_lib.ttypes import QueryRequest
+from pinball.master.thrift_lib.ttypes import StatsRequest
+from pinball.master.thrift_lib.ttypes import Token
+from pinball.master.thrift_lib.ttypes import TokenMasterException
+from pinball.master.thrift_lib.ttypes import WatchRequest
+from tests.pinball.persistence.ephemeral_store import EphemeralStore
+
+
+__author__ = 'Pawel Garbacki'
+__copyright__ = 'Copyright 2015, Pinterest, Inc.'
+__credits__ = [__author__]
+__license__ = 'Apache'
+__version__ = '2.0'
+
+
+_NUM_SHARDS = 3
+
+
+def _get_workflow(shard):
+    """Find a workflow whose tokens live in a given shard."""
+    i = 0
+    while get_shard('/workflow/workflow_%d/' % i, _NUM_SHARDS) != shard:
+        i += 1
+    return 'workflow_%d' % i
+
+
+def _serve_shard(port):
+    NonblockingServer(MasterHandler(EphemeralStore()), port,
+                      threads=2).serve()
+
+
+class LocalShards(object):
+    """Masters owning shards of tokens running in local processes."""
+
+    def __init__(self, num_shards):
+        self._num_shards = num_shards
+        self._processes = []
+        self.addresses = []
+
+    @staticmethod
+    def _get_free_port():
+        probe = socket.socket()
+        probe.bind(('', 0))
+        port = probe.getsockname()[1]
+        probe.close()
+        return port
+
+    @staticmethod
+    def _wait_for_server(port):
+        while True:
+            try:
+                socket.create_connection(('localhost', port)).close()
+                return
+            except socket.error:
+                time.sleep(0.01)
+
+    def start(self):
+        for _ in range(0, self._num_shards):
+            port = LocalShards._get_free_port()
+            process = multiprocessing.Process(target=_serve_shard,
+                                              args=(port,))
+            process.daemon = True
+            process.start()
+            self._processes.append(process)
+            self.addresses.append('localhost:%d' % port)
+        for address in self.addresses:
+            LocalShards._wait_for_server(int(address.split(':')[1]))
+
+    def stop(self):
+        for process in self._processes:
+            process.terminate()
+            process.join()
+
+
+class RoutingTestCase(unittest.TestCase):
+    def test_get_shard(self):
+        workflow = _get_workflow(1)
+        self.assertEqual(1, get_shard('/workflow/%s/123/job/waiting/some_job'
+                                      % workflow, _NUM_SHARDS))
+        self.assertEqual(1, get_shard('/schedule/workflow/%s' % workflow,
+                                      _NUM_SHARDS))
+        self.assertEqual(0, get_shard('/some_dir/some_token', _NUM_SHARDS))
+
+    def test_get_prefix_shards(self):
+        workflow = _get_workflow(2)
+        self.assertEqual([2], get_prefix_shards('/workflow/%s/' % workflow,
+                                                _NUM_SHARDS))
+        self.assertEqual([2], get_prefix_shards(
+            '/workflow/%s/*/job/runnable/' % workflow, _NUM_SHARDS))
+        # Prefixes not ending with the workflow delimiter may match other
+        # workflows.
+        self.assertEqual([0, 1, 2], get_prefix_shards(
+            '/workflow/%s' % workflow, _NUM_SHARDS))
+        self.assertEqual([0, 1, 2], get_prefix_shards('/workflow/',
+                                                      _NUM_SHARDS))
+        self.assertEqual([0, 1, 2], get_prefix_shards('/', _NUM_SHARDS))
+        self.assertEqual([0, 1, 2], get_prefix_shards(
+            '/workflow/*/*/job/runnable/', _NUM_SHARDS))
+        self.assertEqual([0, 1, 2], get_prefix_shards('/schedule/',
+                                                      _NUM_SHARDS))
+        self.assertEqual([0], get_prefix_shards('/some_dir/', _NUM_SHARDS))
+
+
+class ShardedClientTestCase(unittest.TestCase):
+    def setUp(self):
+        self._shard_clients = []
+        for _ in range(0, _NUM_SHARDS):
+            factory = Factory()
+            factory.create_master(EphemeralStore())
+            self._shard_clients.append(factory.get_client())
+        self._client = ShardedClient(self._shard_clients, VersionVectors())
+
+    def _post_tokens(self, shard, count=2):
+        workflow = _get_workflow(shard)
+        tokens = [Token(name='/workflow/%s/123/job/runnable/job_%d' % (
+            workflow, i), priority=i) for i in range(0, count)]
+        return self._client.modify(ModifyRequest(updates=tokens)).updates
+
+    def test_modify(self):
+        tokens = self._post_tokens(1)
+        # Tokens are stored in the owning shard only.
+        for shard, shard_client in enumerate(self._shard_clients):
+            response = shard_client.query(QueryRequest(queries=[
+                Query(namePrefix='/workflow/')]))
+            self.assertEqual(tokens if shard == 1 else [],
+                             response.tokens[0])
+
+        self.assertRaises(TokenMasterException, self._client.modify,
+                          ModifyRequest(updates=[
+                              Token(name='/workflow/%s/some_token' %
+                                    _get_workflow(0)),
+                              Token(name='/workflow/%s/some_token' %
+                                    _get_workflow(2))]))
+
+    def test_query(self):
+        tokens = []
+        for shard in range(0, _NUM_SHARDS):
+            tokens.extend(self._post_tokens(shard))
+        tokens.sort(key=lambda token: token.name.split('/'))
+
+        response = self._client.query(QueryRequest(queries=[
+            Query(namePrefix='/workflow/'),
+            Query(namePrefix='/workflow/%s/' % _get_workflow(2))]))
+        self.assertEqual(tokens, response.tokens[0])
+        self.assertEqual(
+            [token for token in tokens
+             if token.name.startswith('/workflow/%s/' % _get_workflow(2))],
+            response.tokens[1])
+
+        self.assertEqual(tokens, list(iter_tokens(
+            self._client, Query(namePrefix='/workflow/'), page_size=4)))
+
+    def test_query_max_tokens(self):
+        # The shard with the best token comes last in the order of names.
+        shards = sorted(range(0, _NUM_SHARDS), key=_get_workflow)
+        self._post_tokens(shards[0], count=3)
+        best_token = self._post_tokens(shards[-1], count=4)[-1]
+        response = self._client.query(QueryRequest(queries=[
+            Query(namePattern='/workflow/*/*/job/runnable/', maxTokens=2)]))
+        self.assertEqual([3, 2], [token.priority
+                                  for token in response.tokens[0]])
+        self.assertEqual(best_token, response.tokens[0][0])
+        # Ties are broken on names.
+        self.assertEqual(_get_workflow(shards[0]),
+                         response.tokens[0][1].name.split('/')[2])
+
+    def test_query_since_version(self):
+        self._post_tokens(0)
+        response = self._client.query(QueryRequest(queries=[
+            Query(namePrefix='/workflow/')]))
+        self.assertEqual(2, len(response.tokens[0]))
+
+        tokens = self._post_tokens(2, count=1)
+        response = self._client.query(QueryRequest(queries=[
+            Query(namePrefix='/workflow/',
+                  sinceVersion=response.version)]))
+        self.assertEqual([tokens], response.tokens)
+        self.assertEqual([True], response.incremental)
+
+        # Unknown versions result in all tokens.
+        response = self._client.query(QueryRequest(queries=[
+            Query(namePrefix='/workflow/', sinceVersion=-1)]))
+        self.assertEqual(3, len(response.tokens[0]))
+        self.assertEqual([False], response.incremental)
+
+    def test_group(self):
+        self._post_tokens(0)
+        self._post_tokens(1, count=3)
+        response = self._client.group(GroupRequest(namePrefix='/workflow/',
+                                                   groupSuffix='/'))
+        self.assertEqual({'/workflow/%s' % _get_workflow(0): 2,
+                          '/workflow/%s' % _get_workflow(1): 3},
+                         response.counts)
+
+    def test_query_and_own(self):
+        self._post_tokens(0)
+        self._post_tokens(2)
+        request = QueryAndOwnRequest(
+            owner='some_owner',
+            expirationTime=int(time.time()) + 100,
+            query=Query(namePattern='/workflow/*/*/job/runnable/',
+                        maxTokens=3))
+        self.assertEqual(3, len(self._client.query_and_own(request).tokens))
+        self.assertEqual(1, len(self._client.query_and_own(request).tokens))
+        self.assertEqual([], self._client.query_and_own(request).tokens)
+
+    def test_query_and_own_best_tokens(self):
+        # The shard with the best token comes last in the order of names.
+        shards = sorted(range(0, _NUM_SHARDS), key=_get_workflow)
+        self._post_tokens(shards[0], count=3)
+        self._post_tokens(shards[-1], count=4)
+        request = QueryAndOwnRequest(
+            owner='some_owner',
+            expirationTime=int(time.time()) + 100,
+            query=Query(namePattern='/workflow/*/*/job/runnable/',
+                        maxTokens=1))
+        for priority in [3, 2]:
+            tokens = self._client.query_and_own(request).tokens
+            self.assertEqual([priority], [token.priority for token in tokens])
+            self.assertEqual('some_owner', tokens[0].owner)
+
+        request.query.maxTokens = 3
+        tokens = self._client.query_and_own(request).tokens
+        self.assertEqual([2, 1, 1], sorted(
+            [token.priority for token in tokens], reverse=True))
+
+        # Dry runs do not claim tokens.
+        request.dryRun = True
+        tokens = self._client.query_and_own(request).tokens
+        self.assertEqual([0, 0], [token.priority for token in tokens])
+        self.assertEqual([None, None], [token.owner for token in tokens])
+        request.dryRun = None
+        self.assertEqual(2, len(self._client.query_and_own(request).tokens))
+
+    def test_watch(self):
+        version = self._client.watch(WatchRequest()).version
+        response = self._client.watch(WatchRequest(
+            namePrefixes=['/workflow/'], sinceVersion=version, timeoutMs=0))
+        self.assertFalse(response.changed)
+
+        self._post_tokens(1)
+        response = self._client.watch(WatchRequest(
+            namePrefixes=['/workflow/'], sinceVersion=response.version))
+        self.assertTrue(response.changed)
+        response = self._client.watch(WatchRequest(
+            namePrefixes=['/workflow/'], sinceVersion=response.version,
+            timeoutMs=10))
+        self.assertFalse(response.changed)
+
+    def test_watch_shards_in_parallel(self):
+        version = self._client.watch(WatchRequest()).version
+        request = WatchRequest(namePrefixes=['/workflow/'],
+                               sinceVersion=version, timeoutMs=5000)
+        watch = self._client._watch_clients[0].watch
+        with mock.patch.object(self._client._watch_clients[0], 'watch',
+                               wraps=watch) as watch_mock:
+            poster = threading.Timer(0.1, self._post_tokens,
+                                     args=(_NUM_SHARDS - 1,))
+            poster.start()
+            start = time.time()
+            response = self._client.watch(request)
+            poster.join()
+            # The change is noticed while other shards are blocked.
+            self.assertTrue(response.changed)
+            self.assertLess(time.time() - start, 2)
+
+            # The watch of the first shard still pending is reused.
+            request.sinceVersion = response.version
+            request.timeoutMs = 10
+            self.assertFalse(self._client.watch(request).changed)
+            self.assertEqual(
+                1, len([call for call in watch_mock.call_args_list
+                        if call[0][0].timeoutMs]))
+
+    def test_batch(self):
+        responses = self._client.call_many([
+            ModifyRequest(updates=[Token(name='/workflow/%s/some_token' %
+                                         _get_workflow(1))]),
+            ModifyRequest(updates=[Token(name='/workflow/%s/some_token' %
+                                         _get_workflow(2))]),
+            ModifyRequest(updates=[Token(version=1,
+                                         name='/workflow/missing')])])
+        self.assertEqual(1, len(responses[0].updates))
+        self.assertEqual(1, len(responses[1].updates))
+        self.assertTrue(isinstance(responses[2], TokenMasterException))
+
+        self.assertRaises(TokenMasterException, self._client.call_many, [
+            ModifyRequest(updates=[Token(name='/workflow/%s/other_token' %
+                                         _get_workflow(1))]),
+            ModifyRequest(updates=[Token(name='/workflow/%s/other_token' %
+                                         _get_workflow(2))])], atomic=True)
+
+    def test_stats(self):
+        self._post_tokens(1)
+
+        metrics = self._client.stats(StatsRequest()).metrics
+        self.assertEqual(2, metrics[
+            'pinball_master_tokens{shard="1",prefix="/workflow"}'])
+        self.assertEqual(1, metrics[
+            'pinball_master_requests_total{shard="1",request="modify"}'])
+        for shard in range(0, _NUM_SHARDS):
+            self.assertTrue('pinball_master_version{shard="%d"}' % shard
+                            in metrics)
+
+
+class MultiProcessShardedClientTestCase(ShardedClientTestCase):
+    """Tests of masters owning shards running in separate processes."""
+
+    def setUp(self):
+        # Shards are served by the non-blocking server which expects framed
+        # messages.
+        self._config_patcher = mock.patch.object(
+            PinballConfig, 'MASTER_SERVER_TYPE', 'nonblocking')
+        self._config_patcher.start()
+        self._shards = LocalShards(_NUM_SHARDS)
+        self._shards.start()
+        factory = Factory(shards=self._shards.addresses)
+        self._client = factory.get_client()
+        self._shard_clients = self._client._clients
+
+    def tearDown(self):
+        self._shards.stop()
+        self._config_patcher.stop()
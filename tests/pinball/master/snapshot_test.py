@@ -0,0 +1,83 @@
+# Copyright 2015, Pinterest, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Validation tests for snapshot."""
+import mock
+import unittest
+
+from pinball.master.factory import Factory
+from pinball.master.snapshot import Snapshot
+from pinball.master.thrift_lib.ttypes import ModifyRequest
+from pinball.master.thrift_lib.ttypes import Query
+from pinball.master.thrift_lib.ttypes import QueryRequest
+from pinball.master.thrift_lib.ttypes import Token
+from tests.pinball.persistence.ephemeral_store import EphemeralStore
+
+
+__author__ = 'Pawel Garbacki'
+__copyright__ = 'Copyright 2015, Pinterest, Inc.'
+__credits__ = [__author__]
+__license__ = 'Apache'
+__version__ = '2.0'
+
+
+class SnapshotTestCase(unittest.TestCase):
+    def setUp(self):
+        factory = Factory()
+        factory.create_master(EphemeralStore())
+        self._client = factory.get_client()
+
+    def _insert_token(self, name):
+        request = ModifyRequest(updates=[Token(name=name)])
+        self._client.modify(request)
+
+    def test_refresh(self):
+        request = QueryRequest(queries=[Query(namePrefix='/some_dir/')])
+        snapshot = Snapshot(self._client, request)
+        self.assertFalse(snapshot.refresh())
+
+        self._insert_token('/some_other_dir/some_token')
+        self.assertFalse(snapshot.refresh())
+
+        self._insert_token('/some_dir/some_token')
+        self.assertTrue(snapshot.refresh())
+        self.assertFalse(snapshot.refresh())
+
+    def test_refresh_skips_query_if_nothing_changed(self):
+        request = QueryRequest(queries=[Query(namePrefix='/some_dir/')])
+        snapshot = Snapshot(self._client, request)
+        with mock.patch.object(self._client, 'query') as query_mock:
+            self.assertFalse(snapshot.refresh())
+        self.assertFalse(query_mock.called)
+
+    def test_refresh_incrementally(self):
+        request = QueryRequest(queries=[Query(namePrefix='/some_dir/')])
+        self._insert_token('/some_dir/some_token')
+        snapshot = Snapshot(self._client, request)
+        tokens = snapshot.get_tokens()
+        self.assertEqual(['/some_dir/some_token'],
+                         [token.name for token in tokens[0]])
+
+        self._insert_token('/some_dir/some_other_token')
+        self._client.modify(ModifyRequest(deletes=tokens[0]))
+        with mock.patch.object(self._client, 'query',
+                               wraps=self._client.query) as query_mock:
+            self.assertTrue(snapshot.refresh())
+        self.assertEqual(1, query_mock.call_count)
+        # Only changes since the previous refresh are retrieved.
+        query = query_mock.call_args[0][0].queries[0]
+        self.assertIsNotNone(query.sinceVersion)
+        self.assertEqual(['/some_dir/some_other_token'],
+                         [token.name for token in snapshot.get_tokens()[0]])
+        self.assertFalse(snapshot.refresh())
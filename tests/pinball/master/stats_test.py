@@ -0,0 +1,92 @@
+# Copyright 2015, Pinterest, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Validation tests for master metrics."""
+import unittest
+
+from pinball.master.stats import format_text
+from pinball.master.stats import get_request_type
+from pinball.master.stats import get_response_size
+from pinball.master.stats import Histogram
+from pinball.master.stats import MasterStats
+from pinball.master.thrift_lib.ttypes import QueryAndOwnRequest
+from pinball.master.thrift_lib.ttypes import QueryResponse
+from pinball.master.thrift_lib.ttypes import Token
+
+
+__author__ = 'Pawel Garbacki'
+__copyright__ = 'Copyright 2015, Pinterest, Inc.'
+__credits__ = [__author__]
+__license__ = 'Apache'
+__version__ = '2.0'
+
+
+class StatsTestCase(unittest.TestCase):
+    def test_get_request_type(self):
+        self.assertEqual('query_and_own',
+                         get_request_type(QueryAndOwnRequest()))
+
+    def test_get_response_size(self):
+        response = QueryResponse(tokens=[[Token(version=1, name='/a',
+                                                data='abc')]],
+                                 deletedNames=[['/bc']])
+        self.assertEqual(8, get_response_size(response))
+
+    def test_histogram(self):
+        histogram = Histogram((1, 10))
+        for value in (0.5, 1, 5, 100):
+            histogram.observe(value)
+        self.assertEqual(
+            [('some_metric_bucket{request="query",le="1"}', 2),
+             ('some_metric_bucket{request="query",le="10"}', 3),
+             ('some_metric_bucket{request="query",le="+Inf"}', 4),
+             ('some_metric_sum{request="query"}', 106.5),
+             ('some_metric_count{request="query"}', 4)],
+            histogram.get_samples('some_metric', (('request', 'query'),)))
+
+    def test_get_samples(self):
+        stats = MasterStats()
+        labels = (('request', 'query'),)
+        stats.increment('pinball_master_requests_total', labels)
+        stats.increment('pinball_master_requests_total', labels)
+        stats.observe('pinball_master_request_latency_seconds', 0.01, labels)
+        samples = stats.get_samples([('pinball_master_version', (), 5)])
+        self.assertEqual(
+            2, samples['pinball_master_requests_total{request="query"}'])
+        self.assertEqual(
+            1, samples['pinball_master_request_latency_seconds_count'
+                       '{request="query"}'])
+        self.assertEqual(5, samples['pinball_master_version'])
+
+    def test_format_text(self):
+        histogram = Histogram((0.5, 5, 10))
+        histogram.observe(1)
+        samples = dict(histogram.get_samples(
+            'pinball_master_lock_wait_seconds', ()))
+        samples['pinball_master_version'] = 5
+        self.assertEqual(
+            '# HELP pinball_master_lock_wait_seconds Time transactions '
+            'waited for the master locks.\n'
+            '# TYPE pinball_master_lock_wait_seconds histogram\n'
+            'pinball_master_lock_wait_seconds_bucket{le="0.5"} 0.0\n'
+            'pinball_master_lock_wait_seconds_bucket{le="5"} 1.0\n'
+            'pinball_master_lock_wait_seconds_bucket{le="10"} 1.0\n'
+            'pinball_master_lock_wait_seconds_bucket{le="+Inf"} 1.0\n'
+            'pinball_master_lock_wait_seconds_count 1.0\n'
+            'pinball_master_lock_wait_seconds_sum 1.0\n'
+            '# HELP pinball_master_version The blessed version of the '
+            'master.\n'
+            '# TYPE pinball_master_version gauge\n'
+            'pinball_master_version 5.0\n',
+            format_text(samples))
@@ -0,0 +1,115 @@
+# Copyright 2015, Pinterest, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Benchmark of the token trie memory use and throughput against pytrie.
+
+A synthetic tree of job tokens is loaded into each implementation in a
+separate process.  The memory reported is the growth of the process peak
+resident set size while the tokens get inserted.
+
+Usage:
+    python -m tests.pinball.master.token_trie_benchmark [--tokens=<number>]
+"""
+import argparse
+import multiprocessing
+import resource
+import sys
+import time
+
+import pytrie
+
+from pinball.master.thrift_lib.ttypes import Token
+from pinball.master.token_trie import TokenTrie
+
+
+__author__ = 'Pawel Garbacki'
+__copyright__ = 'Copyright 2015, Pinterest, Inc.'
+__credits__ = [__author__]
+__license__ = 'Apache'
+__version__ = '2.0'
+
+
+_IMPLEMENTATIONS = {'pytrie': pytrie.StringTrie, 'token_trie': TokenTrie}
+
+
+def _generate_tokens(num_tokens):
+    """Generate job tokens of 100 workflows with 100 jobs per instance."""
+    tokens = []
+    for i in range(0, num_tokens):
+        state = 'waiting' if i % 3 else 'runnable'
+        name = '/workflow/workflow_%d/%d/job/%s/job_%d' % (
+            i / 100 % 100, i / 10000, state, i % 100)
+        tokens.append(Token(version=i, name=name, priority=i % 10,
+                            data='x' * 100))
+    return tokens
+
+
+def _get_max_rss_kb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _run(implementation, num_tokens, results):
+    tokens = _generate_tokens(num_tokens)
+    names = [token.name for token in tokens]
+    prefixes = sorted(set(name[:name.find('/job/') + 1] for name in names))
+    assert len(set(names)) == len(names)
+    result = {}
+
+    start_rss_kb = _get_max_rss_kb()
+    start = time.time()
+    trie = _IMPLEMENTATIONS[implementation]()
+    for token in tokens:
+        trie[token.name] = token
+    result['insert'] = len(tokens) / (time.time() - start)
+    result['memory_mb'] = (_get_max_rss_kb() - start_rss_kb) / 1024.
+
+    start = time.time()
+    for name in names:
+        trie.get(name)
+    result['get'] = len(names) / (time.time() - start)
+
+    start = time.time()
+    for prefix in prefixes:
+        trie.values(prefix)
+    result['instance values'] = len(prefixes) / (time.time() - start)
+
+    start = time.time()
+    for name in names:
+        del trie[name]
+    result['delete'] = len(names) / (time.time() - start)
+    results.put(result)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the token trie against pytrie.')
+    parser.add_argument('--tokens', dest='tokens', type=int, default=1000000,
+                        help='number of generated tokens')
+    options = parser.parse_args(sys.argv[1:])
+
+    for implementation in sorted(_IMPLEMENTATIONS.keys()):
+        results = multiprocessing.Queue()
+        process = multiprocessing.Process(
+            target=_run, args=(implementation, options.tokens, results))
+        process.start()
+        result = results.get()
+        process.join()
+        print '%s:' % implementation
+        print '    memory: %.0f MB' % result['memory_mb']
+        for operation in ['insert', 'get', 'instance values', 'delete']:
+            print '    %s: %.0f per second' % (operation, result[operation])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,261 @@
+# Copyright 2015, Pinterest, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Validation tests for the token trie."""
+import pickle
+import random
+import unittest
+
+from pinball.master.thrift_lib.ttypes import Token
+from pinball.master.token_trie import PatternIndex
+from pinball.master.token_trie import TokenTrie
+
+
+__author__ = 'Pawel Garbacki'
+__copyright__ = 'Copyright 2015, Pinterest, Inc.'
+__credits__ = [__author__]
+__license__ = 'Apache'
+__version__ = '2.0'
+
+
+class PatternIndexTestCase(unittest.TestCase):
+    def test_matches(self):
+        index = PatternIndex('/workflow/*/*/job/runnable/')
+        self.assertEqual('/workflow/', index.prefix)
+        self.assertTrue(
+            index.matches('/workflow/some_workflow/123/job/runnable/some_job'))
+        self.assertFalse(
+            index.matches('/workflow/some_workflow/123/job/waiting/some_job'))
+        self.assertFalse(
+            index.matches('/workflow/some_workflow/job/runnable/some_job'))
+        self.assertFalse(
+            index.matches('/workflow//123/job/runnable/some_job'))
+
+    def test_get_unowned_tokens(self):
+        index = PatternIndex('/some_dir/')
+        for i in range(0, 5):
+            index.add(Token(version=i, name='/some_dir/token_%d' % i,
+                            priority=i))
+        index.add(Token(version=10, name='/some_dir/token_4', priority=4,
+                        owner='some_owner', expirationTime=100))
+        index.add(Token(version=11, name='/some_dir/token_3', priority=3,
+                        owner='some_owner', expirationTime=200))
+        index.remove('/some_dir/token_2')
+
+        tokens = index.get_unowned_tokens(None, 50)
+        self.assertEqual(['/some_dir/token_1', '/some_dir/token_0'],
+                         [token.name for token in tokens])
+
+        # Ownership of token_4 has expired.
+        tokens = index.get_unowned_tokens(2, 150)
+        self.assertEqual(['/some_dir/token_4', '/some_dir/token_1'],
+                         [token.name for token in tokens])
+        self.assertEqual(3, len(index.get_unowned_tokens(None, 150)))
+
+    def test_get_unowned_tokens_excluded_prefixes(self):
+        index = PatternIndex('/some_dir/*/')
+        for i in range(0, 3):
+            index.add(Token(version=i, name='/some_dir/a/token_%d' % i,
+                            priority=10 + i))
+            index.add(Token(version=i, name='/some_dir/b/token_%d' % i,
+                            priority=i))
+
+        tokens = index.get_unowned_tokens(2, 0, ['/some_dir/a/'])
+        self.assertEqual(['/some_dir/b/token_2', '/some_dir/b/token_1'],
+                         [token.name for token in tokens])
+        # Excluded tokens remain in the index.
+        tokens = index.get_unowned_tokens(1, 0)
+        self.assertEqual(['/some_dir/a/token_2'],
+                         [token.name for token in tokens])
+        self.assertEqual(6, len(index.get_unowned_tokens(None, 0)))
+
+
+class TokenTrieTestCase(unittest.TestCase):
+    def test_index_maintenance(self):
+        trie = TokenTrie()
+        trie['/a/b/c'] = Token(version=1, name='/a/b/c', priority=1)
+        self.assertIsNone(trie.find_index('/a/*/'))
+        index = trie.get_index('/a/*/')
+        self.assertIs(index, trie.get_index('/a/*/'))
+        self.assertIs(index, trie.find_index('/a/*/'))
+        self.assertIsNone(trie.find_index('/a/*/b/'))
+        self.assertEqual(['/a/b/c'],
+                         [token.name for token in index.get_tokens()])
+
+        trie['/a/d/e'] = Token(version=2, name='/a/d/e', priority=2)
+        trie['/a/f'] = Token(version=3, name='/a/f', priority=3)
+        self.assertEqual(['/a/d/e', '/a/b/c'],
+                         [token.name for token in
+                          index.get_unowned_tokens(None, 0)])
+
+        del trie['/a/d/e']
+        self.assertEqual(['/a/b/c'],
+                         [token.name for token in
+                          index.get_unowned_tokens(None, 0)])
+
+    def test_prefix_index(self):
+        trie = TokenTrie()
+        # Empty prefix indexes are not retained.
+        index = trie.get_index('/a/')
+        self.assertEqual(0, len(index))
+        trie['/a/b'] = Token(version=1, name='/a/b', priority=1)
+        self.assertIsNot(index, trie.get_index('/a/'))
+        self.assertEqual(0, len(index))
+
+        index = trie.get_index('/a/')
+        self.assertIs(index, trie.get_index('/a/'))
+        trie['/a/c'] = Token(version=2, name='/a/c', priority=2)
+        trie['/b/c'] = Token(version=3, name='/b/c', priority=3)
+        self.assertEqual(['/a/c', '/a/b'],
+                         [token.name for token in
+                          index.get_unowned_tokens(None, 0)])
+
+        # The index is dropped once all its tokens are gone.
+        del trie['/a/b']
+        self.assertIs(index, trie.get_index('/a/'))
+        del trie['/a/c']
+        self.assertEqual(0, len(index))
+        trie['/a/d'] = Token(version=4, name='/a/d', priority=4)
+        self.assertEqual(0, len(index))
+        self.assertEqual(['/a/d'],
+                         [token.name for token in
+                          trie.get_index('/a/').get_tokens()])
+
+    def test_expired_names(self):
+        trie = TokenTrie()
+        trie['/a/b'] = Token(version=1, name='/a/b', owner='some_owner',
+                             expirationTime=100)
+        trie['/a/c'] = Token(version=2, name='/a/c', owner='some_owner',
+                             expirationTime=50)
+        trie['/a/d'] = Token(version=3, name='/a/d')
+        trie['/a/e'] = Token(version=4, name='/a/e', owner='some_owner',
+                             expirationTime=70)
+        self.assertEqual([], trie.get_expired_names(10))
+
+        # Ownership of /a/e got renewed and /a/c got deleted.
+        trie['/a/e'] = Token(version=5, name='/a/e', owner='some_owner',
+                             expirationTime=120)
+        del trie['/a/c']
+        self.assertEqual(['/a/b'], trie.get_expired_names(110))
+        self.assertEqual([], trie.get_expired_names(110))
+
+        # An update not changing the ownership is not reported again.
+        trie['/a/b'] = Token(version=6, name='/a/b', owner='some_owner',
+                             expirationTime=100, data='some data')
+        self.assertEqual(['/a/e'], trie.get_expired_names(200))
+
+    def test_group_counts(self):
+        trie = TokenTrie()
+        names = ['/a', '/a/', '/a/b', '/a/b/c', '/a/b/d/', '/a//e', '/f/g']
+        for version, name in enumerate(names):
+            trie[name] = Token(version=version, name=name)
+        # Updates of existing tokens do not change counts.
+        trie['/a/b'] = Token(version=10, name='/a/b')
+        self.assertEqual({'/a': 6, '/f': 1}, trie.get_group_counts('/'))
+        self.assertEqual({'/a/': 2, '/a/b': 3}, trie.get_group_counts('/a/'))
+        self.assertEqual({'/a/b/c': 1, '/a/b/d': 1},
+                         trie.get_group_counts('/a/b/'))
+        self.assertEqual({}, trie.get_group_counts('/x/'))
+
+        del trie['/a/b/c']
+        del trie['/a/b/d/']
+        self.assertEqual({}, trie.get_group_counts('/a/b/'))
+        self.assertEqual({'/a/': 2, '/a/b': 1}, trie.get_group_counts('/a/'))
+
+    def test_mapping(self):
+        trie = TokenTrie()
+        self.assertFalse(trie)
+        trie['/a/b'] = Token(version=1, name='/a/b')
+        trie['/a/b/c'] = Token(version=2, name='/a/b/c')
+        trie['/a/bc'] = Token(version=3, name='/a/bc')
+        trie['/a'] = Token(version=4, name='/a')
+        trie[''] = Token(version=5, name='')
+        trie['x/'] = Token(version=6, name='x/')
+        self.assertEqual(6, len(trie))
+        self.assertEqual(2, trie['/a/b/c'].version)
+        self.assertTrue('/a/b' in trie)
+        self.assertFalse('/a/b/' in trie)
+        self.assertIsNone(trie.get('/a/b/c/d'))
+        self.assertRaises(KeyError, trie.__getitem__, '/a/')
+        self.assertRaises(KeyError, trie.__delitem__, '/a/b/c/d')
+
+        # Names are enumerated in the order of components.
+        self.assertEqual(['', '/a', '/a/b', '/a/b/c', '/a/bc', 'x/'],
+                         trie.keys())
+        self.assertEqual(['/a/b', '/a/b/c', '/a/bc'], trie.keys('/a/b'))
+        self.assertEqual(['/a/b', '/a/b/c', '/a/bc'], trie.keys('/a/'))
+        self.assertEqual([1, 2, 3],
+                         [token.version for token in trie.values('/a/')])
+        self.assertEqual([], trie.keys('/b'))
+
+        del trie['/a/b']
+        self.assertEqual(['/a/b/c', '/a/bc'], trie.keys('/a/b'))
+        del trie['/a/b/c']
+        self.assertEqual(['/a/bc'], trie.keys('/a/b'))
+        self.assertEqual(4, len(trie))
+
+        trie = pickle.loads(pickle.dumps(trie))
+        self.assertEqual(['', '/a', '/a/bc', 'x/'], trie.keys())
+
+    def test_start_after(self):
+        trie = TokenTrie()
+        names = ['/a', '/a/b', '/a/b/c', '/a/bc', '/a-b', '/b']
+        for version, name in enumerate(names):
+            trie[name] = Token(version=version, name=name)
+        self.assertEqual(['/a/b/c', '/a/bc', '/a-b', '/b'],
+                         [key for key, _ in trie.iteritems('', '/a/b')])
+        # The cursor does not have to be in the trie.
+        self.assertEqual(['/a/bc', '/a-b'],
+                         [key for key, _ in trie.iteritems('/a', '/a/b/d')])
+        self.assertEqual(['/a/b', '/a/b/c', '/a/bc'],
+                         [key for key, _ in trie.iteritems('/a/b', '')])
+        self.assertEqual([], list(trie.iteritems('', '/b')))
+
+        random.seed(0)
+        components = ['', 'a', 'ab', 'b']
+        trie = TokenTrie()
+        for version in range(0, 200):
+            name = '/'.join(random.choice(components)
+                            for _ in range(0, random.randint(1, 4)))
+            trie[name] = Token(version=version, name=name)
+        names = trie.keys()
+        for cursor in names + ['/ab/a/a/a/a', 'b/c']:
+            expected_names = [key for key in names
+                              if key.split('/') > cursor.split('/')]
+            self.assertEqual(expected_names,
+                             [key for key, _ in trie.iteritems('', cursor)])
+
+    def test_random_operations(self):
+        random.seed(0)
+        trie = TokenTrie()
+        tokens = {}
+        components = ['', 'a', 'ab', 'b']
+        for version in range(0, 2000):
+            name = '/'.join(random.choice(components)
+                            for _ in range(0, random.randint(1, 4)))
+            if name in tokens and random.random() < 0.5:
+                del trie[name]
+                del tokens[name]
+            else:
+                token = Token(version=version, name=name)
+                trie[name] = token
+                tokens[name] = token
+        self.assertEqual(len(tokens), len(trie))
+        for prefix in ['', '/', 'a', 'a/', '/a', '/a/', 'ab/b', '/a/ab/']:
+            expected_names = set(name for name in tokens
+                                 if name.startswith(prefix))
+            self.assertEqual(expected_names, set(trie.keys(prefix)))
+            self.assertEqual(len(expected_names), len(trie.values(prefix)))
+        for name, token in tokens.items():
+            self.assertIs(token, trie[name])
@@ -13,27 +13,37 @@
 # limitations under the License.
 
 """Validation tests for transactions."""
+import collections
 import copy
+import mock
 import pickle
-import pytrie
 import sys
 import unittest
 
 from pinball.master.blessed_version import BlessedVersion
 from pinball.master.master_handler import MasterHandler
+from pinball.master.batch import pack_request
 from pinball.master.thrift_lib.ttypes import ArchiveRequest
+from pinball.master.thrift_lib.ttypes import BatchRequest
 from pinball.master.thrift_lib.ttypes import GroupRequest
+from pinball.master.thrift_lib.ttypes import Lease
 from pinball.master.thrift_lib.ttypes import ModifyRequest
+from pinball.master.thrift_lib.ttypes import Projection
 from pinball.master.thrift_lib.ttypes import Query
 from pinball.master.thrift_lib.ttypes import QueryAndOwnRequest
 from pinball.master.thrift_lib.ttypes import QueryRequest
+from pinball.master.thrift_lib.ttypes import RenewRequest
 from pinball.master.thrift_lib.ttypes import Token
 from pinball.master.thrift_lib.ttypes import TokenMasterException
+from pinball.master.token_trie import TokenTrie
 from pinball.master.transaction import ArchiveTransaction
+from pinball.master.transaction import BatchTransaction
 from pinball.master.transaction import GroupTransaction
 from pinball.master.transaction import ModifyTransaction
 from pinball.master.transaction import QueryAndOwnTransaction
 from pinball.master.transaction import QueryTransaction
+from pinball.master.transaction import REQUEST_TO_TRANSACTION
+from pinball.master.transaction import RenewTransaction
 from tests.pinball.persistence.ephemeral_store import EphemeralStore
 
 
@@ -47,7 +57,7 @@ __version__ = '2.0'
 class TransactionTestCase(unittest.TestCase):
     def setUp(self):
         """Set up self._trie with 111 tokens, one of them a blessed version."""
-        self._trie = pytrie.StringTrie()
+        self._trie = TokenTrie()
         self._store = EphemeralStore()
         blessed_version = BlessedVersion(MasterHandler._BLESSED_VERSION,
                                          MasterHandler._MASTER_OWNER)
@@ -99,6 +109,7 @@ class TransactionTestCase(unittest.TestCase):
         some_other_token = copy.copy(
             self._trie['/some_dir/some_token_0/some_other_token_0'])
         request.tokens.append(some_other_token)
+        version_before = self._get_blessed_version().version
         transaction = ArchiveTransaction()
         transaction.prepare(request)
         transaction.commit(self._trie,
@@ -111,6 +122,25 @@ class TransactionTestCase(unittest.TestCase):
         self.assertEqual(n_tokens_after, n_active_tokens)
         n_all_tokens = len(self._store.read_tokens())
         self.assertEqual(n_tokens_before, n_all_tokens)
+        self.assertEqual(sorted([some_token.name, some_other_token.name]),
+                         sorted(transaction.get_changed_names()))
+        # The blessed version got advanced.
+        self.assertLess(version_before, self._get_blessed_version().version)
+
+    def test_archive_projected_token(self):
+        some_token = self._trie['/some_dir/some_token_0']
+        request = ArchiveRequest(tokens=[Token(version=some_token.version,
+                                               name=some_token.name)])
+        transaction = ArchiveTransaction()
+        transaction.prepare(request)
+        transaction.commit(self._trie,
+                           self._get_blessed_version(),
+                           self._store)
+        self.assertNotIn(some_token.name, self._trie)
+        # The archived token retains its data.
+        archived_tokens = [token for token in self._store.read_tokens()
+                           if token.name == some_token.name]
+        self.assertEqual([some_token], archived_tokens)
 
     # Group tests.
     def test_group_empty(self):
@@ -141,6 +171,23 @@ class TransactionTestCase(unittest.TestCase):
             self.assertEqual(11, count)
         self.assertEqual(expected_groups, groups)
 
+    def test_group_counts_match_scan(self):
+        for name in ['/some_dir/', '/some_dir//a', '/some_dir/some_token_0/',
+                     '/some_dirx/a']:
+            self._trie[name] = Token(version=1, name=name)
+        for prefix in ['/', '/some_dir/', '/some_dir/some_token_0/']:
+            request = GroupRequest(namePrefix=prefix, groupSuffix='/')
+            transaction = GroupTransaction()
+            transaction.prepare(request)
+            response = transaction.commit(self._trie,
+                                          self._get_blessed_version(),
+                                          self._store)
+            expected_counts = collections.defaultdict(int)
+            for name in self._trie.keys(prefix):
+                end = name.find('/', len(prefix))
+                expected_counts[name if end == -1 else name[:end]] += 1
+            self.assertEqual(dict(expected_counts), response.counts)
+
     # Modify tests.
     def test_modity_empty(self):
         request = ModifyRequest()
@@ -265,6 +312,97 @@ class TransactionTestCase(unittest.TestCase):
         for token in response.tokens[1]:
             self.assertTrue(token.name.startswith('/some_dir/some_token_0'))
 
+    def test_query_projection(self):
+        request = QueryRequest(queries=[
+            Query(namePrefix='/some_dir/some_token_1/',
+                  projection=Projection.NAME),
+            Query(namePrefix='/some_dir/some_token_1/',
+                  projection=Projection.METADATA),
+            Query(namePrefix='/some_dir/some_token_1/',
+                  projection=Projection.FULL)])
+        transaction = QueryTransaction()
+        transaction.prepare(request)
+        response = transaction.commit(self._trie,
+                                      self._get_blessed_version(),
+                                      self._store)
+        self.assertEqual(3, len(response.tokens))
+        names, metadata, full = response.tokens
+        self.assertEqual(10, len(full))
+        for name_token, metadata_token, token in zip(names, metadata, full):
+            self.assertEqual(Token(version=token.version, name=token.name),
+                             name_token)
+            self.assertIsNone(metadata_token.data)
+            metadata_token.data = token.data
+            self.assertEqual(token, metadata_token)
+            self.assertIsNotNone(token.data)
+
+    def test_query_pages(self):
+        names = []
+        cursor = None
+        pages = 0
+        while cursor != '':
+            request = QueryRequest(queries=[
+                Query(namePrefix='/some_dir/', startAfterName=cursor,
+                      pageSize=30),
+                Query(namePrefix='/some_dir/some_token_0/')])
+            transaction = QueryTransaction()
+            transaction.prepare(request)
+            response = transaction.commit(self._trie,
+                                          self._get_blessed_version(),
+                                          self._store)
+            self.assertEqual(2, len(response.tokens))
+            self.assertGreaterEqual(30, len(response.tokens[0]))
+            self.assertEqual(10, len(response.tokens[1]))
+            self.assertEqual('', response.nextCursors[1])
+            names.extend([token.name for token in response.tokens[0]])
+            cursor = response.nextCursors[0]
+            pages += 1
+        self.assertEqual(4, pages)
+        self.assertEqual(self._trie.keys('/some_dir/'), names)
+
+    def test_query_pages_invalid(self):
+        for query in [Query(namePrefix='/some_dir/', pageSize=0),
+                      Query(namePattern='/some_dir/*/', pageSize=10),
+                      Query(namePrefix='/some_dir/', maxTokens=10,
+                            pageSize=10),
+                      Query(namePrefix='/some_dir/', sinceVersion=1,
+                            pageSize=10)]:
+            transaction = QueryTransaction()
+            self.assertRaises(TokenMasterException, transaction.prepare,
+                              QueryRequest(queries=[query]))
+
+    def test_query_pattern(self):
+        some_query = Query()
+        some_query.namePattern = '/some_dir/*/'
+        some_query.maxTokens = 20
+        request = QueryRequest()
+        request.queries = [some_query]
+        transaction = QueryTransaction()
+        transaction.prepare(request)
+        response = transaction.commit(self._trie,
+                                      self._get_blessed_version(),
+                                      self._store)
+        self.assertEqual(1, len(response.tokens))
+        self.assertEqual(20, len(response.tokens[0]))
+        for token in response.tokens[0]:
+            self.assertTrue(token.name.startswith('/some_dir/some_token_'))
+            self.assertTrue('/some_other_token_' in token.name)
+            self.assertTrue(token.priority >= 8)
+        # Queries do not create indexes.
+        self.assertIsNone(self._trie.find_index('/some_dir/*/'))
+
+        # An index created by a claim serves the same query.
+        index = self._trie.get_index('/some_dir/*/')
+        transaction = QueryTransaction()
+        transaction.prepare(request)
+        indexed_response = transaction.commit(self._trie,
+                                              self._get_blessed_version(),
+                                              self._store)
+        self.assertIs(index, self._trie.find_index('/some_dir/*/'))
+        self.assertEqual(
+            sorted(token.priority for token in response.tokens[0]),
+            sorted(token.priority for token in indexed_response.tokens[0]))
+
     # Query and own tests.
     def test_query_and_own_empty(self):
         request = QueryAndOwnRequest()
@@ -301,3 +439,295 @@ class TransactionTestCase(unittest.TestCase):
         for token in response.tokens:
             self.assertEquals('some_other_owner', token.owner)
             self.assertEquals(sys.maxint, token.expirationTime)
+
+    def test_query_and_own_dry_run(self):
+        some_query = Query()
+        some_query.namePrefix = '/some_dir/'
+        some_query.maxTokens = 5
+        request = QueryAndOwnRequest()
+        request.owner = 'some_owner'
+        request.expirationTime = sys.maxint
+        request.query = some_query
+        request.dryRun = True
+        blessed_version = self._get_blessed_version()
+        version = blessed_version.version
+        transaction = QueryAndOwnTransaction()
+        transaction.prepare(request)
+        response = transaction.commit(self._trie,
+                                      blessed_version,
+                                      self._store)
+
+        self.assertEqual(5, len(response.tokens))
+        for token in response.tokens:
+            self.assertIsNone(token.owner)
+            self.assertIsNone(token.data)
+            self.assertIsNone(self._trie[token.name].owner)
+        self.assertEqual(version, blessed_version.version)
+
+    def test_query_and_own_pattern(self):
+        some_token = copy.copy(
+            self._trie['/some_dir/some_token_0/some_other_token_9'])
+        some_token.version += 1000
+        some_token.owner = 'some_owner'
+        some_token.expirationTime = sys.maxint  # in the future
+        self._trie[some_token.name] = some_token
+        some_token = copy.copy(
+            self._trie['/some_dir/some_token_1/some_other_token_9'])
+        some_token.version += 1000
+        some_token.owner = 'some_owner'
+        some_token.expirationTime = 10  # in the past
+        self._trie[some_token.name] = some_token
+        some_query = Query()
+        some_query.namePattern = '/some_dir/*/'
+        some_query.maxTokens = 10
+        request = QueryAndOwnRequest()
+        request.owner = 'some_other_owner'
+        request.expirationTime = sys.maxint
+        request.query = some_query
+        transaction = QueryAndOwnTransaction()
+        transaction.prepare(request)
+        response = transaction.commit(self._trie,
+                                      self._get_blessed_version(),
+                                      self._store)
+
+        # Should have owned the highest priority tokens except for the one
+        # that is already owned.
+        self.assertEqual(10, len(response.tokens))
+        names = [token.name for token in response.tokens]
+        self.assertFalse('/some_dir/some_token_0/some_other_token_9' in names)
+        self.assertEqual('/some_dir/some_token_1/some_other_token_9',
+                         names[0])
+        self.assertEqual([9] * 9 + [8],
+                         [token.priority for token in response.tokens])
+        for token in response.tokens:
+            self.assertEquals('some_other_owner', token.owner)
+            self.assertEquals(sys.maxint, token.expirationTime)
+
+        # Owned tokens should not be claimed again.
+        transaction = QueryAndOwnTransaction()
+        transaction.prepare(request)
+        response = transaction.commit(self._trie,
+                                      self._get_blessed_version(),
+                                      self._store)
+        self.assertEqual([8] * 9 + [7],
+                         [token.priority for token in response.tokens])
+
+    def test_query_and_own_prefix_claims(self):
+        some_query = Query()
+        some_query.namePrefix = '/some_dir/some_token_3/'
+        some_query.maxTokens = 1
+        names = []
+        for _ in range(0, 11):
+            request = QueryAndOwnRequest()
+            request.owner = 'some_owner'
+            request.expirationTime = sys.maxint
+            request.query = some_query
+            transaction = QueryAndOwnTransaction()
+            transaction.prepare(request)
+            response = transaction.commit(self._trie,
+                                          self._get_blessed_version(),
+                                          self._store)
+            names.extend([token.name for token in response.tokens])
+
+        # Consecutive claims get tokens in the order of decreasing priority.
+        self.assertEqual(['/some_dir/some_token_3/some_other_token_%d' % i
+                          for i in range(9, -1, -1)], names)
+
+    # Renew tests.
+    def test_renew_empty(self):
+        request = RenewRequest()
+        transaction = RenewTransaction()
+        # Make sure that prepare and commit do not throw an exception.
+        transaction.prepare(request)
+        transaction.commit(self._trie,
+                           self._get_blessed_version(),
+                           self._store)
+
+    def test_renew(self):
+        some_token = self._trie['/some_dir/some_token_0']
+        request = RenewRequest(leases=[Lease(name=some_token.name,
+                                             version=some_token.version,
+                                             expirationTime=sys.maxint)])
+        transaction = RenewTransaction()
+        transaction.prepare(request)
+        with mock.patch.object(
+                self._store, 'commit_tokens',
+                wraps=self._store.commit_tokens) as commit_tokens:
+            response = transaction.commit(self._trie,
+                                          self._get_blessed_version(),
+                                          self._store)
+
+        self.assertEqual(1, len(response.tokens))
+        renewed_token = response.tokens[0]
+        self.assertEqual(some_token.name, renewed_token.name)
+        self.assertLess(some_token.version, renewed_token.version)
+        self.assertEqual(sys.maxint, renewed_token.expirationTime)
+        self.assertIsNone(renewed_token.data)
+        trie_token = self._trie[some_token.name]
+        self.assertEqual(renewed_token.version, trie_token.version)
+        self.assertEqual(sys.maxint, trie_token.expirationTime)
+        self.assertEqual(some_token.data, trie_token.data)
+        # Only ownership changed so no token data gets rewritten.
+        updates, _, renewals = commit_tokens.call_args[0]
+        self.assertEqual([], updates)
+        self.assertEqual(sorted([some_token.name,
+                                 MasterHandler._BLESSED_VERSION]),
+                         sorted([token.name for token in renewals]))
+        self.assertEqual(dict(self._trie.items()), self._get_store_state())
+        self.assertEqual([some_token.name], transaction.get_changed_names())
+        self._check_version_uniqueness()
+
+    def test_renew_version_conflict(self):
+        some_token = self._trie['/some_dir/some_token_0']
+        other_token = self._trie['/some_dir/some_token_1']
+        request = RenewRequest(leases=[
+            Lease(name=some_token.name,
+                  version=some_token.version,
+                  expirationTime=sys.maxint),
+            Lease(name=other_token.name,
+                  version=other_token.version + 1,
+                  expirationTime=sys.maxint)])
+        trie_before = dict(self._trie.items())
+        store_before = self._get_store_state()
+        transaction = RenewTransaction()
+        transaction.prepare(request)
+        self.assertRaises(TokenMasterException, transaction.commit,
+                          self._trie, self._get_blessed_version(), self._store)
+        self.assertEqual(trie_before, dict(self._trie.items()))
+        self.assertEqual(store_before, self._get_store_state())
+        self.assertEqual([], transaction.get_changed_names())
+
+    def test_renew_not_found(self):
+        request = RenewRequest(leases=[Lease(name='/some_dir/no_such_token',
+                                             version=1,
+                                             expirationTime=sys.maxint)])
+        transaction = RenewTransaction()
+        transaction.prepare(request)
+        self.assertRaises(TokenMasterException, transaction.commit,
+                          self._trie, self._get_blessed_version(), self._store)
+
+    # Batch tests.
+    @staticmethod
+    def _create_transaction(request):
+        return REQUEST_TO_TRANSACTION[request.__class__]()
+
+    def _get_store_state(self):
+        return dict((token.name, token)
+                    for token in self._store.read_active_tokens())
+
+    def test_batch_empty(self):
+        request = BatchRequest()
+        transaction = BatchTransaction(TransactionTestCase._create_transaction)
+        transaction.prepare(request)
+        self.assertTrue(transaction.READ_ONLY)
+        response = transaction.commit(self._trie,
+                                      self._get_blessed_version(),
+                                      self._store)
+        self.assertEqual([], response.responses)
+        self.assertEqual([], transaction.get_changed_names())
+
+    def test_batch(self):
+        some_token = copy.copy(self._trie['/some_dir/some_token_0'])
+        some_token.data = 'some other data'
+        archived_token = self._trie['/some_dir/some_token_1']
+        query = Query(namePrefix='/some_dir/some_token_0/', maxTokens=1)
+        requests = [ModifyRequest(updates=[some_token]),
+                    QueryRequest(queries=[Query(namePrefix=some_token.name)]),
+                    ArchiveRequest(tokens=[archived_token]),
+                    QueryAndOwnRequest(owner='some_owner',
+                                       expirationTime=sys.maxint,
+                                       query=query)]
+        request = BatchRequest(
+            requests=[pack_request(request) for request in requests],
+            atomic=True)
+        transaction = BatchTransaction(TransactionTestCase._create_transaction)
+        transaction.prepare(request)
+        self.assertFalse(transaction.READ_ONLY)
+        response = transaction.commit(self._trie,
+                                      self._get_blessed_version(),
+                                      self._store)
+
+        self.assertEqual(4, len(response.responses))
+        # Requests see changes made by their predecessors in the batch.
+        self.assertEqual('some other data',
+                         response.responses[1].query.tokens[0][0].data)
+        self.assertIsNone(response.responses[2].query)
+        owned_token = response.responses[3].queryAndOwn.tokens[0]
+        self.assertEqual('/some_dir/some_token_0/some_other_token_9',
+                         owned_token.name)
+
+        self.assertEqual('some other data',
+                         self._trie['/some_dir/some_token_0'].data)
+        self.assertNotIn(archived_token.name, self._trie)
+        self.assertEqual(owned_token, self._trie[owned_token.name])
+        self.assertEqual(dict(self._trie.items()), self._get_store_state())
+        self.assertEqual([archived_token],
+                         self._store.read_archived_tokens())
+        self.assertEqual(sorted([some_token.name, archived_token.name,
+                                 owned_token.name]),
+                         sorted(transaction.get_changed_names()))
+        self._check_version_uniqueness()
+
+    def test_batch_renew(self):
+        some_token = self._trie['/some_dir/some_token_0']
+        requests = [RenewRequest(leases=[
+                        Lease(name=some_token.name,
+                              version=some_token.version,
+                              expirationTime=sys.maxint)]),
+                    QueryRequest(queries=[Query(namePrefix=some_token.name)])]
+        request = BatchRequest(
+            requests=[pack_request(request) for request in requests],
+            atomic=True)
+        transaction = BatchTransaction(TransactionTestCase._create_transaction)
+        transaction.prepare(request)
+        with mock.patch.object(
+                self._store, 'commit_tokens',
+                wraps=self._store.commit_tokens) as commit_tokens:
+            response = transaction.commit(self._trie,
+                                          self._get_blessed_version(),
+                                          self._store)
+
+        renewed_token = response.responses[0].renew.tokens[0]
+        # The query sees the renewed token with its data.
+        queried_token = [token for token in
+                         response.responses[1].query.tokens[0]
+                         if token.name == some_token.name][0]
+        self.assertEqual(renewed_token.version, queried_token.version)
+        self.assertEqual(some_token.data, queried_token.data)
+        updates, deletes, renewals = commit_tokens.call_args[0]
+        self.assertEqual([], updates)
+        self.assertEqual([], deletes)
+        self.assertEqual(sorted([some_token.name,
+                                 MasterHandler._BLESSED_VERSION]),
+                         sorted([token.name for token in renewals]))
+        self.assertEqual(dict(self._trie.items()), self._get_store_state())
+
+    def test_batch_rollback(self):
+        some_token = copy.copy(self._trie['/some_dir/some_token_0'])
+        some_token.priority = 100
+        deleted_token = self._trie['/some_dir/some_token_1']
+        new_token = Token(name='/some_dir/new_token')
+        requests = [ModifyRequest(updates=[some_token, new_token],
+                                  deletes=[deleted_token]),
+                    # The token version is stale after the first request.
+                    ModifyRequest(updates=[some_token])]
+        request = BatchRequest(
+            requests=[pack_request(request) for request in requests],
+            atomic=True)
+        trie_before = dict(self._trie.items())
+        store_before = self._get_store_state()
+        index = self._trie.get_index('/some_dir/')
+        top_tokens_before = index.get_unowned_tokens(3, 0)
+        transaction = BatchTransaction(TransactionTestCase._create_transaction)
+        transaction.prepare(request)
+        self.assertRaises(TokenMasterException,
+                          transaction.commit,
+                          self._trie,
+                          self._get_blessed_version(),
+                          self._store)
+
+        self.assertEqual(trie_before, dict(self._trie.items()))
+        self.assertEqual(store_before, self._get_store_state())
+        self.assertEqual([], transaction.get_changed_names())
+        # Indexes reflect the restored tokens.
+        self.assertEqual(top_tokens_before, index.get_unowned_tokens(3, 0))
@@ -0,0 +1,117 @@
+# Copyright 2015, Pinterest, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Benchmark of the size of job claims in different wire formats.
+
+A claim is a query_and_own response carrying a job token.  The data of the
+token is a pickled shell job with an execution history of configurable
+length.  The benchmark reports the number of bytes of the serialized response
+and the time to encode it for each protocol and compression setting.
+
+Usage:
+    python -m tests.pinball.master.wire_benchmark [--history=<number>]
+"""
+import argparse
+import mock
+import pickle
+import sys
+import time
+
+from thrift.Thrift import TMessageType
+from thrift.transport import TTransport
+
+from pinball.config.pinball_config import PinballConfig
+from pinball.master.thrift_lib.TokenMasterService import query_and_own_result
+from pinball.master.thrift_lib.ttypes import QueryAndOwnResponse
+from pinball.master.thrift_lib.ttypes import Token
+from pinball.master.wire import encode_token_data
+from pinball.master.wire import get_protocol_factory
+from pinball.workflow.job import ShellJob
+from pinball.workflow.job_executor import ExecutionRecord
+
+
+__author__ = 'Pawel Garbacki'
+__copyright__ = 'Copyright 2015, Pinterest, Inc.'
+__credits__ = [__author__]
+__license__ = 'Apache'
+__version__ = '2.0'
+
+
+def _generate_claim(history):
+    job = ShellJob(name='some_job',
+                   inputs=['/workflow/some_workflow/some_instance/input/'
+                           'some_job/parent_job'],
+                   outputs=['child_job'],
+                   emails=['some_owner@pinterest.com'],
+                   command='python -m some.module --date=%(date)s')
+    for i in range(0, history):
+        record = ExecutionRecord(
+            info='python -m some.module --date=2015-01-01',
+            instance='1420070400%04d' % i,
+            start_time=1420070400 + i * 3600,
+            end_time=1420070400 + i * 3600 + 600,
+            exit_code=0,
+            logs={'stdout': '/mnt/log/some_workflow/some_job.%d.stdout' % i,
+                  'stderr': '/mnt/log/some_workflow/some_job.%d.stderr' % i})
+        record.properties['kv_job_url'] = 'http://some.host/job_%d' % i
+        job.history.append(record)
+    token = Token(version=1420070400000000,
+                  name='/workflow/some_workflow/some_instance/job/runnable/'
+                       'some_job',
+                  owner='some_worker',
+                  expirationTime=1420070400 + 300,
+                  priority=10,
+                  data=pickle.dumps(job))
+    return QueryAndOwnResponse(tokens=[token])
+
+
+def _serialize(response):
+    """Serialize a response the way the server sends it."""
+    otransport = TTransport.TMemoryBuffer()
+    oprot = get_protocol_factory().getProtocol(otransport)
+    oprot.writeMessageBegin('query_and_own', TMessageType.REPLY, 0)
+    query_and_own_result(success=encode_token_data(response)).write(oprot)
+    oprot.writeMessageEnd()
+    return otransport.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the size of job claims on the wire.')
+    parser.add_argument('--history', dest='history', type=int, default=100,
+                        help='number of execution records of the job')
+    parser.add_argument('--iterations', dest='iterations', type=int,
+                        default=1000, help='number of encoded claims')
+    options = parser.parse_args(sys.argv[1:])
+
+    response = _generate_claim(options.history)
+    print 'token data: %d bytes' % len(response.tokens[0].data)
+    for protocol in ['binary', 'compact']:
+        for compression in [None, 'zlib']:
+            with mock.patch.multiple(PinballConfig,
+                                     MASTER_PROTOCOL=protocol,
+                                     MASTER_DATA_COMPRESSION=compression):
+                message = _serialize(response)
+                start = time.time()
+                for _ in range(0, options.iterations):
+                    _serialize(response)
+                encode_ms = (1000 * (time.time() - start) /
+                             options.iterations)
+            print '%s protocol, compression %s: %d bytes per claim, ' \
+                '%.3f ms to encode' % (protocol, compression, len(message),
+                                       encode_ms)
+
+
+if __name__ == '__main__':
+    main()
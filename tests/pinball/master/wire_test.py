@@ -0,0 +1,79 @@
+# Copyright 2015, Pinterest, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Validation tests for the wire format of master RPCs."""
+import mock
+import unittest
+
+from pinball.config.pinball_config import PinballConfig
+from pinball.master.batch import pack_request
+from pinball.master.client import LocalClient
+from pinball.master.master_handler import MasterHandler
+from pinball.master.thrift_lib.ttypes import BatchRequest
+from pinball.master.thrift_lib.ttypes import ModifyRequest
+from pinball.master.thrift_lib.ttypes import Query
+from pinball.master.thrift_lib.ttypes import QueryRequest
+from pinball.master.thrift_lib.ttypes import Token
+from pinball.master.wire import CompressingHandler
+from pinball.master.wire import decode_token_data
+from pinball.master.wire import encode_token_data
+from tests.pinball.persistence.ephemeral_store import EphemeralStore
+
+
+__author__ = 'Pawel Garbacki'
+__copyright__ = 'Copyright 2015, Pinterest, Inc.'
+__credits__ = [__author__]
+__license__ = 'Apache'
+__version__ = '2.0'
+
+
+@mock.patch.object(PinballConfig, 'MASTER_DATA_COMPRESSION', 'zlib')
+class WireTestCase(unittest.TestCase):
+    def test_encode_token_data(self):
+        token = Token(name='/some_dir/some_token', data='some_data' * 100)
+        request = BatchRequest(requests=[
+            pack_request(ModifyRequest(updates=[token, Token(name='/x')]))])
+
+        encoded = encode_token_data(request)
+        encoded_token = encoded.requests[0].modify.updates[0]
+        self.assertEqual(token.name, encoded_token.name)
+        self.assertLess(len(encoded_token.data), len(token.data))
+        self.assertIsNone(encoded.requests[0].modify.updates[1].data)
+        # The original request is not modified.
+        self.assertEqual('some_data' * 100, token.data)
+
+        self.assertEqual(request, decode_token_data(encoded))
+
+    def test_compression_disabled(self):
+        request = ModifyRequest(updates=[Token(name='/x', data='some_data')])
+        with mock.patch.object(PinballConfig, 'MASTER_DATA_COMPRESSION',
+                               None):
+            self.assertIs(request, encode_token_data(request))
+            self.assertIs(request, decode_token_data(request))
+
+    def test_compressing_handler(self):
+        handler = MasterHandler(EphemeralStore())
+        client = LocalClient(CompressingHandler(handler))
+        token = Token(name='/some_dir/some_token', data='some_data')
+        request = encode_token_data(ModifyRequest(updates=[token]))
+        client.modify(request)
+
+        # The handler stores uncompressed data.
+        response = handler.query(QueryRequest(queries=[
+            Query(namePrefix='/some_dir/')]))
+        self.assertEqual('some_data', response.tokens[0][0].data)
+
+        response = decode_token_data(client.query(QueryRequest(queries=[
+            Query(namePrefix='/some_dir/')])))
+        self.assertEqual('some_data', response.tokens[0][0].data)
@@ -12,6 +12,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import copy
+
 from pinball.persistence.store import Store
 
 
@@ -29,13 +31,20 @@ class EphemeralStore(Store):
         self._archived_tokens = {}
         self._cached_data = {}
 
-    def commit_tokens(self, updates=None, deletes=None):
+    def commit_tokens(self, updates=None, deletes=None, renewals=None):
         updates = updates if updates is not None else []
         deletes = deletes if deletes is not None else []
+        renewals = renewals if renewals is not None else []
         for token in updates:
             self._active_tokens[token.name] = token
         for token in deletes:
             del self._active_tokens[token.name]
+        for token in renewals:
+            renewed_token = copy.copy(self._active_tokens[token.name])
+            renewed_token.version = token.version
+            renewed_token.owner = token.owner
+            renewed_token.expirationTime = token.expirationTime
+            self._active_tokens[token.name] = renewed_token
 
     def delete_archived_tokens(self, deletes):
         for token in deletes:
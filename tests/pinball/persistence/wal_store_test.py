@@ -0,0 +1,222 @@
+# Copyright 2015, Pinterest, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Validation tests for the write-ahead log store."""
+import copy
+import mock
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from pinball.master.thrift_lib.ttypes import Token
+from pinball.persistence.wal_store import WalStore
+from tests.pinball.persistence.ephemeral_store import EphemeralStore
+
+
+__author__ = 'Pawel Garbacki'
+__copyright__ = 'Copyright 2015, Pinterest, Inc.'
+__credits__ = [__author__]
+__license__ = 'Apache'
+__version__ = '2.0'
+
+
+class _BlockingStore(EphemeralStore):
+    """Ephemeral store applying changes only after it gets unblocked."""
+    def initialize(self):
+        super(_BlockingStore, self).initialize()
+        self.unblocked = threading.Event()
+        self.committing = threading.Event()
+        self.archived = []
+
+    def commit_tokens(self, updates=None, deletes=None, renewals=None):
+        self.committing.set()
+        self.unblocked.wait()
+        super(_BlockingStore, self).commit_tokens(updates, deletes, renewals)
+
+    def archive_tokens(self, tokens):
+        self.archived.append([token.name for token in tokens])
+        super(_BlockingStore, self).archive_tokens(tokens)
+
+
+class _FailingStore(EphemeralStore):
+    """Ephemeral store failing the first commits."""
+    def initialize(self):
+        super(_FailingStore, self).initialize()
+        self.failures = 2
+
+    def commit_tokens(self, updates=None, deletes=None, renewals=None):
+        if self.failures:
+            self.failures -= 1
+            raise Exception('database unavailable')
+        super(_FailingStore, self).commit_tokens(updates, deletes, renewals)
+
+
+class WalStoreTestCase(unittest.TestCase):
+    def setUp(self):
+        self._dir = tempfile.mkdtemp()
+        self._log_path = os.path.join(self._dir, 'wal')
+
+    def tearDown(self):
+        shutil.rmtree(self._dir)
+
+    def test_commit(self):
+        underlying_store = EphemeralStore()
+        store = WalStore(underlying_store, self._log_path)
+        token = Token(version=1, name='/some_dir/some_token')
+        store.commit_tokens(updates=[token])
+        store.sync()
+        self.assertEqual([token], store.read_active_tokens())
+        self.assertEqual([token], underlying_store.read_active_tokens())
+
+        store.archive_tokens([token])
+        self.assertEqual([], store.read_active_tokens())
+        self.assertEqual([token], store.read_archived_tokens())
+
+    def test_commit_renewals(self):
+        underlying_store = EphemeralStore()
+        store = WalStore(underlying_store, self._log_path)
+        token = Token(version=1, name='/some_dir/some_token',
+                      data='some_data')
+        store.commit_tokens(updates=[token])
+        renewed_token = copy.copy(token)
+        renewed_token.version = 2
+        renewed_token.owner = 'some_owner'
+        renewed_token.expirationTime = 10
+        store.commit_tokens(renewals=[renewed_token])
+        store.sync()
+        self.assertEqual([renewed_token], store.read_active_tokens())
+
+        # Renewals are logged without token data.
+        with open(self._log_path, 'rb') as log:
+            records = WalStore._read_records(log)
+        self.assertEqual(2, len(records))
+        self.assertEqual([], records[1][1])
+        self.assertIsNone(records[1][3][0].data)
+
+    def test_sync_does_not_wait_for_apply(self):
+        underlying_store = _BlockingStore()
+        store = WalStore(underlying_store, self._log_path)
+        token = Token(version=1, name='/some_dir/some_token')
+        store.commit_tokens(updates=[token])
+        store.sync()
+        self.assertEqual([], underlying_store.read_active_tokens())
+        underlying_store.unblocked.set()
+        self.assertEqual([token], store.read_active_tokens())
+
+    @mock.patch.object(WalStore, '_MIN_APPLY_RETRY_DELAY_SEC', 0)
+    def test_apply_retries(self):
+        underlying_store = _FailingStore()
+        store = WalStore(underlying_store, self._log_path)
+        token = Token(version=1, name='/some_dir/some_token')
+        store.commit_tokens(updates=[token])
+        store.sync()
+        self.assertEqual([token], store.read_active_tokens())
+        self.assertEqual(0, underlying_store.failures)
+
+    def test_archive_in_bulk(self):
+        underlying_store = _BlockingStore()
+        store = WalStore(underlying_store, self._log_path)
+        tokens = [Token(version=i, name='/some_dir/some_token_%d' % i)
+                  for i in range(0, 3)]
+        store.commit_tokens(updates=tokens)
+        underlying_store.committing.wait()
+        blessed_version = Token(version=10, name='/__BLESSED_VERSION__')
+        for token in tokens:
+            store.archive_tokens([token])
+            store.commit_tokens(updates=[blessed_version])
+        store.sync()
+        underlying_store.unblocked.set()
+
+        self.assertEqual([blessed_version], store.read_active_tokens())
+        self.assertEqual(tokens, sorted(store.read_archived_tokens(),
+                                        key=lambda token: token.name))
+        self.assertEqual([[token.name for token in tokens]],
+                         underlying_store.archived)
+
+    def test_archive_before_recreate(self):
+        underlying_store = _BlockingStore()
+        store = WalStore(underlying_store, self._log_path)
+        token = Token(version=1, name='/some_dir/some_token')
+        store.commit_tokens(updates=[token])
+        underlying_store.committing.wait()
+        store.archive_tokens([token])
+        new_token = Token(version=2, name='/some_dir/some_token')
+        store.commit_tokens(updates=[new_token])
+        store.sync()
+        underlying_store.unblocked.set()
+
+        self.assertEqual([new_token], store.read_active_tokens())
+        self.assertEqual([token], store.read_archived_tokens())
+
+    def test_recover(self):
+        underlying_store = _BlockingStore()
+        store = WalStore(underlying_store, self._log_path)
+        tokens = [Token(version=i, name='/some_dir/some_token_%d' % i)
+                  for i in range(0, 10)]
+        for token in tokens:
+            store.commit_tokens(updates=[token])
+        store.commit_tokens(deletes=[tokens[0]])
+        store.sync()
+
+        # Simulate a torn write at the end of the log.
+        with open(self._log_path, 'ab') as log:
+            log.write('\x00\x00\x01')
+
+        # The log is replayed into a new store.
+        underlying_store = EphemeralStore()
+        store = WalStore(underlying_store, self._log_path)
+        self.assertEqual(
+            sorted([token.name for token in tokens[1:]]),
+            sorted([token.name for token in
+                    underlying_store.read_active_tokens()]))
+        self.assertEqual(0, os.path.getsize(self._log_path))
+
+    def test_group_commit(self):
+        store = WalStore(EphemeralStore(), self._log_path)
+        flushes = []
+        all_appended = threading.Event()
+        fsync = os.fsync
+
+        def _blocking_fsync(fd):
+            # Block the first flush until all changes are waiting for the
+            # next one.
+            all_appended.wait()
+            flushes.append(fd)
+            fsync(fd)
+
+        def _commit(token):
+            store.commit_tokens(updates=[token])
+            store.sync()
+
+        os.fsync = _blocking_fsync
+        try:
+            threads = []
+            for i in range(0, 50):
+                token = Token(version=i + 1,
+                              name='/some_dir/some_token_%d' % i)
+                thread = threading.Thread(target=_commit, args=(token,))
+                threads.append(thread)
+                thread.start()
+            while store._appended_sequence < 50:
+                time.sleep(0.01)
+            all_appended.set()
+            for thread in threads:
+                thread.join()
+        finally:
+            os.fsync = fsync
+        self.assertEqual(50, len(store.read_active_tokens()))
+        self.assertTrue(len(flushes) <= 2)
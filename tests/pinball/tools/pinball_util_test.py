@@ -25,6 +25,7 @@ from pinball.master.thrift_lib.ttypes import GroupRequest
 from pinball.master.thrift_lib.ttypes import GroupResponse
 from pinball.master.thrift_lib.ttypes import ModifyRequest
 from pinball.master.thrift_lib.ttypes import ModifyResponse
+from pinball.master.thrift_lib.ttypes import Projection
 from pinball.master.thrift_lib.ttypes import Query
 from pinball.master.thrift_lib.ttypes import QueryRequest
 from pinball.master.thrift_lib.ttypes import QueryResponse
@@ -128,7 +129,8 @@ class RmTestCase(unittest.TestCase):
 
         output = command.execute(client, None)
 
-        query = Query(namePrefix='/some_path')
+        query = Query(namePrefix='/some_path',
+                      projection=Projection.METADATA)
         request = QueryRequest(queries=[query])
         client.query.assert_called_once_with(request)
         self.assertEqual('no tokens found\nremoved 0 token(s)\n', output)
@@ -155,7 +157,8 @@ class RmTestCase(unittest.TestCase):
 
         output = command.execute(client, None)
 
-        query = Query(namePrefix='/some_path')
+        query = Query(namePrefix='/some_path',
+                      projection=Projection.METADATA)
         query_request = QueryRequest(queries=[query])
         client.query.assert_called_once_with(query_request)
 
@@ -151,7 +151,8 @@ class StopTestCase(unittest.TestCase):
 
         output = command.execute(client, None)
 
-        query = Query(namePrefix='/workflow/does_not_exist/123/')
+        query = Query(namePrefix='/workflow/does_not_exist/123/',
+                      pageSize=1000)
         query_request = QueryRequest(queries=[query])
         client.query.assert_called_once_with(query_request)
         self.assertEqual('workflow does_not_exist instance 123 not found\n',
@@ -173,7 +174,8 @@ class StopTestCase(unittest.TestCase):
 
         output = command.execute(client, None)
 
-        query = Query(namePrefix='/workflow/some_workflow/123/')
+        query = Query(namePrefix='/workflow/some_workflow/123/',
+                      pageSize=1000)
         query_request = QueryRequest(queries=[query])
         client.query.assert_called_once_with(query_request)
         modify_request = ModifyRequest(deletes=[token])
@@ -195,7 +197,8 @@ class PauseTestCase(unittest.TestCase):
 
         output = command.execute(client, None)
 
-        query = Query(namePrefix='/workflow/does_not_exist/123/')
+        query = Query(namePrefix='/workflow/does_not_exist/123/',
+                      pageSize=1000)
         query_request = QueryRequest(queries=[query])
         client.query.assert_called_once_with(query_request)
         self.assertEqual('workflow does_not_exist instance 123 not found\n',
@@ -218,7 +221,8 @@ class PauseTestCase(unittest.TestCase):
 
         output = command.execute(client, None)
 
-        query = Query(namePrefix='/workflow/some_workflow/123/')
+        query = Query(namePrefix='/workflow/some_workflow/123/',
+                      pageSize=1000)
         query_request = QueryRequest(queries=[query])
         client.query.assert_called_once_with(query_request)
         self.assertEqual(1, client.modify.call_count)
@@ -246,7 +250,8 @@ class ResumeTestCase(unittest.TestCase):
 
         output = command.execute(client, None)
 
-        query = Query(namePrefix='/workflow/does_not_exist/123/')
+        query = Query(namePrefix='/workflow/does_not_exist/123/',
+                      pageSize=1000)
         query_request = QueryRequest(queries=[query])
         client.query.assert_called_once_with(query_request)
         self.assertEqual('workflow does_not_exist instance 123 not found\n',
@@ -270,7 +275,8 @@ class ResumeTestCase(unittest.TestCase):
 
         output = command.execute(client, None)
 
-        query = Query(namePrefix='/workflow/some_workflow/123/')
+        query = Query(namePrefix='/workflow/some_workflow/123/',
+                      pageSize=1000)
         query_request = QueryRequest(queries=[query])
         client.query.assert_called_once_with(query_request)
         updated_token = copy.copy(token)
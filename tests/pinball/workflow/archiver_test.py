@@ -20,6 +20,7 @@ import unittest
 from pinball.workflow.archiver import Archiver
 from pinball.master.thrift_lib.ttypes import ArchiveRequest
 from pinball.master.thrift_lib.ttypes import Token
+from pinball.master.thrift_lib.ttypes import Projection
 from pinball.master.thrift_lib.ttypes import Query
 from pinball.master.thrift_lib.ttypes import QueryRequest
 from pinball.master.thrift_lib.ttypes import QueryResponse
@@ -48,7 +49,8 @@ class ArchiverTestCase(unittest.TestCase):
         self._client.query.return_value = query_response
 
     def _verify_get_instance_tokens(self):
-        query = Query(namePrefix='/workflow/some_workflow/123/')
+        query = Query(namePrefix='/workflow/some_workflow/123/',
+                      projection=Projection.METADATA)
         query_request = QueryRequest(queries=[query])
         self._client.query.assert_called_once_with(query_request)
 
@@ -0,0 +1,173 @@
+# Copyright 2015, Pinterest, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Validation tests for the job trigger."""
+import pickle
+import unittest
+
+from pinball.master.master_handler import MasterHandler
+from pinball.master.thrift_lib.ttypes import GroupRequest
+from pinball.master.thrift_lib.ttypes import ModifyRequest
+from pinball.master.thrift_lib.ttypes import Query
+from pinball.master.thrift_lib.ttypes import QueryRequest
+from pinball.master.thrift_lib.ttypes import Token
+from pinball.workflow.event import Event
+from pinball.workflow.job import ShellJob
+from pinball.workflow.job_trigger import JobTrigger
+from pinball.workflow.name import Name
+from tests.pinball.persistence.ephemeral_store import EphemeralStore
+
+
+__author__ = 'Pawel Garbacki'
+__copyright__ = 'Copyright 2015, Pinterest, Inc.'
+__credits__ = [__author__]
+__license__ = 'Apache'
+__version__ = '2.0'
+
+
+class JobTriggerTestCase(unittest.TestCase):
+    def setUp(self):
+        self._store = EphemeralStore()
+        self._handler = MasterHandler(self._store, triggers=[JobTrigger()])
+
+    @staticmethod
+    def _get_job_token(job, inputs, job_state=Name.WAITING_STATE):
+        name = Name(workflow='some_workflow',
+                    instance='12345',
+                    job_state=job_state,
+                    job=job)
+        job = ShellJob(name=job,
+                       inputs=inputs,
+                       outputs=[],
+                       command='echo %s' % job)
+        return Token(name=name.get_job_token_name(), priority=10,
+                     data=pickle.dumps(job))
+
+    @staticmethod
+    def _get_event_token(job, input_name, event, attributes=None):
+        name = Name(workflow='some_workflow',
+                    instance='12345',
+                    job=job,
+                    input_name=input_name,
+                    event=event)
+        event = Event(creator='JobTriggerTest', attributes=attributes)
+        return Token(name=name.get_event_token_name(),
+                     data=pickle.dumps(event))
+
+    def _get_token_names(self):
+        request = GroupRequest(namePrefix='/workflow/')
+        response = self._handler.group(request)
+        return sorted(response.counts.keys())
+
+    def _get_token(self, name):
+        request = QueryRequest(queries=[Query(namePrefix=name)])
+        response = self._handler.query(request)
+        self.assertEqual(1, len(response.tokens[0]))
+        return response.tokens[0][0]
+
+    def test_start_event_in_the_same_request(self):
+        job_token = JobTriggerTestCase._get_job_token(
+            'parent_job', [Name.WORKFLOW_START_INPUT])
+        event_token = JobTriggerTestCase._get_event_token(
+            'parent_job', Name.WORKFLOW_START_INPUT, 'start_event')
+        request = ModifyRequest(updates=[job_token, event_token])
+        response = self._handler.modify(request)
+
+        # Requested updates are returned even though they got consumed.
+        self.assertEqual(2, len(response.updates))
+        runnable_name = Name(workflow='some_workflow',
+                             instance='12345',
+                             job_state=Name.RUNNABLE_STATE,
+                             job='parent_job').get_job_token_name()
+        self.assertEqual([runnable_name], self._get_token_names())
+        self.assertEqual([runnable_name],
+                         [token.name for token in
+                          self._store.read_active_tokens(
+                              name_prefix='/workflow/')])
+        runnable_token = self._get_token(runnable_name)
+        self.assertEqual(10, runnable_token.priority)
+
+    def test_event_consumption(self):
+        job_token = JobTriggerTestCase._get_job_token(
+            'child_job', ['parent_job', 'other_parent_job'])
+        self._handler.modify(ModifyRequest(updates=[job_token]))
+
+        request = ModifyRequest(updates=[
+            JobTriggerTestCase._get_event_token('child_job', 'parent_job',
+                                                'event_1', {'a': 'b'}),
+            JobTriggerTestCase._get_event_token('child_job', 'parent_job',
+                                                'event_2')])
+        self._handler.modify(request)
+        # One of the inputs has no events so the job remains waiting.
+        self.assertEqual(3, len(self._get_token_names()))
+        self.assertTrue(job_token.name in self._get_token_names())
+
+        event_token = JobTriggerTestCase._get_event_token(
+            'child_job', 'other_parent_job', 'event_3')
+        self._handler.modify(ModifyRequest(updates=[event_token]))
+
+        runnable_name = Name(workflow='some_workflow',
+                             instance='12345',
+                             job_state=Name.RUNNABLE_STATE,
+                             job='child_job').get_job_token_name()
+        event_name = Name(workflow='some_workflow',
+                          instance='12345',
+                          job='child_job',
+                          input_name='parent_job',
+                          event='event_2').get_event_token_name()
+        # One event per input got consumed.
+        self.assertEqual([event_name, runnable_name],
+                         self._get_token_names())
+        job = pickle.loads(self._get_token(runnable_name).data)
+        self.assertEqual(1, len(job.events))
+        self.assertEqual({'a': 'b'}, job.events[0].attributes)
+
+    def test_trigger_loaded_tokens(self):
+        job_token = JobTriggerTestCase._get_job_token(
+            'parent_job', [Name.WORKFLOW_START_INPUT])
+        job_token.version = 1
+        event_token = JobTriggerTestCase._get_event_token(
+            'parent_job', Name.WORKFLOW_START_INPUT, 'start_event')
+        event_token.version = 2
+        self._store.commit_tokens(updates=[job_token, event_token])
+
+        # Loaded tokens are not triggered unless requested.
+        self._handler = MasterHandler(self._store, triggers=[JobTrigger()])
+        self.assertEqual(sorted([job_token.name, event_token.name]),
+                         sorted(self._get_token_names()))
+
+        self._handler = MasterHandler(self._store, triggers=[JobTrigger()],
+                                      trigger_loaded_tokens=True)
+
+        runnable_name = Name(workflow='some_workflow',
+                             instance='12345',
+                             job_state=Name.RUNNABLE_STATE,
+                             job='parent_job').get_job_token_name()
+        self.assertEqual([runnable_name], self._get_token_names())
+
+    def test_runnable_job_not_overwritten(self):
+        runnable_token = JobTriggerTestCase._get_job_token(
+            'parent_job', [Name.WORKFLOW_START_INPUT], Name.RUNNABLE_STATE)
+        runnable_token.owner = 'some_owner'
+        self._handler.modify(ModifyRequest(updates=[runnable_token]))
+
+        job_token = JobTriggerTestCase._get_job_token(
+            'parent_job', [Name.WORKFLOW_START_INPUT])
+        event_token = JobTriggerTestCase._get_event_token(
+            'parent_job', Name.WORKFLOW_START_INPUT, 'start_event')
+        self._handler.modify(ModifyRequest(updates=[job_token, event_token]))
+
+        self.assertEqual(3, len(self._get_token_names()))
+        self.assertEqual('some_owner',
+                         self._get_token(runnable_token.name).owner)
@@ -0,0 +1,164 @@
+# Copyright 2015, Pinterest, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Validation tests for the lease manager."""
+import copy
+import mock
+import pickle
+import time
+import unittest
+
+from pinball.master.factory import Factory
+from pinball.master.thrift_lib.ttypes import ModifyRequest
+from pinball.master.thrift_lib.ttypes import Query
+from pinball.master.thrift_lib.ttypes import QueryRequest
+from pinball.master.thrift_lib.ttypes import Token
+from pinball.master.thrift_lib.ttypes import TokenMasterException
+from pinball.workflow.job import ShellJob
+from pinball.workflow.lease_manager import LeaseManager
+from pinball.workflow.name import Name
+from pinball.workflow.signaller import Signal
+from pinball.workflow.signaller import Signaller
+from tests.pinball.persistence.ephemeral_store import EphemeralStore
+
+
+__author__ = 'Pawel Garbacki'
+__copyright__ = 'Copyright 2015, Pinterest, Inc.'
+__credits__ = [__author__]
+__license__ = 'Apache'
+__version__ = '2.0'
+
+
+class LeaseManagerTestCase(unittest.TestCase):
+    _LEASE_TIME_SEC = 100
+
+    def setUp(self):
+        self._factory = Factory()
+        self._factory.create_master(EphemeralStore())
+        self._client = self._factory.get_client()
+        self._lease_manager = LeaseManager(self._factory.get_client())
+
+    def _post_job_token(self, instance, expiration_time):
+        name = Name(workflow='some_workflow',
+                    instance=instance,
+                    job_state=Name.RUNNABLE_STATE,
+                    job='some_job')
+        job = ShellJob(name='some_job', inputs=[], outputs=[],
+                       command='echo')
+        token = Token(name=name.get_job_token_name(),
+                      owner='some_worker',
+                      expirationTime=expiration_time,
+                      data=pickle.dumps(job))
+        response = self._client.modify(ModifyRequest(updates=[token]))
+        return response.updates[0]
+
+    def _get_token(self, name):
+        request = QueryRequest(queries=[Query(namePrefix=name)])
+        response = self._client.query(request)
+        return response.tokens[0][0]
+
+    @staticmethod
+    def _create_executor():
+        executor = mock.Mock()
+        executor.job_dirty = False
+        return executor
+
+    def test_renew(self):
+        now = int(time.time())
+        expiring_token = self._post_job_token('123', now)
+        valid_token = self._post_job_token(
+            '456', now + LeaseManagerTestCase._LEASE_TIME_SEC)
+        expiring_executor = LeaseManagerTestCase._create_executor()
+        valid_executor = LeaseManagerTestCase._create_executor()
+        self._lease_manager.add(expiring_token, expiring_executor,
+                                LeaseManagerTestCase._LEASE_TIME_SEC)
+        self._lease_manager.add(valid_token, valid_executor,
+                                LeaseManagerTestCase._LEASE_TIME_SEC)
+
+        self._lease_manager.renew()
+
+        renewed_token = self._lease_manager.remove(expiring_token.name)
+        self.assertEqual(renewed_token, self._get_token(expiring_token.name))
+        self.assertLess(expiring_token.version, renewed_token.version)
+        self.assertLess(expiring_token.expirationTime,
+                        renewed_token.expirationTime)
+        self.assertEqual(expiring_token.data, renewed_token.data)
+        # Leases that are not about to expire are left alone.
+        self.assertEqual(valid_token,
+                         self._lease_manager.remove(valid_token.name))
+        self.assertEqual(valid_token, self._get_token(valid_token.name))
+        self.assertFalse(expiring_executor.abort.called)
+        self.assertFalse(valid_executor.abort.called)
+
+    def test_update_dirty_job(self):
+        token = self._post_job_token(
+            '123', int(time.time()) + LeaseManagerTestCase._LEASE_TIME_SEC)
+        executor = LeaseManagerTestCase._create_executor()
+        executor.job_dirty = True
+        executor.job = pickle.loads(token.data)
+        executor.job.command = 'echo some_property'
+        self._lease_manager.add(token, executor,
+                                LeaseManagerTestCase._LEASE_TIME_SEC)
+
+        self._lease_manager.renew()
+
+        self.assertFalse(executor.job_dirty)
+        updated_token = self._lease_manager.remove(token.name)
+        self.assertEqual(updated_token, self._get_token(token.name))
+        self.assertEqual('echo some_property',
+                         pickle.loads(updated_token.data).command)
+
+    def test_abort_signal(self):
+        now = int(time.time())
+        aborted_token = self._post_job_token('123', now)
+        running_token = self._post_job_token('456', now)
+        aborted_executor = LeaseManagerTestCase._create_executor()
+        running_executor = LeaseManagerTestCase._create_executor()
+        self._lease_manager.add(aborted_token, aborted_executor,
+                                LeaseManagerTestCase._LEASE_TIME_SEC)
+        self._lease_manager.add(running_token, running_executor,
+                                LeaseManagerTestCase._LEASE_TIME_SEC)
+        signaller = Signaller(self._client, 'some_workflow', '123')
+        signaller.set_action(Signal.ABORT)
+
+        self._lease_manager.renew()
+        self._lease_manager.renew()
+
+        aborted_executor.abort.assert_called_once_with()
+        self.assertFalse(running_executor.abort.called)
+
+    def test_version_conflict(self):
+        token = self._post_job_token('123', int(time.time()))
+        executor = LeaseManagerTestCase._create_executor()
+        self._lease_manager.add(token, executor,
+                                LeaseManagerTestCase._LEASE_TIME_SEC)
+        # Someone else modifies the token.
+        self._client.modify(ModifyRequest(updates=[copy.copy(token)]))
+
+        self._lease_manager.renew()
+
+        executor.abort.assert_called_once_with()
+        self.assertEqual(token, self._lease_manager.remove(token.name))
+
+    def test_master_failure(self):
+        token = self._post_job_token('123', int(time.time()))
+        executor = LeaseManagerTestCase._create_executor()
+        self._lease_manager.add(token, executor,
+                                LeaseManagerTestCase._LEASE_TIME_SEC)
+
+        with mock.patch.object(self._lease_manager._client, 'call_many',
+                               side_effect=TokenMasterException()):
+            self._lease_manager.renew()
+
+        executor.abort.assert_called_once_with()
@@ -47,6 +47,12 @@ class NameTestCase(unittest.TestCase):
         self.assertEqual('waiting', name.job_state)
         self.assertEqual(PREFIX, name.get_job_state_prefix())
 
+    def test_job_state_pattern(self):
+        name = Name(job_state=Name.RUNNABLE_STATE)
+        self.assertEqual('/workflow/*/*/job/runnable/',
+                         name.get_job_state_pattern())
+        self.assertEqual('', Name().get_job_state_pattern())
+
     def test_job_prefix(self):
         PREFIX = '/workflow/some_workflow/some_instance/job/'
         name = Name.from_job_prefix(PREFIX)
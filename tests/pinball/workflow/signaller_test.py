@@ -15,6 +15,7 @@
 """Validation tests for the signaller."""
 import mock
 import pickle
+import threading
 import unittest
 
 from pinball.config.pinball_config import PinballConfig
@@ -199,3 +200,18 @@ class SignallerTestCase(unittest.TestCase):
                          reading_signaller.get_attribute(
                              Signal.ARCHIVE,
                              Signal.TIMESTAMP_ATTR))
+
+    def test_wait_for_change(self):
+        client = self._factory.get_client()
+        signaller = Signaller(client, workflow='some_workflow',
+                              instance='123')
+        self.assertFalse(signaller.wait_for_change(0))
+
+        other_signaller = Signaller(client)
+        waiter = threading.Thread(
+            target=lambda: signaller.wait_for_change(60))
+        waiter.start()
+        other_signaller.set_action(Signal.DRAIN)
+        waiter.join()
+
+        self.assertTrue(signaller.is_action_set(Signal.DRAIN))
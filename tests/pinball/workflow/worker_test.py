@@ -26,15 +26,18 @@ from pinball.run_pinball import _run_worker
 from pinball.workflow.event import Event
 from pinball.workflow.name import Name
 from pinball.workflow.job import ShellJob
+from pinball.workflow.job_trigger import JobTrigger
 from pinball.workflow.worker import Worker
 from pinball.master.thrift_lib.ttypes import GroupRequest
 from pinball.master.thrift_lib.ttypes import ModifyRequest
 from pinball.master.thrift_lib.ttypes import Token
 from pinball.master.thrift_lib.ttypes import Query
 from pinball.master.thrift_lib.ttypes import QueryRequest
+from pinball.master.thrift_lib.ttypes import WatchRequest
 from pinball.workflow.job_executor import ExecutionRecord
 from tests.pinball.persistence.ephemeral_store import EphemeralStore
 from pinball.workflow.signaller import Signal
+from pinball.workflow.signaller import Signaller
 
 
 __author__ = 'Pawel Garbacki'
@@ -55,7 +58,7 @@ class WorkerTestCase(unittest.TestCase):
     def setUp(self):
         self._factory = Factory()
         self._store = EphemeralStore()
-        self._factory.create_master(self._store)
+        self._factory.create_master(self._store, triggers=[JobTrigger()])
         self._emailer = mock.Mock()
         self._worker = Worker(self._factory.get_client(), self._store,
                               self._emailer)
@@ -135,23 +138,6 @@ class WorkerTestCase(unittest.TestCase):
         self.assertEqual(1, len(tokens))
         return tokens[0]
 
-    def _verify_parent_job_waiting(self):
-        token_names = [
-            Name(workflow='some_workflow',
-                 instance='12345',
-                 job_state=Name.WAITING_STATE,
-                 job='parent_job').get_job_token_name(),
-            Name(workflow='some_workflow',
-                 instance='12345',
-                 job_state=Name.WAITING_STATE,
-                 job='child_job').get_job_token_name(),
-            Name(workflow='some_workflow',
-                 instance='12345',
-                 job='parent_job',
-                 input_name=Name.WORKFLOW_START_INPUT,
-                 event='workflow_start_event').get_event_token_name()]
-        self._verify_token_names(token_names)
-
     def _verify_parent_job_runnable(self):
         token_names = [Name(workflow='some_workflow',
                             instance='12345',
@@ -163,76 +149,6 @@ class WorkerTestCase(unittest.TestCase):
                             job='child_job').get_job_token_name()]
         self._verify_token_names(token_names)
 
-    def test_get_triggering_events(self):
-        self.assertEqual([], Worker._get_triggering_events([]))
-
-        self.assertEqual(['a'], Worker._get_triggering_events([['a']]))
-
-        events = Worker._get_triggering_events([['a', 'b']])
-        self.assertTrue(events == ['a'] or events == ['b'])
-
-        events = Worker._get_triggering_events([['a', 'b'], ['1', '2']])
-        self.assertTrue(events == ['a', '1'] or events == ['a', '2'] or
-                        events == ['b', '1'] or events == ['b', '2'])
-
-    def test_move_job_token_to_runnable(self):
-        self._post_job_tokens()
-        self._post_workflow_start_event_token()
-        job_name = Name(workflow='some_workflow',
-                        instance='12345',
-                        job_state=Name.WAITING_STATE,
-                        job='parent_job')
-        job_token = self._get_token(job_name.get_job_token_name())
-        event_name = Name(workflow='some_workflow',
-                          instance='12345',
-                          job='parent_job',
-                          input_name=Name.WORKFLOW_START_INPUT,
-                          event='workflow_start_event')
-        event_token = self._get_token(event_name.get_event_token_name())
-        self._worker._move_job_token_to_runnable(job_token, [event_token])
-        # Event token should have been removed and the parent job should be
-        # runnable.
-        self._verify_parent_job_runnable()
-
-    def test_make_job_runnable(self):
-        self._post_job_tokens()
-        self._post_workflow_start_event_token()
-
-        parent_job_name = Name(workflow='some_workflow',
-                               instance='12345',
-                               job_state=Name.WAITING_STATE,
-                               job='parent_job').get_job_token_name()
-        child_job_name = Name(workflow='some_workflow',
-                              instance='12345',
-                              job_state=Name.WAITING_STATE,
-                              job='child_job').get_job_token_name()
-
-        parent_job_token = self._get_token(parent_job_name)
-        child_job_token = self._get_token(child_job_name)
-
-        self._worker._make_job_runnable(child_job_token)
-        # Child job is missing triggering tokens so it cannot be made runnable.
-        self._verify_parent_job_waiting()
-
-        self._worker._make_job_runnable(parent_job_token)
-        # Parent job has all triggering tokens so it can be made runnable.
-        self._verify_parent_job_runnable()
-
-    def test_make_runnable(self):
-        self._post_job_tokens()
-        self._post_workflow_start_event_token()
-
-        self._worker._make_runnable('some_other_workflow', '12345')
-        # Workflow instance does not exist so nothing should have changed.
-        self._verify_parent_job_waiting()
-
-        self._worker._make_runnable('some_workflow', 'some_other_instance')
-        # Workflow instance does not exist so nothing should have changed.
-        self._verify_parent_job_waiting()
-
-        self._worker._make_runnable('some_workflow', '12345')
-        self._verify_parent_job_runnable()
-
     def test_own_runnable_job_token(self):
         self._post_job_tokens()
 
@@ -260,6 +176,47 @@ class WorkerTestCase(unittest.TestCase):
                  job='parent_job').get_job_token_name())
         self.assertEqual(parent_token, self._worker._owned_job_token)
 
+    def _post_runnable_job_token(self, instance, job, priority):
+        name = Name(workflow='some_workflow',
+                    instance=instance,
+                    job_state=Name.RUNNABLE_STATE,
+                    job=job)
+        job = ShellJob(name=job, inputs=[], outputs=[], command='echo')
+        token = Token(name=name.get_job_token_name(), priority=priority,
+                      data=pickle.dumps(job))
+        request = ModifyRequest(updates=[token])
+        self._client.modify(request)
+        return name.get_job_token_name()
+
+    def test_query_and_own_best_runnable_job_token(self):
+        self._post_runnable_job_token('123', 'some_job', 10)
+        best_name = self._post_runnable_job_token('456', 'some_job', 20)
+        drained_name = self._post_runnable_job_token('789', 'some_job', 30)
+        Signaller(self._client, 'some_workflow', '789').set_action(
+            Signal.DRAIN)
+
+        self._worker._query_and_own_best_runnable_job_token()
+        # The job in the drained instance should have been skipped.
+        self.assertIsNone(self._get_token(drained_name).owner)
+        self.assertEqual(best_name, self._worker._owned_job_token.name)
+        self.assertEqual(self._worker._name, self._get_token(best_name).owner)
+
+    def test_query_and_own_in_drained_instance(self):
+        self._post_runnable_job_token('789', 'some_job', 30)
+        Signaller(self._client, 'some_workflow', '789').set_action(
+            Signal.DRAIN)
+        other_worker = Worker(self._factory.get_client(), self._store,
+                              self._emailer)
+        version = self._client.watch(WatchRequest()).version
+
+        for _ in range(0, 3):
+            for worker in [self._worker, other_worker]:
+                worker._query_and_own_best_runnable_job_token()
+                self.assertIsNone(worker._owned_job_token)
+        # Workers skipping the drained instance do not modify its tokens so
+        # they do not wake up each other.
+        self.assertEqual(version, self._client.watch(WatchRequest()).version)
+
     def _add_history_to_owned_token(self):
         job = pickle.loads(self._worker._owned_job_token.data)
         execution_record = ExecutionRecord(start_time=123456,